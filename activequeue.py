@@ -0,0 +1,291 @@
+"""
+主动学习优先队列：给未标注的图片打分，按分数从高到低决定下一张标注哪张图片。
+
+打分器可以组合使用（分数都在 [0, 1]，按权重相加）:
+    UncertaintyScorer   模型预测的不确定性：置信度越接近 0.5 的框越不确定，取图片内最大值
+    DiversityScorer     多样性：与已标注图片在嵌入空间中的最近距离（没有嵌入文件时用感知哈希的 64 位）
+    RarityScorer        类别稀有度：模型预测包含已标注数量少的类别的图片优先
+
+图片保存后只更新打分器的统计（已标注的嵌入、各类别的图片数），不重新给整个数据集打分。
+新增标注只会让其它图片的分数变小，所以队列中保存的分数是上界，取下一张时按惰性贪心 (CELF) 的方式
+只重新计算堆顶的几张图片，直到堆顶的新分数不低于第二名的旧分数。改标或清空标注使某个类别的计数
+减少时，预测含该类别的图片分数会变大：打分器返回这些图片和最大增量，队列把它们的上界加上增量后重新入堆。
+清空标注的图片的嵌入仍留在多样性的参考集中，它附近的图片分数偏低，但不会超过上界。
+
+打分器的接口:
+    initial_scores()                全部图片的初始分数（向量化计算）
+    score(index)                    某张图片当前的分数
+    update(index, old, new)         图片的标注从 old 变为 new（类别ID集合，未知时 old 为 None）；
+                                    有图片的分数可能变大时返回 (图片序号数组, 最大增量)，否则返回 None
+"""
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import predeval
+
+
+def load_predictions(pred_paths, workers=None, chunk_size=2048):
+    """并行读取预测文件，返回 (类别, 置信度, offsets)"""
+    chunks = [pred_paths[i:i + chunk_size] for i in range(0, len(pred_paths), chunk_size)]
+    if len(chunks) <= 1 or workers == 1:
+        results = [predeval.scan_prediction_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(predeval.scan_prediction_chunk, chunks))
+    classes = [r[0] for r in results] or [np.empty(0, np.int32)]
+    scores = [r[2] for r in results] or [np.empty(0, np.float32)]
+    offsets = np.zeros(len(pred_paths) + 1, dtype=np.int64)
+    np.cumsum(np.concatenate([np.diff(r[3]) for r in results] or [np.empty(0, np.int64)]), out=offsets[1:])
+    return np.concatenate(classes), np.concatenate(scores), offsets
+
+
+def load_embeddings(path, image_files):
+    """
+    读取嵌入文件 (.npz，包含 paths 和 vectors 两个数组，paths 为图片文件名或完整路径)。
+
+    Returns:
+        (np.ndarray, np.ndarray): float32 嵌入 (图片数 x 维数) 和是否有嵌入的布尔数组。
+    """
+    data = np.load(path)
+    vectors = data['vectors'].astype(np.float32)
+    row_of = {}
+    for row, name in enumerate(data['paths']):
+        row_of[str(name)] = row
+        row_of.setdefault(os.path.basename(str(name)), row)
+    embeddings = np.zeros((len(image_files), vectors.shape[1]), dtype=np.float32)
+    valid = np.zeros(len(image_files), dtype=bool)
+    for i, image_path in enumerate(image_files):
+        row = row_of.get(image_path, row_of.get(os.path.basename(image_path)))
+        if row is not None:
+            embeddings[i], valid[i] = vectors[row], True
+    return embeddings, valid
+
+
+def hash_embeddings(hashes):
+    """64 位感知哈希 -> 0/1 向量（欧氏距离的平方等于汉明距离）"""
+    return np.unpackbits(hashes.astype('>u8').view(np.uint8).reshape(-1, 8), axis=1).astype(np.float32)
+
+
+class UncertaintyScorer:
+    """模型预测的不确定性：每个框 1 - |2 * conf - 1|，图片取最大值；没有预测框的图片为 0"""
+
+    def __init__(self, pred_scores, pred_offsets):
+        uncertainty = 1.0 - np.abs(2.0 * pred_scores.astype(np.float64) - 1.0)
+        self.values = np.zeros(len(pred_offsets) - 1)
+        counts = np.diff(pred_offsets)
+        nonempty = counts > 0
+        if nonempty.any():
+            self.values[nonempty] = np.maximum.reduceat(uncertainty, pred_offsets[:-1][nonempty])
+
+    def initial_scores(self):
+        return self.values
+
+    def score(self, index):
+        return float(self.values[index])
+
+    def update(self, index, old, new):
+        pass
+
+
+class DiversityScorer:
+    """
+    与已标注图片的最近距离（除以初始最大值归一化），已标注的图片越少覆盖的区域分数越高。
+
+    初始分数只与最多 sample_size 张已标注图片比较（距离只会偏大，仍是上界）；之后新标注的图片逐张
+    记录，score(index) 只把该图片与上次计算之后新增的已标注图片比较。
+    """
+
+    def __init__(self, embeddings, valid, labeled, sample_size=4096, seed=0):
+        self.embeddings = embeddings
+        self.valid = valid
+        self.added = []  # 队列建立之后新标注的图片的嵌入
+        reference = np.flatnonzero(labeled & valid)
+        if len(reference) > sample_size:
+            reference = np.random.default_rng(seed).choice(reference, sample_size, replace=False)
+        self.min_dist = np.full(len(embeddings), np.inf)
+        if len(reference):
+            ref = embeddings[reference]
+            ref_norms = (ref ** 2).sum(axis=1)
+            for start in range(0, len(embeddings), 8192):
+                block = embeddings[start:start + 8192]
+                dist = (block ** 2).sum(axis=1)[:, None] + ref_norms[None, :] - 2.0 * block @ ref.T
+                self.min_dist[start:start + 8192] = np.sqrt(np.maximum(dist.min(axis=1), 0))
+        finite = self.min_dist[np.isfinite(self.min_dist) & valid]
+        if len(finite) and finite.max() > 0:
+            self.scale = float(finite.max())
+        else:
+            # 还没有已标注的图片：用到嵌入中心的距离近似
+            self.scale = float(np.sqrt(((embeddings[valid] - embeddings[valid].mean(axis=0)) ** 2).sum(axis=1)).max()) \
+                if valid.any() else 1.0
+            self.scale = self.scale or 1.0
+        self.stamp = np.zeros(len(embeddings), dtype=np.int64)  # 每张图片的 min_dist 已包含 added 的前多少个
+
+    def initial_scores(self):
+        return np.where(self.valid, np.minimum(self.min_dist / self.scale, 1.0), 0.0)
+
+    def score(self, index):
+        if not self.valid[index]:
+            return 0.0
+        if self.stamp[index] < len(self.added):
+            new = np.asarray(self.added[self.stamp[index]:])
+            dist = float(np.sqrt(((new - self.embeddings[index]) ** 2).sum(axis=1).min()))
+            self.min_dist[index] = min(self.min_dist[index], dist)
+            self.stamp[index] = len(self.added)
+        return min(self.min_dist[index] / self.scale, 1.0)
+
+    def update(self, index, old, new):
+        if self.valid[index] and not old:
+            self.added.append(self.embeddings[index])
+
+
+class RarityScorer:
+    """
+    类别稀有度：类别权重为 1 / sqrt(1 + 含该类别的已标注图片数)，图片取模型预测的各类别中的最大权重。
+    标注保存后只更新类别计数。
+    """
+
+    def __init__(self, pred_classes, pred_offsets, label_counts):
+        self.pred_classes = pred_classes.astype(np.int64)
+        self.pred_offsets = pred_offsets
+        num_classes = int(max(self.pred_classes.max(initial=-1), max(label_counts, default=-1))) + 1
+        self.counts = np.zeros(max(num_classes, 1), dtype=np.int64)
+        for class_id, count in label_counts.items():
+            self.counts[class_id] = count
+
+    def weights(self):
+        return 1.0 / np.sqrt(1.0 + self.counts)
+
+    def initial_scores(self):
+        scores = np.zeros(len(self.pred_offsets) - 1)
+        nonempty = np.diff(self.pred_offsets) > 0
+        if nonempty.any():
+            scores[nonempty] = np.maximum.reduceat(self.weights()[self.pred_classes], self.pred_offsets[:-1][nonempty])
+        return scores
+
+    def score(self, index):
+        classes = self.pred_classes[self.pred_offsets[index]:self.pred_offsets[index + 1]]
+        return float(self.weights()[classes].max()) if len(classes) else 0.0
+
+    def update(self, index, old, new):
+        before = self.counts.copy()
+        for class_id in (old or ()):
+            if 0 <= class_id < len(self.counts):
+                self.counts[class_id] = max(self.counts[class_id] - 1, 0)
+        for class_id in new:
+            if class_id >= len(self.counts):
+                self.counts = np.r_[self.counts, np.zeros(class_id + 1 - len(self.counts), dtype=np.int64)]
+            if class_id >= 0:
+                self.counts[class_id] += 1
+        # 计数减少的类别权重变大，预测含这些类别的图片分数最多增加权重的最大增量
+        decreased = np.flatnonzero(self.counts[:len(before)] < before)
+        if not len(decreased):
+            return None
+        delta = float((1.0 / np.sqrt(1.0 + self.counts[decreased]) - 1.0 / np.sqrt(1.0 + before[decreased])).max())
+        boxes = np.flatnonzero(np.isin(self.pred_classes, decreased))
+        return np.unique(np.searchsorted(self.pred_offsets, boxes, side='right') - 1), delta
+
+
+class ActiveQueue:
+    """
+    未标注图片的优先队列。
+
+    Args:
+        labeled (np.ndarray): 每张图片是否已标注（已标注的图片不进入队列）。
+        scorers (list): [(打分器, 权重)]。
+        image_classes (dict, optional): 图片序号 -> 已标注的类别ID集合，用于更新时减去旧的统计。
+    """
+
+    def __init__(self, labeled, scorers, image_classes=None):
+        self.labeled = np.array(labeled, dtype=bool)
+        self.scorers = scorers
+        self.image_classes = image_classes or {}
+        self.visited = np.zeros(len(self.labeled), dtype=bool)  # 已经从队列取出（跳过未标注的也不再出现）
+        total = np.zeros(len(self.labeled))
+        for scorer, weight in scorers:
+            total += weight * scorer.initial_scores()
+        self.bounds = total  # 每张图片在堆中的分数上界
+        candidates = np.flatnonzero(~self.labeled)
+        self.heap = list(zip((-total[candidates]).tolist(), candidates.tolist()))
+        heapq.heapify(self.heap)
+
+    def __len__(self):
+        return int(np.count_nonzero(~self.labeled & ~self.visited))
+
+    def score(self, index):
+        return sum(weight * scorer.score(index) for scorer, weight in self.scorers)
+
+    def pop_next(self):
+        """取出分数最高的未标注图片，队列为空时返回 -1"""
+        while self.heap:
+            _, index = self.heap[0]
+            if self.labeled[index] or self.visited[index]:
+                heapq.heappop(self.heap)
+                continue
+            fresh = self.score(index)
+            # 其它图片保存的分数都是上界：新分数不低于第二名的旧分数时就是当前最高分
+            if len(self.heap) == 1 or -fresh <= min(self.heap[1:3])[0]:
+                heapq.heappop(self.heap)
+                self.visited[index] = True
+                return index
+            self.bounds[index] = fresh
+            heapq.heapreplace(self.heap, (-fresh, index))
+        return -1
+
+    def update(self, index, class_ids):
+        """图片的标注已保存: 更新打分器的统计；标注被清空的图片重新进入队列"""
+        class_ids = set(class_ids)
+        old = self.image_classes.get(index)
+        for scorer, weight in self.scorers:
+            raised = scorer.update(index, old, class_ids)
+            if raised is not None:
+                self.raise_bounds(raised[0], weight * raised[1])
+        self.image_classes[index] = class_ids
+        if class_ids:
+            self.labeled[index] = True
+        elif self.labeled[index]:
+            self.labeled[index] = False
+            self.visited[index] = False
+            self.bounds[index] = self.score(index)
+            heapq.heappush(self.heap, (-self.bounds[index], index))
+
+    def raise_bounds(self, indices, delta):
+        """这些图片的分数最多增加 delta：提高上界后重新入堆（旧的条目留在堆中，取到时重新计算或因已访问而跳过）"""
+        indices = np.asarray(indices, dtype=np.int64)
+        indices = indices[~self.labeled[indices] & ~self.visited[indices]]
+        self.bounds[indices] += delta
+        for i in indices.tolist():
+            heapq.heappush(self.heap, (-self.bounds[i], i))
+
+
+def build_queue(table, pred_paths=None, embeddings=None, weights=None, workers=None):
+    """
+    根据已有标注（labelio.LabelTable）、预测文件和嵌入建立队列；没有预测文件时不使用不确定性和稀有度。
+
+    Args:
+        pred_paths (list, optional): 与图片一一对应的预测文件路径。
+        embeddings (tuple, optional): (嵌入, 是否有效)，见 load_embeddings / hash_embeddings。
+        weights (dict, optional): 打分器权重，键为 'uncertainty' / 'diversity' / 'rarity'。
+    """
+    weights = {'uncertainty': 1.0, 'diversity': 1.0, 'rarity': 0.5, **(weights or {})}
+    counts = table.counts()
+    labeled = counts > 0
+    image_ids = table.image_ids()
+    image_classes = {}
+    for i, class_id in set(zip(image_ids.tolist(), table.classes.tolist())):
+        image_classes.setdefault(i, set()).add(class_id)
+    label_counts = {}
+    for classes in image_classes.values():
+        for class_id in classes:
+            label_counts[class_id] = label_counts.get(class_id, 0) + 1
+
+    scorers = []
+    if pred_paths:
+        pred_classes, pred_scores, pred_offsets = load_predictions(pred_paths, workers)
+        scorers.append((UncertaintyScorer(pred_scores, pred_offsets), weights['uncertainty']))
+        scorers.append((RarityScorer(pred_classes, pred_offsets, label_counts), weights['rarity']))
+    if embeddings is not None:
+        scorers.append((DiversityScorer(embeddings[0], embeddings[1], labeled), weights['diversity']))
+    return ActiveQueue(labeled, [(scorer, weight) for scorer, weight in scorers if weight > 0], image_classes)
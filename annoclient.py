@@ -0,0 +1,297 @@
+"""
+标注服务器（annoserver.py）的客户端。
+
+AnnotationClient  复用 HTTP/1.1 长连接（连接池），JSON 请求
+RemoteStore       与 labelstore 相同接口的远程标注存储：图片下载到本地缓存目录，界面照常按路径打开；
+                  后台线程预取接下来几张图片和它们的标注；保存时带上读取时的版本号
+"""
+import hashlib
+import http.client
+import json
+import os
+import queue
+import select
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import numpy as np
+
+import labelio
+import labelstore
+
+IDEMPOTENT_METHODS = ("GET", "HEAD")  # 发送后连接断开时可以重发的请求
+
+
+class ServerError(Exception):
+    """服务器返回错误"""
+
+
+class ConflictError(ServerError, labelstore.ConflictError):
+    """保存时版本不一致：标注已被其他人修改"""
+
+
+class LeaseError(ServerError):
+    """图片被其他人租用"""
+
+
+class AnnotationClient:
+    """
+    标注服务器客户端。
+
+    Args:
+        base_url (str): 例如 http://127.0.0.1:8765
+        client_id (str, optional): 客户端ID，默认随机生成。
+        pool_size (int): 连接池大小（同时进行的请求数，预取线程共用）。
+    """
+
+    def __init__(self, base_url, client_id=None, pool_size=4, timeout=30):
+        url = urlparse(base_url)
+        if url.scheme not in ("http", "https"):
+            raise ValueError(f"不支持的地址: {base_url}")
+        self.base_url = base_url
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.timeout = timeout
+        self.client_id = client_id or uuid.uuid4().hex
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    @staticmethod
+    def _is_stale(connection):
+        """空闲的长连接上有可读数据（通常是服务器关闭连接的 EOF）说明已不能再用"""
+        if connection.sock is None:
+            return False
+        try:
+            return bool(select.select([connection.sock], [], [], 0)[0])
+        except (OSError, ValueError):
+            return True
+
+    def request(self, method, path, payload=None, raw=False):
+        """
+        发送请求并返回 JSON（raw 时返回字节）。
+
+        长连接被服务器关闭时重连：发送前检查到的直接换新连接；发送之后才断开的只重发 GET/HEAD，
+        保存（PUT）和领取（POST）服务器可能已经执行过，重发会与自己的第一次请求冲突，直接报错。
+        """
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        with self._slots:
+            try:
+                connection = self._pool.get_nowait()
+            except queue.Empty:
+                connection = self._connect()
+            if self._is_stale(connection):
+                connection.close()
+                connection = self._connect()
+            for attempt in range(2):
+                sent = False
+                try:
+                    connection.request(method, path, body=body, headers=headers)
+                    sent = True
+                    response = connection.getresponse()
+                    data = response.read()
+                    break
+                except (http.client.HTTPException, OSError):
+                    connection.close()
+                    if attempt or (sent and method not in IDEMPOTENT_METHODS):
+                        raise
+                    connection = self._connect()
+            self._pool.put_nowait(connection)
+
+        if response.status == 200:
+            return data if raw else json.loads(data.decode("utf-8"))
+        try:
+            error = json.loads(data.decode("utf-8"))
+        except ValueError:
+            error = {'error': data.decode("utf-8", "replace")}
+        message = error.get('error', f"HTTP {response.status}")
+        if response.status == 409:
+            raise ConflictError(message, error.get('version'), error.get('annotations'))
+        if response.status == 423:
+            raise LeaseError(f"{message}: {error.get('holder')}")
+        raise ServerError(message)
+
+    def info(self):
+        return self.request("GET", "/info")
+
+    def list_images(self, offset=0, limit=None):
+        query = f"?offset={offset}" + (f"&limit={limit}" if limit is not None else "")
+        return self.request("GET", "/images" + query)['images']
+
+    def lease(self, count, ttl=None):
+        """领取 count 张图片，返回 [(序号, 文件名)]"""
+        response = self.request("POST", "/lease", {'client': self.client_id, 'count': count, 'ttl': ttl})
+        return list(zip(response['images'], response['names']))
+
+    def renew(self, ttl=None):
+        return self.request("POST", "/renew", {'client': self.client_id, 'ttl': ttl})['images']
+
+    def release(self, indices):
+        self.request("POST", "/release", {'client': self.client_id, 'images': list(indices)})
+
+    def get_image(self, index):
+        return self.request("GET", f"/image/{index}", raw=True)
+
+    def get_labels(self, index):
+        return self.request("GET", f"/labels/{index}")
+
+    def get_labels_batch(self, indices):
+        return self.request("POST", "/labels/batch", {'indices': list(indices)})['labels']
+
+    def save_labels(self, index, annotations, version):
+        """保存标注，返回新版本号；版本不一致抛出 ConflictError"""
+        payload = {'client': self.client_id, 'version': version,
+                   'annotations': [{'class': ann['class'], 'bbox': list(ann['bbox'])} for ann in annotations]}
+        return self.request("PUT", f"/labels/{index}", payload)['version']
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class RemoteStore:
+    """
+    远程标注存储（接口与 labelstore.YoloFileStore 相同，但没有 remap：类别编号由服务器管理，界面上不能修改类别）。
+
+    每张图片对应本地缓存目录中的一个文件 <序号>_<文件名>，界面按这个路径打开图片；
+    文件不存在时由 ensure_image 下载。读取标注时记录版本号，保存时带上该版本号。
+    """
+
+    kind = 'remote'
+
+    def __init__(self, client, cache_dir, indices, names, prefetch_workers=2):
+        self.client = client
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.paths = [os.path.join(cache_dir, f"{index:08d}_{name}") for index, name in zip(indices, names)]
+        self.index_of = {path: index for path, index in zip(self.paths, indices)}
+        self.leased = set(indices)
+        self.versions = {}  # 服务器图片序号 -> 读取时的版本号
+        self._labels = {}  # 预取的标注: 服务器图片序号 -> (annotations, version)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=prefetch_workers)
+        self._pending = {}  # 路径 -> Future
+
+    def _download(self, image_path):
+        if os.path.exists(image_path):
+            return
+        data = self.client.get_image(self.index_of[image_path])
+        temp_path = f"{image_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, image_path)
+
+    def ensure_image(self, image_path):
+        """确保图片已下载到缓存目录（正在预取时等待预取完成）"""
+        future = self._pending.get(image_path)
+        if future is not None:
+            future.result()
+        self._download(image_path)
+
+    def _prefetch_one(self, image_path):
+        try:
+            self._download(image_path)
+            index = self.index_of[image_path]
+            labels = self.client.get_labels(index)
+            with self._lock:
+                self._labels.setdefault(index, (labels['annotations'], labels['version']))
+        except Exception as e:
+            print(f"预取 {os.path.basename(image_path)} 失败: {e}")
+
+    def prefetch(self, image_paths):
+        """在后台预取图片和标注"""
+        for image_path in image_paths:
+            if image_path in self._pending and not self._pending[image_path].done():
+                continue
+            if os.path.exists(image_path) and self.index_of[image_path] in self._labels:
+                continue
+            self._pending[image_path] = self._executor.submit(self._prefetch_one, image_path)
+
+    def read(self, image_path):
+        index = self.index_of[image_path]
+        with self._lock:
+            cached = self._labels.pop(index, None)
+        if cached is None:
+            labels = self.client.get_labels(index)
+            cached = (labels['annotations'], labels['version'])
+        annotations, version = cached
+        self.versions[index] = version
+        return annotations
+
+    def write(self, image_path, annotations):
+        index = self.index_of[image_path]
+        try:
+            self.versions[index] = self.client.save_labels(index, annotations, self.versions.get(index, 0))
+        except ConflictError as e:
+            raise ConflictError(f"标注已被其他人修改（服务器版本 {e.version}，本地版本 {self.versions.get(index, 0)}）",
+                                e.version, e.annotations) from None
+
+    def scan(self, image_files, workers=None, batch_size=500):
+        """批量读取标注，组装为 LabelTable"""
+        classes, boxes, counts = [], [], []
+        for start in range(0, len(image_files), batch_size):
+            indices = [self.index_of[p] for p in image_files[start:start + batch_size]]
+            for labels in self.client.get_labels_batch(indices):
+                annotations = labels['annotations']
+                classes.extend(ann['class'] for ann in annotations)
+                boxes.extend(ann['bbox'] for ann in annotations)
+                counts.append(len(annotations))
+        offsets = np.zeros(len(image_files) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return labelio.LabelTable(np.array(classes, dtype=np.int32),
+                                  np.array(boxes, dtype=np.float32).reshape(-1, 4), offsets)
+
+    def accept(self, image_path, version):
+        """接受服务器上的当前版本，之后的 write 将覆盖它"""
+        self.versions[self.index_of[image_path]] = version
+
+    def lease_more(self, count):
+        """再领取 count 张图片，返回新领取的 (序号, 路径) 列表"""
+        added = []
+        for index, name in self.client.lease(count):
+            if index in self.leased:
+                continue
+            path = os.path.join(self.cache_dir, f"{index:08d}_{name}")
+            self.paths.append(path)
+            self.index_of[path] = index
+            self.leased.add(index)
+            added.append((index, path))
+        return added
+
+    def renew(self):
+        """续期租约，返回仍然有效的图片序号"""
+        return self.client.renew()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        try:
+            if self.leased:
+                self.client.release(sorted(self.leased))
+        except Exception as e:
+            print(f"释放租约失败: {e}")
+        self.client.close()
+
+
+def connect(base_url, count, cache_dir):
+    """连接服务器并领取 count 张图片，返回 (RemoteStore, 类别列表, 租约时长)"""
+    client = AnnotationClient(base_url)
+    info = client.info()
+    leased = client.lease(count)
+    store = RemoteStore(client, cache_dir, [index for index, _ in leased], [name for _, name in leased])
+    return store, info['classes'], info['lease_seconds']
+
+
+def cache_dir_for(base_url):
+    """服务器图片的本地缓存目录: ~/.labelbridge/remote/<地址哈希>"""
+    digest = hashlib.sha1(base_url.rstrip("/").encode('utf-8')).hexdigest()[:16]
+    return os.path.join(os.path.expanduser("~"), ".labelbridge", "remote", digest)
@@ -0,0 +1,278 @@
+"""
+多人标注服务器：通过 HTTP/JSON 分发图片租约、提供图片和标注，保存时用版本号做乐观并发控制。
+
+接口（除图片外均为 JSON）:
+    GET  /info                      图片数、类别列表、默认租约时长
+    GET  /images?offset=&limit=     图片列表 [{index, name}]
+    GET  /image/<index>             图片原始字节
+    GET  /labels/<index>            {annotations, version, holder}
+    POST /labels/batch              {indices} -> {labels: [{index, annotations, version}]}
+    PUT  /labels/<index>            {client, version, annotations} -> {version}
+                                    版本不一致返回 409 和服务器上的当前标注；被其他人租用时返回 423
+    POST /lease                     {client, count, ttl} -> {images: [index], names: [文件名], ttl}
+    POST /renew                     {client} -> {images: [index]}  续期该客户端的全部租约
+    POST /release                   {client, images}
+    GET  /classes                   {classes}
+
+标注通过 labelstore 读写（文件夹中有 labels.db 时写入 SQLite，否则写 .txt）。
+版本号和租约只保存在内存中：服务器重启后所有版本从 0 开始，客户端需要重新领取图片。
+
+命令行用法:
+    python annoserver.py <图片文件夹> [--host 127.0.0.1] [--port 8765]
+"""
+import argparse
+import json
+import mimetypes
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import labelio
+import labelstore
+
+DEFAULT_LEASE_SECONDS = 600
+
+
+class AnnotationService:
+    """服务器状态：图片列表、版本号和租约，所有方法线程安全"""
+
+    def __init__(self, folder_path, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.folder_path = folder_path
+        self.lease_seconds = lease_seconds
+        self.image_files = labelio.list_image_files(folder_path)
+        self.store = labelstore.open_store(folder_path)
+        self.versions = [0] * len(self.image_files)
+        self.leases = {}  # 图片序号 -> (客户端ID, 到期时间)
+        self.cursor = 0  # 下一次分发从这里开始找空闲图片
+        self._lock = threading.Lock()
+
+    def class_names(self):
+        classes_path = os.path.join(self.folder_path, "classes.txt")
+        return labelio.read_class_names(classes_path) if os.path.exists(classes_path) else []
+
+    def holder(self, index, now=None):
+        """当前租用该图片的客户端，没有或已过期时返回 None"""
+        lease = self.leases.get(index)
+        if lease and lease[1] > (now or time.monotonic()):
+            return lease[0]
+        return None
+
+    def lease(self, client, count, ttl=None):
+        """分发最多 count 张没有被其他人租用的图片，已租用的图片也会续期"""
+        ttl = ttl or self.lease_seconds
+        now = time.monotonic()
+        with self._lock:
+            granted = []
+            total = len(self.image_files)
+            for step in range(total):
+                if len(granted) >= count:
+                    break
+                index = (self.cursor + step) % total
+                if self.holder(index, now) is None:
+                    self.leases[index] = (client, now + ttl)
+                    granted.append(index)
+            if granted:
+                self.cursor = (granted[-1] + 1) % total
+            return granted
+
+    def renew(self, client, ttl=None):
+        ttl = ttl or self.lease_seconds
+        now = time.monotonic()
+        with self._lock:
+            held = [index for index, (holder, expires) in self.leases.items() if holder == client and expires > now]
+            for index in held:
+                self.leases[index] = (client, now + ttl)
+            return sorted(held)
+
+    def release(self, client, indices):
+        with self._lock:
+            for index in indices:
+                if self.leases.get(index, (None,))[0] == client:
+                    del self.leases[index]
+
+    def read_labels(self, index):
+        with self._lock:
+            return {'index': index, 'annotations': self.store.read(self.image_files[index]),
+                    'version': self.versions[index], 'holder': self.holder(index)}
+
+    def save_labels(self, index, client, version, annotations):
+        """返回 (HTTP 状态码, 响应)；版本检查和写入在同一把锁内完成"""
+        with self._lock:
+            holder = self.holder(index)
+            if holder is not None and holder != client:
+                return 423, {'error': "图片已被其他人租用", 'holder': holder}
+            if version != self.versions[index]:
+                return 409, {'error': "版本冲突", 'version': self.versions[index],
+                             'annotations': self.store.read(self.image_files[index])}
+            try:
+                self.store.write(self.image_files[index], annotations)
+            except labelstore.ConflictError as e:
+                # 服务器上的标注文件被其他程序修改过，视为一个新版本
+                self.store.accept(self.image_files[index], e.version)
+                self.versions[index] += 1
+                return 409, {'error': "标注文件已被其他程序修改", 'version': self.versions[index],
+                             'annotations': e.annotations}
+            self.versions[index] += 1
+            return 200, {'version': self.versions[index]}
+
+
+def parse_annotations(value):
+    """校验客户端提交的标注"""
+    annotations = []
+    for ann in value:
+        bbox = [float(v) for v in ann['bbox']]
+        if len(bbox) != 4:
+            raise ValueError("bbox 必须有 4 个数")
+        annotations.append({'class': int(ann['class']), 'bbox': bbox})
+    return annotations
+
+
+def read_ttl(request):
+    """校验客户端提交的租约时长（秒），没有给出时返回 None（使用服务器默认值）"""
+    ttl = request.get('ttl')
+    if ttl is None:
+        return None
+    ttl = float(ttl)
+    if not ttl > 0:
+        raise ValueError("ttl 必须为正数")
+    return ttl
+
+
+class AnnotationHandler(BaseHTTPRequestHandler):
+    """HTTP/1.1 长连接，客户端可以复用连接"""
+
+    protocol_version = "HTTP/1.1"
+    service = None  # 由 make_server 设置
+
+    def log_message(self, format, *args):
+        pass  # 不在控制台打印每个请求
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length).decode("utf-8")) if length else {}
+
+    def image_index(self, part):
+        index = int(part)
+        if not 0 <= index < len(self.service.image_files):
+            raise IndexError(f"图片序号超出范围: {index}")
+        return index
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        try:
+            if parts == ["info"]:
+                self.send_json(200, {'images': len(self.service.image_files),
+                                     'classes': self.service.class_names(),
+                                     'lease_seconds': self.service.lease_seconds})
+            elif parts == ["classes"]:
+                self.send_json(200, {'classes': self.service.class_names()})
+            elif parts == ["images"]:
+                query = parse_qs(url.query)
+                offset = int(query.get("offset", ["0"])[0])
+                limit = int(query.get("limit", [str(len(self.service.image_files))])[0])
+                files = self.service.image_files[offset:offset + limit]
+                self.send_json(200, {'images': [{'index': offset + i, 'name': os.path.basename(p)}
+                                                for i, p in enumerate(files)]})
+            elif len(parts) == 2 and parts[0] == "image":
+                path = self.service.image_files[self.image_index(parts[1])]
+                with open(path, "rb") as f:
+                    data = f.read()
+                self.send_response(200)
+                self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            elif len(parts) == 2 and parts[0] == "labels":
+                self.send_json(200, self.service.read_labels(self.image_index(parts[1])))
+            else:
+                self.send_json(404, {'error': f"未知的路径: {url.path}"})
+        except (ValueError, IndexError) as e:
+            self.send_json(400, {'error': str(e)})
+        except Exception as e:
+            self.send_json(500, {'error': str(e)})
+
+    def do_POST(self):
+        parts = urlparse(self.path).path.strip("/").split("/")
+        try:
+            request = self.read_json()
+            if parts == ["lease"]:
+                ttl = read_ttl(request)
+                granted = self.service.lease(str(request['client']), int(request.get('count', 1)), ttl)
+                names = [os.path.basename(self.service.image_files[i]) for i in granted]
+                self.send_json(200, {'images': granted, 'names': names, 'ttl': ttl or self.service.lease_seconds})
+            elif parts == ["renew"]:
+                self.send_json(200, {'images': self.service.renew(str(request['client']), read_ttl(request))})
+            elif parts == ["release"]:
+                self.service.release(str(request['client']), [int(i) for i in request.get('images', [])])
+                self.send_json(200, {})
+            elif parts == ["labels", "batch"]:
+                indices = [self.image_index(i) for i in request.get('indices', [])]
+                self.send_json(200, {'labels': [self.service.read_labels(i) for i in indices]})
+            else:
+                self.send_json(404, {'error': "未知的路径"})
+        except (KeyError, ValueError, IndexError, TypeError) as e:
+            self.send_json(400, {'error': str(e)})
+        except Exception as e:
+            self.send_json(500, {'error': str(e)})
+
+    def do_PUT(self):
+        parts = urlparse(self.path).path.strip("/").split("/")
+        try:
+            if len(parts) != 2 or parts[0] != "labels":
+                self.send_json(404, {'error': "未知的路径"})
+                return
+            index = self.image_index(parts[1])
+            request = self.read_json()
+            status, payload = self.service.save_labels(index, str(request['client']), int(request['version']),
+                                                       parse_annotations(request['annotations']))
+            self.send_json(status, payload)
+        except (KeyError, ValueError, IndexError, TypeError) as e:
+            self.send_json(400, {'error': str(e)})
+        except Exception as e:
+            self.send_json(500, {'error': str(e)})
+
+
+def make_server(folder_path, host="127.0.0.1", port=8765, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """创建（但不启动）服务器；port 为 0 时由系统分配端口"""
+    service = AnnotationService(folder_path, lease_seconds)
+    handler = type("BoundAnnotationHandler", (AnnotationHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多人标注服务器")
+    parser.add_argument("folder", help="图片文件夹")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，默认只允许本机访问")
+    parser.add_argument("--port", type=int, default=8765, help="端口")
+    parser.add_argument("--lease", type=int, default=DEFAULT_LEASE_SECONDS, help="租约时长（秒）")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.folder, args.host, args.port, args.lease)
+    service = server.RequestHandlerClass.service
+    print(f"标注服务器: http://{args.host}:{server.server_address[1]}  {len(service.image_files)} 张图片")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
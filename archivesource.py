@@ -0,0 +1,230 @@
+"""
+zip/tar 压缩包作为图片来源，不解压、直接按偏移读取（几十 GB 的数据集不需要先占用同样大的磁盘空间解压）。
+
+压缩包内图片的路径为 <压缩包路径>/<成员名>（见 labelio.split_archive_path），界面和命令行工具把压缩包当作文件夹打开。
+标注保存在压缩包旁边的 <压缩包路径>.labels 目录中（覆盖层，目录结构与压缩包内相同）：第一次打开时把压缩包内的
+.txt 标注和 classes.txt 复制到覆盖层，之后只读写覆盖层，压缩包本身不修改。
+
+成员索引（每个成员数据的偏移、大小和压缩方式）只建立一次，缓存在数据集缓存目录:
+    zip  读取中央目录和每个成员的本地文件头（得到数据的实际起点）
+    tar  顺序读取各成员的头部，跳过数据
+只支持未压缩的 tar；.tar.gz 等整体压缩的格式无法按偏移读取，需要先解压。
+
+读取时每个压缩包只做一次内存映射：未压缩的成员（zip stored、tar）直接从映射中切片，deflate 成员只解压该成员的数据，
+每张图片都不需要 open/seek/read 系统调用。
+"""
+import io
+import mmap
+import os
+import struct
+import tarfile
+import threading
+import zipfile
+import zlib
+
+import numpy as np
+
+import labelio
+
+INDEX_VERSION = 1
+METHOD_STORED = 0
+METHOD_DEFLATED = 8
+OVERLAY_STAMP = ".archive_key"  # 覆盖层中记录已复制的压缩包版本
+
+
+class ArchiveIndex:
+    """成员索引: 成员名、数据偏移、存储大小、原始大小、压缩方式（0 未压缩，8 deflate，其它为不支持）"""
+
+    def __init__(self, names, offsets, stored_sizes, sizes, methods):
+        self.names = [str(name) for name in names]
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.stored_sizes = np.asarray(stored_sizes, dtype=np.int64)
+        self.sizes = np.asarray(sizes, dtype=np.int64)
+        self.methods = np.asarray(methods, dtype=np.int64)
+        self.position = {name: i for i, name in enumerate(self.names)}
+
+
+def build_zip_index(archive_path):
+    """读取 zip 中央目录，再读每个成员的本地文件头得到数据起点（本地头的扩展字段长度可能与中央目录不同）"""
+    names, offsets, stored_sizes, sizes, methods = [], [], [], [], []
+    with open(archive_path, "rb") as f, zipfile.ZipFile(f) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            f.seek(info.header_offset)
+            header = f.read(30)
+            if len(header) < 30 or header[:4] != b"PK\x03\x04":
+                raise ValueError(f"zip 本地文件头错误: {info.filename}")
+            name_length, extra_length = struct.unpack("<HH", header[26:30])
+            names.append(info.filename)
+            offsets.append(info.header_offset + 30 + name_length + extra_length)
+            stored_sizes.append(info.compress_size)
+            sizes.append(info.file_size)
+            methods.append(-1 if info.flag_bits & 0x1 else info.compress_type)  # 加密的成员不支持
+    return ArchiveIndex(names, offsets, stored_sizes, sizes, methods)
+
+
+def build_tar_index(archive_path):
+    """顺序读取 tar 成员头（只支持未压缩的 tar）"""
+    names, offsets, sizes = [], [], []
+    with tarfile.open(archive_path, "r:") as archive:
+        for member in archive:
+            if member.isfile():
+                names.append(member.name)
+                offsets.append(member.offset_data)
+                sizes.append(member.size)
+    return ArchiveIndex(names, offsets, sizes, sizes, np.zeros(len(names), dtype=np.int64))
+
+
+def build_index(archive_path):
+    if archive_path.lower().endswith(".zip"):
+        return build_zip_index(archive_path)
+    try:
+        return build_tar_index(archive_path)
+    except tarfile.ReadError as e:
+        raise ValueError(f"无法按偏移读取 {archive_path}（只支持未压缩的 tar）: {e}")
+
+
+_indices = {}  # 压缩包路径 -> ((mtime_ns, 大小), ArchiveIndex)
+_indices_lock = threading.Lock()
+
+
+def load_index(archive_path):
+    """读取缓存的成员索引，压缩包变化或没有缓存时重新建立"""
+    stat = os.stat(archive_path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _indices_lock:
+        cached = _indices.get(archive_path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    cache_path = os.path.join(labelio.dataset_cache_dir(os.path.dirname(archive_path)),
+                              f"archive_{os.path.basename(archive_path)}.npz")
+    index = None
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as data:
+                if tuple(data["key"].tolist()) == key + (INDEX_VERSION,):
+                    index = ArchiveIndex(data["names"], data["offsets"], data["stored_sizes"], data["sizes"],
+                                         data["methods"])
+        except (OSError, ValueError, KeyError):
+            index = None
+    if index is None:
+        index = build_index(archive_path)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+        np.savez(temp_path, key=np.array(key + (INDEX_VERSION,), dtype=np.int64),
+                 names=np.array(index.names, dtype=str), offsets=index.offsets, stored_sizes=index.stored_sizes,
+                 sizes=index.sizes, methods=index.methods)
+        os.replace(temp_path, cache_path)
+    with _indices_lock:
+        _indices[archive_path] = (key, index)
+    return index
+
+
+_maps = {}  # 压缩包路径 -> (mmap, ArchiveIndex)，每个进程各自映射
+_maps_lock = threading.Lock()
+
+
+def _open_archive(archive_path):
+    with _maps_lock:
+        opened = _maps.get(archive_path)
+    if opened is not None:
+        return opened
+    index = load_index(archive_path)
+    with open(archive_path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+    with _maps_lock:
+        opened = _maps.setdefault(archive_path, (mapped, index))
+    return opened
+
+
+def close_archives():
+    """关闭所有内存映射（切换文件夹时调用；索引仍保留在内存中）"""
+    with _maps_lock:
+        for mapped, _ in _maps.values():
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+        _maps.clear()
+
+
+def read_member(path):
+    """读取压缩包内图片路径对应成员的全部字节"""
+    archive_path, name = labelio.split_archive_path(path)
+    mapped, index = _open_archive(archive_path)
+    i = index.position.get(name)
+    if i is None:
+        raise FileNotFoundError(f"压缩包中没有 {name}: {archive_path}")
+    start = int(index.offsets[i])
+    data = mapped[start:start + int(index.stored_sizes[i])]
+    method = int(index.methods[i])
+    if method == METHOD_STORED:
+        return data
+    if method == METHOD_DEFLATED:
+        return zlib.decompress(data, -15)
+    raise ValueError(f"不支持的 zip 压缩方式 ({method}): {name}")
+
+
+def open_member(path):
+    """以只读的文件对象打开压缩包成员（读入内存）"""
+    return io.BytesIO(read_member(path))
+
+
+def member_size(path):
+    """成员的原始大小（不解压）"""
+    archive_path, name = labelio.split_archive_path(path)
+    index = load_index(archive_path)
+    i = index.position.get(name)
+    if i is None:
+        raise FileNotFoundError(f"压缩包中没有 {name}: {archive_path}")
+    return int(index.sizes[i])
+
+
+def prepare_overlay(archive_path):
+    """
+    把压缩包内的 .txt 标注和 classes.txt 复制到覆盖层（已存在的文件不覆盖，保留之前的修改）。
+    每个版本的压缩包只复制一次，之后打开时只比较覆盖层中记录的压缩包 mtime 和大小。
+    """
+    label_dir = archive_path + labelio.ARCHIVE_LABEL_SUFFIX
+    stat = os.stat(archive_path)
+    key = f"{stat.st_mtime_ns} {stat.st_size} {INDEX_VERSION}"
+    stamp_path = os.path.join(label_dir, OVERLAY_STAMP)
+    try:
+        with open(stamp_path, encoding="utf-8") as f:
+            if f.read().strip() == key:
+                return label_dir
+    except OSError:
+        pass
+
+    index = load_index(archive_path)
+    os.makedirs(label_dir, exist_ok=True)
+    root = os.path.realpath(label_dir)
+    for name in index.names:
+        if not name.lower().endswith(".txt"):
+            continue
+        # 成员名中的 .. 和绝对路径不能把文件写到覆盖层之外（zip-slip）
+        parts = labelio.safe_path_parts(name)
+        target = os.path.join(label_dir, *parts)
+        if not parts or os.path.commonpath([root, os.path.realpath(target)]) != root:
+            print(f"跳过压缩包中路径不安全的标注: {name}")
+            continue
+        if os.path.exists(target):
+            continue
+        try:
+            data = read_member(f"{archive_path}{os.sep}{name}")
+        except (ValueError, zlib.error) as e:
+            print(f"读取压缩包中的标注 {name} 失败: {e}")
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(target + ".tmp", target)
+    labelio.write_text_atomic(stamp_path, key)
+    return label_dir
+
+
+def list_images(archive_path):
+    """列出压缩包中的全部图片路径（已排序），同时准备标注覆盖层"""
+    index = load_index(archive_path)
+    prepare_overlay(archive_path)
+    names = sorted(name for name in index.names if name.lower().endswith(labelio.IMAGE_EXTENSIONS))
+    return [f"{archive_path}{os.sep}{name}" for name in names]
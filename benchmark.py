@@ -0,0 +1,221 @@
+"""
+可复现的性能基准：生成合成数据集并对加载文件夹、切换图片、绘制、类别重映射和标注解析计时。
+
+用法:
+    python benchmark.py --images 500 --width 1920 --height 1080 --boxes 20 --classes 10 --out bench.json
+
+结果为 JSON，包含机器信息、git 提交、参数以及每项基准的耗时分布，便于在不同提交之间对比。
+没有 wx 时只运行不依赖界面的基准，其余基准记为 skipped。
+"""
+import argparse
+import json
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+import labelio
+from telemetry import StageStats, telemetry
+
+
+def write_png(path, rgb):
+    """把 HxWx3 uint8 数组写成 PNG（无需图像库）"""
+    height, width = rgb.shape[:2]
+    raw = np.empty((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 0] = 0  # 每行的过滤类型: None
+    raw[:, 1:] = rgb.reshape(height, width * 3)
+
+    def chunk(tag, data):
+        body = tag + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw.tobytes(), 1)))
+        f.write(chunk(b"IEND", b""))
+
+
+def synthetic_boxes(rng, count, num_classes):
+    """生成 count 个随机 YOLO 框"""
+    w = rng.uniform(0.02, 0.4, count)
+    h = rng.uniform(0.02, 0.4, count)
+    cx = rng.uniform(w / 2, 1 - w / 2)
+    cy = rng.uniform(h / 2, 1 - h / 2)
+    classes = rng.integers(0, max(1, num_classes), count)
+    return [{'class': int(c), 'bbox': [float(a), float(b), float(d), float(e)]}
+            for c, a, b, d, e in zip(classes, cx, cy, w, h)]
+
+
+def generate_dataset(folder, images=100, width=1280, height=720, boxes=10, classes=5, seed=0):
+    """生成合成数据集：图片、同名标注文件和 classes.txt；相同参数和种子生成的文件完全一致"""
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    # 所有图片共用一张渐变底图，再叠加少量随机色块，避免编码时间主导生成过程
+    yy, xx = np.mgrid[0:height, 0:width]
+    base = np.stack([(xx * 255 // max(1, width - 1)),
+                     (yy * 255 // max(1, height - 1)),
+                     np.full_like(xx, 128)], axis=-1).astype(np.uint8)
+    for i in range(images):
+        image = base.copy()
+        for _ in range(4):
+            x0, y0 = int(rng.integers(0, width)), int(rng.integers(0, height))
+            image[y0:y0 + height // 8, x0:x0 + width // 8] = rng.integers(0, 256, 3, dtype=np.uint8)
+        image_path = os.path.join(folder, f"img_{i:06d}.png")
+        write_png(image_path, image)
+        labelio.write_annotations(labelio.label_path_for(image_path), synthetic_boxes(rng, boxes, classes))
+    labelio.write_class_names(os.path.join(folder, "classes.txt"), [f"class_{c}" for c in range(classes)])
+    return folder
+
+
+def measure(func, repeat=1, items=1):
+    """运行 func repeat 次，返回耗时统计（毫秒）以及每个条目的平均耗时"""
+    stats = StageStats(window=max(1, repeat))
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        stats.add((time.perf_counter() - start) * 1000.0)
+    result = stats.to_dict()
+    del result["histogram"]
+    result["items"] = items
+    result["per_item_ms"] = result["mean_ms"] / items if items else 0.0
+    return result
+
+
+def git_commit():
+    """当前 git 提交，不在仓库中时返回 None"""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def bench_label_parse(folder, repeat):
+    """解析全部标注文件（与界面 LoadAnnotations 使用相同代码）"""
+    label_paths = [labelio.label_path_for(p) for p in labelio.list_image_files(folder)]
+
+    def run():
+        for txt_path in label_paths:
+            labelio.read_annotations(txt_path)
+
+    return measure(run, repeat, len(label_paths))
+
+
+def run_gui_benchmarks(folder, args, results):
+    """使用隐藏窗口和离屏 MemoryDC 运行依赖 wx 的基准"""
+    try:
+        import wx
+        from labelbridge import YoloLabelingTool
+    except ImportError as e:
+        for name in ("folder_load", "navigation", "paint", "remap"):
+            results[name] = {"skipped": f"wx 不可用: {e}"}
+        return
+
+    app = wx.App(False)
+    frame = YoloLabelingTool()
+    frame.SetSize(args.window_width, args.window_height)
+    frame.Layout()
+    panel = frame.annotation_panel
+    frame.LoadClassesFromFile(folder)
+    frame.UpdateClassList()
+
+    results["folder_load"] = measure(lambda: frame.LoadImageFolder(folder), args.repeat, 1)
+
+    count = len(frame.image_files)
+
+    def navigate():
+        for i in range(count):
+            frame.image_list.SetSelection(i)
+            frame.OnImageSelect(None)
+
+    results["navigation"] = measure(navigate, args.repeat, count)
+
+    frame.image_list.SetSelection(0)
+    frame.OnImageSelect(None)
+    panel.annotations = synthetic_boxes(np.random.default_rng(args.seed), args.paint_boxes, args.classes)
+    panel.selected_annotation_index = 0
+    results["paint"] = measure(panel.DrawToBuffer, args.paint_repeat, 1)
+    results["paint"]["boxes"] = args.paint_boxes
+
+    # 交换类别 0 和 1，两次执行后数据集恢复原状
+    swap = {c: c for c in range(args.classes)}
+    if args.classes > 1:
+        swap[0], swap[1] = 1, 0
+    results["remap"] = measure(lambda: frame.UpdateAllAnnotationFiles(swap), args.repeat * 2, count)
+
+    panel.image_path = None  # 避免关闭时保存被基准修改过的标注
+    frame.Destroy()
+    app.Destroy()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LabelBridge 性能基准")
+    parser.add_argument("--images", type=int, default=100, help="图片数量")
+    parser.add_argument("--width", type=int, default=1280, help="图片宽度")
+    parser.add_argument("--height", type=int, default=720, help="图片高度")
+    parser.add_argument("--boxes", type=int, default=10, help="每张图片的框数")
+    parser.add_argument("--classes", type=int, default=5, help="类别数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--repeat", type=int, default=3, help="每项基准重复次数")
+    parser.add_argument("--paint-boxes", type=int, default=200, help="绘制基准中的框数")
+    parser.add_argument("--paint-repeat", type=int, default=50, help="绘制基准重复次数")
+    parser.add_argument("--window-width", type=int, default=1200)
+    parser.add_argument("--window-height", type=int, default=800)
+    parser.add_argument("--dataset", help="数据集目录（默认临时目录，结束后删除）")
+    parser.add_argument("--headless", action="store_true", help="只运行不依赖 wx 的基准")
+    parser.add_argument("--out", help="结果 JSON 路径（默认输出到标准输出）")
+    args = parser.parse_args(argv)
+
+    temp_dir = None
+    folder = args.dataset
+    if not folder:
+        temp_dir = tempfile.mkdtemp(prefix="labelbridge-bench-")
+        folder = temp_dir
+
+    try:
+        start = time.perf_counter()
+        if not os.path.isdir(folder) or not labelio.list_image_files(folder):
+            generate_dataset(folder, args.images, args.width, args.height, args.boxes, args.classes, args.seed)
+        generate_s = time.perf_counter() - start
+
+        telemetry.reset()
+        results = {"label_parse": bench_label_parse(folder, args.repeat)}
+        if args.headless:
+            for name in ("folder_load", "navigation", "paint", "remap"):
+                results[name] = {"skipped": "--headless"}
+        else:
+            run_gui_benchmarks(folder, args, results)
+
+        report = {
+            "commit": git_commit(),
+            "timestamp": time.time(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "params": {k: v for k, v in vars(args).items() if k not in ("out", "dataset")},
+            "generate_s": generate_s,
+            "results": results,
+            "stages": telemetry.summary()["stages"],
+            "machine": telemetry.summary()["machine"],
+        }
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
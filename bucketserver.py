@@ -0,0 +1,162 @@
+"""
+最小的 S3 兼容对象存储服务器（只读）：把本地文件夹当作一个桶，用于不连接真实对象存储时测试 imagesource.HttpSource。
+
+接口:
+    GET  /<桶>?list-type=2&prefix=&delimiter=&max-keys=&continuation-token=     ListObjectsV2（XML）
+    GET  /<桶>/<键>                 对象内容，支持 Range: bytes=起点-终点（返回 206）
+    HEAD /<桶>/<键>                 Content-Length 和 Last-Modified
+
+不检查签名，也不支持写入。
+
+命令行用法:
+    python bucketserver.py <图片文件夹> [--bucket images] [--host 127.0.0.1] [--port 9000]
+    然后在界面中打开 http://127.0.0.1:9000/images/
+"""
+import argparse
+import datetime
+import email.utils
+import os
+import sys
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+LIST_PAGE_SIZE = 1000
+
+
+class BucketHandler(BaseHTTPRequestHandler):
+    """把本地文件夹当作一个桶的最小 S3 兼容服务（只读）"""
+
+    protocol_version = "HTTP/1.1"
+    folder = None
+    bucket = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _resolve(self):
+        """请求路径 -> (对象键, 本地文件路径, 查询参数)；不是本桶时返回 None"""
+        url = urlparse(self.path)
+        bucket, _, key = url.path.lstrip("/").partition("/")
+        if bucket != self.bucket:
+            return None
+        key = unquote(key)
+        path = os.path.normpath(os.path.join(self.folder, *key.split("/"))) if key else self.folder
+        if not path.startswith(os.path.normpath(self.folder)):
+            return None
+        return key, path, parse_qs(url.query)
+
+    def _send(self, status, body=b"", headers=None, head=False, length=None):
+        """发送响应；HEAD 请求只发送响应头，Content-Length 为 length（默认为 body 的长度）"""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body) if length is None else length))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _list(self, query):
+        prefix = query.get("prefix", [""])[0]
+        delimiter = query.get("delimiter", [""])[0]
+        max_keys = int(query.get("max-keys", [str(LIST_PAGE_SIZE)])[0])
+        start = query.get("continuation-token", [""])[0]
+        keys, prefixes = [], set()
+        for root, dirs, files in os.walk(self.folder):
+            relative = os.path.relpath(root, self.folder).replace(os.sep, "/")
+            relative = "" if relative == "." else relative + "/"
+            for name in files:
+                key = relative + name
+                if not key.startswith(prefix):
+                    continue
+                rest = key[len(prefix):]
+                if delimiter and delimiter in rest:
+                    prefixes.add(prefix + rest.split(delimiter)[0] + delimiter)
+                else:
+                    keys.append(key)
+        keys = sorted(key for key in keys if key > start)
+        page, truncated = keys[:max_keys], len(keys) > max_keys
+        parts = ['<?xml version="1.0" encoding="UTF-8"?>',
+                 '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">',
+                 f"<Name>{escape(self.bucket)}</Name><Prefix>{escape(prefix)}</Prefix>",
+                 f"<KeyCount>{len(page)}</KeyCount><IsTruncated>{str(truncated).lower()}</IsTruncated>"]
+        for key in page:
+            st = os.stat(os.path.join(self.folder, *key.split("/")))
+            modified = datetime.datetime.fromtimestamp(st.st_mtime_ns // 1_000_000_000, datetime.timezone.utc)
+            parts.append(f"<Contents><Key>{escape(key)}</Key>"
+                         f"<LastModified>{modified.strftime('%Y-%m-%dT%H:%M:%S')}."
+                         f"{st.st_mtime_ns % 1_000_000_000:09d}Z</LastModified>"
+                         f"<Size>{st.st_size}</Size></Contents>")
+        for common in sorted(prefixes):
+            parts.append(f"<CommonPrefixes><Prefix>{escape(common)}</Prefix></CommonPrefixes>")
+        if truncated:
+            parts.append(f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>")
+        parts.append("</ListBucketResult>")
+        self._send(200, "".join(parts).encode("utf-8"), {"Content-Type": "application/xml"})
+
+    def _object(self, head):
+        resolved = self._resolve()
+        if resolved is None:
+            self._send(404, b"NoSuchBucket", head=head)
+            return
+        key, path, query = resolved
+        if not key and query.get("list-type"):
+            self._list(query)
+            return
+        if not os.path.isfile(path):
+            self._send(404, b"NoSuchKey", head=head)
+            return
+        st = os.stat(path)
+        headers = {"Last-Modified": email.utils.formatdate(st.st_mtime, usegmt=True), "Accept-Ranges": "bytes",
+                   "Content-Type": "application/octet-stream"}
+        with open(path, "rb") as f:
+            requested = self.headers.get("Range", "")
+            if requested.startswith("bytes="):
+                first, _, last = requested[len("bytes="):].partition("-")
+                start = int(first)
+                end = min(int(last) if last else st.st_size - 1, st.st_size - 1)
+                if start > end:
+                    self._send(416, b"", {"Content-Range": f"bytes */{st.st_size}"}, head=head)
+                    return
+                f.seek(start)
+                headers["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+                self._send(206, f.read(end - start + 1), headers, head=head)
+            elif head:
+                self._send(200, b"", headers, head=True, length=st.st_size)
+            else:
+                self._send(200, f.read(), headers)
+
+    def do_GET(self):
+        self._object(head=False)
+
+    def do_HEAD(self):
+        self._object(head=True)
+
+
+def serve_folder(folder, bucket="images", host="127.0.0.1", port=9000):
+    """创建把 folder 当作桶 bucket 的 S3 兼容服务器（调用 serve_forever 开始服务）"""
+    handler = type("FolderBucketHandler", (BucketHandler,),
+                   {"folder": os.path.abspath(folder), "bucket": bucket})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把本地文件夹作为 S3 兼容的桶提供服务（测试对象存储图片来源用）")
+    parser.add_argument("folder", help="图片文件夹")
+    parser.add_argument("--bucket", default="images", help="桶名")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，默认只允许本机访问")
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args(argv)
+    server = serve_folder(args.folder, args.bucket, args.host, args.port)
+    print(f"http://{args.host}:{server.server_address[1]}/{args.bucket}/ -> {os.path.abspath(args.folder)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
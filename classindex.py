@@ -0,0 +1,115 @@
+"""
+类别 -> 图片 的倒排索引。
+
+每个类别对应一个压缩位图（np.packbits，little 位序），第 i 位表示第 i 张图片是否包含该类别。
+100 万张图片、80 个类别约占 10 MB；单张图片更新为 O(类别数)，组合查询直接对位图做按位运算。
+"""
+import numpy as np
+
+
+class ClassIndex:
+    """类别倒排索引，图片以 image_files 中的序号表示"""
+
+    def __init__(self, num_images):
+        self.num_images = num_images
+        self.bitmaps = {}  # 类别ID -> np.uint8 压缩位图
+
+    @classmethod
+    def from_table(cls, table):
+        """从 labelio.LabelTable 批量构建"""
+        index = cls(len(table))
+        if not len(table.classes):
+            return index
+        # 对 (类别, 图片) 去重后按类别分段，每个类别只构建一次位图
+        keys = np.unique(table.classes.astype(np.int64) * index.num_images + table.image_ids())
+        class_ids = keys // index.num_images
+        image_ids = keys % index.num_images
+        boundaries = np.flatnonzero(np.diff(class_ids)) + 1
+        for start, stop in zip(np.r_[0, boundaries], np.r_[boundaries, len(keys)]):
+            mask = np.zeros(index.num_images, dtype=bool)
+            mask[image_ids[start:stop]] = True
+            index.bitmaps[int(class_ids[start])] = np.packbits(mask, bitorder='little')
+        return index
+
+    def _empty_bitmap(self):
+        return np.zeros((self.num_images + 7) // 8, dtype=np.uint8)
+
+    def _to_indices(self, bitmap):
+        return np.flatnonzero(np.unpackbits(bitmap, count=self.num_images, bitorder='little'))
+
+    def update_image(self, image_index, class_ids):
+        """图片的标注保存后更新索引，class_ids 为该图片当前包含的类别"""
+        byte, bit = divmod(image_index, 8)
+        mask = np.uint8(1 << bit)
+        class_ids = set(int(c) for c in class_ids)
+        for class_id, bitmap in self.bitmaps.items():
+            if class_id not in class_ids:
+                bitmap[byte] &= ~mask
+        for class_id in class_ids:
+            bitmap = self.bitmaps.get(class_id)
+            if bitmap is None:
+                bitmap = self.bitmaps[class_id] = self._empty_bitmap()
+            bitmap[byte] |= mask
+
+    def resize(self, num_images):
+        """图片追加到列表末尾后扩展位图，新图片不属于任何类别"""
+        size = (num_images + 7) // 8
+        for class_id, bitmap in self.bitmaps.items():
+            if len(bitmap) < size:
+                self.bitmaps[class_id] = np.concatenate([bitmap, np.zeros(size - len(bitmap), dtype=np.uint8)])
+        self.num_images = num_images
+
+    def remove_images(self, keep):
+        """删除图片后压缩位图，keep 为长度 num_images 的布尔数组，保留的图片依次重新编号"""
+        for class_id, bitmap in self.bitmaps.items():
+            mask = np.unpackbits(bitmap, count=self.num_images, bitorder='little').astype(bool)
+            self.bitmaps[class_id] = np.packbits(mask[keep], bitorder='little')
+        self.num_images = int(np.count_nonzero(keep))
+
+    def remap(self, id_mapping):
+        """跟随类别重映射（与 UpdateAllAnnotationFiles 的规则一致：不在映射中的类别被删除）"""
+        bitmaps = {}
+        for old_id, bitmap in self.bitmaps.items():
+            if old_id not in id_mapping:
+                continue
+            new_id = id_mapping[old_id]
+            if new_id in bitmaps:
+                bitmaps[new_id] = bitmaps[new_id] | bitmap
+            else:
+                bitmaps[new_id] = bitmap
+        self.bitmaps = bitmaps
+
+    def query_bitmap(self, class_ids, match_all=False):
+        """包含 class_ids 中任一（match_all 时为全部）类别的图片位图"""
+        result = None
+        for class_id in class_ids:
+            bitmap = self.bitmaps.get(int(class_id))
+            if bitmap is None:
+                if match_all:
+                    return self._empty_bitmap()
+                continue
+            if result is None:
+                result = bitmap.copy()
+            elif match_all:
+                result &= bitmap
+            else:
+                result |= bitmap
+        return result if result is not None else self._empty_bitmap()
+
+    def images_with(self, class_ids, match_all=False):
+        """包含指定类别的图片索引（升序 int64 数组）"""
+        return self._to_indices(self.query_bitmap(class_ids, match_all))
+
+    def next_image(self, current, class_ids, match_all=False, step=1):
+        """current 之后（step=-1 时为之前）第一张包含指定类别的图片，没有时返回 -1"""
+        indices = self.images_with(class_ids, match_all)
+        if step > 0:
+            position = np.searchsorted(indices, current, side='right')
+            return int(indices[position]) if position < len(indices) else -1
+        position = np.searchsorted(indices, current, side='left') - 1
+        return int(indices[position]) if position >= 0 else -1
+
+    def image_counts(self):
+        """每个类别包含的图片数"""
+        return {class_id: int(np.unpackbits(bitmap, count=self.num_images, bitorder='little').sum())
+                for class_id, bitmap in self.bitmaps.items()}
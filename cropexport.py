@@ -0,0 +1,258 @@
+"""
+把每个标注框裁剪为单独的图片，按类别分文件夹保存，用于训练第二阶段的分类器。
+
+每张图片只读一次标注、解码一次：先只读文件头得到原图尺寸，算出所有框裁剪后缩放到目标尺寸所需的最低分辨率，
+JPEG 直接按缩小后的分辨率解码（见 imagecodec.decode_rgb）。图片由进程池按批处理。
+
+可以中断后重新运行：每张图片的输入（图片 mtime/大小、标注内容、裁剪参数）哈希后记录在输出文件夹的
+manifest.jsonl 中（每批处理完追加写入），再次运行时输入没有变化且裁剪图都在的图片直接跳过；
+有变化的图片先删除旧的裁剪图再重新生成，已不在图片列表中的图片的裁剪图在最后删除。
+
+输出: <out_dir>/<类别名>/<图片相对路径，/ 换为 __>_<框序号>.jpg
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+
+import numpy as np
+
+import imagesource
+import labelio
+from imagecodec import decode_rgb, encode_jpeg, read_image_size, resize_rgb
+from labelexport import class_name_for, iter_chunks
+
+MANIFEST_NAME = "manifest.jsonl"
+MANIFEST_VERSION = 1
+
+
+def crop_name(relative_path, box_index):
+    """裁剪图的文件名（不含类别文件夹）"""
+    stem = os.path.splitext(relative_path)[0] if not labelio.split_frame_path(relative_path) else relative_path
+    for separator in ("/", "\\", labelio.FRAME_SEPARATOR):
+        stem = stem.replace(separator, "__")
+    return f"{stem}_{box_index:03d}.jpg"
+
+
+def class_folder(class_names, class_id):
+    """类别文件夹名（去掉路径分隔符）"""
+    return class_name_for(class_names, class_id).replace("/", "_").replace("\\", "_").strip() or f"class_{class_id}"
+
+
+def crop_regions(boxes, image_size, padding, square):
+    """
+    相对 (cx, cy, w, h) -> 像素裁剪区域 (x1, y1, x2, y2)，四周各扩展 padding 倍宽/高，square 时扩成正方形；
+    裁剪区域限制在图片范围内。
+    """
+    width, height = image_size
+    boxes = boxes.astype(np.float64)
+    w = boxes[:, 2] * width * (1 + 2 * padding)
+    h = boxes[:, 3] * height * (1 + 2 * padding)
+    if square:
+        w = h = np.maximum(w, h)
+    cx, cy = boxes[:, 0] * width, boxes[:, 1] * height
+    regions = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    regions = np.clip(np.rint(regions), 0, [width, height, width, height]).astype(np.int64)
+    regions[:, 2:4] = np.maximum(regions[:, 2:4], regions[:, 0:2] + 1)
+    return np.minimum(regions, [width - 1, height - 1, width, height])
+
+
+def decode_size_for(regions, image_size, target_size):
+    """解码时的长边上限：保证缩小后每个裁剪区域的长边仍不小于 target_size；不能缩小时返回 None"""
+    long_sides = np.maximum(regions[:, 2] - regions[:, 0], regions[:, 3] - regions[:, 1])
+    scale = float(target_size / max(int(long_sides.min()), 1))
+    if scale >= 1.0:
+        return None
+    return max(1, math.ceil(max(image_size) * scale))
+
+
+def output_size(region, target_size, square):
+    """裁剪图缩放后的尺寸：正方形为 target_size x target_size，否则长边为 target_size"""
+    w, h = region[2] - region[0], region[3] - region[1]
+    if square:
+        return target_size, target_size
+    scale = target_size / max(w, h)
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+
+def input_hash(image_path, label_bytes, params):
+    """图片（mtime、大小）、标注内容和裁剪参数的哈希"""
+    stat = labelio.source_stat(image_path)
+    digest = hashlib.sha1(json.dumps([MANIFEST_VERSION, stat.st_mtime_ns, stat.st_size, params]).encode("utf-8"))
+    digest.update(label_bytes)
+    return digest.hexdigest()
+
+
+def crop_chunk(items, out_dir, class_names, params):
+    """
+    工作进程：处理一批图片。
+
+    Args:
+        items (list): [(图片路径, 标注文件路径, 相对路径, 上次的哈希, 上次的裁剪图)]。
+        params (dict): padding、size、square、quality。
+
+    Returns:
+        (list): [(相对路径, 哈希, 裁剪图列表, 状态, 错误信息)]，状态为 'written' / 'skipped' / 'failed'。
+    """
+    results = []
+    for image_path, txt_path, relative, old_hash, old_files in items:
+        try:
+            try:
+                with open(txt_path, "rb") as f:
+                    label_bytes = f.read()
+            except FileNotFoundError:
+                label_bytes = b""
+            digest = input_hash(image_path, label_bytes, params)
+            if digest == old_hash and all(os.path.exists(os.path.join(out_dir, p)) for p in old_files):
+                results.append((relative, digest, old_files, 'skipped', None))
+                continue
+            for p in old_files:
+                try:
+                    os.remove(os.path.join(out_dir, p))
+                except FileNotFoundError:
+                    pass
+
+            classes, boxes, _ = labelio.parse_label_array(label_bytes.decode("utf-8"))
+            valid = (boxes[:, 2] > 0) & (boxes[:, 3] > 0)
+            files = []
+            if valid.any():
+                image_size = read_image_size(image_path)
+                regions = crop_regions(boxes[valid], image_size, params['padding'], params['square'])
+                rgb, _ = decode_rgb(image_path, decode_size_for(regions, image_size, params['size']))
+                scale = np.array([rgb.shape[1] / image_size[0], rgb.shape[0] / image_size[1]] * 2)
+                for box_index, class_id, region in zip(np.flatnonzero(valid), classes[valid], regions):
+                    x1, y1, x2, y2 = (int(v) for v in np.floor(region * scale))
+                    crop = rgb[y1:max(y2, y1 + 1), x1:max(x2, x1 + 1)]
+                    crop = resize_rgb(crop, *output_size((0, 0, crop.shape[1], crop.shape[0]), params['size'],
+                                                         params['square']))
+                    name = os.path.join(class_folder(class_names, int(class_id)), crop_name(relative, int(box_index)))
+                    path = os.path.join(out_dir, name)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path + ".tmp", "wb") as f:
+                        f.write(encode_jpeg(crop, params['quality']))
+                    os.replace(path + ".tmp", path)
+                    files.append(name.replace(os.sep, "/"))
+            results.append((relative, digest, files, 'written', None))
+        except Exception as e:
+            results.append((relative, None, [], 'failed', str(e)))
+    return results
+
+
+def read_manifest(path):
+    """读取 manifest.jsonl: {相对路径: (哈希, 裁剪图列表)}，同一图片以最后一行为准"""
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 中断时写了一半的行
+            entries[record['image']] = (record['hash'], record['files'])
+    return entries
+
+
+def export_crops(image_files, class_names, out_dir, root=None, padding=0.1, size=224, square=True, quality=95,
+                 workers=None, chunk_size=64, label_path=labelio.label_path_for, progress=None):
+    """
+    导出所有标注框的裁剪图。
+
+    Args:
+        padding (float): 四周扩展的比例（相对框的宽/高）。
+        size (int): 裁剪图的边长（square=False 时为长边）。
+        square (bool): 扩成正方形再裁剪，避免缩放变形。
+
+    Returns:
+        (dict): {'images', 'annotations' (裁剪图数), 'skipped' (未变化的图片数), 'removed', 'failed'}
+    """
+    if root is None:
+        root = os.path.dirname(image_files[0]) if image_files else "."
+    os.makedirs(out_dir, exist_ok=True)
+    params = {'padding': float(padding), 'size': int(size), 'square': bool(square), 'quality': int(quality),
+              'class_names': list(class_names)}
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    manifest = read_manifest(manifest_path)
+
+    items = []
+    for image_path in image_files:
+        relative = os.path.relpath(image_path, root).replace(os.sep, "/")
+        old_hash, old_files = manifest.get(relative, (None, []))
+        items.append((image_path, label_path(image_path), relative, old_hash, old_files))
+    chunks = [(items[i:i + chunk_size], out_dir, list(class_names), params) for i in range(0, len(items), chunk_size)]
+
+    stats = {'images': 0, 'annotations': 0, 'skipped': 0, 'removed': 0, 'failed': []}
+    path_of = {item[2]: item[0] for item in items}
+    with open(manifest_path, "a", encoding="utf-8") as log:
+        for chunk_index, results in enumerate(iter_chunks(crop_chunk, chunks, workers)):
+            lines = []
+            for relative, digest, files, status, error in results:
+                if status == 'failed':
+                    stats['failed'].append((path_of[relative], error))
+                    continue  # 保留上次的记录，下次运行时哈希不同会重新生成
+                stats['images'] += 1
+                stats['annotations'] += len(files)
+                stats['skipped'] += status == 'skipped'
+                if status == 'written':
+                    manifest[relative] = (digest, files)
+                    lines.append(json.dumps({'image': relative, 'hash': digest, 'files': files},
+                                            ensure_ascii=False) + "\n")
+            log.write("".join(lines))
+            log.flush()
+            if progress:
+                progress(min((chunk_index + 1) * chunk_size, len(items)), len(items))
+
+    # 删除已不在图片列表中的图片的裁剪图，并压缩 manifest
+    for relative in set(manifest) - set(path_of):
+        for p in manifest.pop(relative)[1]:
+            try:
+                os.remove(os.path.join(out_dir, p))
+                stats['removed'] += 1
+            except FileNotFoundError:
+                pass
+    labelio.write_text_atomic(manifest_path, "".join(
+        json.dumps({'image': relative, 'hash': digest, 'files': files}, ensure_ascii=False) + "\n"
+        for relative, (digest, files) in manifest.items()))
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把标注框裁剪为按类别分文件夹的图片（分类数据集），可中断后继续")
+    parser.add_argument("folder", help="图片文件夹（标注文件与图片同目录）、zip/tar 压缩包或对象存储前缀 (http(s):// 或 s3://)")
+    parser.add_argument("--out", required=True, help="输出文件夹")
+    parser.add_argument("--padding", type=float, default=0.1, help="四周扩展的比例（相对框的宽/高）")
+    parser.add_argument("--size", type=int, default=224, help="裁剪图边长（--keep-aspect 时为长边）")
+    parser.add_argument("--keep-aspect", action="store_true", help="不扩成正方形，保持框的宽高比")
+    parser.add_argument("--quality", type=int, default=95, help="JPEG 质量")
+    parser.add_argument("--classes", help="类别文件，默认为图片文件夹下的 classes.txt")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--recursive", action="store_true",
+                        help="包括子文件夹（YOLO 的 images/、labels/ 布局中标注从 labels/ 下对应的位置读取）")
+    args = parser.parse_args(argv)
+
+    args.folder = imagesource.normalize_url(args.folder)
+    image_files = imagesource.list_images(args.folder, args.recursive)
+    if not image_files:
+        print(f"没有找到图片: {args.folder}")
+        return 1
+    classes_path = args.classes or os.path.join(labelio.label_folder_for(args.folder), "classes.txt")
+    class_names = labelio.read_class_names(classes_path) if os.path.exists(classes_path) else []
+
+    def progress(done, total):
+        print(f"\r{done}/{total}", end="", file=sys.stderr)
+
+    stats = export_crops(image_files, class_names, args.out, root=args.folder, padding=args.padding, size=args.size,
+                         square=not args.keep_aspect, quality=args.quality, workers=args.workers, progress=progress)
+    print(file=sys.stderr)
+    print(f"{stats['images']} 张图片（{stats['skipped']} 张未变化，跳过），{stats['annotations']} 个裁剪图 -> {args.out}")
+    for path, message in stats['failed'][:20]:
+        print(f"  {path}: {message}")
+    if len(stats['failed']) > 20:
+        print(f"  ... 共 {len(stats['failed'])} 张图片失败")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
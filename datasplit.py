@@ -0,0 +1,205 @@
+"""
+按类别分层划分 train/val/test，不复制图片：生成列表文件、硬链接或符号链接，并写出 data.yaml。
+
+分层方式: 每张图片归入它所含类别中图片数最少的那个类别（没有框的图片单独一组），
+组内用固定种子随机排序后按比例切分。稀有类别因此在每个子集中都按比例出现；整个过程只有
+一次批量标注扫描加几次 NumPy 排序，百万张图片也只需几秒。
+
+命令行用法:
+    python datasplit.py <图片文件夹> --out <输出文件夹> [--ratios 0.8 0.1 0.1] [--seed 0] [--mode list]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+
+import labelio
+
+SPLIT_NAMES = ('train', 'val', 'test')
+SPLIT_MODES = ('list', 'hardlink', 'symlink')
+
+
+def stratify_keys(table):
+    """每张图片的分层键：所含类别中图片数最少的类别ID，没有框的图片为 -1"""
+    num_images = len(table)
+    keys = np.full(num_images, -1, dtype=np.int64)
+    if not len(table.classes):
+        return keys
+    # 对 (图片, 类别) 去重，再统计每个类别出现在多少张图片中
+    low = int(table.classes.min())
+    span = int(table.classes.max()) - low + 1
+    pairs = np.unique(table.image_ids() * span + (table.classes.astype(np.int64) - low))
+    pair_images, pair_classes = pairs // span, pairs % span + low
+    class_ids, image_counts = np.unique(pair_classes, return_counts=True)
+    frequency = image_counts[np.searchsorted(class_ids, pair_classes)]
+    # 按 (图片, 频率, 类别) 排序后取每张图片的第一项
+    order = np.lexsort((pair_classes, frequency, pair_images))
+    pair_images, pair_classes = pair_images[order], pair_classes[order]
+    first = np.r_[True, pair_images[1:] != pair_images[:-1]]
+    keys[pair_images[first]] = pair_classes[first]
+    return keys
+
+
+def split_indices(keys, ratios=(0.8, 0.1, 0.1), seed=0):
+    """
+    按分层键切分。
+
+    Returns:
+        (np.ndarray): 每张图片所属子集的序号（0=train, 1=val, 2=test），int8。
+    """
+    ratios = np.asarray(ratios, dtype=np.float64)
+    if ratios.sum() <= 0 or (ratios < 0).any():
+        raise ValueError("划分比例必须为非负数且不能全为 0")
+    bounds = np.cumsum(ratios / ratios.sum())
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(len(keys)), keys))
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    sizes = np.diff(np.r_[starts, len(keys)])
+    group_of = np.repeat(np.arange(len(starts)), sizes)
+    rank = np.arange(len(keys)) - starts[group_of]
+    # 用组内位置的中点决定子集，小组也会尽量按比例分配
+    fraction = (rank + 0.5) / sizes[group_of]
+    splits = np.empty(len(keys), dtype=np.int8)
+    splits[order] = np.minimum(np.searchsorted(bounds, fraction, side='right'), len(ratios) - 1)
+    return splits
+
+
+def split_summary(table, splits, class_names):
+    """每个子集的图片数和各类别框数"""
+    summary = {}
+    box_splits = splits[table.image_ids()] if len(table.classes) else np.empty(0, dtype=np.int8)
+    for split, name in enumerate(SPLIT_NAMES):
+        classes = table.classes[box_splits == split]
+        class_ids, counts = np.unique(classes, return_counts=True)
+        summary[name] = {
+            'images': int((splits == split).sum()),
+            'boxes': {(class_names[c] if 0 <= c < len(class_names) else f"Class {c}"): int(n)
+                      for c, n in zip(class_ids.tolist(), counts.tolist())},
+        }
+    return summary
+
+
+def write_data_yaml(path, root, entries, class_names):
+    """写出 data.yaml（YOLO 训练配置）；名称用 JSON 字符串写出，同时是合法的 YAML"""
+    lines = [f"path: {json.dumps(os.path.abspath(root), ensure_ascii=False)}"]
+    for name in SPLIT_NAMES:
+        if name in entries:
+            lines.append(f"{name}: {json.dumps(entries[name], ensure_ascii=False)}")
+    lines.append(f"nc: {len(class_names)}")
+    lines.append("names: [" + ", ".join(json.dumps(n, ensure_ascii=False) for n in class_names) + "]")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _link(source, target, mode):
+    if os.path.lexists(target):
+        os.remove(target)
+    if mode == 'hardlink':
+        os.link(source, target)
+    else:
+        os.symlink(os.path.abspath(source), target)
+
+
+def _clear_split_dir(path, source_dirs):
+    """删除上一次生成的子集目录；源图片位于其中时拒绝删除，避免输出目录选在数据集内部时误删原图"""
+    if not os.path.lexists(path):
+        return
+    root = os.path.abspath(path)
+    if any(d == root or d.startswith(root + os.sep) for d in source_dirs):
+        raise ValueError(f"输出目录包含源图片，不能覆盖: {path}")
+    shutil.rmtree(path)
+
+
+def materialize_split(image_files, splits, out_dir, class_names, mode='list', label_path=labelio.label_path_for):
+    """
+    生成划分结果。
+
+    list:      out_dir/{train,val,test}.txt，每行一个原图绝对路径（标注文件仍在图片旁边）
+    hardlink/symlink: out_dir/images/<子集>/ 和 out_dir/labels/<子集>/ 下的链接，即常见的 YOLO 目录结构；
+                      保留图片相对公共根目录的子文件夹，不同子文件夹中的同名图片不会互相覆盖
+
+    每次生成前先清掉上一次的子集列表/目录，重新划分时不会有图片残留在别的子集里。
+
+    Returns:
+        (str): data.yaml 路径。
+    """
+    if mode not in SPLIT_MODES:
+        raise ValueError(f"未知的划分方式: {mode}")
+    os.makedirs(out_dir, exist_ok=True)
+    source_dirs = {os.path.dirname(os.path.abspath(p)) for p in image_files}
+    for name in SPLIT_NAMES:
+        list_path = os.path.join(out_dir, f"{name}.txt")
+        if os.path.isfile(list_path):
+            os.remove(list_path)
+        _clear_split_dir(os.path.join(out_dir, "images", name), source_dirs)
+        _clear_split_dir(os.path.join(out_dir, "labels", name), source_dirs)
+    root = os.path.commonpath(list(source_dirs)) if source_dirs else ""
+    entries = {}
+    for split, name in enumerate(SPLIT_NAMES):
+        members = np.flatnonzero(splits == split)
+        if not len(members):
+            continue
+        if mode == 'list':
+            list_path = os.path.join(out_dir, f"{name}.txt")
+            with open(list_path, 'w', encoding='utf-8') as f:
+                f.writelines(os.path.abspath(image_files[i]) + "\n" for i in members)
+            entries[name] = f"{name}.txt"
+            continue
+        image_dir = os.path.join(out_dir, "images", name)
+        label_dir = os.path.join(out_dir, "labels", name)
+        for i in members:
+            image_path = image_files[i]
+            sub_dir = os.path.relpath(os.path.dirname(os.path.abspath(image_path)), root)
+            os.makedirs(os.path.join(image_dir, sub_dir), exist_ok=True)
+            _link(image_path, os.path.join(image_dir, sub_dir, os.path.basename(image_path)), mode)
+            txt_path = label_path(image_path)
+            if os.path.exists(txt_path):
+                os.makedirs(os.path.join(label_dir, sub_dir), exist_ok=True)
+                _link(txt_path, os.path.join(label_dir, sub_dir, os.path.basename(txt_path)), mode)
+        entries[name] = f"images/{name}"
+    yaml_path = os.path.join(out_dir, "data.yaml")
+    write_data_yaml(yaml_path, out_dir, entries, class_names)
+    return yaml_path
+
+
+def split_dataset(image_files, class_names, out_dir, ratios=(0.8, 0.1, 0.1), seed=0, mode='list', workers=None,
+                  label_path=labelio.label_path_for):
+    """扫描标注、分层划分并生成结果，返回 (data.yaml 路径, 每个子集的统计)"""
+    table = labelio.scan_labels(image_files, workers=workers, label_path=label_path)
+    splits = split_indices(stratify_keys(table), ratios, seed)
+    yaml_path = materialize_split(image_files, splits, out_dir, class_names, mode, label_path)
+    return yaml_path, split_summary(table, splits, class_names)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按类别分层划分 train/val/test（不复制图片）")
+    parser.add_argument("folder", help="图片文件夹（标注文件与图片同目录）")
+    parser.add_argument("--out", required=True, help="输出文件夹")
+    parser.add_argument("--ratios", type=float, nargs=3, default=(0.8, 0.1, 0.1), metavar=("TRAIN", "VAL", "TEST"))
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--mode", choices=SPLIT_MODES, default='list', help="列表文件、硬链接或符号链接")
+    parser.add_argument("--classes", help="类别文件，默认为图片文件夹下的 classes.txt")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    args = parser.parse_args(argv)
+
+    image_files = labelio.list_image_files(args.folder)
+    if not image_files:
+        print(f"没有找到图片: {args.folder}")
+        return 1
+    classes_path = args.classes or os.path.join(args.folder, "classes.txt")
+    class_names = labelio.read_class_names(classes_path) if os.path.exists(classes_path) else []
+
+    yaml_path, summary = split_dataset(image_files, class_names, args.out, args.ratios, args.seed, args.mode,
+                                       args.workers)
+    for name, info in summary.items():
+        print(f"{name}: {info['images']} 张图片 {info['boxes']}")
+    print(f"已写出 {yaml_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
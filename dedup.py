@@ -0,0 +1,273 @@
+"""
+感知哈希查找近似重复图片（抓取的数据和视频抽帧中常见大量几乎相同的帧）。
+
+哈希 (64 位):
+    ahash   8x8 灰度图与均值比较
+    dhash   9x8 灰度图相邻像素比较
+    phash   32x32 灰度图做 DCT，取左上 8x8 低频与中位数比较
+
+哈希由进程池计算，按 (路径, mtime, 大小) 缓存在数据集缓存目录的 <method>.npz 中。
+查找使用多索引哈希: 把 64 位分成几段，按抽屉原理只比较至少一段足够接近的候选对，再向量化计算汉明距离，
+不需要两两比较全部图片。
+"""
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import labelio
+from imagecodec import decode_rgb
+
+HASH_METHODS = ('ahash', 'dhash', 'phash')
+HASH_BITS = 64
+
+
+def resize_gray(gray, width, height):
+    """按块平均缩小灰度图（不依赖图像库）"""
+    h, w = gray.shape
+    rows = np.linspace(0, h, height + 1).astype(np.int64)[:-1]
+    cols = np.linspace(0, w, width + 1).astype(np.int64)[:-1]
+    summed = np.add.reduceat(np.add.reduceat(gray, rows, axis=0), cols, axis=1)
+    row_counts = np.diff(np.r_[rows, h])
+    col_counts = np.diff(np.r_[cols, w])
+    return summed / np.outer(row_counts, col_counts)
+
+
+def _dct_matrix(n):
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return matrix * np.sqrt(2 / n)
+
+
+DCT_32 = _dct_matrix(32)
+
+
+def pack_bits(bits):
+    """64 个布尔值 -> uint64"""
+    return np.packbits(bits.ravel().astype(np.uint8), bitorder='little').view(np.uint64)[0]
+
+
+def hash_gray(gray, method='phash'):
+    """计算灰度图 (float, HxW) 的感知哈希"""
+    if method == 'ahash':
+        small = resize_gray(gray, 8, 8)
+        return pack_bits(small > small.mean())
+    if method == 'dhash':
+        small = resize_gray(gray, 9, 8)
+        return pack_bits(small[:, 1:] > small[:, :-1])
+    if method == 'phash':
+        small = resize_gray(gray, 32, 32)
+        low = (DCT_32 @ small @ DCT_32.T)[:8, :8]
+        return pack_bits(low > np.median(low.ravel()[1:]))  # 中位数不含直流分量
+    raise ValueError(f"未知的哈希方法: {method}")
+
+
+def hash_image(path, method='phash'):
+    """解码（JPEG 按缩小后的分辨率解码）并计算一张图片的哈希"""
+    rgb, _ = decode_rgb(path, 64)
+    gray = rgb.astype(np.float64) @ np.array([0.299, 0.587, 0.114])
+    return hash_gray(gray, method)
+
+
+def hash_chunk(paths, method='phash'):
+    """工作进程：计算一批图片的哈希，返回 [(路径, mtime_ns, 大小, 哈希或 None)]"""
+    results = []
+    for path in paths:
+        try:
+            stat = labelio.source_stat(path)
+            results.append((path, stat.st_mtime_ns, stat.st_size, int(hash_image(path, method))))
+        except Exception as e:
+            print(f"计算图片哈希 {path} 失败: {e}")
+            results.append((path, 0, 0, None))
+    return results
+
+
+class HashCache:
+    """哈希缓存（npz 文件），只有 mtime 和大小都未变化时才命中"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}  # 路径 -> (mtime_ns, 大小, 哈希)
+        if path and os.path.exists(path):
+            try:
+                with np.load(path) as data:
+                    self.entries = dict(zip(data['paths'].tolist(), zip(data['mtime_ns'].tolist(),
+                                                                        data['size'].tolist(),
+                                                                        data['hash'].tolist())))
+            except (OSError, ValueError, KeyError):
+                self.entries = {}
+
+    def lookup(self, path):
+        entry = self.entries.get(path)
+        if entry is None:
+            return None
+        try:
+            stat = labelio.source_stat(path)
+        except OSError:
+            return None
+        if entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size:
+            return None
+        return entry[2]
+
+    def save(self, keep_paths):
+        if not self.path:
+            return
+        paths = [p for p in keep_paths if p in self.entries]
+        temp_path = self.path + ".tmp.npz"
+        np.savez(temp_path, paths=np.array(paths, dtype=str),
+                 mtime_ns=np.array([self.entries[p][0] for p in paths], dtype=np.int64),
+                 size=np.array([self.entries[p][1] for p in paths], dtype=np.int64),
+                 hash=np.array([self.entries[p][2] for p in paths], dtype=np.uint64))
+        os.replace(temp_path, self.path)
+
+
+def compute_hashes(image_files, method='phash', cache_path=None, workers=None, chunk_size=256):
+    """
+    并行计算 image_files 的哈希。
+
+    Returns:
+        (np.ndarray, np.ndarray): uint64 哈希和是否有效的布尔数组（解码失败的图片无效）。
+    """
+    cache = HashCache(cache_path)
+    hashes = np.zeros(len(image_files), dtype=np.uint64)
+    valid = np.zeros(len(image_files), dtype=bool)
+    todo = []
+    for i, path in enumerate(image_files):
+        cached = cache.lookup(path)
+        if cached is None:
+            todo.append(i)
+        else:
+            hashes[i], valid[i] = cached, True
+
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    path_chunks = [[image_files[i] for i in chunk] for chunk in chunks]
+    if len(chunks) <= 1 or workers == 1:
+        results = [hash_chunk(paths, method) for paths in path_chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(hash_chunk, path_chunks, [method] * len(chunks)))
+
+    for chunk, chunk_results in zip(chunks, results):
+        for i, (path, mtime_ns, size, value) in zip(chunk, chunk_results):
+            if value is None:
+                continue
+            hashes[i], valid[i] = value, True
+            cache.entries[path] = (mtime_ns, size, value)
+    if todo:
+        cache.save(image_files)
+    return hashes, valid
+
+
+def popcount(values):
+    """uint64 数组每个元素中 1 的个数"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    table = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    return table[values.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+def band_masks(width, radius):
+    """宽度为 width 的段内，汉明距离不超过 radius 的全部异或掩码"""
+    masks = [0]
+    for r in range(1, radius + 1):
+        masks += [sum(1 << bit for bit in bits) for bits in itertools.combinations(range(width), r)]
+    return np.array(masks, dtype=np.uint64)
+
+
+def choose_bands(n, threshold):
+    """按估算的查找次数和候选对数选择段数：段越多每段越短，需要枚举的掩码越少，但桶越大"""
+    best_bands, best_cost = 1, None
+    for bands in range(1, threshold + 2):
+        width = HASH_BITS // bands
+        masks = sum(math.comb(width, r) for r in range(threshold // bands + 1))
+        cost = bands * masks * n * (np.log2(max(n, 2)) + n / 2.0 ** width)
+        if best_cost is None or cost < best_cost:
+            best_bands, best_cost = bands, cost
+    return best_bands
+
+
+def near_duplicate_pairs(hashes, threshold=6, band_bits=None):
+    """
+    多索引哈希查找汉明距离 <= threshold 的哈希对。
+
+    64 位分成 m 段，汉明距离 <= threshold 的两个哈希至少有一段距离 <= threshold // m；
+    对每段只需在有序数组里查找距离这么近的段值。
+
+    Args:
+        hashes (np.ndarray): 互不相同的 uint64 哈希。
+        band_bits (int, optional): 每段位数，默认按哈希数和阈值自动选择（见 choose_bands）。
+
+    Returns:
+        (np.ndarray, np.ndarray): 哈希对的下标 (first, second)，first < second。
+    """
+    n = len(hashes)
+    bands = choose_bands(n, threshold) if band_bits is None else max(1, HASH_BITS // band_bits)
+    radius = threshold // bands
+    edges = np.linspace(0, HASH_BITS, bands + 1).astype(np.uint64)
+    firsts, seconds = [], []
+    for band in range(bands):
+        width = edges[band + 1] - edges[band]
+        # 右移而不是 (1 << width) - 1，只有一段（width 为 64）时也不会溢出
+        keys = (hashes >> edges[band]) & (np.uint64(0xFFFFFFFFFFFFFFFF) >> (np.uint64(HASH_BITS) - width))
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        for mask in band_masks(int(width), radius):
+            lo = np.searchsorted(sorted_keys, keys ^ mask, side='left')
+            counts = np.searchsorted(sorted_keys, keys ^ mask, side='right') - lo
+            total = int(counts.sum())
+            if not total:
+                continue
+            a = np.repeat(np.arange(n), counts)
+            b = order[np.repeat(lo, counts) + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)]
+            keep = (a < b) & (popcount(hashes[a] ^ hashes[b]) <= threshold)
+            firsts.append(a[keep])
+            seconds.append(b[keep])
+    if not firsts:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    pairs = np.unique(np.stack([np.concatenate(firsts), np.concatenate(seconds)], axis=1), axis=0)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def connected_groups(num_items, first, second):
+    """向量化求连通分量（最小标签传播 + 指针跳跃），返回每个元素的组代表（组内最小下标）"""
+    labels = np.arange(num_items)
+    while True:
+        smallest = np.minimum(labels[first], labels[second])
+        updated = labels.copy()
+        np.minimum.at(updated, first, smallest)
+        np.minimum.at(updated, second, smallest)
+        np.minimum.at(updated, labels, updated)  # 让旧代表也指向新的最小标签
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def find_duplicate_groups(hashes, valid=None, threshold=6):
+    """
+    把近似重复的图片分组。
+
+    Returns:
+        (list): 每组为升序的图片下标数组（至少 2 张），组按第一张图片排序；第一张视为该组的代表。
+    """
+    indices = np.arange(len(hashes)) if valid is None else np.flatnonzero(valid)
+    # 完全相同的哈希先合并，多索引查找只在不同的哈希之间进行
+    unique_hashes, inverse = np.unique(hashes[indices], return_inverse=True)
+    first, second = near_duplicate_pairs(unique_hashes, threshold)
+    roots = connected_groups(len(unique_hashes), first, second)[inverse]
+
+    order = np.lexsort((indices, roots))
+    sorted_roots, sorted_indices = roots[order], indices[order]
+    starts = np.flatnonzero(np.r_[True, sorted_roots[1:] != sorted_roots[:-1]])
+    groups = [group for group in np.split(sorted_indices, starts[1:]) if len(group) > 1]
+    groups.sort(key=lambda group: group[0])
+    return groups
+
+
+def find_duplicates(image_files, method='phash', threshold=6, cache_path=None, workers=None):
+    """计算哈希并分组，返回近似重复的图片组（见 find_duplicate_groups）"""
+    hashes, valid = compute_hashes(image_files, method, cache_path, workers)
+    return find_duplicate_groups(hashes, valid, threshold)
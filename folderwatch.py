@@ -0,0 +1,235 @@
+"""
+监视图片文件夹的变化（其他程序或同事新增/删除/重命名图片、修改标注文件）。
+
+Linux 上通过 ctypes 直接调用 inotify，不需要第三方库；其它平台或 inotify 不可用时
+（例如超过 max_user_instances）每隔 interval 秒用 os.scandir 扫描一次，按 (mtime, 大小, inode) 比较。
+
+变化先合并 debounce 秒再批量回调，批量复制几千个文件时只触发少数几次刷新。
+回调在监视线程中调用，参数为 [(事件, 路径, 原路径)]:
+    created / modified / deleted    原路径为 None
+    moved                           文件夹内重命名（包括先写临时文件再替换的原子写入）
+    rescan                          inotify 事件队列溢出，调用方需要重新扫描整个文件夹
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def coalesce(events):
+    """
+    合并同一批事件: 先创建后修改仍为创建，先创建后删除则忽略，先删除后创建视为修改；
+    重命名的源文件如果是本批刚创建的，合并为目标文件的创建。
+    """
+    pending = {}  # 路径 -> (事件, 原路径)，按首次出现的顺序
+    for kind, path, old_path in events:
+        if kind == 'moved':
+            previous = pending.pop(old_path, None)
+            if previous and previous[0] == 'created':
+                kind, old_path = 'created', None
+            elif previous and previous[0] == 'moved':
+                old_path = previous[1]
+            pending[path] = (kind, old_path)
+            continue
+        previous = pending.get(path)
+        if previous is None:
+            pending[path] = (kind, old_path)
+        elif kind == 'deleted':
+            if previous[0] == 'created':
+                del pending[path]
+            elif previous[0] == 'moved':
+                pending[path] = ('deleted', None)
+                pending[previous[1]] = ('deleted', None)
+            else:
+                pending[path] = ('deleted', None)
+        elif previous[0] == 'deleted':
+            pending[path] = ('modified', None)
+    return [(kind, path, old_path) for path, (kind, old_path) in pending.items()]
+
+
+class _Inotify:
+    """inotify 文件描述符（监视给定的各个目录，不递归）"""
+
+    def __init__(self, folder_path, folders):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.folders = {}  # 监视描述符 -> 目录
+        for folder in folders:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(errno, f"inotify_add_watch 失败: {folder}")
+            self.folders[wd] = folder
+        self.folder_path = folder_path
+        self.moved_from = {}  # cookie -> (原路径, 收到事件的时间)
+
+    def read_events(self, timeout):
+        """等待最多 timeout 秒，返回 [(事件, 路径, 原路径)]"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                events.append(('rescan', self.folder_path, None))
+                continue
+            if mask & IN_ISDIR or not name or wd not in self.folders:
+                continue
+            path = os.path.join(self.folders[wd], name)
+            if mask & IN_MOVED_FROM:
+                self.moved_from[cookie] = (path, time.monotonic())
+            elif mask & IN_MOVED_TO:
+                old_path = self.moved_from.pop(cookie, (None, 0.0))[0]
+                events.append(('moved', path, old_path) if old_path else ('created', path, None))
+            elif mask & IN_DELETE:
+                events.append(('deleted', path, None))
+            elif mask & IN_CLOSE_WRITE:
+                events.append(('modified', path, None))
+        return events
+
+    def flush_moved_out(self, max_age=0.0):
+        """等待超过 max_age 秒仍没有配对 IN_MOVED_TO 的 IN_MOVED_FROM 是移出了文件夹，视为删除"""
+        now = time.monotonic()
+        expired = [cookie for cookie, (_, received) in self.moved_from.items() if now - received >= max_age]
+        return [('deleted', self.moved_from.pop(cookie)[0], None) for cookie in expired]
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _Poller:
+    """定期扫描目录，按 (mtime_ns, 大小, inode) 找出变化"""
+
+    def __init__(self, folders, interval):
+        self.folders = folders
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snapshot = {}
+        for folder in self.folders:
+            try:
+                entries = os.scandir(folder)
+            except FileNotFoundError:
+                continue  # 子目录被删除，其中的文件按删除处理
+            with entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+                    except OSError:
+                        continue
+        return snapshot
+
+    def read_events(self, timeout):
+        time.sleep(max(timeout, self.interval))
+        try:
+            current = self.scan()
+        except OSError:
+            return []
+        previous, self.snapshot = self.snapshot, current
+        removed = {previous[p][2]: p for p in previous.keys() - current.keys()}
+        events = []
+        for path in sorted(current.keys() - previous.keys()):
+            old_path = removed.pop(current[path][2], None)
+            events.append(('moved', path, old_path) if old_path else ('created', path, None))
+        events += [('deleted', path, None) for path in sorted(removed.values())]
+        events += [('modified', path, None) for path in sorted(current.keys() & previous.keys())
+                   if current[path] != previous[path]]
+        return events
+
+    def flush_moved_out(self, max_age=0.0):
+        return []
+
+    def close(self):
+        pass
+
+
+class FolderWatcher:
+    """
+    在后台线程中监视文件夹，把合并后的变化交给 callback。
+
+    Args:
+        folder_path (str): 图片文件夹（不递归子文件夹）。
+        callback (callable): callback(changes)，在监视线程中调用。
+        folders (list, optional): 要监视的全部目录（递归扫描的数据集中图片和标注所在的各个子目录），默认只有 folder_path。
+        interval (float): 轮询间隔（秒），只在不能使用 inotify 时有效。
+        debounce (float): 最后一个事件之后等待多久再回调。
+        use_inotify (bool): False 时强制轮询（例如网络文件系统上 inotify 收不到其他机器的修改）。
+    """
+
+    def __init__(self, folder_path, callback, interval=2.0, debounce=0.3, use_inotify=True, folders=None):
+        self.folder_path = folder_path
+        self.callback = callback
+        self.debounce = debounce
+        self.source = None
+        folders = list(folders or [folder_path])
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self.source = _Inotify(folder_path, folders)
+            except (OSError, AttributeError) as e:
+                print(f"inotify 不可用，改为定期扫描: {e}")
+        if self.source is None:
+            self.source = _Poller(folders, interval)
+        self.backend = 'inotify' if isinstance(self.source, _Inotify) else 'polling'
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+
+    def _run(self):
+        pending = []
+        last_event = 0.0
+        try:
+            while not self._stop.is_set():
+                events = self.source.read_events(self.debounce if pending else 0.5)
+                if events:
+                    pending.extend(events)
+                    last_event = time.monotonic()
+                    continue
+                # 单独的移出事件没有后续事件触发，空闲时也要检查（它本身已经等待了 debounce 秒）
+                pending.extend(self.source.flush_moved_out(self.debounce))
+                if pending and time.monotonic() - last_event >= self.debounce:
+                    changes, pending = coalesce(pending), []
+                    if changes and not self._stop.is_set():
+                        try:
+                            self.callback(changes)
+                        except Exception as e:
+                            print(f"处理文件夹变化失败: {e}")
+        finally:
+            self.source.close()
@@ -0,0 +1,180 @@
+"""
+损坏/截断图片扫描：检查文件头和文件尾（JPEG 的 EOI、PNG 的 IEND 等），可选完整解码。
+
+JPEG 末尾附近找不到 EOI 时可能是被截断，也可能是相机/手机在 EOI 后附加了数据（如动态照片），
+标记为"可疑"，完整解码检查时再确认。
+
+结果按 (路径, mtime, 大小) 缓存在数据集缓存目录的 imagecheck.json 中，文件未变化时不再重复检查。
+"""
+import json
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+import labelio
+from imagecodec import decode_rgb, open_image_file
+
+STATUS_OK = 'ok'
+STATUS_EMPTY = 'empty'
+STATUS_TRUNCATED = 'truncated'
+STATUS_SUSPECT = 'suspect'
+STATUS_CORRUPT = 'corrupt'
+STATUS_UNREADABLE = 'unreadable'
+
+STATUS_NAMES = {
+    STATUS_OK: "正常",
+    STATUS_EMPTY: "空文件",
+    STATUS_TRUNCATED: "文件被截断",
+    STATUS_SUSPECT: "可能被截断",
+    STATUS_CORRUPT: "文件已损坏",
+    STATUS_UNREADABLE: "无法读取",
+}
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_IEND = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+TAIL_SIZE = 64
+JPEG_TAIL_SIZE = 64 * 1024  # 末尾一小段中没有 EOI 时，再在这么大的范围内查找
+
+
+def check_structure(head, tail, file_size):
+    """根据文件头和文件尾判断图片是否完整，返回 (状态, 说明)"""
+    if file_size == 0:
+        return STATUS_EMPTY, "文件大小为 0"
+    if head.startswith(b"\xff\xd8\xff"):
+        # JPEG 结尾应有 EOI 标记（部分相机会在其后补零或附加数据，找不到时只算可疑）
+        if b"\xff\xd9" not in tail:
+            return STATUS_SUSPECT, f"JPEG 末尾 {len(tail)} 字节内没有 EOI 结束标记"
+        return STATUS_OK, ""
+    if head.startswith(PNG_SIGNATURE):
+        if not tail.endswith(PNG_IEND):
+            return STATUS_TRUNCATED, "PNG 缺少 IEND 块"
+        return STATUS_OK, ""
+    if head.startswith(b"BM") and len(head) >= 6:
+        declared = struct.unpack("<I", head[2:6])[0]
+        if declared > file_size:
+            return STATUS_TRUNCATED, f"BMP 声明大小 {declared} 大于实际大小 {file_size}"
+        return STATUS_OK, ""
+    if head.startswith((b"II*\x00", b"MM\x00*")):
+        return STATUS_OK, ""
+    return STATUS_CORRUPT, "无法识别的文件头"
+
+
+def check_image(path, full_decode=False):
+    """检查单张图片，返回 (状态, 说明)"""
+    if labelio.split_frame_path(path):
+        status, message = STATUS_OK, ""  # 视频帧没有单独的文件，只在完整解码时检查
+    else:
+        try:
+            with open_image_file(path, head_only=True) as f:
+                head = f.read(16)
+                f.seek(0, os.SEEK_END)
+                file_size = f.tell()
+                f.seek(max(0, file_size - TAIL_SIZE))
+                tail = f.read(TAIL_SIZE)
+                status, message = check_structure(head, tail, file_size)
+                if status == STATUS_SUSPECT and file_size > TAIL_SIZE:
+                    f.seek(max(0, file_size - JPEG_TAIL_SIZE))
+                    status, message = check_structure(head, f.read(JPEG_TAIL_SIZE), file_size)
+        except (OSError, ValueError) as e:
+            return STATUS_UNREADABLE, str(e)
+    if status in (STATUS_OK, STATUS_SUSPECT) and full_decode:
+        try:
+            decode_rgb(path)
+        except Exception as e:
+            if status == STATUS_SUSPECT:
+                return STATUS_TRUNCATED, f"{message}，解码失败: {e}"
+            return STATUS_CORRUPT, f"解码失败: {e}"
+        status, message = STATUS_OK, ""
+    return status, message
+
+
+def check_image_chunk(paths, full_decode=False):
+    """工作进程：检查一批图片，返回 [(路径, mtime_ns, 大小, 状态, 说明)]"""
+    results = []
+    for path in paths:
+        try:
+            stat = labelio.source_stat(path)
+            mtime_ns, size = stat.st_mtime_ns, stat.st_size
+        except OSError:
+            mtime_ns, size = 0, 0
+        status, message = check_image(path, full_decode)
+        results.append((path, mtime_ns, size, status, message))
+    return results
+
+
+class ImageCheckCache:
+    """检查结果缓存（JSON 文件），只有 mtime 和大小都未变化时才命中"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}  # 路径 -> [mtime_ns, 大小, 状态, 说明, 是否完整解码]
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def lookup(self, path, full_decode=False):
+        """命中时返回 (状态, 说明)，否则返回 None"""
+        entry = self.entries.get(path)
+        if not entry:
+            return None
+        try:
+            stat = labelio.source_stat(path)
+        except OSError:
+            return None
+        mtime_ns, size, status, message, decoded = entry
+        if mtime_ns != stat.st_mtime_ns or size != stat.st_size:
+            return None
+        if full_decode and not decoded and status in (STATUS_OK, STATUS_SUSPECT):
+            return None  # 之前只检查了文件结构
+        return status, message
+
+    def store(self, path, mtime_ns, size, status, message, full_decode):
+        self.entries[path] = [mtime_ns, size, status, message, bool(full_decode)]
+
+    def save(self):
+        if not self.path:
+            return
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+
+def scan_images(image_files, full_decode=False, cache_path=None, workers=None, chunk_size=256):
+    """
+    并行检查 image_files。
+
+    Returns:
+        (dict): 有问题的图片路径 -> (状态, 说明)；正常的图片不出现在结果中。
+    """
+    cache = ImageCheckCache(cache_path)
+    bad = {}
+    todo = []
+    for path in image_files:
+        cached = cache.lookup(path, full_decode)
+        if cached is None:
+            todo.append(path)
+        elif cached[0] != STATUS_OK:
+            bad[path] = cached
+
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    if len(chunks) <= 1 or workers == 1:
+        results = [check_image_chunk(chunk, full_decode) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(check_image_chunk, chunks, [full_decode] * len(chunks)))
+
+    for chunk_results in results:
+        for path, mtime_ns, size, status, message in chunk_results:
+            cache.store(path, mtime_ns, size, status, message, full_decode)
+            if status != STATUS_OK:
+                bad[path] = (status, message)
+    if todo or len(cache.entries) > len(image_files):
+        # 顺便清理已不在列表中的图片
+        wanted = set(image_files)
+        cache.entries = {path: entry for path, entry in cache.entries.items() if path in wanted}
+        cache.save()
+    return bad
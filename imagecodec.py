@@ -0,0 +1,161 @@
+"""
+不依赖 GUI 的图片解码/编码，供后台进程使用。
+
+安装了 Pillow 时优先使用 Pillow（JPEG 可按缩小后的分辨率直接解码），否则使用 wx.Image。
+视频帧路径（<视频路径>#<帧序号>）由 videosource 解码；压缩包内和对象存储中的图片由 imagesource 读出字节后解码。
+wx 只在实际解码时才导入，工作进程不会因为导入本模块而加载 wx。
+"""
+import io
+import struct
+
+import numpy as np
+
+import labelio
+
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+
+def decode_rgb(path, max_size=None):
+    """
+    解码图片为 HxWx3 uint8 数组。
+
+    Args:
+        path (str): 图片路径。
+        max_size (int, optional): 长边上限，给定时按比例缩小（JPEG 在解码阶段就缩小）。
+
+    Returns:
+        (np.ndarray, tuple): 像素数组和原图尺寸 (width, height)。
+    """
+    if labelio.split_frame_path(path):
+        import videosource
+        rgb = videosource.read_frame(path)
+        original_size = (rgb.shape[1], rgb.shape[0])
+        if max_size and max(original_size) > max_size:
+            step = -(-max(original_size) // max_size)  # 视频帧按整数步长抽样缩小
+            rgb = rgb[::step, ::step]
+        return rgb, original_size
+
+    source = path if labelio.is_local_file(path) else open_image_file(path)
+    if PILImage is not None:
+        with PILImage.open(source) as image:
+            original_size = image.size
+            if max_size:
+                image.draft("RGB", (max_size, max_size))
+            image = image.convert("RGB")
+            if max_size and max(image.size) > max_size:
+                image.thumbnail((max_size, max_size))
+            return np.asarray(image, dtype=np.uint8), original_size
+
+    import wx
+    no_log = wx.LogNull()  # 解码失败时不弹出 wx 日志窗口
+    image = wx.Image(source)
+    del no_log
+    if not image.IsOk():
+        raise ValueError(f"无法解码图片: {path}")
+    original_size = (image.GetWidth(), image.GetHeight())
+    if max_size and max(original_size) > max_size:
+        scale = max_size / max(original_size)
+        image = image.Scale(max(1, round(original_size[0] * scale)), max(1, round(original_size[1] * scale)),
+                            wx.IMAGE_QUALITY_BOX_AVERAGE)
+    pixels = np.frombuffer(bytes(image.GetData()), dtype=np.uint8)
+    return pixels.reshape(image.GetHeight(), image.GetWidth(), 3), original_size
+
+
+def open_image_file(path, head_only=False):
+    """以二进制方式打开图片文件；压缩包内和对象存储中的图片由 imagesource 读取（head_only 时只读文件头）"""
+    if labelio.is_local_file(path):
+        return open(path, "rb")
+    import imagesource
+    return imagesource.open_image(path, head_only)
+
+
+def resize_rgb(rgb, width, height):
+    """把 HxWx3 uint8 数组缩放到 width x height"""
+    rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+    if PILImage is not None:
+        resized = PILImage.fromarray(rgb, "RGB").resize((width, height), PILImage.BILINEAR, reducing_gap=2.0)
+        return np.asarray(resized, dtype=np.uint8)
+
+    import wx
+    image = wx.Image(rgb.shape[1], rgb.shape[0], rgb.tobytes())
+    image = image.Scale(width, height, wx.IMAGE_QUALITY_HIGH)
+    pixels = np.frombuffer(bytes(image.GetData()), dtype=np.uint8)
+    return pixels.reshape(height, width, 3)
+
+
+def encode_jpeg(rgb, quality=85):
+    """把 HxWx3 uint8 数组编码为 JPEG 字节"""
+    rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+    if PILImage is not None:
+        stream = io.BytesIO()
+        PILImage.fromarray(rgb, "RGB").save(stream, "JPEG", quality=quality)
+        return stream.getvalue()
+
+    import wx
+    height, width = rgb.shape[:2]
+    image = wx.Image(width, height, rgb.tobytes())
+    image.SetOption(wx.IMAGE_OPTION_QUALITY, quality)
+    stream = io.BytesIO()
+    if not image.SaveFile(stream, wx.BITMAP_TYPE_JPEG):
+        raise ValueError("JPEG 编码失败")
+    return stream.getvalue()
+
+
+def read_image_size(path):
+    """
+    只读取文件头获取图片尺寸 (width, height)，不解码像素。
+
+    支持 JPEG（扫描到 SOF 段）、PNG、BMP、GIF；其它格式交给 Pillow（同样只读文件头）。
+    无法识别时抛出 ValueError。
+    """
+    if labelio.split_frame_path(path):
+        import videosource
+        return videosource.frame_size(path)
+
+    with open_image_file(path, head_only=True) as f:
+        head = f.read(32)
+        if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+            return struct.unpack(">II", head[16:24])
+        if head.startswith((b"GIF87a", b"GIF89a")):
+            return struct.unpack("<HH", head[6:10])
+        if head.startswith(b"BM") and len(head) >= 26:
+            width, height = struct.unpack("<ii", head[18:26])
+            return width, abs(height)  # 高度为负表示自上而下存储
+        if head.startswith(b"\xff\xd8"):
+            return _read_jpeg_size(f)
+
+    if PILImage is not None:
+        with PILImage.open(path if labelio.is_local_file(path) else open_image_file(path)) as image:
+            return image.size
+    raise ValueError(f"无法识别图片尺寸: {path}")
+
+
+def _read_jpeg_size(f):
+    """逐段跳过 JPEG 标记，直到 SOFn 段"""
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        while len(marker) == 2 and marker[0] == 0xFF and marker[1] == 0xFF:
+            marker = marker[1:] + f.read(1)  # 填充字节
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ValueError("JPEG 段结构错误")
+        code = marker[1]
+        if code in (0x01, 0xD8) or 0xD0 <= code <= 0xD7:
+            continue  # 没有长度字段的标记
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            raise ValueError("JPEG 文件被截断")
+        length = struct.unpack(">H", length_bytes)[0]
+        # SOF0-SOF15，除去 DHT(C4)、JPG(C8)、DAC(CC)
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            data = f.read(5)
+            if len(data) < 5:
+                raise ValueError("JPEG 文件被截断")
+            height, width = struct.unpack(">HH", data[1:5])
+            return width, height
+        if code == 0xDA:
+            raise ValueError("JPEG 缺少 SOF 段")
+        f.seek(length - 2, io.SEEK_CUR)
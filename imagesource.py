@@ -0,0 +1,489 @@
+"""
+图片来源：界面、解码和后台工具都通过这里按路径读取图片，不关心图片在本地磁盘还是对象存储中。
+
+    LocalSource   本地文件（压缩包内的图片由 archivesource 读取）
+    HttpSource    HTTP/S3 兼容的对象存储，图片路径为对象的 URL（路径风格: http(s)://主机/桶/键）
+
+HttpSource:
+    - 每个主机一个连接池（HTTP/1.1 长连接），界面线程和预取线程共用
+    - 打开文件夹时用 ListObjectsV2 列出前缀下一层的对象（delimiter=/），对象的大小和修改时间保存在内存中，
+      供 labelio.source_stat 使用（各种缓存按 mtime 和大小判断是否有效）；不在列表中的对象用 HEAD 请求
+    - 只需要文件头时（图片尺寸、损坏检查）用 Range 请求按块读取，不下载整张图片
+    - 完整读取的图片保存在本地磁盘缓存中，按最近使用淘汰，总大小不超过 LABELBRIDGE_CACHE_MB（默认 2048 MB）
+    - prefetch 在后台线程池中并行下载接下来的几张图片
+    - 设置了 AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY 时按 AWS Signature V4 签名（区域为 AWS_REGION，默认 us-east-1）
+    - s3://桶/前缀 按 AWS_ENDPOINT_URL（默认 https://s3.amazonaws.com）转换为路径风格的 URL
+
+远程图片的标注保存在本地 ~/.labelbridge/remote/<主机>/<桶>/<键>.txt（见 labelio.label_path_for）；
+打开前缀时把其中的 .txt 和 classes.txt 对象下载到这里，已存在的文件不覆盖（保留本地的修改）。
+
+不连接真实对象存储时可以用 bucketserver.py 把本地文件夹当作桶测试。
+"""
+import datetime
+import email.utils
+import hashlib
+import hmac
+import http.client
+import io
+import os
+import queue
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, quote, urlencode, urlparse
+
+import labelio
+
+DEFAULT_CACHE_MB = 2048
+READ_BLOCK_SIZE = 64 * 1024  # 只读文件头时每次 Range 请求的大小
+LIST_PAGE_SIZE = 1000
+
+ObjectStat = namedtuple("ObjectStat", ["st_size", "st_mtime_ns"])
+
+
+class LocalSource:
+    """本地文件"""
+
+    def open(self, path, head_only=False):
+        if labelio.split_archive_path(path):
+            import archivesource
+            return archivesource.open_member(path)
+        return open(path, "rb")
+
+    def read(self, path):
+        if labelio.split_archive_path(path):
+            import archivesource
+            return archivesource.read_member(path)
+        with open(path, "rb") as f:
+            return f.read()
+
+    def stat(self, path):
+        return labelio.source_stat(path)
+
+    def prefetch(self, paths):
+        pass
+
+    def list_images(self, folder_path, recursive=False):
+        if labelio.is_archive(folder_path):
+            import archivesource
+            return archivesource.list_images(folder_path)
+        return labelio.list_image_files(folder_path, recursive)
+
+
+def sign_v4(method, url, headers, access_key, secret_key, region, service="s3"):
+    """AWS Signature V4：返回加上 x-amz-date、x-amz-content-sha256 和 Authorization 的请求头（请求体不参与签名）"""
+    parsed = urlparse(url)
+    amz_date = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    headers = dict(headers, Host=parsed.netloc)
+    headers["x-amz-date"] = amz_date
+    headers["x-amz-content-sha256"] = "UNSIGNED-PAYLOAD"
+    canonical_headers = sorted((name.lower(), " ".join(str(value).split())) for name, value in headers.items())
+    signed_headers = ";".join(name for name, _ in canonical_headers)
+    canonical_query = "&".join(f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}"
+                               for name, value in sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    canonical_request = "\n".join([
+        method, parsed.path or "/", canonical_query,
+        "".join(f"{name}:{value}\n" for name, value in canonical_headers), signed_headers, "UNSIGNED-PAYLOAD"])
+    scope = f"{amz_date[:8]}/{region}/{service}/aws4_request"
+    string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope,
+                                hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()])
+    key = ("AWS4" + secret_key).encode("utf-8")
+    for part in (amz_date[:8], region, service, "aws4_request"):
+        key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+    headers["Authorization"] = (f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+                                f"SignedHeaders={signed_headers}, Signature={signature}")
+    return headers
+
+
+def normalize_url(url):
+    """s3://桶/前缀 -> 路径风格的 HTTP URL"""
+    if url.startswith("s3://"):
+        endpoint = os.environ.get("AWS_ENDPOINT_URL", "https://s3.amazonaws.com").rstrip("/")
+        return endpoint + "/" + url[len("s3://"):]
+    return url
+
+
+class DiskCache:
+    """
+    本地磁盘上的对象缓存，按最近使用淘汰，总大小不超过 max_bytes。
+
+    每个进程各自维护使用顺序（启动时按文件的访问时间恢复）；其它进程淘汰了的文件读取时当作未命中。
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.entries = None  # 文件名 -> 大小，按最近使用排序（第一次使用时加载）
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                st = entry.stat()
+                found.append((st.st_atime_ns, entry.name, st.st_size))
+        found.sort()
+        self.entries = OrderedDict((name, size) for _, name, size in found)
+        self.total = sum(self.entries.values())
+
+    def get(self, key):
+        """命中时返回缓存文件路径"""
+        with self._lock:
+            if self.entries is None:
+                self._load()
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+        path = os.path.join(self.cache_dir, key)
+        try:
+            os.utime(path)  # 其它进程恢复使用顺序时以访问时间为准
+        except OSError:
+            with self._lock:
+                self.total -= self.entries.pop(key, 0)
+            return None
+        return path
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if self.entries is None:
+                self._load()
+        path = os.path.join(self.cache_dir, key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        with self._lock:
+            self.total += len(data) - self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            while self.total > self.max_bytes and len(self.entries) > 1:
+                name, size = self.entries.popitem(last=False)
+                self.total -= size
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+
+class _ConnectionPool:
+    """一个主机的 HTTP/1.1 长连接池"""
+
+    def __init__(self, scheme, netloc, size, timeout):
+        self.scheme = scheme
+        self.netloc = netloc
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=size)
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return connection_class(self.netloc, timeout=self.timeout)
+
+    def request(self, method, target, headers):
+        """发送请求，返回 (状态码, 响应头, 内容)；长连接被服务器关闭时自动重连一次"""
+        with self._slots:
+            try:
+                connection = self._pool.get_nowait()
+            except queue.Empty:
+                connection = self._connect()
+            for attempt in range(2):
+                try:
+                    connection.request(method, target, headers=headers)
+                    response = connection.getresponse()
+                    data = response.read()
+                    break
+                except (http.client.HTTPException, OSError):
+                    connection.close()
+                    if attempt:
+                        raise
+                    connection = self._connect()
+            self._pool.put_nowait(connection)
+        return response.status, response.headers, data
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class RangeFile(io.RawIOBase):
+    """按需用 Range 请求读取的只读文件对象（包在 BufferedReader 中，每次请求 READ_BLOCK_SIZE 字节）"""
+
+    def __init__(self, source, url, size):
+        super().__init__()
+        self.source = source
+        self.url = url
+        self.size = size
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def readinto(self, buffer):
+        count = min(len(buffer), self.size - self.position)
+        if count <= 0:
+            return 0
+        data = self.source.read_range(self.url, self.position, self.position + count - 1)
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+def _local_tag(element):
+    """去掉 XML 命名空间的标签名"""
+    return element.tag.rsplit("}", 1)[-1]
+
+
+def _parse_s3_time(text):
+    """
+    ListObjectsV2 的 LastModified (ISO 8601, UTC) -> 纳秒时间戳。
+
+    舍去秒以下的部分：HEAD 的 Last-Modified 只精确到秒，两种方式得到的 mtime 必须相同，
+    否则按 mtime 判断的缓存（磁盘缓存、缩略图、损坏检查等）在列出和未列出对象的进程之间互相失效。
+    """
+    moment = datetime.datetime.strptime(text[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=datetime.timezone.utc)
+    return int(moment.timestamp()) * 1_000_000_000
+
+
+class HttpSource:
+    """
+    HTTP/S3 兼容对象存储（见模块说明）。
+
+    Args:
+        cache_dir (str, optional): 磁盘缓存目录，默认 ~/.labelbridge/objects。
+        max_cache_bytes (int, optional): 磁盘缓存上限，默认 LABELBRIDGE_CACHE_MB 或 2048 MB。
+        pool_size (int): 每个主机的连接数。
+        prefetch_workers (int): 预取线程数。
+    """
+
+    def __init__(self, cache_dir=None, max_cache_bytes=None, pool_size=8, prefetch_workers=4, timeout=30):
+        if max_cache_bytes is None:
+            max_cache_bytes = int(float(os.environ.get("LABELBRIDGE_CACHE_MB", DEFAULT_CACHE_MB)) * 1024 * 1024)
+        self.cache = DiskCache(cache_dir or os.path.join(os.path.expanduser("~"), ".labelbridge", "objects"),
+                               max_cache_bytes)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.credentials = None
+        if os.environ.get("AWS_ACCESS_KEY_ID") and os.environ.get("AWS_SECRET_ACCESS_KEY"):
+            self.credentials = (os.environ["AWS_ACCESS_KEY_ID"], os.environ["AWS_SECRET_ACCESS_KEY"],
+                                os.environ.get("AWS_REGION", "us-east-1"))
+        self.stats = {}  # URL -> ObjectStat
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=prefetch_workers)
+        self._pending = {}  # URL -> Future
+
+    def request(self, method, url, headers=None, query=None):
+        """发送请求，返回 (状态码, 响应头, 内容)；404 抛出 FileNotFoundError，其它错误状态抛出 OSError"""
+        parsed = urlparse(url)
+        with self._lock:
+            pool = self._pools.get((parsed.scheme, parsed.netloc))
+            if pool is None:
+                pool = self._pools[(parsed.scheme, parsed.netloc)] = _ConnectionPool(
+                    parsed.scheme, parsed.netloc, self.pool_size, self.timeout)
+        target = quote(parsed.path or "/", safe="/-_.~") + (f"?{urlencode(query)}" if query else "")
+        headers = dict(headers or {})
+        if self.credentials:
+            headers = sign_v4(method, f"{parsed.scheme}://{parsed.netloc}{target}", headers, *self.credentials)
+        status, response_headers, data = pool.request(method, target, headers)
+        if status == 404:
+            raise FileNotFoundError(f"对象不存在: {url}")
+        if status >= 300:
+            raise OSError(f"HTTP {status}: {url} {data[:200].decode('utf-8', 'replace')}")
+        return status, response_headers, data
+
+    def _cache_key(self, url):
+        """
+        缓存文件名：URL 和对象的大小、修改时间（对象被覆盖后不会读到旧内容）。
+
+        总是先 stat（内存中没有时发 HEAD 请求），并按整秒计算修改时间，工作进程和界面得到同一个文件名。
+        """
+        st = self.stat(url)
+        key = f"{url} {st.st_size} {st.st_mtime_ns // 1_000_000_000}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest() + os.path.splitext(urlparse(url).path)[1].lower()
+
+    def stat(self, url):
+        st = self.stats.get(url)
+        if st is None:
+            _, headers, _ = self.request("HEAD", url)
+            modified = headers.get("Last-Modified")
+            mtime_ns = int(email.utils.parsedate_to_datetime(modified).timestamp() * 1e9) if modified else 0
+            st = self.stats[url] = ObjectStat(int(headers.get("Content-Length", 0)), mtime_ns)
+        return st
+
+    def read(self, url):
+        """完整读取对象（优先从磁盘缓存读取，下载后写入缓存）"""
+        key = self._cache_key(url)
+        path = self.cache.get(key)
+        if path is not None:
+            try:
+                with open(path, "rb") as f:
+                    return f.read()
+            except OSError:
+                pass  # 刚被其它进程淘汰
+        _, _, data = self.request("GET", url)
+        self.cache.put(key, data)
+        return data
+
+    def read_range(self, url, start, end):
+        """读取 [start, end] 字节；已缓存的对象从缓存读取"""
+        path = self.cache.get(self._cache_key(url))
+        if path is not None:
+            with open(path, "rb") as f:
+                f.seek(start)
+                return f.read(end - start + 1)
+        status, _, data = self.request("GET", url, {"Range": f"bytes={start}-{end}"})
+        if status == 200:  # 服务器不支持 Range，返回了整个对象
+            self.cache.put(self._cache_key(url), data)
+            return data[start:end + 1]
+        return data
+
+    def open(self, url, head_only=False):
+        """以只读的文件对象打开；head_only 时未缓存的对象按块用 Range 请求读取"""
+        path = self.cache.get(self._cache_key(url))
+        if path is not None:
+            return open(path, "rb")
+        if head_only:
+            return io.BufferedReader(RangeFile(self, url, self.stat(url).st_size), buffer_size=READ_BLOCK_SIZE)
+        return io.BytesIO(self.read(url))
+
+    def _prefetch_one(self, url):
+        try:
+            if self.cache.get(self._cache_key(url)) is None:
+                self.read(url)
+        except Exception as e:
+            print(f"预取 {url} 失败: {e}")
+
+    def prefetch(self, urls):
+        """在后台并行下载尚未缓存的对象"""
+        for url in urls:
+            future = self._pending.get(url)
+            if future is not None and not future.done():
+                continue
+            # 是否已缓存在后台线程中检查（计算缓存文件名可能需要 HEAD 请求）
+            self._pending[url] = self._executor.submit(self._prefetch_one, url)
+
+    def list_objects(self, folder_url, recursive=False):
+        """列出前缀下一层（recursive 时为全部）的对象，返回 [(URL, ObjectStat)]，同时记录到 stats"""
+        parsed = urlparse(folder_url.rstrip("/") + "/")
+        bucket, _, prefix = parsed.path.lstrip("/").partition("/")
+        if not bucket:
+            raise ValueError(f"URL 中缺少桶名: {folder_url}")
+        bucket_url = f"{parsed.scheme}://{parsed.netloc}/{bucket}"
+        objects = []
+        token = None
+        while True:
+            query = {"list-type": "2", "prefix": prefix, "max-keys": str(LIST_PAGE_SIZE)}
+            if not recursive:
+                query["delimiter"] = "/"
+            if token:
+                query["continuation-token"] = token
+            _, _, data = self.request("GET", bucket_url, query=query)
+            token, truncated = None, False
+            for element in ET.fromstring(data):
+                tag = _local_tag(element)
+                if tag == "Contents":
+                    fields = {_local_tag(child): child.text or "" for child in element}
+                    url = f"{bucket_url}/{fields['Key']}"
+                    st = self.stats[url] = ObjectStat(int(fields["Size"]), _parse_s3_time(fields["LastModified"]))
+                    objects.append((url, st))
+                elif tag == "NextContinuationToken":
+                    token = element.text
+                elif tag == "IsTruncated":
+                    truncated = (element.text or "").strip().lower() == "true"
+            if not truncated or not token:
+                return objects
+
+    def list_images(self, folder_url, recursive=False):
+        """列出前缀下的图片 URL（已排序），并把其中的标注文件下载到本地标注目录（已存在的不覆盖）"""
+        objects = self.list_objects(normalize_url(folder_url), recursive)
+        labels = [url for url, _ in objects
+                  if url.lower().endswith(".txt") and not os.path.exists(labelio.remote_local_path(url))]
+        for url, data in zip(labels, self._executor.map(self.read_label, labels)):
+            if data is None:
+                continue
+            path = labelio.remote_local_path(url)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+        return sorted(url for url, _ in objects if url.lower().endswith(labelio.IMAGE_EXTENSIONS))
+
+    def read_label(self, url):
+        """下载标注文件（不经过磁盘缓存）；失败时返回 None"""
+        try:
+            return self.request("GET", url)[2]
+        except OSError as e:
+            print(f"下载标注文件 {url} 失败: {e}")
+            return None
+
+    def close(self):
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+            self._pools.clear()
+
+
+LOCAL = LocalSource()
+_remote = None
+_remote_lock = threading.Lock()
+
+
+def remote_source():
+    """进程内共用的 HttpSource（第一次使用时创建）"""
+    global _remote
+    with _remote_lock:
+        if _remote is None:
+            _remote = HttpSource()
+        return _remote
+
+
+def source_for(path):
+    return remote_source() if labelio.is_remote_path(path) else LOCAL
+
+
+def open_image(path, head_only=False):
+    """以只读的文件对象打开图片；head_only 表示只读取文件头（远程对象不下载整个文件）"""
+    return source_for(path).open(path, head_only)
+
+
+def read_image(path):
+    """图片的全部字节"""
+    return source_for(path).read(path)
+
+
+def stat(path):
+    """图片的大小和修改时间（st_size、st_mtime_ns）"""
+    return source_for(path).stat(path)
+
+
+def prefetch(paths):
+    """提示来源在后台准备接下来要打开的图片（本地文件不需要）"""
+    remote = [path for path in paths if labelio.is_remote_path(path)]
+    if remote:
+        remote_source().prefetch(remote)
+
+
+def list_images(folder_path, recursive=False):
+    """列出文件夹（压缩包、对象存储前缀）中的图片；recursive 时包括子文件夹（压缩包总是列出全部成员）"""
+    if labelio.is_remote_path(folder_path) or folder_path.startswith("s3://"):
+        return remote_source().list_images(folder_path, recursive)
+    return LOCAL.list_images(folder_path, recursive)
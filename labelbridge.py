@@ -1,8 +1,17 @@
 import wx
+import io
 import os
-import ctypes
+import sys
+import threading
+from collections import OrderedDict
 import numpy as np
 
+import labelio
+import labelstore
+from classindex import ClassIndex
+from thumbcache import ThumbnailCache
+from telemetry import telemetry, default_dump_path, process_rss_bytes
+
 
 class Colors:
     """
@@ -153,6 +162,14 @@ class Colors:
 colors = Colors()  # create instance for 'from utils.plots import colors'
 
 
+def close_media_sources():
+    """关闭打开的视频解码器和压缩包；模块还没有导入说明没有打开过，不为此导入（videosource 会加载 OpenCV）"""
+    if "videosource" in sys.modules:
+        sys.modules["videosource"].close_sources()
+    if "archivesource" in sys.modules:
+        sys.modules["archivesource"].close_archives()
+
+
 class AnnotationPanel(wx.Panel):
     def __init__(self, parent, main_frame):
         super().__init__(parent)
@@ -161,13 +178,18 @@ class AnnotationPanel(wx.Panel):
         self.main_frame = main_frame
         self.image = None
         self.image_path = None
-        self.image_size = None
+        self.image_size = None  # 原图真实尺寸，即使原图像素已释放也保留
         self.scale_factor = 1.0
         self.offset_x = 0
         self.offset_y = 0
 
         # 标注相关
         self.annotations = []
+        self.saved_annotations = []  # 最近一次读取或保存的标注，用于判断是否有未保存的修改
+        self.predictions = []  # 模型预测框 [{'class', 'bbox', 'score'}]，作为单独的一层绘制
+        self.show_predictions = True
+        self.compare_annotations = []  # 另一组标注（比较两组标注时），与当前标注叠加显示差异
+        self.show_compare = True
         self.current_box = None
         self.drawing = False
         self.start_pos = None
@@ -182,6 +204,17 @@ class AnnotationPanel(wx.Panel):
 
         # 缓存的背景图片
         self.background_bitmap = None
+        self.placeholder_text = None  # 没有图片时画布中央显示的文字（例如视频帧正在解码）
+
+        # 内存预算（MB）：原图解码后超过预算时只保留显示分辨率的图片，需要更高分辨率时再重新解码
+        self.memory_budget_mb = None
+        budget = os.environ.get("LABELBRIDGE_MEMORY_BUDGET_MB")
+        if budget:
+            try:
+                self.memory_budget_mb = float(budget) or None
+            except ValueError:
+                pass
+        self.display_image = None  # 显示分辨率的图片（仅在原图被释放时使用）
 
         self.SetBackgroundColour(wx.Colour(240, 240, 240))
 
@@ -191,6 +224,9 @@ class AnnotationPanel(wx.Panel):
         self.show_crosshair = True  # 是否显示十字辅助线（可用界面开关）
         self.cross_pos = None  # 当前鼠标位置（wx.Point），用于画十字
 
+        # 性能 HUD（显示 FPS 与各阶段 p50/p99）
+        self.show_hud = False
+
         # 绑定事件
         self.Bind(wx.EVT_PAINT, self.OnPaint)
         self.Bind(wx.EVT_LEFT_DOWN, self.OnLeftDown)
@@ -203,27 +239,108 @@ class AnnotationPanel(wx.Panel):
         # 设置焦点以接收键盘事件
         self.SetCanFocus(True)
 
-    def LoadImage(self, image_path):
-        """加载图片"""
+    def LoadImage(self, image_path, quiet=False):
+        """加载图片（quiet 时解码失败不弹出错误对话框，例如已标记为损坏的图片）"""
         try:
+            self.placeholder_text = None
             self.image_path = image_path
-            self.image = wx.Image(image_path)
+            self.image = self.DecodeImage(image_path, quiet)
+            self.display_image = None
             self.image_size = (self.image.GetWidth(), self.image.GetHeight())
-            self.FitImageToPanel()
+            self.FitImageToPanel()  # 同时创建背景缓存
             size = self.GetClientSize()
             self.buffer = wx.Bitmap(size.width, size.height)
             self.LoadAnnotations()
-            self.CreateBackgroundBitmap()
+            if self.ExceedsMemoryBudget():
+                # 背景缓存已生成，释放原图像素
+                self.image = None
             self.selected_annotation_index = -1  # 重置选择
             self.Refresh(False)  # 刷新，不擦背景，减少闪烁
             return True
         except Exception as e:
-            wx.MessageBox(f"无法加载图片: {str(e)}", "错误", wx.OK | wx.ICON_ERROR)
+            if not quiet:
+                wx.MessageBox(f"无法加载图片: {str(e)}", "错误", wx.OK | wx.ICON_ERROR)
+            return False
+
+    def ClearImage(self):
+        """清空画布（例如当前图片已损坏）"""
+        self.image = None
+        self.image_path = None
+        self.image_size = None
+        self.display_image = None
+        self.background_bitmap = None
+        self.annotations = []
+        self.saved_annotations = []
+        self.predictions = []
+        self.compare_annotations = []
+        self.selected_annotation_index = -1
+        self.placeholder_text = None
+        self.Refresh(False)
+
+    def ShowPlaceholder(self, text):
+        """清空画布并在中央显示 text（图片还在后台加载时使用）"""
+        self.ClearImage()
+        self.placeholder_text = text
+        self.Refresh(False)
+
+    @staticmethod
+    def DecodeImage(image_path, quiet=False):
+        """
+        解码图片文件（压缩包内和对象存储中的图片由 imagesource 读取）；quiet 时屏蔽 wx 自己弹出的解码错误日志。
+
+        视频帧由 videosource 的工作线程解码；OpenImage 在帧进入缓冲区之后才调用这里，不会在界面线程中等待解码。
+        """
+        frame = labelio.split_frame_path(image_path)
+        if frame:
+            import videosource
+            with telemetry.span("decode"):
+                rgb = videosource.open_source(frame[0]).get_frame(frame[1])
+            return wx.Image(rgb.shape[1], rgb.shape[0], rgb.tobytes())
+        with telemetry.span("decode"):
+            log_guard = wx.LogNull() if quiet else None  # 存在期间 wx 不弹出解码错误的日志窗口
+            try:
+                if not labelio.is_local_file(image_path):
+                    import imagesource
+                    image = wx.Image(imagesource.open_image(image_path))
+                else:
+                    image = wx.Image(image_path)
+            finally:
+                del log_guard
+        if not image.IsOk():
+            raise ValueError(f"无法解码图片: {image_path}")
+        return image
+
+    def ExceedsMemoryBudget(self):
+        """原图像素（RGB + Alpha）是否超过内存预算"""
+        if not self.memory_budget_mb or not self.image_size:
             return False
+        channels = 4 if self.image and self.image.HasAlpha() else 3
+        return self.image_size[0] * self.image_size[1] * channels > self.memory_budget_mb * 1024 * 1024
+
+    def SetMemoryBudget(self, budget_mb):
+        """设置内存预算（MB），None 或 0 表示不限制"""
+        self.memory_budget_mb = budget_mb or None
+        if self.image and self.ExceedsMemoryBudget():
+            self.CreateBackgroundBitmap()
+            self.image = None
+        elif not self.image and self.image_path and not self.ExceedsMemoryBudget():
+            # 预算放宽后重新保留原图
+            self.image = self.DecodeImage(self.image_path)
+            self.display_image = None
+
+    def GetDisplaySource(self, width, height):
+        """获取用于缩放到 width x height 的源图片，必要时重新解码原图"""
+        if self.image:
+            return self.image
+        if self.display_image and self.display_image.GetWidth() >= width and self.display_image.GetHeight() >= height:
+            return self.display_image
+        # 显示尺寸变大（例如面板放大），重新解码原图并只保留显示分辨率
+        self.display_image = self.DecodeImage(self.image_path).Scale(width, height)
+        return self.display_image
 
     def FitImageToPanel(self):
         """调整图片大小以适应面板"""
-        if not self.image:
+        if not self.image_size:
             return
 
         panel_size = self.GetSize()
@@ -242,13 +359,12 @@ class AnnotationPanel(wx.Panel):
         self.offset_y = (panel_size.height - scaled_height) // 2
 
         # 重新创建背景图片缓存
-        if self.image:
-            self.CreateBackgroundBitmap()
+        self.CreateBackgroundBitmap()
 
+    @telemetry.timed("scale")
     def CreateBackgroundBitmap(self):
         """创建背景图片缓存"""
-        print("CreateBackgroundBitmap")
-        if not self.image:
+        if not self.image_size:
             return
 
         panel_size = self.GetSize()
@@ -272,7 +388,10 @@ class AnnotationPanel(wx.Panel):
         if scaled_width > 1 and scaled_height > 1:
             try:
                 # 绘制缩放后的图片
-                scaled_image = self.image.Scale(scaled_width, scaled_height)
+                scaled_image = self.GetDisplaySource(scaled_width, scaled_height).Scale(scaled_width, scaled_height)
+                if self.memory_budget_mb and self.image and self.ExceedsMemoryBudget():
+                    # 原图即将被释放，保留显示分辨率的副本
+                    self.display_image = scaled_image
                 bitmap = wx.Bitmap(scaled_image)
                 dc.DrawBitmap(bitmap, int(self.offset_x), int(self.offset_y))
             except Exception as e:
@@ -282,7 +401,7 @@ class AnnotationPanel(wx.Panel):
 
     def ClampPositionToImage(self, pos):
         """将位置限制在图片区域内"""
-        if not self.image:
+        if not self.image_size:
             return pos
 
         # 计算图片在面板中的边界
@@ -302,13 +421,14 @@ class AnnotationPanel(wx.Panel):
 
     def OnSize(self, event):
         """面板大小改变事件"""
-        if self.image:
+        if self.image_size:
             size = self.GetClientSize()
             self.buffer = wx.Bitmap(size.width, size.height)
             self.FitImageToPanel()
             self.Refresh(False)  # 刷新，不擦背景，减少闪烁
         event.Skip()
 
+    @telemetry.timed("paint")
     def DrawToBuffer(self):
         """在内存 bitmap 上绘制内容"""
         dc = wx.MemoryDC(self.buffer)  # 绘制到缓存位图
@@ -318,6 +438,12 @@ class AnnotationPanel(wx.Panel):
             # 绘制缓存的背景图片
             dc.DrawBitmap(self.background_bitmap, 0, 0)
 
+            # 模型预测框画在标注框下面
+            if self.show_predictions and self.predictions:
+                self.DrawPredictions(dc)
+            if self.show_compare and self.main_frame.compare_folder:
+                self.DrawComparison(dc)
+
             # 绘制所有标注框
             self.DrawAllAnnotations(dc)
 
@@ -333,7 +459,13 @@ class AnnotationPanel(wx.Panel):
                 self.DrawCrosshair(dc, self.cross_pos, wx.Colour(0, 255, 0), style=wx.PENSTYLE_DOT)
         else:
             dc.Clear()
-            pass
+            if self.placeholder_text:
+                width, height = dc.GetTextExtent(self.placeholder_text)
+                size = self.GetClientSize()
+                dc.DrawText(self.placeholder_text, (size.width - width) // 2, (size.height - height) // 2)
+
+        if self.show_hud:
+            self.DrawHud(dc)
 
         dc.SelectObject(wx.NullBitmap)  # 解除绑定
 
@@ -342,6 +474,25 @@ class AnnotationPanel(wx.Panel):
         self.DrawToBuffer()
         dc = wx.PaintDC(self)
         dc.DrawBitmap(self.buffer, 0, 0)
+        telemetry.tick_frame()
+
+    def DrawHud(self, dc):
+        """在画布左上角绘制性能 HUD"""
+        lines = [f"FPS: {telemetry.fps():.1f}"]
+        for name, p50, p99 in telemetry.stage_percentiles():
+            lines.append(f"{name}: p50 {p50:.1f} ms / p99 {p99:.1f} ms")
+
+        dc.SetFont(wx.Font(9, wx.FONTFAMILY_TELETYPE, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL))
+        line_height = dc.GetCharHeight() + 2
+        width = max(dc.GetTextExtent(line)[0] for line in lines) + 12
+        height = line_height * len(lines) + 8
+
+        dc.SetPen(wx.TRANSPARENT_PEN)
+        dc.SetBrush(wx.Brush(wx.Colour(0, 0, 0)))
+        dc.DrawRectangle(4, 4, width, height)
+        dc.SetTextForeground(wx.Colour(0, 255, 0))
+        for i, line in enumerate(lines):
+            dc.DrawText(line, 10, 8 + i * line_height)
 
     # def OnPaint(self, event):
     #     """绘制事件"""
@@ -398,6 +549,68 @@ class AnnotationPanel(wx.Panel):
             dc.SetTextForeground(color)
             dc.DrawText(class_name, x, max(0, y - 20))
 
+    def DrawPredictions(self, dc):
+        """
+        绘制置信度不低于阈值的预测框（虚线）：与当前标注匹配的为类别颜色，误检为红色；
+        没有被任何预测匹配的标注框（漏检）外面加一圈红色点线。匹配按当前编辑中的标注实时计算。
+        """
+        import predeval
+        threshold = self.main_frame.eval_conf_threshold
+        predictions = [pred for pred in self.predictions if pred['score'] >= threshold]
+        matched = predeval.match_image(self.annotations, predictions, self.main_frame.eval_iou_threshold)
+        class_names = self.main_frame.class_names
+        missed_color = wx.Colour(255, 0, 0)
+        dc.SetBrush(wx.TRANSPARENT_BRUSH)
+        for pred, gt_index in zip(predictions, matched):
+            x, y, w, h = self.YoloToPixel(pred['bbox'])
+            if gt_index >= 0:
+                rgb_color = colors(pred['class'])
+                color = wx.Colour(rgb_color[0], rgb_color[1], rgb_color[2])
+            else:
+                color = missed_color
+            dc.SetPen(wx.Pen(color, 1, wx.PENSTYLE_SHORT_DASH))
+            dc.DrawRectangle(x, y, w, h)
+            class_name = class_names[pred['class']] if pred['class'] < len(class_names) else f"Class {pred['class']}"
+            dc.SetTextForeground(color)
+            dc.DrawText(f"{class_name} {pred['score']:.2f}", x, y + h + 2)
+
+        dc.SetPen(wx.Pen(missed_color, 1, wx.PENSTYLE_DOT))
+        for i in set(range(len(self.annotations))) - set(matched.tolist()):
+            x, y, w, h = self.YoloToPixel(self.annotations[i]['bbox'])
+            dc.DrawRectangle(x - 3, y - 3, w + 6, h + 6)
+
+    def DrawComparison(self, dc):
+        """
+        叠加显示另一组标注与当前标注的差异（按当前编辑中的标注实时比较）：
+        新增的框为绿色虚线，移动后的位置为黄色虚线，改了类别的为紫色虚线并标出另一组的类别，
+        另一组中删除了的当前框外面加一圈红色点线；没有变化的框不画。
+        """
+        import labeldiff
+        a_status, b_status = labeldiff.diff_image(self.annotations, self.compare_annotations)
+        class_names = self.main_frame.class_names
+        status_colors = {
+            'added': wx.Colour(0, 200, 0),
+            'moved': wx.Colour(255, 200, 0),
+            'reclassified': wx.Colour(200, 0, 255),
+        }
+        dc.SetBrush(wx.TRANSPARENT_BRUSH)
+        for ann, status in zip(self.compare_annotations, b_status):
+            color = status_colors.get(status)
+            if color is None:
+                continue
+            x, y, w, h = self.YoloToPixel(ann['bbox'])
+            dc.SetPen(wx.Pen(color, 2, wx.PENSTYLE_SHORT_DASH))
+            dc.DrawRectangle(x, y, w, h)
+            class_name = class_names[ann['class']] if ann['class'] < len(class_names) else f"Class {ann['class']}"
+            dc.SetTextForeground(color)
+            dc.DrawText(f"B: {class_name} ({labeldiff.CHANGE_NAMES[status]})", x, y + h + 2)
+
+        dc.SetPen(wx.Pen(wx.Colour(255, 0, 0), 2, wx.PENSTYLE_DOT))
+        for ann, status in zip(self.annotations, a_status):
+            if status == 'removed':
+                x, y, w, h = self.YoloToPixel(ann['bbox'])
+                dc.DrawRectangle(x - 4, y - 4, w + 8, h + 8)
+
     def DrawBox(self, dc, box, color, width):
         """绘制矩形框"""
         pen = wx.Pen(color, width)
@@ -439,7 +652,7 @@ class AnnotationPanel(wx.Panel):
         在图片区域绘制十字（水平 + 垂直线）。pos: wx.Point（面板坐标）。
         style: wx pen style 如 wx.PENSTYLE_DOT, wx.PENSTYLE_SHORT_DASH 等。
         """
-        if not self.image:
+        if not self.image_size:
             return
 
         # 计算图片显示的边界（面板坐标）
@@ -503,7 +716,7 @@ class AnnotationPanel(wx.Panel):
 
     def OnLeftDown(self, event):
         """鼠标左键按下"""
-        if not self.image:
+        if not self.image_size:
             return
 
         self.SetFocus()  # 获取焦点以接收键盘事件
@@ -613,7 +826,7 @@ class AnnotationPanel(wx.Panel):
         pos = event.GetPosition()
 
         # 每次移动都更新 cross_pos（但限制到图片区域）
-        if self.image and self.IsInImageArea(pos):
+        if self.image_size and self.IsInImageArea(pos):
             self.cross_pos = self.ClampPositionToImage(pos)
         else:
             self.cross_pos = None
@@ -766,7 +979,7 @@ class AnnotationPanel(wx.Panel):
 
     def OnRightDown(self, event):
         """右键删除标注"""
-        if not self.image:
+        if not self.image_size:
             return
 
         pos = event.GetPosition()
@@ -783,7 +996,7 @@ class AnnotationPanel(wx.Panel):
 
     def IsInImageArea(self, pos):
         """检查位置是否在图片区域内"""
-        if not self.image:
+        if not self.image_size:
             return False
 
         scaled_width = self.image_size[0] * self.scale_factor
@@ -829,53 +1042,250 @@ class AnnotationPanel(wx.Panel):
         # return int(px), int(py), int(pw), int(ph)
         return round(px), round(py), round(pw), round(ph)
 
+    @telemetry.timed("label_parse")
     def LoadAnnotations(self):
         """加载标注文件"""
         if not self.image_path:
             return
 
-        # 根据图片路径生成标注文件路径
-        base_name = os.path.splitext(os.path.basename(self.image_path))[0]
-        txt_path = os.path.join(os.path.dirname(self.image_path), f"{base_name}.txt")
-
         self.annotations = []
-        if os.path.exists(txt_path):
-            try:
-                with open(txt_path, 'r') as f:
-                    for line in f:
-                        parts = line.strip().split()
-                        if len(parts) == 5:
-                            class_id = int(parts[0])
-                            bbox = [float(x) for x in parts[1:]]
-                            self.annotations.append({
-                                'class': class_id,
-                                'bbox': bbox
-                            })
-            except Exception as e:
-                wx.MessageBox(f"加载标注文件失败: {str(e)}", "错误", wx.OK | wx.ICON_ERROR)
+        try:
+            self.annotations = self.main_frame.label_store.read(self.image_path)
+        except Exception as e:
+            wx.MessageBox(f"加载标注文件失败: {str(e)}", "错误", wx.OK | wx.ICON_ERROR)
+        self.saved_annotations = self.CopyAnnotations()
+
+    def CopyAnnotations(self):
+        return [{'class': ann['class'], 'bbox': list(ann['bbox'])} for ann in self.annotations]
 
+    def HasUnsavedChanges(self):
+        return self.annotations != self.saved_annotations
+
+    @telemetry.timed("label_save")
     def SaveAnnotations(self):
         """保存标注文件"""
-        print("SaveAnnotations")
-        if not self.image_path:
-            return
-
-        base_name = os.path.splitext(os.path.basename(self.image_path))[0]
-        txt_path = os.path.join(os.path.dirname(self.image_path), f"{base_name}.txt")
+        if not self.image_path or not self.HasUnsavedChanges():
+            return  # 没有修改时不写入，也不会与其他程序的修改冲突
 
         try:
-            if not self.annotations:
-                # 如果没有标注，删除标注文件（如果存在）
-                if os.path.exists(txt_path):
-                    os.remove(txt_path)
-            else:
-                # 有标注时正常保存
-                with open(txt_path, 'w') as f:
-                    for ann in self.annotations:
-                        bbox = ann['bbox']
-                        f.write(f"{ann['class']} {bbox[0]:.6f} {bbox[1]:.6f} {bbox[2]:.6f} {bbox[3]:.6f}\n")
+            # YOLO 文件存储在没有标注时删除标注文件（如果存在）
+            self.main_frame.label_store.write(self.image_path, self.annotations)
+        except labelstore.ConflictError as e:
+            self.main_frame.OnSaveConflict(self.image_path, self.annotations, e)
+            return
         except Exception as e:
             wx.MessageBox(f"保存标注文件失败: {str(e)}", "错误", wx.OK | wx.ICON_ERROR)
+            return
+        self.saved_annotations = self.CopyAnnotations()
+        self.main_frame.OnAnnotationsSaved(self.image_path, self.annotations)
+
+
+class ThumbnailGrid(wx.VScrolledWindow):
+    """虚拟化缩略图网格：只绘制、只请求可见行的缩略图，并叠加显示框数"""
+
+    def __init__(self, parent, main_frame):
+        super().__init__(parent, style=wx.WANTS_CHARS)
+
+        self.main_frame = main_frame
+        self.cache = None
+        self.thumb_size = 128
+        self.cell_width = self.thumb_size + 16
+        self.cell_height = self.thumb_size + 36
+        self.columns = 1
+
+        # 已转换为 wx.Bitmap 的缩略图（只保留最近使用的一部分）和框数缓存
+        self.bitmaps = OrderedDict()
+        self.max_bitmaps = 1000
+        self.box_counts = {}
+        self.requested_paths = None  # 上次向缓存请求的图片（可见范围加预取的一行），没有变化时重绘不再请求
+
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
+        self.Bind(wx.EVT_PAINT, self.OnPaint)
+        self.Bind(wx.EVT_SIZE, self.OnSize)
+        self.Bind(wx.EVT_LEFT_DOWN, self.OnLeftDown)
+
+    def SetCache(self, cache):
+        """切换缩略图缓存（数据集变化时）；None 表示没有打开文件夹，只画背景"""
+        self.cache = cache
+        self.thumb_size = cache.size if cache else self.thumb_size
+        self.cell_width = self.thumb_size + 16
+        self.cell_height = self.thumb_size + 36
+        self.bitmaps.clear()
+        self.box_counts.clear()
+        self.requested_paths = None
+        self.UpdateLayout()
+
+    def OnGetRowHeight(self, row):
+        return self.cell_height
+
+    def UpdateLayout(self):
+        """根据窗口宽度重新计算列数和行数"""
+        self.columns = max(1, self.GetClientSize().width // self.cell_width)
+        count = len(self.main_frame.image_files)
+        self.SetRowCount((count + self.columns - 1) // self.columns)
+        self.Refresh(False)
+
+    def OnSize(self, event):
+        self.UpdateLayout()
+        event.Skip()
+
+    def GetVisibleIndices(self):
+        """可见范围内的图片索引"""
+        count = len(self.main_frame.image_files)
+        first = self.GetVisibleRowsBegin() * self.columns
+        last = min(count, self.GetVisibleRowsEnd() * self.columns)
+        return range(first, max(first, last))
+
+    def GetThumbnailBitmap(self, path):
+        """从缓存读取缩略图并转换为 wx.Bitmap，尚未生成时返回 None"""
+        bitmap = self.bitmaps.get(path)
+        if bitmap is not None:
+            self.bitmaps.move_to_end(path)
+            return bitmap
+        thumb = self.cache.get(path)
+        if thumb is None:
+            return None
+        bitmap = wx.Bitmap(wx.Image(io.BytesIO(thumb[3]), wx.BITMAP_TYPE_JPEG))
+        self.bitmaps[path] = bitmap
+        if len(self.bitmaps) > self.max_bitmaps:
+            self.bitmaps.popitem(last=False)
+        return bitmap
+
+    def GetBoxCount(self, path):
+        """图片的标注框数量（只在可见时读取标注文件）"""
+        count = self.box_counts.get(path)
+        if count is None:
+            try:
+                count = len(self.main_frame.label_store.read(path))
+            except Exception:
+                count = 0
+            self.box_counts[path] = count
+        return count
+
+    def OnPaint(self, event):
+        dc = wx.AutoBufferedPaintDC(self)
+        dc.SetBackground(wx.Brush(wx.Colour(48, 48, 48)))
+        dc.Clear()
+        if not self.cache:
+            return
+
+        image_files = self.main_frame.image_files
+        indices = self.GetVisibleIndices()
+        # 只请求可见范围的缩略图（多预取一行），滚出视野的任务会被取消；悬停等只重绘时范围不变，不再请求
+        prefetch_end = min(len(image_files), indices.stop + self.columns)
+        wanted = image_files[indices.start:prefetch_end]
+        if wanted != self.requested_paths:
+            self.cache.request(wanted)
+            self.requested_paths = wanted
+
+        first_row = self.GetVisibleRowsBegin()
+        dc.SetFont(wx.Font(8, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL))
+        for i in indices:
+            row, col = divmod(i, self.columns)
+            self.DrawCell(dc, i, col * self.cell_width + 8, (row - first_row) * self.cell_height + 4)
+
+    def DrawCell(self, dc, index, x, y):
+        """绘制一个缩略图格子"""
+        path = self.main_frame.image_files[index]
+        size = self.thumb_size
+
+        if index == self.main_frame.current_image_index:
+            dc.SetPen(wx.Pen(wx.Colour(0, 180, 255), 3))
+            dc.SetBrush(wx.TRANSPARENT_BRUSH)
+            dc.DrawRectangle(x - 4, y - 2, size + 8, size + 8)
+
+        bitmap = self.GetThumbnailBitmap(path)
+        if bitmap:
+            dc.DrawBitmap(bitmap, x + (size - bitmap.GetWidth()) // 2, y + 2 + (size - bitmap.GetHeight()) // 2)
+        else:
+            # 占位框
+            dc.SetPen(wx.Pen(wx.Colour(90, 90, 90), 1))
+            dc.SetBrush(wx.Brush(wx.Colour(64, 64, 64)))
+            dc.DrawRectangle(x, y + 2, size, size)
+
+        # 右上角叠加框数
+        count = self.GetBoxCount(path)
+        if count:
+            text = str(count)
+            tw, th = dc.GetTextExtent(text)
+            dc.SetPen(wx.TRANSPARENT_PEN)
+            dc.SetBrush(wx.Brush(wx.Colour(220, 40, 40)))
+            dc.DrawRoundedRectangle(x + size - tw - 10, y + 4, tw + 8, th + 2, 3)
+            dc.SetTextForeground(wx.Colour(255, 255, 255))
+            dc.DrawText(text, x + size - tw - 6, y + 5)
+
+        name = os.path.basename(path)
+        while len(name) > 4 and dc.GetTextExtent(name)[0] > size:
+            name = name[:-4] + "..."
+        dc.SetTextForeground(wx.Colour(220, 220, 220))
+        dc.DrawText(name, x, y + size + 8)
+
+    def OnLeftDown(self, event):
+        """单击缩略图切换到对应图片"""
+        pos = event.GetPosition()
+        row = self.VirtualHitTest(pos.y)
+        col = pos.x // self.cell_width
+        if row == wx.NOT_FOUND or col >= self.columns:
+            return
+        index = row * self.columns + col
+        if index < len(self.main_frame.image_files):
+            self.main_frame.SelectImage(index)
+            self.Refresh(False)
+
+    def OnThumbnailReady(self, path):
+        """后台生成完成（已切换到主线程）"""
+        self.bitmaps.pop(path, None)
+        self.Refresh(False)
+
+    def InvalidateImage(self, path, image_changed=False):
+        """图片的标注被修改后重新读取框数；image_changed 时图片文件也变了，重新生成缩略图"""
+        self.box_counts.pop(path, None)
+        if image_changed and self.cache:
+            self.cache.invalidate(path)
+            self.bitmaps.pop(path, None)
+            self.requested_paths = None
+        self.Refresh(False)
+
+
+class ThumbnailFrame(wx.Frame):
+    """缩略图浏览窗口"""
+
+    def __init__(self, main_frame):
+        super().__init__(main_frame, title="缩略图浏览", size=wx.Size(900, 650))
+
+        self.main_frame = main_frame
+        self.cache = None
+        self.grid = ThumbnailGrid(self, main_frame)
+
+        self.Bind(wx.EVT_CLOSE, self.OnClose)
+        self.Reload()
+
+    def Reload(self):
+        """数据集变化后重新打开对应的缩略图缓存"""
+        if self.cache:
+            self.cache.close()
+            self.cache = None
+        if not self.main_frame.current_folder:
+            self.grid.SetCache(None)  # 网格不能继续使用已关闭的缓存
+            return
+        pack_path = os.path.join(labelio.dataset_cache_dir(self.main_frame.current_folder), "thumbs.pack")
+        self.cache = ThumbnailCache(pack_path, on_ready=self.OnThumbnailReady)
+        self.grid.SetCache(self.cache)
+
+    def OnThumbnailReady(self, path):
+        """缓存的回调在后台线程中执行，转到主线程刷新"""
+        wx.CallAfter(self.DeliverThumbnail, path)
+
+    def DeliverThumbnail(self, path):
+        if self:  # 窗口可能已关闭
+            self.grid.OnThumbnailReady(path)
+
+    def OnClose(self, event):
+        if self.cache:
+            self.cache.close()
+            self.cache = None
+        self.main_frame.thumbnail_frame = None
+        self.Destroy()
 
 
 class YoloLabelingTool(wx.Frame):
@@ -890,10 +1300,81 @@ class YoloLabelingTool(wx.Frame):
         self.current_image_index = -1
         self.class_names = []  # 初始为空
         self.current_folder = None
+        self.thumbnail_frame = None
+        self.folder_scan_generation = 0  # 用上次会话的图片列表打开文件夹后，后台重新扫描的结果按此丢弃过期的
+        self.label_store = labelstore.YoloFileStore()  # 加载文件夹时按文件夹内容选择存储后端
+
+        # 图片列表筛选：filter_indices 为按类别/质检筛选出的 image_files 序号，None 表示不筛选；
+        # visible_indices 为列表每一行实际对应的序号（筛选后再去掉隐藏的损坏图片），None 表示与 image_files 一致
+        self.filter_indices = None
+        self.visible_indices = None
+
+        # 损坏图片扫描结果: image_files 序号 -> (状态, 说明)
+        self.bad_images = {}
+        self.hide_bad_images = False
+        self.image_check_generation = 0
+        self.frame_generation = 0  # 后台等待视频帧解码的代数，切换图片后旧的结果作废
+        self.image_index_of = {}  # 图片路径 -> image_files 序号
+
+        # 类别倒排索引（后台构建，构建完成前为 None）
+        self.class_index = None
+        self.class_index_generation = 0
+        self.class_index_pending = {}  # 构建期间保存的图片 -> 类别
+
+        # 标注质检结果
+        self.qa_report = None
+        self.qa_generation = 0
+
+        # 近似重复图片分组: duplicate_group_of[i] 为第 i 张图片所在组的序号，不重复为 -1
+        self.duplicate_groups = []
+        self.duplicate_group_of = None
+        self.dedup_generation = 0
+
+        # 标注服务器地址（连接后标注存储为 annoclient.RemoteStore），打开图片时预取后面几张
+        self.server_url = None
+        self.remote_prefetch_count = 4
+
+        # 监视图片文件夹：其他程序新增/删除/重命名图片或修改标注文件时增量更新
+        self.folder_watcher = None
+        self.folder_watch_generation = 0
+        self.label_index_of = {}  # 标注文件路径 -> image_files 序号
+        self.label_paths = labelio.LabelPathTable()  # 图片路径 -> 标注文件路径，切换文件夹时预先计算
+        self.recursive_scan = True  # 包括子文件夹（YOLO 的 images/、labels/ 布局）
+
+        # 把标注框传播到下一张（序列图片）：当前图片的框有变化时在后台跟踪到下一张，切换时直接使用结果
+        self.propagate_boxes = False
+        self.propagation_key = None  # (当前图片, 下一张图片, 框)
+        self.propagation_result = None  # (key, 跟踪后的框, 得分)
+        self.propagation_job = None  # 等待后台线程处理的 (key, 框)，只保留最新的一个
+        self.pending_propagation = None  # 切换到下一张后还没有应用的 (key, 框)，等图片打开或后台跟踪完成后应用
+        self.propagation_running = False
+        self.propagation_lock = threading.Lock()
+        self.gray_cache = OrderedDict()  # 图片路径 -> 灰度图，只保留最近几张
+
+        # 模型预测评估：预测文件夹、评估结果；image_order 为图片列表的显示顺序（例如按错误数排序），None 为原顺序
+        self.prediction_folder = None
+        self.eval_report = None
+        self.eval_generation = 0
+        self.eval_iou_threshold = 0.5
+        self.eval_conf_threshold = 0.25
+        self.image_order = None
+        self.visible_rows = None  # image_order 生效时: image_files 序号 -> 列表行号（不在列表中为 -1）
+
+        # 主动学习：开启后“下一张”从优先队列中取分数最高的未标注图片（队列在后台建立，保存标注时增量更新）
+        self.priority_mode = False
+        self.active_queue = None
+        self.active_generation = 0
+
+        # 与另一组标注比较（重新标注、外包交付）：另一组的标注文件夹和比较结果
+        self.compare_folder = None
+        self.diff_report = None
+        self.diff_generation = 0
 
         self.InitUI()
         self.Centre()
 
+        self.Bind(wx.EVT_CLOSE, self.OnClose)
+
     def InitUI(self):
         """初始化用户界面"""
         panel = wx.Panel(self)
@@ -929,6 +1410,18 @@ class YoloLabelingTool(wx.Frame):
         self.image_list.Bind(wx.EVT_LISTBOX, self.OnImageSelect)
         list_sizer.Add(self.image_list, 1, wx.EXPAND | wx.ALL, 5)
 
+        # 按类别筛选
+        filter_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        filter_btn = wx.Button(left_panel, label="按类别筛选")
+        filter_btn.Bind(wx.EVT_BUTTON, self.OnFilterByClass)
+        filter_sizer.Add(filter_btn, 1, wx.EXPAND | wx.RIGHT, 2)
+
+        clear_filter_btn = wx.Button(left_panel, label="显示全部")
+        clear_filter_btn.Bind(wx.EVT_BUTTON, self.OnClearFilter)
+        filter_sizer.Add(clear_filter_btn, 1, wx.EXPAND | wx.LEFT, 2)
+
+        list_sizer.Add(filter_sizer, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 5)
+
         # 导航按钮
         nav_sizer = wx.BoxSizer(wx.HORIZONTAL)
         prev_btn = wx.Button(left_panel, label="上一张")
@@ -990,6 +1483,8 @@ class YoloLabelingTool(wx.Frame):
         sort_btn_sizer.Add(down_btn, 1, wx.EXPAND | wx.LEFT, 2)
 
         class_sizer.Add(sort_btn_sizer, 0, wx.EXPAND | wx.ALL, 5)
+        # 连接标注服务器时类别由服务器管理，禁用这些按钮（见 SwitchLabelStore）
+        self.class_edit_buttons = [add_class_btn, edit_class_btn, del_class_btn, up_btn, down_btn]
 
         left_sizer.Add(class_sizer, 1, wx.EXPAND | wx.ALL, 5)
 
@@ -1021,9 +1516,19 @@ class YoloLabelingTool(wx.Frame):
         # 创建菜单栏
         self.CreateMenuBar()
 
-        # 创建状态栏
-        self.CreateStatusBar()
+        # 创建状态栏（右侧显示进程内存占用）
+        self.CreateStatusBar(2)
+        self.GetStatusBar().SetStatusWidths([-1, 160])
         self.SetStatusText("就绪 - 左键拖拽创建框，单击选中，拖拽移动/调整大小")
+        self.UpdateMemoryStatus(None)
+
+        self.memory_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.UpdateMemoryStatus, self.memory_timer)
+        self.memory_timer.Start(2000)
+
+        # 连接标注服务器时定期续期租约
+        self.lease_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.OnRenewLeases, self.lease_timer)
 
     def CreateMenuBar(self):
         """创建菜单栏"""
@@ -1032,8 +1537,22 @@ class YoloLabelingTool(wx.Frame):
         # 文件菜单
         file_menu = wx.Menu()
         file_menu.Append(wx.ID_OPEN, "打开文件夹\tCtrl+O")
+        file_menu.Append(141, "打开压缩包（zip/tar，不解压）...")
+        file_menu.Append(142, "打开对象存储（S3/HTTP）...")
+        file_menu.AppendCheckItem(143, "包括子文件夹")
         file_menu.Append(wx.ID_SAVE, "保存\tCtrl+S")
         file_menu.AppendSeparator()
+        file_menu.Append(116, "导出 COCO JSON...")
+        file_menu.Append(117, "导出 Pascal VOC...")
+        file_menu.Append(139, "导出训练包（NumPy 标注 + 图片 tar 分片）...")
+        file_menu.Append(140, "导出目标裁剪图（分类数据集）...")
+        file_menu.Append(118, "导入 COCO JSON...")
+        file_menu.Append(119, "导入 Pascal VOC...")
+        file_menu.AppendSeparator()
+        file_menu.Append(126, "连接标注服务器...")
+        file_menu.Append(127, "领取更多图片...")
+        file_menu.Append(128, "断开标注服务器")
+        file_menu.AppendSeparator()
         file_menu.Append(wx.ID_EXIT, "退出\tCtrl+Q")
 
         menubar.Append(file_menu, "文件")
@@ -1042,9 +1561,57 @@ class YoloLabelingTool(wx.Frame):
         nav_menu = wx.Menu()
         nav_menu.Append(101, "上一张\tLeft")
         nav_menu.Append(102, "下一张\tRight")
+        nav_menu.AppendSeparator()
+        nav_menu.Append(107, "上一张含当前类别\tCtrl+Left")
+        nav_menu.Append(108, "下一张含当前类别\tCtrl+Right")
+        nav_menu.Append(111, "上一张有问题的图片\tCtrl+Shift+E")
+        nav_menu.Append(112, "下一张有问题的图片\tCtrl+E")
+        nav_menu.Append(135, "上一张有差异的图片\tCtrl+Shift+D")
+        nav_menu.Append(136, "下一张有差异的图片\tCtrl+D")
+        nav_menu.AppendSeparator()
+        nav_menu.AppendCheckItem(129, "下一张时传播标注框\tCtrl+P")
+        nav_menu.AppendCheckItem(133, "下一张按主动学习优先级")
 
         menubar.Append(nav_menu, "导航")
 
+        # 视图菜单
+        view_menu = wx.Menu()
+        view_menu.AppendCheckItem(103, "性能HUD\tF3")
+        view_menu.Append(104, "导出性能数据...")
+        view_menu.Append(106, "缩略图浏览\tCtrl+T")
+        view_menu.AppendCheckItem(115, "隐藏损坏的图片")
+        view_menu.AppendCheckItem(132, "显示模型预测框")
+        view_menu.AppendCheckItem(137, "显示另一组标注的差异")
+        view_menu.AppendSeparator()
+        view_menu.Append(105, "内存预算...")
+
+        menubar.Append(view_menu, "视图")
+
+        # 工具菜单
+        tools_menu = wx.Menu()
+        tools_menu.Append(109, "标注质检...")
+        tools_menu.Append(113, "只显示有问题的图片")
+        tools_menu.Append(110, "批量修复标注问题...")
+        tools_menu.AppendSeparator()
+        tools_menu.Append(114, "检查损坏图片（完整解码）")
+        tools_menu.AppendSeparator()
+        tools_menu.Append(120, "划分训练/验证/测试集...")
+        tools_menu.AppendSeparator()
+        tools_menu.Append(121, "查找近似重复图片...")
+        tools_menu.Append(122, "跳过重复图片（每组只显示第一张）")
+        tools_menu.Append(123, "把当前标注复制到同组的重复图片")
+        tools_menu.AppendSeparator()
+        tools_menu.Append(124, "转换为 SQLite 单文件标注存储")
+        tools_menu.Append(125, "转换为 YOLO 标注文件")
+        tools_menu.AppendSeparator()
+        tools_menu.Append(130, "加载模型预测并评估...")
+        tools_menu.AppendCheckItem(131, "按预测错误数排序图片列表")
+        tools_menu.AppendSeparator()
+        tools_menu.Append(134, "与另一组标注比较...")
+        tools_menu.Append(138, "只显示有差异的图片")
+
+        menubar.Append(tools_menu, "工具")
+
         # 帮助菜单
         help_menu = wx.Menu()
         help_menu.Append(wx.ID_ABOUT, "关于")
@@ -1052,14 +1619,56 @@ class YoloLabelingTool(wx.Frame):
         menubar.Append(help_menu, "帮助")
 
         self.SetMenuBar(menubar)
+        menubar.Check(143, self.recursive_scan)
 
         # 绑定菜单事件
         self.Bind(wx.EVT_MENU, self.OnLoadFolder, id=wx.ID_OPEN)
+        self.Bind(wx.EVT_MENU, self.OnLoadArchive, id=141)
+        self.Bind(wx.EVT_MENU, self.OnLoadBucket, id=142)
+        self.Bind(wx.EVT_MENU, self.OnToggleRecursive, id=143)
         self.Bind(wx.EVT_MENU, self.OnSave, id=wx.ID_SAVE)
         self.Bind(wx.EVT_MENU, self.OnExit, id=wx.ID_EXIT)
         self.Bind(wx.EVT_MENU, self.OnAbout, id=wx.ID_ABOUT)
         self.Bind(wx.EVT_MENU, self.OnPrevImage, id=101)
         self.Bind(wx.EVT_MENU, self.OnNextImage, id=102)
+        self.Bind(wx.EVT_MENU, self.OnToggleHud, id=103)
+        self.Bind(wx.EVT_MENU, self.OnExportTelemetry, id=104)
+        self.Bind(wx.EVT_MENU, self.OnMemoryBudget, id=105)
+        self.Bind(wx.EVT_MENU, self.OnShowThumbnails, id=106)
+        self.Bind(wx.EVT_MENU, self.OnPrevWithClass, id=107)
+        self.Bind(wx.EVT_MENU, self.OnNextWithClass, id=108)
+        self.Bind(wx.EVT_MENU, self.OnRunQA, id=109)
+        self.Bind(wx.EVT_MENU, self.OnFixIssues, id=110)
+        self.Bind(wx.EVT_MENU, self.OnPrevIssue, id=111)
+        self.Bind(wx.EVT_MENU, self.OnNextIssue, id=112)
+        self.Bind(wx.EVT_MENU, self.OnFilterIssues, id=113)
+        self.Bind(wx.EVT_MENU, self.OnCheckImagesFull, id=114)
+        self.Bind(wx.EVT_MENU, self.OnToggleHideBad, id=115)
+        self.Bind(wx.EVT_MENU, lambda event: self.ExportDataset("coco"), id=116)
+        self.Bind(wx.EVT_MENU, lambda event: self.ExportDataset("voc"), id=117)
+        self.Bind(wx.EVT_MENU, lambda event: self.ExportDataset("packed"), id=139)
+        self.Bind(wx.EVT_MENU, lambda event: self.ExportDataset("crops"), id=140)
+        self.Bind(wx.EVT_MENU, lambda event: self.ImportDataset("coco"), id=118)
+        self.Bind(wx.EVT_MENU, lambda event: self.ImportDataset("voc"), id=119)
+        self.Bind(wx.EVT_MENU, self.OnSplitDataset, id=120)
+        self.Bind(wx.EVT_MENU, self.OnFindDuplicates, id=121)
+        self.Bind(wx.EVT_MENU, self.OnSkipDuplicates, id=122)
+        self.Bind(wx.EVT_MENU, self.OnCopyLabelsToDuplicates, id=123)
+        self.Bind(wx.EVT_MENU, lambda event: self.OnConvertStore('sqlite'), id=124)
+        self.Bind(wx.EVT_MENU, lambda event: self.OnConvertStore('yolo'), id=125)
+        self.Bind(wx.EVT_MENU, self.OnConnectServer, id=126)
+        self.Bind(wx.EVT_MENU, self.OnLeaseMore, id=127)
+        self.Bind(wx.EVT_MENU, self.OnDisconnectServer, id=128)
+        self.Bind(wx.EVT_MENU, self.OnTogglePropagation, id=129)
+        self.Bind(wx.EVT_MENU, self.OnLoadPredictions, id=130)
+        self.Bind(wx.EVT_MENU, self.OnSortByErrors, id=131)
+        self.Bind(wx.EVT_MENU, self.OnToggleShowPredictions, id=132)
+        self.Bind(wx.EVT_MENU, self.OnTogglePriority, id=133)
+        self.Bind(wx.EVT_MENU, self.OnCompareLabels, id=134)
+        self.Bind(wx.EVT_MENU, self.OnPrevDiff, id=135)
+        self.Bind(wx.EVT_MENU, self.OnNextDiff, id=136)
+        self.Bind(wx.EVT_MENU, self.OnToggleShowCompare, id=137)
+        self.Bind(wx.EVT_MENU, self.OnFilterDiffs, id=138)
 
         # 绑定快捷键
         accel_tbl = wx.AcceleratorTable([
@@ -1068,20 +1677,789 @@ class YoloLabelingTool(wx.Frame):
             (wx.ACCEL_CTRL, ord('Q'), wx.ID_EXIT),
             (wx.ACCEL_NORMAL, wx.WXK_LEFT, 101),
             (wx.ACCEL_NORMAL, wx.WXK_RIGHT, 102),
+            (wx.ACCEL_NORMAL, wx.WXK_F3, 103),
+            (wx.ACCEL_CTRL, ord('T'), 106),
+            (wx.ACCEL_CTRL, wx.WXK_LEFT, 107),
+            (wx.ACCEL_CTRL, wx.WXK_RIGHT, 108),
+            (wx.ACCEL_CTRL | wx.ACCEL_SHIFT, ord('E'), 111),
+            (wx.ACCEL_CTRL, ord('E'), 112),
+            (wx.ACCEL_CTRL, ord('P'), 129),
+            (wx.ACCEL_CTRL | wx.ACCEL_SHIFT, ord('D'), 135),
+            (wx.ACCEL_CTRL, ord('D'), 136),
         ])
         self.SetAcceleratorTable(accel_tbl)
 
+    def OnToggleHud(self, event):
+        """切换性能 HUD 显示"""
+        self.annotation_panel.show_hud = not self.annotation_panel.show_hud
+        self.GetMenuBar().Check(103, self.annotation_panel.show_hud)
+        self.annotation_panel.Refresh(False)
+
+    def GetTelemetryMeta(self):
+        """导出性能数据时附带的数据集信息"""
+        return {
+            "folder": self.current_folder,
+            "image_count": len(self.image_files),
+            "class_count": len(self.class_names),
+        }
+
+    def OnExportTelemetry(self, event):
+        """手动导出性能数据"""
+        dlg = wx.FileDialog(self, "导出性能数据", defaultFile="telemetry.json", wildcard="JSON (*.json)|*.json",
+                            style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
+        if dlg.ShowModal() == wx.ID_OK:
+            try:
+                path = telemetry.dump(dlg.GetPath(), self.GetTelemetryMeta())
+                self.SetStatusText(f"性能数据已导出: {path}")
+            except Exception as e:
+                wx.MessageBox(f"导出性能数据失败: {str(e)}", "错误", wx.OK | wx.ICON_ERROR)
+        dlg.Destroy()
+
+    def UpdateMemoryStatus(self, event):
+        """在状态栏显示进程 RSS"""
+        rss = process_rss_bytes()
+        budget = self.annotation_panel.memory_budget_mb
+        text = f"内存: {rss / 1024 / 1024:.0f} MB" if rss is not None else "内存: 未知"
+        if budget:
+            text += f" (预算 {budget:.0f} MB)"
+        self.SetStatusText(text, 1)
+
+    def OnMemoryBudget(self, event):
+        """设置内存预算"""
+        current = int(self.annotation_panel.memory_budget_mb or 0)
+        dlg = wx.NumberEntryDialog(self, "超过预算的图片只保留显示分辨率，需要时重新解码。\n0 表示不限制。",
+                                   "预算 (MB):", "内存预算", current, 0, 100000)
+        if dlg.ShowModal() == wx.ID_OK:
+            try:
+                self.annotation_panel.SetMemoryBudget(dlg.GetValue())
+            except Exception as e:
+                wx.MessageBox(f"设置内存预算失败: {str(e)}", "错误", wx.OK | wx.ICON_ERROR)
+            self.UpdateMemoryStatus(None)
+        dlg.Destroy()
+
+    def OnShowThumbnails(self, event):
+        """打开缩略图浏览窗口"""
+        if not self.thumbnail_frame:
+            self.thumbnail_frame = ThumbnailFrame(self)
+        self.thumbnail_frame.Show()
+        self.thumbnail_frame.Raise()
+
+    def OnClose(self, event):
+        """关闭窗口时导出性能数据"""
+        self.memory_timer.Stop()
+        self.lease_timer.Stop()
+        self.StopFolderWatcher()
+        if self.thumbnail_frame:
+            self.thumbnail_frame.Close()
+        try:
+            self.SaveSession()
+        except Exception as e:
+            print(f"保存会话失败: {e}")
+        try:
+            telemetry.dump(default_dump_path(), self.GetTelemetryMeta())
+        except Exception as e:
+            print(f"导出性能数据失败: {e}")
+        self.label_store.close()  # 连接标注服务器时同时释放租约
+        close_media_sources()
+        event.Skip()
+
     def OnPrevImage(self, event):
-        """上一张图片"""
-        if self.image_files and self.current_image_index > 0:
-            self.image_list.SetSelection(self.current_image_index - 1)
-            self.OnImageSelect(None)
+        """上一张图片（筛选时为列表中的上一张）"""
+        if self.image_files:
+            row = self.GetNeighbourRow(-1)
+            if row != wx.NOT_FOUND:
+                self.image_list.SetSelection(row)
+                self.OnImageSelect(None)
 
     def OnNextImage(self, event):
-        """下一张图片"""
-        if self.image_files and self.current_image_index < len(self.image_files) - 1:
-            self.image_list.SetSelection(self.current_image_index + 1)
-            self.OnImageSelect(None)
+        """下一张图片（筛选时为列表中的下一张）；开启传播时把当前的框带到下一张"""
+        if self.image_files and self.priority_mode:
+            self.NextPriorityImage()
+        elif self.image_files:
+            row = self.GetNeighbourRow(1)
+            if row != wx.NOT_FOUND:
+                source_path = self.annotation_panel.image_path
+                annotations = self.annotation_panel.CopyAnnotations()
+                self.pending_propagation = None
+                if self.propagate_boxes and source_path and annotations:
+                    target_path = self.image_files[self.RowToImageIndex(row)]
+                    self.pending_propagation = (self.PropagationKey(source_path, target_path, annotations), annotations)
+                self.image_list.SetSelection(row)
+                self.OnImageSelect(None)
+                self.ApplyPropagation()
+
+    def OnTogglePriority(self, event):
+        """开启/关闭按主动学习优先级选择下一张"""
+        self.priority_mode = event.IsChecked()
+        if self.priority_mode:
+            self.StartActiveQueueBuild()
+        else:
+            self.active_queue = None
+            self.active_generation += 1
+
+    def StartActiveQueueBuild(self):
+        """
+        在后台给全部未标注图片打分并建立优先队列：加载了模型预测时使用不确定性和类别稀有度，
+        图片文件夹中有 embeddings.npz 时用其中的嵌入计算多样性，否则用感知哈希。
+        """
+        import activequeue
+        import dedup
+        self.active_queue = None
+        self.active_generation += 1
+        if not self.image_files:
+            return
+        if self.annotation_panel.image_path:
+            self.annotation_panel.SaveAnnotations()
+        generation = self.active_generation
+        image_files = list(self.image_files)
+        store = self.label_store
+        folder_path = self.current_folder or os.path.dirname(image_files[0])
+        pred_folder = self.prediction_folder
+        label_paths = self.label_paths
+        self.SetStatusText("正在建立主动学习队列...")
+
+        def run():
+            try:
+                pred_paths = labelio.mirrored_label_paths(pred_folder, image_files, folder_path, label_paths) \
+                    if pred_folder else None
+                embeddings_path = os.path.join(folder_path, "embeddings.npz")
+                if os.path.exists(embeddings_path):
+                    embeddings = activequeue.load_embeddings(embeddings_path, image_files)
+                else:
+                    hashes, valid = dedup.compute_hashes(
+                        image_files, 'phash', os.path.join(labelio.dataset_cache_dir(folder_path), "phash.npz"))
+                    embeddings = (activequeue.hash_embeddings(hashes), valid)
+                queue, error = activequeue.build_queue(store.scan(image_files), pred_paths, embeddings), None
+            except Exception as e:
+                queue, error = None, e
+            wx.CallAfter(self.OnActiveQueueReady, generation, queue, error)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def OnActiveQueueReady(self, generation, queue, error):
+        """优先队列建立完成"""
+        if generation != self.active_generation:
+            return
+        if error:
+            wx.MessageBox(f"建立主动学习队列失败: {str(error)}", "错误", wx.OK | wx.ICON_ERROR)
+            return
+        self.active_queue = queue
+        self.SetStatusText(f"主动学习队列: {len(queue)} 张未标注图片"
+                           + ("" if self.prediction_folder else "（未加载模型预测，只按多样性排序）"))
+
+    def NextPriorityImage(self):
+        """打开优先队列中分数最高的未标注图片"""
+        if self.active_queue is None:
+            self.SetStatusText("主动学习队列还在建立中...")
+            return
+        index = self.active_queue.pop_next()
+        while index == self.current_image_index and index >= 0:
+            index = self.active_queue.pop_next()
+        if index < 0:
+            self.SetStatusText("主动学习队列中没有未标注的图片了")
+            return
+        self.SelectImage(index)
+
+    def OnTogglePropagation(self, event):
+        """开启/关闭下一张时传播标注框"""
+        self.propagate_boxes = event.IsChecked()
+        self.propagation_key = None
+        self.propagation_result = None
+        self.pending_propagation = None
+        if self.propagate_boxes:
+            self.SchedulePropagation()
+        else:
+            self.gray_cache.clear()
+
+    def LoadGray(self, image_path):
+        """解码图片为灰度图（可在后台线程调用），最近用过的几张保留在缓存中"""
+        import boxtrack
+        with self.propagation_lock:
+            gray = self.gray_cache.get(image_path)
+            if gray is not None:
+                self.gray_cache.move_to_end(image_path)
+                return gray
+        gray = boxtrack.load_gray(image_path)
+        with self.propagation_lock:
+            self.gray_cache[image_path] = gray
+            while len(self.gray_cache) > 3:
+                self.gray_cache.popitem(last=False)
+        return gray
+
+    def TrackBoxes(self, source_path, target_path, annotations):
+        """把 source_path 上的框跟踪到 target_path（可在后台线程调用）"""
+        import boxtrack
+        if self.label_store.kind == 'remote':
+            self.label_store.ensure_image(target_path)
+        with telemetry.span("propagate"):
+            return boxtrack.propagate(self.LoadGray(source_path), self.LoadGray(target_path), annotations)
+
+    @staticmethod
+    def PropagationKey(source_path, target_path, annotations):
+        return source_path, target_path, tuple((ann['class'], tuple(ann['bbox'])) for ann in annotations)
+
+    def SchedulePropagation(self):
+        """当前图片的框有变化时，在后台线程把它们跟踪到列表中的下一张"""
+        image_path = self.annotation_panel.image_path
+        if not image_path or not self.annotation_panel.annotations:
+            return
+        row = self.GetNeighbourRow(1)
+        if row == wx.NOT_FOUND:
+            return
+        next_path = self.image_files[self.RowToImageIndex(row)]
+        annotations = self.annotation_panel.CopyAnnotations()
+        key = self.PropagationKey(image_path, next_path, annotations)
+        if key == self.propagation_key:
+            return
+        self.propagation_key = key
+        self.QueuePropagation(key, annotations)
+
+    def QueuePropagation(self, key, annotations):
+        """交给后台线程跟踪（key 见 PropagationKey），完成后调用 OnPropagationReady"""
+        with self.propagation_lock:
+            # 拖动框时每次移动都会调用，后台线程只处理最新的一次
+            self.propagation_job = (key, annotations)
+            if self.propagation_running:
+                return
+            self.propagation_running = True
+
+        def run():
+            while True:
+                with self.propagation_lock:
+                    job, self.propagation_job = self.propagation_job, None
+                    if job is None:
+                        self.propagation_running = False
+                        return
+                job_key, job_annotations = job
+                try:
+                    proposals, scores = self.TrackBoxes(job_key[0], job_key[1], job_annotations)
+                except Exception as e:
+                    print(f"传播标注框失败: {e}")
+                    wx.CallAfter(self.OnPropagationFailed, job_key, e)
+                    continue
+                wx.CallAfter(self.OnPropagationReady, job_key, proposals, scores)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def OnPropagationReady(self, key, proposals, scores):
+        """后台跟踪完成（框在此期间又有变化时丢弃）；已经切换到目标图片时立即应用"""
+        pending = self.pending_propagation
+        if key == self.propagation_key or (pending and pending[0] == key):
+            self.propagation_result = (key, proposals, scores)
+            self.ApplyPropagation()
+
+    def OnPropagationFailed(self, key, error):
+        """后台跟踪失败：正在等待这次结果时放弃传播"""
+        if self.pending_propagation and self.pending_propagation[0] == key:
+            self.pending_propagation = None
+            self.SetStatusText(f"传播标注框失败: {error}")
+
+    def ApplyPropagation(self):
+        """
+        切换到下一张后，如果这张还没有标注，用跟踪结果作为它的标注（移到下一张时一起保存）。
+
+        目标图片还在后台解码（视频帧）或跟踪还没算完时保留 pending_propagation，
+        由 OnFrameDecoded / OnPropagationReady 再次调用；界面线程不解码也不跟踪。
+        """
+        import boxtrack
+        if not self.pending_propagation:
+            return
+        key, annotations = self.pending_propagation
+        panel = self.annotation_panel
+        if panel.image_path is None:
+            return  # 占位画面，等图片打开
+        if panel.image_path != key[1] or panel.annotations:
+            self.pending_propagation = None  # 已经离开目标图片，或它已有标注
+            return
+        if not (self.propagation_result and self.propagation_result[0] == key):
+            self.QueuePropagation(key, annotations)  # 已在排队时只替换为这一次
+            self.SetStatusText("正在传播标注框...")
+            return
+        self.pending_propagation = None
+        _, proposals, scores = self.propagation_result
+        panel.annotations = [{'class': ann['class'], 'bbox': list(ann['bbox'])} for ann in proposals]
+        panel.selected_annotation_index = -1
+        panel.Refresh(False)
+        self.UpdateAnnotationList()
+        weak = sum(1 for score in scores if score < boxtrack.MIN_SCORE)
+        message = f"已传播 {len(proposals)} 个框"
+        if weak:
+            message += f"（{weak} 个匹配得分低，保持原位置）"
+        self.SetStatusText(message)
+
+    def RowToImageIndex(self, row):
+        """图片列表的行号 -> image_files 序号"""
+        if self.visible_indices is None:
+            return row
+        return int(self.visible_indices[row])
+
+    def ImageIndexToRow(self, index):
+        """image_files 序号 -> 图片列表的行号，不在列表中时返回 wx.NOT_FOUND"""
+        if self.visible_indices is None:
+            return index
+        if self.visible_rows is not None:
+            row = int(self.visible_rows[index]) if 0 <= index < len(self.visible_rows) else -1
+            return row if row >= 0 else wx.NOT_FOUND
+        row = int(np.searchsorted(self.visible_indices, index))
+        if row >= len(self.visible_indices) or self.visible_indices[row] != index:
+            return wx.NOT_FOUND
+        return row
+
+    def GetNeighbourRow(self, step):
+        """当前图片在列表中的上一行/下一行，没有时返回 wx.NOT_FOUND"""
+        count = self.image_list.GetCount()
+        if self.visible_indices is None:
+            row = self.current_image_index + step
+        elif self.visible_rows is not None:
+            # 自定义顺序：当前图片不在列表中时从第一行开始
+            row = self.ImageIndexToRow(self.current_image_index)
+            row = row + step if row != wx.NOT_FOUND else (0 if step > 0 else wx.NOT_FOUND)
+        else:
+            # 当前图片可能不在筛选结果中，按位置找相邻的一行
+            side = 'right' if step > 0 else 'left'
+            row = int(np.searchsorted(self.visible_indices, self.current_image_index, side=side))
+            if step < 0:
+                row -= 1
+        return row if 0 <= row < count else wx.NOT_FOUND
+
+    def SelectImage(self, index):
+        """打开 image_files 中的第 index 张图片，并同步列表选中项"""
+        row = self.ImageIndexToRow(index)
+        if row != wx.NOT_FOUND:
+            self.image_list.SetSelection(row)
+        else:
+            self.image_list.SetSelection(wx.NOT_FOUND)
+        self.OpenImage(index)
+
+    def RefreshImageList(self):
+        """按当前筛选和显示顺序重新填充图片列表，损坏的图片加标记或隐藏"""
+        indices = self.filter_indices
+        if self.image_order is not None:
+            indices = self.image_order if indices is None else self.image_order[np.isin(self.image_order, indices)]
+        if self.hide_bad_images and self.bad_images:
+            if indices is None:
+                indices = np.arange(len(self.image_files))
+            indices = indices[~np.isin(indices, np.fromiter(self.bad_images, dtype=np.int64))]
+        self.visible_indices = indices
+        self.visible_rows = None
+        if self.image_order is not None:
+            self.visible_rows = np.full(len(self.image_files), -1, dtype=np.int64)
+            self.visible_rows[indices] = np.arange(len(indices))
+
+        rows = range(len(self.image_files)) if indices is None else indices
+        names = []
+        for i in rows:
+            name = self.DisplayName(self.image_files[i])
+            if i in self.bad_images:
+                import imagecheck
+                name = ("[可疑] " if self.bad_images[i][0] == imagecheck.STATUS_SUSPECT else "[损坏] ") + name
+            names.append(name)
+        self.image_list.Set(names)
+
+        # 恢复当前图片的选中状态
+        if self.current_image_index >= 0:
+            row = self.ImageIndexToRow(self.current_image_index)
+            if row != wx.NOT_FOUND and row < len(names):
+                self.image_list.SetSelection(row)
+
+    def DisplayName(self, path):
+        """图片列表中显示的名称：包括子文件夹时为相对于当前文件夹的路径（不同子集中可能有同名图片），否则为文件名"""
+        folder = self.current_folder
+        if self.recursive_scan and folder and path.startswith(folder) and path[len(folder):][:1] in ("/", "\\"):
+            return path[len(folder) + 1:]
+        return os.path.basename(path)
+
+    def StartClassIndexBuild(self):
+        """在后台并行扫描标注文件并构建类别倒排索引"""
+        self.class_index = None
+        self.class_index_pending = {}
+        self.class_index_generation += 1
+        generation = self.class_index_generation
+        image_files = list(self.image_files)
+        store = self.label_store
+
+        def build():
+            try:
+                index = ClassIndex.from_table(store.scan(image_files))
+            except Exception as e:
+                print(f"构建类别索引失败: {e}")
+                index = None
+            wx.CallAfter(self.OnClassIndexReady, generation, index)
+
+        threading.Thread(target=build, daemon=True).start()
+
+    def OnClassIndexReady(self, generation, index):
+        """后台构建完成，补上构建期间保存的修改"""
+        if generation != self.class_index_generation or index is None:
+            return
+        for image_index, class_ids in self.class_index_pending.items():
+            index.update_image(image_index, class_ids)
+        self.class_index_pending = {}
+        self.class_index = index
+
+    def OnAnnotationsSaved(self, image_path, annotations):
+        """某张图片的标注已保存：更新类别索引和缩略图框数"""
+        image_index = self.image_index_of.get(image_path)
+        if image_index is not None:
+            class_ids = {ann['class'] for ann in annotations}
+            if self.class_index:
+                self.class_index.update_image(image_index, class_ids)
+            else:
+                self.class_index_pending[image_index] = class_ids
+            if self.active_queue:
+                self.active_queue.update(image_index, class_ids)
+        if self.thumbnail_frame:
+            self.thumbnail_frame.grid.InvalidateImage(image_path)
+
+    def OnFilterByClass(self, event):
+        """只显示包含所选类别（任一或全部）的图片"""
+        if not self.image_files or not self.class_names:
+            return
+        if not self.class_index:
+            wx.MessageBox("类别索引正在后台构建，请稍候", "提示", wx.OK | wx.ICON_INFORMATION)
+            return
+
+        counts = self.class_index.image_counts()
+        choices = [f"{i}: {name} ({counts.get(i, 0)} 张)" for i, name in enumerate(self.class_names)]
+        dlg = wx.MultiChoiceDialog(self, "显示包含以下类别的图片:", "按类别筛选", choices)
+        selections = dlg.GetSelections() if dlg.ShowModal() == wx.ID_OK else []
+        dlg.Destroy()
+        if not selections:
+            return
+
+        match_all = False
+        if len(selections) > 1:
+            mode_dlg = wx.SingleChoiceDialog(self, "多个类别的组合方式:", "按类别筛选",
+                                             ["包含任一类别", "同时包含所有类别"])
+            if mode_dlg.ShowModal() != wx.ID_OK:
+                mode_dlg.Destroy()
+                return
+            match_all = mode_dlg.GetSelection() == 1
+            mode_dlg.Destroy()
+
+        # 筛选结果是快照：之后修改标注不会让图片从列表中消失，重新筛选即可更新
+        self.filter_indices = self.class_index.images_with(selections, match_all)
+        self.RefreshImageList()
+        names = ", ".join(self.class_names[i] for i in selections)
+        self.SetStatusText(f"筛选: {names} - {len(self.filter_indices)}/{len(self.image_files)} 张图片")
+
+    def OnClearFilter(self, event):
+        """取消筛选，显示全部图片"""
+        if self.filter_indices is None:
+            return
+        self.filter_indices = None
+        self.RefreshImageList()
+        self.SetStatusText(f"共 {len(self.image_files)} 张图片")
+
+    def JumpToClass(self, step):
+        """跳到上一张/下一张包含当前类别的图片"""
+        if not self.image_files or not self.class_names:
+            return
+        if not self.class_index:
+            self.SetStatusText("类别索引正在后台构建，请稍候")
+            return
+        class_id = self.GetCurrentClass()
+        index = self.class_index.next_image(self.current_image_index, [class_id], step=step)
+        if index < 0:
+            self.SetStatusText(f"没有更多包含 '{self.class_names[class_id]}' 的图片")
+            return
+        self.SelectImage(index)
+
+    def OnPrevWithClass(self, event):
+        self.JumpToClass(-1)
+
+    def OnNextWithClass(self, event):
+        self.JumpToClass(1)
+
+    def OnRunQA(self, event):
+        """在后台并行检查整个数据集的标注"""
+        import labelqa
+        if not self.image_files:
+            wx.MessageBox("请先导入图片文件夹", "提示", wx.OK | wx.ICON_INFORMATION)
+            return
+        if self.annotation_panel.image_path:
+            self.annotation_panel.SaveAnnotations()
+
+        self.qa_generation += 1
+        generation = self.qa_generation
+        image_files = list(self.image_files)
+        num_classes = len(self.class_names)
+        store = self.label_store
+        self.SetStatusText("正在检查标注...")
+
+        def run():
+            try:
+                if store.kind == 'yolo':
+                    report = labelqa.run_qa(image_files, num_classes)
+                else:
+                    report = labelqa.QAReport(labelqa.check_table(store.scan(image_files), num_classes),
+                                              len(image_files))
+                error = None
+            except Exception as e:
+                report, error = None, e
+            wx.CallAfter(self.OnQAReady, generation, report, error)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def OnQAReady(self, generation, report, error):
+        """质检完成"""
+        if generation != self.qa_generation:
+            return
+        if error:
+            wx.MessageBox(f"标注质检失败: {str(error)}", "错误", wx.OK | wx.ICON_ERROR)
+            return
+        self.qa_report = report
+        self.SetStatusText(f"标注质检完成: {len(report.image_indices)} 张图片有问题")
+        wx.MessageBox(report.summary() + "\n\nCtrl+E 跳到下一张有问题的图片", "标注质检",
+                      wx.OK | wx.ICON_INFORMATION)
+
+    def JumpToIssue(self, step):
+        """跳到上一张/下一张有问题的图片"""
+        if not self.qa_report:
+            self.SetStatusText("请先运行标注质检")
+            return
+        index = self.qa_report.next_image(self.current_image_index, step)
+        if index < 0:
+            self.SetStatusText("没有更多有问题的图片")
+            return
+        self.SelectImage(index)
+
+    def OnPrevIssue(self, event):
+        self.JumpToIssue(-1)
+
+    def OnNextIssue(self, event):
+        self.JumpToIssue(1)
+
+    def StartImageCheck(self, full_decode=False):
+        """在后台检查损坏/截断的图片（结果按 mtime 缓存）"""
+        import imagecheck
+        if not self.image_files or self.label_store.kind == 'remote':
+            return  # 服务器上的图片按需下载，打开时解码失败再标记
+        self.image_check_generation += 1
+        generation = self.image_check_generation
+        image_files = list(self.image_files)
+        cache_path = os.path.join(labelio.dataset_cache_dir(self.current_folder or os.path.dirname(image_files[0])),
+                                  "imagecheck.json")
+
+        def run():
+            try:
+                bad, error = imagecheck.scan_images(image_files, full_decode, cache_path), None
+            except Exception as e:
+                bad, error = {}, e
+            wx.CallAfter(self.OnImageCheckReady, generation, bad, error)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def OnImageCheckReady(self, generation, bad, error):
+        """损坏图片检查完成，在列表中标记"""
+        if generation != self.image_check_generation:
+            return
+        if error:
+            print(f"检查损坏图片失败: {error}")
+            return
+        self.bad_images = {self.image_index_of[path]: result for path, result in bad.items()
+                           if path in self.image_index_of}
+        self.RefreshImageList()
+        if self.bad_images:
+            self.SetStatusText(f"发现 {len(self.bad_images)} 张损坏的图片")
+
+    def OnCheckImagesFull(self, event):
+        """完整解码检查所有图片"""
+        if not self.image_files:
+            wx.MessageBox("请先导入图片文件夹", "提示", wx.OK | wx.ICON_INFORMATION)
+            return
+        self.SetStatusText("正在完整解码检查图片...")
+        self.StartImageCheck(full_decode=True)
+
+    def OnToggleHideBad(self, event):
+        """隐藏/显示损坏的图片"""
+        self.hide_bad_images = not self.hide_bad_images
+        self.GetMenuBar().Check(115, self.hide_bad_images)
+        self.RefreshImageList()
+
+    def OnToggleRecursive(self, event):
+        """切换是否包括子文件夹，重新加载当前文件夹"""
+        self.recursive_scan = not self.recursive_scan
+        self.GetMenuBar().Check(143, self.recursive_scan)
+        if self.current_folder and self.label_store.kind != 'remote' and not labelio.is_archive(self.current_folder):
+            self.LoadImageFolder(self.current_folder, self.image_files, self.annotation_panel.image_path)
+
+    def OnFilterIssues(self, event):
+        """图片列表只显示有问题的图片"""
+        if not self.qa_report:
+            wx.MessageBox("请先运行标注质检", "提示", wx.OK | wx.ICON_INFORMATION)
+            return
+        self.filter_indices = self.qa_report.image_indices
+        self.RefreshImageList()
+        self.SetStatusText(f"筛选: 有问题的图片 - {len(self.filter_indices)}/{len(self.image_files)} 张图片")
+
+    def GetIssueText(self, index):
+        """当前图片的质检问题摘要（用于状态栏）"""
+        if not self.qa_report:
+            return ""
+        issues = self.qa_report.issues_for(index)
+        if not issues:
+            return ""
+        import labelqa
+        parts = []
+        for _, box, code, detail in issues[:3]:
+            where = f"框{box + 1} " if box >= 0 else ""
+            parts.append(f"{where}{labelqa.ISSUE_NAMES.get(code, code)}: {detail}")
+        if len(issues) > 3:
+            parts.append(f"等 {len(issues)} 处")
+        return " | 问题: " + "; ".join(parts)
+
+    def OnFindDuplicates(self, event):
+        """在后台计算感知哈希并把近似重复的图片分组"""
+        import dedup
+        if not self.image_files:
+            wx.MessageBox("请先导入图片文件夹", "提示", wx.OK | wx.ICON_INFORMATION)
+            return
+        dlg = wx.SingleChoiceDialog(self, "哈希方法:", "查找近似重复图片", list(dedup.HASH_METHODS))
+        dlg.SetSelection(dedup.HASH_METHODS.index('phash'))
+        method = dedup.HASH_METHODS[dlg.GetSelection()] if dlg.ShowModal() == wx.ID_OK else None
+        dlg.Destroy()
+        if not method:
+            return
+        dlg = wx.NumberEntryDialog(self, "汉明距离不超过该值视为重复（0 为完全相同）:", "阈值",
+                                   "查找近似重复图片", 6, 0, 16)
+        threshold = dlg.GetValue() if dlg.ShowModal() == wx.ID_OK else None
+        dlg.Destroy()
+        if threshold is None:
+            return
+
+        self.dedup_generation += 1
+        generation = self.dedup_generation
+        image_files = list(self.image_files)
+        cache_path = os.path.join(labelio.dataset_cache_dir(self.current_folder or os.path.dirname(image_files[0])),
+                                  f"{method}.npz")
+        self.SetStatusText("正在计算图片哈希...")
+
+        def run():
+            try:
+                groups, error = dedup.find_duplicates(image_files, method, threshold, cache_path), None
+            except Exception as e:
+                groups, error = None, e
+            wx.CallAfter(self.OnDuplicatesReady, generation, groups, error)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def OnDuplicatesReady(self, generation, groups, error):
+        """重复图片分组完成"""
+        if generation != self.dedup_generation:
+            return
+        if error:
+            wx.MessageBox(f"查找重复图片失败: {str(error)}", "错误", wx.OK | wx.ICON_ERROR)
+            return
+        self.duplicate_groups = groups
+        self.duplicate_group_of = np.full(len(self.image_files), -1, dtype=np.int64)
+        for group_id, group in enumerate(groups):
+            self.duplicate_group_of[group] = group_id
+        extra = sum(len(group) - 1 for group in groups)
+        self.SetStatusText(f"找到 {len(groups)} 组近似重复图片，可跳过 {extra} 张")
+        wx.MessageBox(f"找到 {len(groups)} 组近似重复图片，共 {extra + len(groups)} 张。\n\n"
+                      "“跳过重复图片”只保留每组第一张；标注完第一张后可把标注复制到同组其它图片。",
+                      "查找近似重复图片", wx.OK | wx.ICON_INFORMATION)
+
+    def GetDuplicateText(self, index):
+        """当前图片的重复分组信息（用于状态栏）"""
+        if self.duplicate_group_of is None or self.duplicate_group_of[index] < 0:
+            return ""
+        group_id = int(self.duplicate_group_of[index])
+        group = self.duplicate_groups[group_id]
+        position = int(np.searchsorted(group, index))
+        return f" | 重复组 {group_id + 1}: 第 {position + 1}/{len(group)} 张"
+
+    def OnSkipDuplicates(self, event):
+        """图片列表中每组重复图片只保留第一张"""
+        if not self.duplicate_groups:
+            wx.MessageBox("请先查找近似重复图片", "提示", wx.OK | wx.ICON_INFORMATION)
+            return
+        skipped = np.concatenate([group[1:] for group in self.duplicate_groups])
+        base = self.filter_indices if self.filter_indices is not None else np.arange(len(self.image_files))
+        self.filter_indices = base[~np.isin(base, skipped)]
+        self.RefreshImageList()
+        self.SetStatusText(f"已跳过 {len(skipped)} 张重复图片 - {len(self.filter_indices)}/{len(self.image_files)} 张图片")
+
+    def OnCopyLabelsToDuplicates(self, event):
+        """把当前图片的标注复制到同组的其它重复图片（覆盖它们已有的标注）"""
+        index = self.current_image_index
+        if self.duplicate_group_of is None or index < 0 or self.duplicate_group_of[index] < 0:
+            wx.MessageBox("当前图片不在任何重复组中", "提示", wx.OK | wx.ICON_INFORMATION)
+            return
+        group = self.duplicate_groups[int(self.duplicate_group_of[index])]
+        targets = [int(i) for i in group if i != index]
+        if wx.MessageBox(f"用当前图片的 {len(self.annotation_panel.annotations)} 个框覆盖同组其它 {len(targets)} 张图片的标注？",
+                         "复制标注", wx.YES_NO | wx.ICON_QUESTION) != wx.YES:
+            return
+
+        self.annotation_panel.SaveAnnotations()
+        annotations = [dict(ann, bbox=list(ann['bbox'])) for ann in self.annotation_panel.annotations]
+        for i in targets:
+            image_path = self.image_files[i]
+            try:
+                self.label_store.write(image_path, annotations)
+                self.OnAnnotationsSaved(image_path, annotations)
+            except Exception as e:
+                print(f"复制标注到 {image_path} 失败: {e}")
+        self.SetStatusText(f"已把标注复制到 {len(targets)} 张重复图片")
+
+    def OnFixIssues(self, event):
+        """批量自动修复质检发现的问题"""
+        import labelqa
+        if not self.qa_report or not len(self.qa_report.image_indices):
+            wx.MessageBox("没有需要修复的问题，请先运行标注质检", "提示", wx.OK | wx.ICON_INFORMATION)
+            return
+
+        # 没有类别列表时无法判断类别ID是否存在，不提供删除 orphan_class 的修复
+        codes = [code for code in labelqa.FIXABLE_ISSUES if code != 'orphan_class' or self.class_names]
+        choices = [labelqa.ISSUE_NAMES[code] for code in codes]
+        dlg = wx.MultiChoiceDialog(self, "选择要自动修复的问题（超出图片的框会被裁剪，其余问题框会被删除）:",
+                                   "批量修复", choices)
+        # 默认只选中不删除框的修复
+        dlg.SetSelections([i for i, code in enumerate(codes) if code in labelqa.SAFE_FIXES])
+        fixes = [codes[i] for i in dlg.GetSelections()] if dlg.ShowModal() == wx.ID_OK else []
+        dlg.Destroy()
+        if not fixes:
+            return
+
+        if self.annotation_panel.image_path:
+            self.annotation_panel.SaveAnnotations()
+        image_files = [self.image_files[i] for i in self.qa_report.image_indices]
+        num_classes = len(self.class_names)
+        self.SetStatusText("正在修复标注...")
+
+        store = self.label_store
+
+        def run():
+            try:
+                if store.kind == 'yolo':
+                    changed = labelqa.fix_label_files(image_files, num_classes, fixes)
+                else:
+                    changed = labelqa.fix_store(store, image_files, num_classes, fixes)
+                error = None
+            except Exception as e:
+                changed, error = 0, e
+            wx.CallAfter(self.OnFixIssuesDone, changed, error)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def OnFixIssuesDone(self, changed, error):
+        """修复完成：重新加载当前图片的标注，重建索引并重新质检"""
+        if error:
+            wx.MessageBox(f"批量修复失败: {str(error)}", "错误", wx.OK | wx.ICON_ERROR)
+            return
+        if self.annotation_panel.image_path:
+            self.annotation_panel.LoadAnnotations()
+            self.annotation_panel.selected_annotation_index = -1
+            self.UpdateAnnotationList()
+            self.annotation_panel.Refresh(False)
+        if self.thumbnail_frame:
+            self.thumbnail_frame.grid.box_counts.clear()
+            self.thumbnail_frame.grid.Refresh(False)
+        self.StartClassIndexBuild()
+        self.SetStatusText(f"已修复 {changed} 个标注文件")
+        self.OnRunQA(None)
 
     def OnAnnotationSelect(self, event):
         """选择标注列表中的项目"""
@@ -1092,17 +2470,11 @@ class YoloLabelingTool(wx.Frame):
             self.annotation_panel.Refresh()
 
     def LoadClassesFromFile(self, folder_path):
-        """从classes.txt文件加载类别"""
-        classes_path = os.path.join(folder_path, "classes.txt")
+        """从classes.txt文件加载类别（压缩包为标注覆盖层中的 classes.txt，对象存储为本地标注目录中的）"""
+        classes_path = os.path.join(labelio.label_folder_for(folder_path), "classes.txt")
         if os.path.exists(classes_path):
             try:
-                with open(classes_path, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-                    self.class_names = []
-                    for i, line in enumerate(lines):
-                        class_name = line.strip()
-                        if class_name:
-                            self.class_names.append(class_name)
+                self.class_names = labelio.read_class_names(classes_path)
                 return True
             except Exception as e:
                 wx.MessageBox(f"读取classes.txt失败: {str(e)}", "错误", wx.OK | wx.ICON_ERROR)
@@ -1121,44 +2493,331 @@ class YoloLabelingTool(wx.Frame):
             self.LoadImageFolder(folder_path)
         dlg.Destroy()
 
-    def LoadImageFolder(self, folder_path):
-        """加载文件夹中的所有图片"""
-        image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
-        self.image_files = []
+    def OnLoadArchive(self, event):
+        """打开 zip/tar 压缩包作为图片文件夹（不解压，标注保存在压缩包旁边的 .labels 目录）"""
+        dlg = wx.FileDialog(self, "选择图片压缩包", wildcard="压缩包 (*.zip;*.tar)|*.zip;*.tar",
+                            style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST)
+        if dlg.ShowModal() == wx.ID_OK:
+            import archivesource
+            archive_path = dlg.GetPath()
+            self.SetStatusText("正在读取压缩包索引...")
+            try:
+                archivesource.prepare_overlay(archive_path)  # 先复制压缩包中的 classes.txt 和标注
+            except Exception as e:
+                wx.MessageBox(f"打开压缩包失败: {str(e)}", "错误", wx.OK | wx.ICON_ERROR)
+                dlg.Destroy()
+                return
+            self.current_folder = archive_path
+            self.LoadClassesFromFile(archive_path)
+            self.UpdateClassList()
+            self.LoadImageFolder(archive_path)
+        dlg.Destroy()
 
-        for file_name in os.listdir(folder_path):
-            if any(file_name.lower().endswith(ext) for ext in image_extensions):
-                self.image_files.append(os.path.join(folder_path, file_name))
+    def OnLoadBucket(self, event):
+        """打开对象存储（S3 兼容或 HTTP）中的一个前缀作为图片文件夹，在后台列出对象"""
+        import imagesource
+        dlg = wx.TextEntryDialog(self, "前缀地址（http(s)://主机/桶/前缀 或 s3://桶/前缀）:", "打开对象存储",
+                                 self.current_folder if labelio.is_remote_path(self.current_folder or "") else "")
+        url = dlg.GetValue().strip() if dlg.ShowModal() == wx.ID_OK else ""
+        dlg.Destroy()
+        if not url:
+            return
+        url = imagesource.normalize_url(url).rstrip("/")
+        if not labelio.is_remote_path(url):
+            wx.MessageBox(f"不支持的地址: {url}", "错误", wx.OK | wx.ICON_ERROR)
+            return
+        self.SetStatusText(f"正在列出 {url} ...")
+        recursive = self.recursive_scan
 
-        self.image_files.sort()
+        def run():
+            try:
+                image_files, error = imagesource.list_images(url, recursive), None
+            except Exception as e:
+                image_files, error = None, e
+            wx.CallAfter(self.OnBucketListed, url, image_files, error)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def OnBucketListed(self, url, image_files, error):
+        """对象列出完成：加载标注目录中的 classes.txt 并打开图片列表"""
+        if error:
+            self.SetStatusText("打开对象存储失败")
+            wx.MessageBox(f"打开对象存储失败: {str(error)}", "错误", wx.OK | wx.ICON_ERROR)
+            return
+        self.current_folder = url
+        self.LoadClassesFromFile(url)
+        self.UpdateClassList()
+        self.LoadImageFolder(url, image_files, rescan=False)
+
+    @staticmethod
+    def ListImageFiles(folder_path, recursive=False):
+        """
+        列出文件夹中的图片，视频按帧列在图片后面（需要 OpenCV）；压缩包和对象存储的前缀列出其中的图片。
+        recursive 时包括子文件夹（各目录并行扫描，视频只列出顶层的）。
+        """
+        if labelio.is_remote_path(folder_path) or labelio.is_archive(folder_path):
+            import imagesource
+            return imagesource.list_images(folder_path, recursive)
+        import videosource
+        return labelio.list_image_files(folder_path, recursive) + videosource.list_frames(folder_path)
+
+    def SwitchLabelStore(self, store):
+        """切换标注存储，切换前先把当前图片的标注保存到原来的存储（同时停止监视文件夹）"""
+        self.StopFolderWatcher()
+        if self.annotation_panel.image_path:
+            self.annotation_panel.SaveAnnotations()
+            self.annotation_panel.ClearImage()
+        self.label_store.close()
+        self.label_store = store
+        if store.kind == 'yolo':
+            store.label_path = self.label_paths
+        for button in self.class_edit_buttons:
+            button.Enable(store.kind != 'remote')
+
+    @telemetry.timed("folder_scan")
+    def LoadImageFolder(self, folder_path, cached_files=None, current_path=None, rescan=True):
+        """
+        加载文件夹中的所有图片。
+
+        给定 cached_files（上次会话保存的或已经在后台列出的图片列表）时直接使用并打开 current_path；
+        rescan 时同时在后台重新扫描文件夹，扫描完成后按差异增量更新列表。
+        """
+        if self.label_store.kind == 'remote':
+            self.lease_timer.Stop()
+            self.server_url = None
+        self.SwitchLabelStore(labelstore.open_store(folder_path))
+        close_media_sources()
+        labelio.label_dir_for.cache_clear()  # labels 目录可能在上次打开之后才创建
+        # 只监视本地文件夹（压缩包不会被其他程序修改其中的图片，对象存储无法监视）
+        watch = os.path.isdir(folder_path)
+        recursive = self.recursive_scan
+        if cached_files is None:
+            self.SetImageFiles(self.ListImageFiles(folder_path, recursive))
+            if watch:
+                self.StartFolderWatcher(folder_path)
+            self.SetStatusText(f"加载了 {len(self.image_files)} 张图片")
+            return
+
+        self.SetImageFiles(cached_files, current_path)
+        if watch:
+            self.StartFolderWatcher(folder_path)
+        if not rescan:
+            self.SetStatusText(f"加载了 {len(self.image_files)} 张图片")
+            return
+        generation = self.folder_scan_generation
+
+        def run():
+            try:
+                image_files, error = self.ListImageFiles(folder_path, recursive), None
+            except Exception as e:
+                image_files, error = None, e
+            wx.CallAfter(self.OnFolderScanned, generation, image_files, error)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def OnFolderScanned(self, generation, image_files, error):
+        """后台重新扫描完成：与上次会话的图片列表比较，增量删除/追加图片"""
+        if generation != self.folder_scan_generation:
+            return
+        if error:
+            print(f"重新扫描文件夹失败: {error}")
+            return
+        current = set(image_files)
+        removed = set(self.image_index_of.keys() - current)
+        added = [path for path in image_files if path not in self.image_index_of]
+        if removed:
+            self.RemoveImages(removed)
+        if added:
+            self.AddImages(added)
+        self.SetStatusText(f"加载了 {len(self.image_files)} 张图片" +
+                           (f"（与上次相比新增 {len(added)}，删除 {len(removed)} 张）" if added or removed else ""))
+
+    def SaveSession(self):
+        """保存当前文件夹、图片、类别和图片列表，下次启动时由 RestoreSession 恢复（连接标注服务器时不保存）"""
+        if not self.current_folder or self.label_store.kind == 'remote':
+            return
+        remote = labelio.is_remote_path(self.current_folder)
+        folder_path = self.current_folder if remote else os.path.abspath(self.current_folder)
+        current_path = self.annotation_panel.image_path
+        labelio.write_session({
+            'folder': folder_path,
+            'image': os.path.relpath(current_path, folder_path) if current_path else None,
+            'class': self.GetCurrentClass(),
+            'image_files': [os.path.relpath(path, folder_path) for path in self.image_files],
+            'recursive': self.recursive_scan,
+        })
+
+    def RestoreSession(self):
+        """启动时恢复上次的文件夹、类别和图片：先用保存的图片列表立即打开上次的图片，再在后台重新扫描文件夹"""
+        session = labelio.read_session()
+        folder_path = session.get('folder')
+        if self.current_folder or not folder_path:
+            return
+        remote = labelio.is_remote_path(folder_path)
+        if not remote and not os.path.exists(folder_path):
+            return
+        self.current_folder = folder_path
+        self.recursive_scan = bool(session.get('recursive', True))
+        self.GetMenuBar().Check(143, self.recursive_scan)
+        self.LoadClassesFromFile(folder_path)
+        self.UpdateClassList()
+        class_id = session.get('class')
+        if isinstance(class_id, int) and 0 <= class_id < self.class_list.GetCount():
+            self.class_list.SetSelection(class_id)
+            self.OnClassSelect(None)
+        join = (lambda path: f"{folder_path}/{path}") if remote else (lambda path: os.path.join(folder_path, path))
+        cached_files = [join(path) for path in session.get('image_files') or []]
+        if not cached_files:
+            self.LoadImageFolder(folder_path)
+            return
+        current_path = join(session['image']) if session.get('image') else None
+        self.LoadImageFolder(folder_path, cached_files, current_path)
+        self.SetStatusText(f"已恢复上次的会话: {len(self.image_files)} 张图片，正在后台重新扫描文件夹...")
+
+    def SetImageFiles(self, image_files, current_path=None):
+        """替换图片列表并重置所有按图片序号保存的状态，打开 current_path（不在列表中时打开第一张）"""
+        self.image_files = image_files
+        self.folder_scan_generation += 1
+        self.image_index_of = {path: i for i, path in enumerate(self.image_files)}
+        # 一次算出全部标注文件路径，打开、保存和批量改写标注时只查表
+        self.label_paths = labelio.LabelPathTable(self.image_files)
+        if self.label_store.kind == 'yolo':
+            self.label_store.label_path = self.label_paths
+        self.label_index_of = {self.label_paths(path): i for i, path in enumerate(self.image_files)}
+        self.current_image_index = -1
 
         # 更新图片列表
-        self.image_list.Clear()
-        for img_path in self.image_files:
-            self.image_list.Append(os.path.basename(img_path))
+        self.filter_indices = None
+        self.image_order = None
+        self.bad_images = {}
+        self.RefreshImageList()
+
+        self.StartClassIndexBuild()
+        self.StartImageCheck()
+        self.qa_report = None
+        self.qa_generation += 1
+        self.duplicate_groups = []
+        self.duplicate_group_of = None
+        self.dedup_generation += 1
+        self.prediction_folder = None
+        self.eval_report = None
+        self.eval_generation += 1
+        self.GetMenuBar().Check(131, False)
+        self.compare_folder = None
+        self.diff_report = None
+        self.diff_generation += 1
+        if self.priority_mode:
+            self.StartActiveQueueBuild()
+
+        if self.thumbnail_frame:
+            self.thumbnail_frame.Reload()
 
         if self.image_files:
-            self.image_list.SetSelection(0)
-            self.OnImageSelect(None)
-
-        self.SetStatusText(f"加载了 {len(self.image_files)} 张图片")
+            self.SelectImage(self.image_index_of.get(current_path, 0))
 
     def OnImageSelect(self, event):
         """选择图片"""
         selection = self.image_list.GetSelection()
         if selection != wx.NOT_FOUND:
-            self.current_image_index = selection
-            image_path = self.image_files[selection]
+            self.OpenImage(self.RowToImageIndex(selection))
 
-            # 保存之前图片的标注
-            if hasattr(self, 'annotation_panel') and self.annotation_panel.image_path:
-                self.annotation_panel.SaveAnnotations()
+    def OpenImage(self, index):
+        """打开 image_files 中的第 index 张图片"""
+        self.current_image_index = index
+        image_path = self.image_files[index]
+
+        # 保存之前图片的标注
+        if hasattr(self, 'annotation_panel') and self.annotation_panel.image_path:
+            self.annotation_panel.SaveAnnotations()
 
-            # 加载新图片
-            if self.annotation_panel.LoadImage(image_path):
+        # 连接标注服务器时按需下载图片，并在后台预取后面几张
+        if self.label_store.kind == 'remote':
+            try:
+                self.label_store.ensure_image(image_path)
+            except Exception as e:
+                self.annotation_panel.ClearImage()
+                self.UpdateAnnotationList()
+                self.SetStatusText(f"下载图片失败: {os.path.basename(image_path)} - {e}")
+                return
+            self.label_store.prefetch(self.image_files[index + 1:index + 1 + self.remote_prefetch_count])
+        elif labelio.is_remote_path(image_path):
+            # 对象存储中的图片：在后台并行下载后面几张到本地缓存
+            import imagesource
+            imagesource.prefetch(self.image_files[index + 1:index + 1 + self.remote_prefetch_count])
+
+        # 视频帧还不在缓冲区中时先显示占位文字，在后台等待解码完成后再打开，界面线程不等待
+        if labelio.split_frame_path(image_path):
+            import videosource
+            if not videosource.frame_ready(image_path):
+                self.annotation_panel.ShowPlaceholder("正在解码视频帧...")
                 self.UpdateAnnotationList()
-                self.SetStatusText(
-                    f"当前图片: {os.path.basename(image_path)} ({selection + 1}/{len(self.image_files)})")
+                self.SetStatusText(f"正在解码: {os.path.basename(image_path)} ({index + 1}/{len(self.image_files)})")
+                self.LoadFrameInBackground(index)
+                return
+
+        # 已标记为损坏的图片仍然尝试解码（检查只看文件头尾，可能误判），但失败时不弹出错误对话框
+        import imagecheck
+        flagged = index in self.bad_images
+        if self.annotation_panel.LoadImage(image_path, quiet=flagged):
+            if flagged and self.bad_images[index][0] == imagecheck.STATUS_SUSPECT:
+                # 能解码只能排除"可疑"；wx 解码截断的 JPEG 也会成功（缺失部分填灰），确认过的损坏仍保留标记
+                del self.bad_images[index]
+                self.RefreshImageList()
+            self.LoadPredictions()
+            self.LoadCompareAnnotations()
+            self.UpdateAnnotationList()
+            self.SetStatusText(
+                f"当前图片: {os.path.basename(image_path)} ({index + 1}/{len(self.image_files)})"
+                + self.GetDuplicateText(index) + self.GetIssueText(index) + self.GetEvalText(index)
+                + self.GetDiffText(index))
+        elif flagged:
+            status, message = self.bad_images[index]
+            self.annotation_panel.ClearImage()
+            self.UpdateAnnotationList()
+            self.SetStatusText(f"图片已损坏: {os.path.basename(image_path)} - "
+                               f"{imagecheck.STATUS_NAMES.get(status, status)} {message}")
+        else:
+            self.bad_images[index] = (imagecheck.STATUS_CORRUPT, "解码失败")
+            self.annotation_panel.ClearImage()
+            self.UpdateAnnotationList()
+            self.RefreshImageList()
+        if self.thumbnail_frame:
+            self.thumbnail_frame.grid.Refresh(False)
+
+    def LoadFrameInBackground(self, index):
+        """在后台线程中打开视频并等待第 index 张（视频帧）解码，完成后回到界面线程打开"""
+        import videosource
+        self.frame_generation += 1
+        generation = self.frame_generation
+        image_path = self.image_files[index]
+
+        def run():
+            try:
+                videosource.read_frame(image_path)
+                error = None
+            except Exception as e:
+                error = e
+            wx.CallAfter(self.OnFrameDecoded, generation, index, image_path, error)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def OnFrameDecoded(self, generation, index, image_path, error):
+        """视频帧解码完成：仍停留在这一帧（画布显示占位文字）时打开它"""
+        if generation != self.frame_generation or index != self.current_image_index:
+            return
+        if index >= len(self.image_files) or self.image_files[index] != image_path:
+            return
+        if self.annotation_panel.image_path:
+            return
+        if error:
+            import imagecheck
+            self.bad_images[index] = (imagecheck.STATUS_CORRUPT, f"解码失败: {error}")
+            self.annotation_panel.ClearImage()
+            self.SetStatusText(f"图片已损坏: {os.path.basename(image_path)} - 解码失败 {error}")
+            self.RefreshImageList()
+            return
+        self.OpenImage(index)
+        self.ApplyPropagation()
 
     def OnSave(self, event):
         """保存当前标注"""
@@ -1174,26 +2833,848 @@ class YoloLabelingTool(wx.Frame):
             wx.MessageBox("没有图片需要导出", "提示", wx.OK | wx.ICON_INFORMATION)
             return
 
+        # 选择导出格式
+        formats = ["YOLO（classes.txt）", "COCO JSON", "Pascal VOC XML"]
+        dlg = wx.SingleChoiceDialog(self, "选择导出格式:", "导出所有标注", formats)
+        choice = dlg.GetSelection() if dlg.ShowModal() == wx.ID_OK else -1
+        dlg.Destroy()
+        if choice < 0:
+            return
+        if choice > 0:
+            self.ExportDataset("coco" if choice == 1 else "voc")
+            return
+
         # 保存当前标注
         if self.annotation_panel.image_path:
             self.annotation_panel.SaveAnnotations()
 
         # 创建classes.txt文件
         if self.image_files and self.class_names:
-            folder_path = os.path.dirname(self.image_files[0])
+            # 与 LoadClassesFromFile 读取的位置相同（对象存储和压缩包为本地标注目录，子文件夹的数据集为顶层文件夹）
+            folder_path = labelio.label_folder_for(self.current_folder or os.path.dirname(self.image_files[0]))
             classes_path = os.path.join(folder_path, "classes.txt")
 
             try:
-                with open(classes_path, 'w', encoding='utf-8') as f:
-                    for class_id in range(len(self.class_names)):
-                        f.write(f"{self.class_names[class_id]}\n")
+                labelio.write_class_names(classes_path, self.class_names)
 
                 wx.MessageBox(f"导出完成！\n类别文件: {classes_path}", "导出成功", wx.OK | wx.ICON_INFORMATION)
             except Exception as e:
                 wx.MessageBox(f"导出失败: {str(e)}", "错误", wx.OK | wx.ICON_ERROR)
 
+    def RequireLabelFiles(self):
+        """导入/导出/划分等批量工具直接读写 .txt 标注文件，使用 SQLite 存储时需要先转换"""
+        if self.label_store.kind == 'yolo':
+            return True
+        if self.label_store.kind == 'remote':
+            wx.MessageBox("连接标注服务器时不能使用此功能，请在服务器端的图片文件夹上操作。", "提示",
+                          wx.OK | wx.ICON_INFORMATION)
+            return False
+        wx.MessageBox("当前文件夹使用 SQLite 标注存储（labels.db）。\n"
+                      "请先通过“工具 → 转换为 YOLO 标注文件”转换后再使用此功能。", "提示", wx.OK | wx.ICON_INFORMATION)
+        return False
+
+    def OnConvertStore(self, target):
+        """在 YOLO 标注文件和 SQLite 单文件存储之间转换当前文件夹"""
+        if not self.current_folder:
+            wx.MessageBox("请先导入图片文件夹", "提示", wx.OK | wx.ICON_INFORMATION)
+            return
+        if self.label_store.kind == 'remote' and not self.RequireLabelFiles():
+            return
+        if self.label_store.kind == target:
+            wx.MessageBox("当前文件夹已经是这种存储方式", "提示", wx.OK | wx.ICON_INFORMATION)
+            return
+        remove_txt = False
+        if target == 'sqlite':
+            answer = wx.MessageBox("转换完成后删除原来的 .txt 标注文件吗？", "转换为 SQLite 存储",
+                                   wx.YES_NO | wx.CANCEL | wx.ICON_QUESTION)
+            if answer == wx.CANCEL:
+                return
+            remove_txt = answer == wx.YES
+
+        self.SwitchLabelStore(labelstore.YoloFileStore())
+        folder_path = self.current_folder
+        image_files = list(self.image_files)
+        self.SetStatusText("正在转换标注存储...")
+
+        def run():
+            try:
+                if target == 'sqlite':
+                    result = labelstore.convert_to_sqlite(folder_path, image_files, remove_txt)
+                else:
+                    result = labelstore.convert_to_yolo(folder_path)
+                error = None
+            except Exception as e:
+                result, error = None, e
+            wx.CallAfter(self.OnConvertStoreDone, folder_path, result, error)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def OnConvertStoreDone(self, folder_path, result, error):
+        """存储转换完成，重新加载文件夹"""
+        if error:
+            wx.MessageBox(f"转换标注存储失败: {str(error)}", "错误", wx.OK | wx.ICON_ERROR)
+        if folder_path == self.current_folder:
+            current_index = self.current_image_index
+            self.LoadImageFolder(folder_path)
+            if 0 <= current_index < len(self.image_files):
+                self.SelectImage(current_index)
+        if not error:
+            if isinstance(result, dict):
+                self.SetStatusText(f"已转换为 SQLite 存储: {result['images']} 张图片，{result['annotations']} 个框")
+            else:
+                self.SetStatusText(f"已转换为 YOLO 标注文件: {result} 个文件")
+
+    def OnConnectServer(self, event):
+        """连接标注服务器并领取一批图片"""
+        import annoclient
+        dlg = wx.TextEntryDialog(self, "标注服务器地址:", "连接标注服务器", self.server_url or "http://127.0.0.1:8765")
+        url = dlg.GetValue().strip() if dlg.ShowModal() == wx.ID_OK else ""
+        dlg.Destroy()
+        if not url:
+            return
+        count = wx.GetNumberFromUser("每次领取的图片数:", "", "连接标注服务器", 50, 1, 10000, self)
+        if count < 0:
+            return
+        self.SetStatusText(f"正在连接 {url}...")
+
+        def run():
+            try:
+                result, error = annoclient.connect(url, count, annoclient.cache_dir_for(url)), None
+            except Exception as e:
+                result, error = None, e
+            wx.CallAfter(self.OnServerConnected, url, result, error)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def OnServerConnected(self, url, result, error):
+        """连接成功：切换到远程存储，列表显示领取到的图片"""
+        if error:
+            wx.MessageBox(f"连接标注服务器失败: {str(error)}", "错误", wx.OK | wx.ICON_ERROR)
+            self.SetStatusText("就绪")
+            return
+        store, class_names, lease_seconds = result
+        self.SwitchLabelStore(store)
+        self.server_url = url
+        self.current_folder = store.cache_dir
+        self.class_names = class_names
+        self.UpdateClassList()
+        self.SetImageFiles(list(store.paths))
+        self.lease_timer.Start(max(lease_seconds // 3, 5) * 1000)
+        if self.image_files:
+            self.SetStatusText(f"已连接 {url}，领取了 {len(self.image_files)} 张图片")
+        else:
+            self.SetStatusText(f"已连接 {url}，没有可领取的图片")
+
+    def OnLeaseMore(self, event):
+        """再领取一批图片，追加到列表末尾"""
+        if self.label_store.kind != 'remote':
+            wx.MessageBox("请先连接标注服务器", "提示", wx.OK | wx.ICON_INFORMATION)
+            return
+        count = wx.GetNumberFromUser("领取的图片数:", "", "领取更多图片", 50, 1, 10000, self)
+        if count < 0:
+            return
+        try:
+            added = self.label_store.lease_more(count)
+        except Exception as e:
+            wx.MessageBox(f"领取图片失败: {str(e)}", "错误", wx.OK | wx.ICON_ERROR)
+            return
+        for _, path in added:
+            self.image_index_of[path] = len(self.image_files)
+            self.image_files.append(path)
+        if added:
+            self.RefreshImageList()
+            self.StartClassIndexBuild()
+            if self.thumbnail_frame:
+                self.thumbnail_frame.Reload()
+        self.SetStatusText(f"领取了 {len(added)} 张图片，共 {len(self.image_files)} 张")
+
+    def OnDisconnectServer(self, event):
+        """断开标注服务器：保存当前标注并释放全部租约"""
+        if self.label_store.kind != 'remote':
+            return
+        self.lease_timer.Stop()
+        self.SwitchLabelStore(labelstore.YoloFileStore())
+        self.server_url = None
+        self.current_folder = None
+        self.SetImageFiles([])
+        self.SetStatusText("已断开标注服务器")
+
+    def OnRenewLeases(self, event):
+        """定时续期租约（在后台线程中请求）"""
+        store = self.label_store
+        if store.kind != 'remote':
+            self.lease_timer.Stop()
+            return
+
+        def run():
+            try:
+                held, error = store.renew(), None
+            except Exception as e:
+                held, error = None, e
+            wx.CallAfter(self.OnLeasesRenewed, store, held, error)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def OnLeasesRenewed(self, store, held, error):
+        if store is not self.label_store:
+            return
+        if error:
+            self.SetStatusText(f"续期租约失败: {error}")
+            return
+        expired = len(store.leased - set(held))
+        if expired:
+            self.SetStatusText(f"{expired} 张图片的租约已过期，保存时可能与其他人冲突")
+
+    def OnSaveConflict(self, image_path, annotations, error):
+        """保存时标注已被其他人修改（标注服务器或其他程序）：选择覆盖或放弃本地修改"""
+        answer = wx.MessageBox(f"{error}\n\n是: 用本地标注覆盖\n否: 放弃本地修改，使用对方保存的标注",
+                               "标注冲突", wx.YES_NO | wx.ICON_WARNING)
+        self.label_store.accept(image_path, error.version)
+        if answer == wx.YES:
+            try:
+                self.label_store.write(image_path, annotations)
+            except Exception as e:
+                wx.MessageBox(f"保存标注文件失败: {str(e)}", "错误", wx.OK | wx.ICON_ERROR)
+                return
+        else:
+            annotations[:] = error.annotations
+        if self.annotation_panel.image_path == image_path:
+            self.annotation_panel.saved_annotations = self.annotation_panel.CopyAnnotations()
+            self.annotation_panel.Refresh()
+            self.UpdateAnnotationList()
+        self.OnAnnotationsSaved(image_path, annotations)
+
+    def StartFolderWatcher(self, folder_path):
+        """开始监视图片文件夹，变化在主线程中由 OnFolderChanged 处理"""
+        self.StopFolderWatcher()
+        self.folder_watch_generation += 1
+        generation = self.folder_watch_generation
+        import folderwatch
+        try:
+            # 递归扫描的数据集监视图片和标注所在的每个目录（包括 images/ 对应的 labels/ 目录）
+            folders = [folder for folder in self.label_paths.folders() if os.path.isdir(folder)]
+            self.folder_watcher = folderwatch.FolderWatcher(
+                folder_path, lambda changes: wx.CallAfter(self.OnFolderChanged, generation, changes),
+                folders=sorted(set(folders) | {folder_path})).start()
+        except Exception as e:
+            print(f"监视文件夹失败: {e}")
+
+    def StopFolderWatcher(self):
+        if self.folder_watcher:
+            self.folder_watcher.stop()
+            self.folder_watcher = None
+        self.folder_watch_generation += 1
+
+    def OnFolderChanged(self, generation, changes):
+        """文件夹中的图片或标注文件被其他程序修改：增量更新图片列表、索引和当前标注"""
+        if generation != self.folder_watch_generation:
+            return
+        added, removed, renamed, labels_changed = [], set(), [], set()
+        for kind, path, old_path in changes:
+            if kind == 'rescan':
+                # 事件丢失，与重新扫描的结果比较；标注可能都变了，重建类别索引
+                current = set(self.ListImageFiles(self.current_folder, self.recursive_scan))
+                added = sorted(current - self.image_index_of.keys())
+                removed = set(self.image_index_of.keys() - current)
+                labels_changed = set(range(len(self.image_files)))
+                renamed = []
+                break
+            is_image = path.lower().endswith(labelio.IMAGE_EXTENSIONS)
+            if kind == 'moved':
+                if old_path in self.image_index_of:
+                    if is_image and path not in self.image_index_of:
+                        renamed.append((old_path, path))
+                        continue
+                    removed.add(old_path)
+                elif old_path in self.label_index_of:
+                    labels_changed.add(self.label_index_of[old_path])
+                kind = 'modified'  # 目标文件按新建或修改处理
+            if is_image:
+                if kind == 'deleted':
+                    if path in self.image_index_of:
+                        removed.add(path)
+                elif path not in self.image_index_of:
+                    added.append(path)
+                else:
+                    index = self.image_index_of[path]
+                    self.bad_images.pop(index, None)
+                    if self.thumbnail_frame:
+                        self.thumbnail_frame.grid.InvalidateImage(path, image_changed=True)
+            elif path in self.label_index_of:
+                labels_changed.add(self.label_index_of[path])
+
+        # 先按原来的序号处理标注变化，再改变图片列表
+        labels_changed -= {self.image_index_of[path] for path in removed}
+        if labels_changed:
+            self.ReloadExternalLabels(sorted(labels_changed))
+        if renamed:
+            self.RenameImages(renamed)
+        if removed:
+            self.RemoveImages(removed)
+        if added:
+            self.AddImages(sorted(added))
+        if renamed or removed or added:
+            self.SetStatusText(f"文件夹已变化: 新增 {len(added)}，删除 {len(removed)}，重命名 {len(renamed)} 张图片，"
+                               f"共 {len(self.image_files)} 张")
+
+    def ReloadExternalLabels(self, indices):
+        """标注文件被其他程序修改：更新类别索引和缩略图；当前图片没有未保存的修改时重新加载"""
+        store = self.label_store
+        if store.kind != 'yolo':
+            return  # SQLite 存储的修改不对应单个文件
+        bulk = len(indices) > 1000
+        if bulk:
+            self.StartClassIndexBuild()  # 大批量修改时在后台重建，不在界面线程逐个读文件
+        for index in indices:
+            image_path = self.image_files[index]
+            if index == self.current_image_index and self.annotation_panel.image_path == image_path:
+                if not store.changed_externally(image_path):
+                    continue  # 自己保存产生的事件
+                if self.annotation_panel.HasUnsavedChanges():
+                    self.SetStatusText("当前图片的标注文件已被其他程序修改，保存时将提示冲突")
+                    continue
+                self.annotation_panel.LoadAnnotations()
+                self.annotation_panel.selected_annotation_index = -1
+                self.annotation_panel.Refresh()
+                self.UpdateAnnotationList()
+                self.OnAnnotationsSaved(image_path, self.annotation_panel.annotations)
+                self.SetStatusText(f"已重新加载被其他程序修改的标注: {os.path.basename(image_path)}")
+            elif not bulk and store.changed_externally(image_path):
+                try:
+                    annotations = labelio.read_annotations(store.label_path(image_path))
+                except Exception as e:
+                    print(f"读取标注文件失败: {e}")
+                    continue
+                self.OnAnnotationsSaved(image_path, annotations)
+        if bulk and self.thumbnail_frame:
+            self.thumbnail_frame.grid.box_counts.clear()
+            self.thumbnail_frame.grid.Refresh(False)
+
+    def RenameImages(self, renamed):
+        """图片在文件夹内被重命名：序号不变，只更新路径"""
+        for old_path, new_path in renamed:
+            index = self.image_index_of.pop(old_path)
+            self.label_index_of.pop(self.label_paths(old_path), None)
+            self.label_paths.discard([old_path])
+            self.image_files[index] = new_path
+            self.image_index_of[new_path] = index
+            self.label_index_of[self.label_paths(new_path)] = index
+            if self.annotation_panel.image_path == old_path:
+                self.annotation_panel.image_path = new_path
+        self.RefreshImageList()
+        if self.thumbnail_frame:
+            self.thumbnail_frame.grid.Refresh(False)
+
+    def RemoveImages(self, removed):
+        """图片被删除：压缩图片列表，按序号保存的状态跟随重新编号（质检结果失效）"""
+        keep = np.ones(len(self.image_files), dtype=bool)
+        keep[[self.image_index_of[path] for path in removed]] = False
+        new_index = np.cumsum(keep) - 1
+
+        if self.current_image_index >= 0:
+            if keep[self.current_image_index]:
+                self.current_image_index = int(new_index[self.current_image_index])
+            else:
+                self.annotation_panel.ClearImage()
+                self.UpdateAnnotationList()
+                self.current_image_index = -1
+
+        self.image_files = [path for path, k in zip(self.image_files, keep) if k]
+        self.image_index_of = {path: i for i, path in enumerate(self.image_files)}
+        self.label_paths.discard(removed)
+        self.label_index_of = {self.label_paths(path): i for i, path in enumerate(self.image_files)}
+        self.bad_images = {int(new_index[i]): result for i, result in self.bad_images.items() if keep[i]}
+        if self.filter_indices is not None:
+            self.filter_indices = new_index[self.filter_indices[keep[self.filter_indices]]]
+        if self.image_order is not None:
+            self.image_order = new_index[self.image_order[keep[self.image_order]]]
+
+        if self.class_index:
+            self.class_index.remove_images(keep)
+        else:
+            self.StartClassIndexBuild()
+        self.qa_report = None
+        self.qa_generation += 1
+        self.eval_report = None  # 排序保持不变，每张图片的 TP/FP/FN 需要重新评估
+        self.eval_generation += 1
+        self.diff_report = None
+        self.diff_generation += 1
+        if self.priority_mode:
+            self.StartActiveQueueBuild()
+        groups = [new_index[group[keep[group]]] for group in self.duplicate_groups]
+        self.duplicate_groups = [group for group in groups if len(group) > 1]
+        if self.duplicate_group_of is not None:
+            self.duplicate_group_of = np.full(len(self.image_files), -1, dtype=np.int64)
+            for group_id, group in enumerate(self.duplicate_groups):
+                self.duplicate_group_of[group] = group_id
+        self.dedup_generation += 1
+
+        self.RefreshImageList()
+        if self.thumbnail_frame:
+            self.thumbnail_frame.grid.UpdateLayout()
+
+    def AddImages(self, added):
+        """新增的图片追加到列表末尾，已有图片的序号不变"""
+        start = len(self.image_files)
+        self.image_files.extend(added)
+        for i, path in enumerate(added, start):
+            self.image_index_of[path] = i
+            self.label_index_of[self.label_paths(path)] = i
+        if self.duplicate_group_of is not None:
+            self.duplicate_group_of = np.r_[self.duplicate_group_of, np.full(len(added), -1, dtype=np.int64)]
+        if self.image_order is not None:
+            self.image_order = np.r_[self.image_order, np.arange(start, len(self.image_files))]
+
+        if self.class_index and len(added) <= 1000:
+            self.class_index.resize(len(self.image_files))
+            for path in added:
+                try:
+                    annotations = self.label_store.read(path)
+                except Exception as e:
+                    print(f"读取标注文件失败: {e}")
+                    continue
+                self.class_index.update_image(self.image_index_of[path], {ann['class'] for ann in annotations})
+        else:
+            self.StartClassIndexBuild()
+
+        self.RefreshImageList()
+        self.StartImageCheck()
+        if self.priority_mode:
+            self.StartActiveQueueBuild()
+        if self.thumbnail_frame:
+            self.thumbnail_frame.grid.UpdateLayout()
+
+    def OnLoadPredictions(self, event):
+        """选择模型预测文件夹，在后台与全部标注匹配并计算 AP"""
+        import predeval
+        if not self.image_files:
+            wx.MessageBox("请先导入图片文件夹", "提示", wx.OK | wx.ICON_INFORMATION)
+            return
+        dlg = wx.DirDialog(self, "选择模型预测文件夹（每行 class cx cy w h conf）",
+                           defaultPath=self.prediction_folder or self.current_folder or "")
+        if dlg.ShowModal() != wx.ID_OK:
+            dlg.Destroy()
+            return
+        pred_folder = dlg.GetPath()
+        dlg.Destroy()
+        if self.annotation_panel.image_path:
+            self.annotation_panel.SaveAnnotations()
+
+        self.eval_generation += 1
+        generation = self.eval_generation
+        image_files = list(self.image_files)
+        store = self.label_store
+        iou_threshold, conf_threshold = self.eval_iou_threshold, self.eval_conf_threshold
+        folder_path, label_paths = self.current_folder, self.label_paths
+        self.SetStatusText("正在评估模型预测...")
+
+        def run():
+            try:
+                pred_paths = labelio.mirrored_label_paths(pred_folder, image_files, folder_path, label_paths)
+                report = predeval.evaluate(store.scan(image_files), pred_paths, iou_threshold, conf_threshold)
+                error = None
+            except Exception as e:
+                report, error = None, e
+            wx.CallAfter(self.OnEvalReady, generation, pred_folder, report, error)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def OnEvalReady(self, generation, pred_folder, report, error):
+        """评估完成，显示预测框和摘要"""
+        if generation != self.eval_generation:
+            return
+        if error:
+            wx.MessageBox(f"评估模型预测失败: {str(error)}", "错误", wx.OK | wx.ICON_ERROR)
+            return
+        self.prediction_folder = pred_folder
+        self.eval_report = report
+        self.annotation_panel.show_predictions = True
+        self.GetMenuBar().Check(132, True)
+        if self.image_order is not None:
+            self.image_order = self.WorstFirstOrder()
+            self.RefreshImageList()
+        self.LoadPredictions()
+        self.annotation_panel.Refresh(False)
+        if self.priority_mode:
+            self.StartActiveQueueBuild()  # 加入预测的不确定性和类别稀有度
+        self.SetStatusText(f"评估完成: mAP {report.mean_ap():.4f}")
+        wx.MessageBox(report.summary(self.class_names) + "\n\n工具 > 按预测错误数排序图片列表，先看错误最多的图片",
+                      "模型评估", wx.OK | wx.ICON_INFORMATION)
+
+    def LoadPredictions(self):
+        """读取当前图片的预测框"""
+        panel = self.annotation_panel
+        panel.predictions = []
+        if self.prediction_folder and panel.image_path:
+            import predeval
+            try:
+                panel.predictions = predeval.read_predictions(
+                    labelio.mirrored_label_path(self.prediction_folder, panel.image_path, self.current_folder))
+            except Exception as e:
+                print(f"读取预测文件失败: {e}")
+
+    def WorstFirstOrder(self):
+        """按评估的错误数 (FP + FN) 从多到少排列的图片序号，评估之后新增的图片排在最后"""
+        order = self.eval_report.worst_first()
+        order = order[order < len(self.image_files)]
+        return np.r_[order, np.arange(self.eval_report.num_images, len(self.image_files))].astype(np.int64)
+
+    def OnSortByErrors(self, event):
+        """图片列表按预测错误数排序 / 恢复原顺序"""
+        if event.IsChecked():
+            if not self.eval_report:
+                self.GetMenuBar().Check(131, False)
+                wx.MessageBox("请先加载模型预测并评估", "提示", wx.OK | wx.ICON_INFORMATION)
+                return
+            self.image_order = self.WorstFirstOrder()
+            self.SetStatusText("图片列表按预测错误数排序")
+        else:
+            self.image_order = None
+            self.SetStatusText("图片列表恢复原顺序")
+        self.RefreshImageList()
+
+    def OnToggleShowPredictions(self, event):
+        """显示/隐藏预测框"""
+        self.annotation_panel.show_predictions = event.IsChecked()
+        self.annotation_panel.Refresh(False)
+
+    def GetEvalText(self, index):
+        """当前图片的预测评估结果（用于状态栏）"""
+        report = self.eval_report
+        if not report or index >= report.num_images:
+            return ""
+        return f" | 预测: TP {report.tp[index]} FP {report.fp[index]} FN {report.fn[index]}"
+
+    def OnCompareLabels(self, event):
+        """选择另一组标注的文件夹，在后台逐张比较"""
+        import labeldiff
+        if not self.image_files:
+            wx.MessageBox("请先导入图片文件夹", "提示", wx.OK | wx.ICON_INFORMATION)
+            return
+        dlg = wx.DirDialog(self, "选择另一组标注文件夹（与当前标注文件同名的 .txt）",
+                           defaultPath=self.compare_folder or self.current_folder or "")
+        if dlg.ShowModal() != wx.ID_OK:
+            dlg.Destroy()
+            return
+        compare_folder = dlg.GetPath()
+        dlg.Destroy()
+        if self.annotation_panel.image_path:
+            self.annotation_panel.SaveAnnotations()
+
+        self.diff_generation += 1
+        generation = self.diff_generation
+        image_files = list(self.image_files)
+        store = self.label_store
+        folder_path, label_paths = self.current_folder, self.label_paths
+        self.SetStatusText("正在比较两组标注...")
+
+        def run():
+            try:
+                other_paths = labelio.mirrored_label_paths(compare_folder, image_files, folder_path, label_paths)
+                report, error = labeldiff.diff_labels(store.scan(image_files), other_paths), None
+            except Exception as e:
+                report, error = None, e
+            wx.CallAfter(self.OnDiffReady, generation, compare_folder, report, error)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def OnDiffReady(self, generation, compare_folder, report, error):
+        """比较完成，叠加显示当前图片的差异"""
+        if generation != self.diff_generation:
+            return
+        if error:
+            wx.MessageBox(f"比较标注失败: {str(error)}", "错误", wx.OK | wx.ICON_ERROR)
+            return
+        self.compare_folder = compare_folder
+        self.diff_report = report
+        self.annotation_panel.show_compare = True
+        self.GetMenuBar().Check(137, True)
+        self.LoadCompareAnnotations()
+        self.annotation_panel.Refresh(False)
+        self.SetStatusText(f"比较完成: {len(report.image_indices)} 张图片有差异")
+        wx.MessageBox(report.summary() + "\n\nCtrl+D 跳到下一张有差异的图片", "比较标注",
+                      wx.OK | wx.ICON_INFORMATION)
+
+    def LoadCompareAnnotations(self):
+        """读取当前图片在另一组中的标注"""
+        panel = self.annotation_panel
+        panel.compare_annotations = []
+        if self.compare_folder and panel.image_path:
+            try:
+                panel.compare_annotations = labelio.read_annotations(
+                    labelio.mirrored_label_path(self.compare_folder, panel.image_path, self.current_folder))
+            except Exception as e:
+                print(f"读取另一组标注失败: {e}")
+
+    def JumpToDiff(self, step):
+        """跳到上一张/下一张有差异的图片"""
+        if not self.diff_report:
+            self.SetStatusText("请先与另一组标注比较")
+            return
+        index = self.diff_report.next_image(self.current_image_index, step)
+        if index < 0:
+            self.SetStatusText("没有更多有差异的图片")
+            return
+        self.SelectImage(index)
+
+    def OnPrevDiff(self, event):
+        self.JumpToDiff(-1)
+
+    def OnNextDiff(self, event):
+        self.JumpToDiff(1)
+
+    def OnFilterDiffs(self, event):
+        """图片列表只显示有差异的图片"""
+        if not self.diff_report:
+            wx.MessageBox("请先与另一组标注比较", "提示", wx.OK | wx.ICON_INFORMATION)
+            return
+        self.filter_indices = self.diff_report.image_indices
+        self.RefreshImageList()
+        self.SetStatusText(f"筛选: 有差异的图片 - {len(self.filter_indices)}/{len(self.image_files)} 张图片")
+
+    def OnToggleShowCompare(self, event):
+        """显示/隐藏另一组标注的差异"""
+        self.annotation_panel.show_compare = event.IsChecked()
+        self.annotation_panel.Refresh(False)
+
+    def GetDiffText(self, index):
+        """当前图片与另一组标注的差异摘要（用于状态栏）"""
+        if not self.diff_report or index >= self.diff_report.num_images:
+            return ""
+        changes = self.diff_report.changes_for(index)
+        if not changes:
+            return ""
+        import labeldiff
+        return " | 差异: " + " ".join(f"{labeldiff.CHANGE_NAMES[kind]} {n}" for kind, n in changes.items())
+
+    def ExportDataset(self, fmt):
+        """在后台导出 COCO JSON、Pascal VOC XML、训练用的打包格式或目标裁剪图"""
+        import cropexport
+        import labelexport
+        if not self.image_files:
+            wx.MessageBox("没有图片需要导出", "提示", wx.OK | wx.ICON_INFORMATION)
+            return
+        if not self.RequireLabelFiles():
+            return
+        folder_path = self.current_folder or os.path.dirname(self.image_files[0])
+        if fmt == "coco":
+            dlg = wx.FileDialog(self, "导出 COCO JSON", defaultDir=folder_path, defaultFile="annotations.json",
+                                wildcard="JSON 文件 (*.json)|*.json", style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
+        elif fmt == "voc":
+            dlg = wx.DirDialog(self, "选择 VOC XML 输出文件夹", defaultPath=folder_path)
+        elif fmt == "crops":
+            dlg = wx.DirDialog(self, "选择裁剪图输出文件夹（再次导出到同一文件夹时跳过未修改的图片）",
+                               defaultPath=folder_path)
+        else:
+            dlg = wx.DirDialog(self, "选择训练包输出文件夹", defaultPath=folder_path)
+        out_path = dlg.GetPath() if dlg.ShowModal() == wx.ID_OK else None
+        dlg.Destroy()
+        if not out_path:
+            return
+        shard_size = None
+        if fmt == "packed":
+            dlg = wx.NumberEntryDialog(self, "图片 tar 分片大小 (MB)，0 表示只导出标注:", "分片大小",
+                                       "导出训练包", 1024, 0, 100000)
+            if dlg.ShowModal() != wx.ID_OK:
+                dlg.Destroy()
+                return
+            shard_size = dlg.GetValue() * 1024 * 1024 or None
+            dlg.Destroy()
+        crop_size, crop_padding = 224, 10
+        if fmt == "crops":
+            dlg = wx.NumberEntryDialog(self, "裁剪图边长（像素）:", "边长", "导出目标裁剪图", crop_size, 8, 4096)
+            if dlg.ShowModal() != wx.ID_OK:
+                dlg.Destroy()
+                return
+            crop_size = dlg.GetValue()
+            dlg.Destroy()
+            dlg = wx.NumberEntryDialog(self, "框四周扩展的比例 (%):", "扩展", "导出目标裁剪图", crop_padding, 0, 200)
+            if dlg.ShowModal() != wx.ID_OK:
+                dlg.Destroy()
+                return
+            crop_padding = dlg.GetValue()
+            dlg.Destroy()
+
+        if self.annotation_panel.image_path:
+            self.annotation_panel.SaveAnnotations()
+        image_files = list(self.image_files)
+        class_names = list(self.class_names)
+        if fmt == "packed":
+            def export(*args, **kwargs):
+                return labelexport.export_packed(*args, shard_size=shard_size, **kwargs)
+        elif fmt == "crops":
+            def export(*args, **kwargs):
+                return cropexport.export_crops(*args, padding=crop_padding / 100, size=crop_size, **kwargs)
+        else:
+            export = labelexport.export_coco if fmt == "coco" else labelexport.export_voc
+
+        def progress(done, total):
+            wx.CallAfter(self.SetStatusText, f"正在导出... {done}/{total}")
+
+        def run():
+            try:
+                stats, error = export(image_files, class_names, out_path, root=folder_path, progress=progress), None
+            except Exception as e:
+                stats, error = None, e
+            wx.CallAfter(self.OnExportDone, out_path, stats, error)
+
+        self.SetStatusText("正在导出...")
+        threading.Thread(target=run, daemon=True).start()
+
+    def OnExportDone(self, out_path, stats, error):
+        """导出完成"""
+        if error:
+            self.SetStatusText("导出失败")
+            wx.MessageBox(f"导出失败: {str(error)}", "错误", wx.OK | wx.ICON_ERROR)
+            return
+        message = f"导出完成！\n{stats['images']} 张图片，{stats['annotations']} 个框\n{out_path}"
+        if stats['failed']:
+            message += f"\n\n{len(stats['failed'])} 张图片读取失败，例如:\n" + "\n".join(
+                f"{os.path.basename(path)}: {reason}" for path, reason in stats['failed'][:5])
+        self.SetStatusText(f"导出完成: {stats['images']} 张图片")
+        wx.MessageBox(message, "导出成功", wx.OK | wx.ICON_INFORMATION)
+
+    def ImportDataset(self, fmt):
+        """在后台把 COCO JSON 或 Pascal VOC XML 导入为当前文件夹的标注文件"""
+        import labelimport
+        if not self.current_folder:
+            wx.MessageBox("请先导入图片文件夹", "提示", wx.OK | wx.ICON_INFORMATION)
+            return
+        if not self.RequireLabelFiles():
+            return
+        if fmt == "coco":
+            dlg = wx.FileDialog(self, "选择 COCO JSON", wildcard="JSON 文件 (*.json)|*.json",
+                                style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST)
+        else:
+            dlg = wx.DirDialog(self, "选择 VOC XML 文件夹")
+        source = dlg.GetPath() if dlg.ShowModal() == wx.ID_OK else None
+        dlg.Destroy()
+        if not source:
+            return
+        merge = wx.MessageBox("保留已有的标注框？\n选择“否”将覆盖同名图片的标注文件。", "导入",
+                              wx.YES_NO | wx.ICON_QUESTION) == wx.YES
+
+        # 先保存当前图片，导入完成后重新加载
+        if self.annotation_panel.image_path:
+            self.annotation_panel.SaveAnnotations()
+        folder_path = self.current_folder
+
+        def progress(done, total):
+            wx.CallAfter(self.SetStatusText, f"正在导入... {done}/{total}")
+
+        def run():
+            try:
+                if fmt == "coco":
+                    stats = labelimport.import_coco(source, folder_path, merge, progress=progress)
+                else:
+                    stats = labelimport.import_voc(source, folder_path, merge, progress=progress)
+                error = None
+            except Exception as e:
+                stats, error = None, e
+            wx.CallAfter(self.OnImportDone, folder_path, stats, error)
+
+        self.SetStatusText("正在导入...")
+        threading.Thread(target=run, daemon=True).start()
+
+    def OnImportDone(self, folder_path, stats, error):
+        """导入完成：重新加载类别和图片文件夹"""
+        if error:
+            self.SetStatusText("导入失败")
+            wx.MessageBox(f"导入失败: {str(error)}", "错误", wx.OK | wx.ICON_ERROR)
+            return
+        if folder_path == self.current_folder:
+            current_index = self.current_image_index
+            self.LoadClassesFromFile(folder_path)
+            self.UpdateClassList()
+            self.annotation_panel.image_path = None  # 标注文件已被改写，不要再保存旧的标注
+            self.LoadImageFolder(folder_path)
+            if 0 <= current_index < len(self.image_files):
+                self.SelectImage(current_index)
+        message = f"导入完成！\n{stats['images']} 个标注文件，{stats['annotations']} 个框，共 {len(stats['classes'])} 个类别"
+        if stats.get('orphans'):
+            message += f"\n{stats['orphans']} 个框找不到对应图片，已跳过"
+        if stats['failed']:
+            message += f"\n\n{len(stats['failed'])} 个失败，例如:\n" + "\n".join(
+                f"{os.path.basename(path)}: {reason}" for path, reason in stats['failed'][:5])
+        wx.MessageBox(message, "导入成功", wx.OK | wx.ICON_INFORMATION)
+
+    def OnSplitDataset(self, event):
+        """按类别分层划分 train/val/test，生成列表文件或链接以及 data.yaml"""
+        import datasplit
+        if not self.image_files:
+            wx.MessageBox("请先导入图片文件夹", "提示", wx.OK | wx.ICON_INFORMATION)
+            return
+        if not self.RequireLabelFiles():
+            return
+
+        dlg = wx.TextEntryDialog(self, "训练/验证/测试比例:", "划分数据集", "0.8, 0.1, 0.1")
+        text = dlg.GetValue() if dlg.ShowModal() == wx.ID_OK else None
+        dlg.Destroy()
+        if text is None:
+            return
+        try:
+            ratios = [float(x) for x in text.replace("，", ",").split(",")]
+            if len(ratios) != 3:
+                raise ValueError("需要 3 个比例")
+        except ValueError as e:
+            wx.MessageBox(f"比例格式错误: {str(e)}", "错误", wx.OK | wx.ICON_ERROR)
+            return
+
+        modes = ["列表文件（train.txt 等）", "硬链接", "符号链接"]
+        dlg = wx.SingleChoiceDialog(self, "生成方式（均不复制图片）:", "划分数据集", modes)
+        choice = dlg.GetSelection() if dlg.ShowModal() == wx.ID_OK else -1
+        dlg.Destroy()
+        if choice < 0:
+            return
+        mode = datasplit.SPLIT_MODES[choice]
+
+        dlg = wx.DirDialog(self, "选择输出文件夹")
+        out_dir = dlg.GetPath() if dlg.ShowModal() == wx.ID_OK else None
+        dlg.Destroy()
+        if not out_dir:
+            return
+
+        if self.annotation_panel.image_path:
+            self.annotation_panel.SaveAnnotations()
+        image_files = list(self.image_files)
+        class_names = list(self.class_names)
+        self.SetStatusText("正在划分数据集...")
+
+        def run():
+            try:
+                result, error = datasplit.split_dataset(image_files, class_names, out_dir, ratios, mode=mode), None
+            except Exception as e:
+                result, error = None, e
+            wx.CallAfter(self.OnSplitDone, result, error)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def OnSplitDone(self, result, error):
+        """划分完成"""
+        if error:
+            self.SetStatusText("划分失败")
+            wx.MessageBox(f"划分数据集失败: {str(error)}", "错误", wx.OK | wx.ICON_ERROR)
+            return
+        yaml_path, summary = result
+        lines = [f"{name}: {info['images']} 张图片，{sum(info['boxes'].values())} 个框"
+                 for name, info in summary.items()]
+        self.SetStatusText("数据集划分完成")
+        wx.MessageBox("\n".join(lines) + f"\n\n{yaml_path}", "划分完成", wx.OK | wx.ICON_INFORMATION)
+
+    def CanEditClasses(self):
+        """
+        连接标注服务器时不能添加、修改、删除或移动类别：类别编号由服务器管理，
+        本地改动类别列表后保存会把错位的类别ID写到服务器上。
+        """
+        if self.label_store.kind != 'remote':
+            return True
+        wx.MessageBox("连接标注服务器时不能修改类别，请在服务器端修改。", "提示", wx.OK | wx.ICON_INFORMATION)
+        return False
+
     def OnAddClass(self, event):
         """添加新类别"""
+        if not self.CanEditClasses():
+            return
         dlg = wx.TextEntryDialog(self, "输入新类别名称:", "添加类别")
         if dlg.ShowModal() == wx.ID_OK:
             class_name = dlg.GetValue().strip()
@@ -1210,6 +3691,8 @@ class YoloLabelingTool(wx.Frame):
 
     def OnEditClass(self, event):
         """编辑类别"""
+        if not self.CanEditClasses():
+            return
         selection = self.class_list.GetSelection()
         if selection == wx.NOT_FOUND:
             wx.MessageBox("请先选择要编辑的类别", "提示", wx.OK | wx.ICON_INFORMATION)
@@ -1230,44 +3713,28 @@ class YoloLabelingTool(wx.Frame):
                 self.UpdateAnnotationList()
         dlg.Destroy()
 
+    @telemetry.timed("remap")
     def UpdateAllAnnotationFiles(self, id_mapping):
         """更新所有标注文件中的类别ID"""
         if not self.image_files:
             return
 
-        for image_path in self.image_files:
-            # 生成对应的标注文件路径
-            base_name = os.path.splitext(os.path.basename(image_path))[0]
-            txt_path = os.path.join(os.path.dirname(image_path), f"{base_name}.txt")
-
-            if os.path.exists(txt_path):
-                try:
-                    # 读取标注文件
-                    annotations = []
-                    with open(txt_path, 'r') as f:
-                        for line in f:
-                            parts = line.strip().split()
-                            if len(parts) == 5:
-                                class_id = int(parts[0])
-                                bbox = [float(x) for x in parts[1:]]
-                                # 更新类别ID
-                                if class_id in id_mapping:
-                                    new_class_id = id_mapping[class_id]
-                                    annotations.append((new_class_id, bbox))
-                    # 写回文件
-                    if annotations:
-                        with open(txt_path, 'w') as f:
-                            for class_id, bbox in annotations:
-                                f.write(f"{class_id} {bbox[0]:.6f} {bbox[1]:.6f} {bbox[2]:.6f} {bbox[3]:.6f}\n")
-                    else:
-                        # 如果没有标注了，删除标注文件
-                        os.remove(txt_path)
+        # YOLO 文件存储逐个改写文件（没有标注了则删除），SQLite 存储只执行一条 UPDATE
+        try:
+            self.label_store.remap(self.image_files, id_mapping)
+        except Exception as e:
+            print(f"更新标注失败: {e}")
 
-                except Exception as e:
-                    print(f"更新标注文件 {txt_path} 失败: {e}")
+        # 类别索引跟随重映射；仍在构建时重新构建
+        if self.class_index:
+            self.class_index.remap(id_mapping)
+        else:
+            self.StartClassIndexBuild()
 
     def OnDeleteClass(self, event):
         """删除类别"""
+        if not self.CanEditClasses():
+            return
         selection = self.class_list.GetSelection()
         if selection == wx.NOT_FOUND:
             wx.MessageBox("请先选择要删除的类别", "提示", wx.OK | wx.ICON_INFORMATION)
@@ -1328,6 +3795,8 @@ class YoloLabelingTool(wx.Frame):
 
     def OnMoveUp(self, event):
         """上移类别"""
+        if not self.CanEditClasses():
+            return
         selection = self.class_list.GetSelection()
         if selection == wx.NOT_FOUND or selection == 0:
             return
@@ -1358,6 +3827,8 @@ class YoloLabelingTool(wx.Frame):
 
     def OnMoveDown(self, event):
         """下移类别"""
+        if not self.CanEditClasses():
+            return
         selection = self.class_list.GetSelection()
         if selection == wx.NOT_FOUND or selection == self.class_list.GetCount() - 1:
             return
@@ -1450,6 +3921,8 @@ class YoloLabelingTool(wx.Frame):
             prefix = "► " if i == self.annotation_panel.selected_annotation_index else "  "
             self.annotation_list.Append(
                 f"{prefix}{i + 1}. {class_name} ({bbox[0]:.3f}, {bbox[1]:.3f}, {bbox[2]:.3f}, {bbox[3]:.3f})")
+        if self.propagate_boxes:
+            self.SchedulePropagation()
 
     def OnDeleteAnnotation(self, event):
         """删除选中的标注"""
@@ -1511,14 +3984,17 @@ class YoloApp(wx.App):
     def OnInit(self):
         frame = YoloLabelingTool()
         frame.Show()
+        wx.CallAfter(frame.RestoreSession)  # 窗口先显示出来再打开上次的文件夹
         return True
 
 
 if __name__ == '__main__':
-    # 设置 DPI 感知
-    try:
-        ctypes.windll.shcore.SetProcessDpiAwareness(1)  # 1: 系统 DPI 感知, 2: 每个监视器 DPI 感知
-    except Exception:
-        ctypes.windll.user32.SetProcessDPIAware()  # 备用方法
+    # 设置 DPI 感知（只在 Windows 上）
+    if os.name == 'nt':
+        import ctypes
+        try:
+            ctypes.windll.shcore.SetProcessDpiAwareness(1)  # 1: 系统 DPI 感知, 2: 每个监视器 DPI 感知
+        except Exception:
+            ctypes.windll.user32.SetProcessDPIAware()  # 备用方法
     app = YoloApp()
     app.MainLoop()
@@ -0,0 +1,295 @@
+"""
+比较两组 YOLO 标注（例如重新标注前后、自己的标注和外包交付的标注），找出每张图片中框的变化。
+
+两组框不区分类别按 IoU 做最优匹配（有 scipy 时用匈牙利算法，否则按 IoU 从高到低贪心），
+IoU 低于 match_iou 的不算匹配。匹配上的框对:
+    unchanged       类别相同且 IoU >= same_iou
+    moved           类别相同但位置或大小有变化
+    reclassified    类别不同（位置可能也变了）
+A 中没有匹配的框为 removed，B 中没有匹配的框为 added。
+
+一批图片的所有框对一次性生成并计算 IoU，多批图片在进程池中并行。
+一致性指标: 框级 F1（类别也相同才算一致）、匹配框的平均 IoU、匹配框类别的 Cohen's kappa、完全一致的图片比例。
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import labelio
+from labelqa import pair_iou, xywh_to_xyxy
+from predeval import cross_image_pairs
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+CHANGE_KINDS = ('added', 'removed', 'moved', 'reclassified')
+CHANGE_NAMES = {
+    'added': "新增",
+    'removed': "删除",
+    'moved': "移动",
+    'reclassified': "改类别",
+    'unchanged': "不变",
+}
+
+
+def assign(first, second, iou, group):
+    """
+    在候选框对中做一对一匹配，每组（同一张图片）内独立。
+
+    Returns:
+        (np.ndarray): 被选中的候选框对的下标。
+    """
+    if not len(first):
+        return np.empty(0, dtype=np.int64)
+    if linear_sum_assignment is None:
+        # 按 IoU 从高到低贪心
+        chosen = []
+        used_a, used_b = set(), set()
+        for k in np.argsort(-iou, kind='stable'):
+            if first[k] not in used_a and second[k] not in used_b:
+                used_a.add(first[k])
+                used_b.add(second[k])
+                chosen.append(k)
+        return np.sort(np.array(chosen, dtype=np.int64))
+
+    chosen = []
+    order = np.argsort(group, kind='stable')
+    boundaries = np.flatnonzero(np.diff(group[order])) + 1
+    for pairs in np.split(order, boundaries):
+        rows, row_index = np.unique(first[pairs], return_inverse=True)
+        cols, col_index = np.unique(second[pairs], return_inverse=True)
+        if len(pairs) == 1:
+            chosen.append(pairs)
+            continue
+        cost = np.zeros((len(rows), len(cols)))
+        cost[row_index, col_index] = -iou[pairs]
+        pair_of = np.full((len(rows), len(cols)), -1, dtype=np.int64)
+        pair_of[row_index, col_index] = pairs
+        r, c = linear_sum_assignment(cost)
+        selected = pair_of[r, c]
+        chosen.append(selected[selected >= 0])
+    return np.sort(np.concatenate(chosen))
+
+
+def match_boxes(a_classes, a_boxes, a_offsets, b_classes, b_boxes, b_offsets, match_iou=0.3, same_iou=0.9):
+    """
+    匹配一批图片的两组框。
+
+    Returns:
+        (tuple): (A 的匹配对象, B 的匹配对象, 匹配对的 IoU)，匹配对象为另一组中的全局框索引，没有匹配为 -1；
+            IoU 数组与 A 对齐。
+    """
+    a_match = np.full(len(a_classes), -1, dtype=np.int64)
+    b_match = np.full(len(b_classes), -1, dtype=np.int64)
+    a_iou = np.zeros(len(a_classes))
+    if not len(a_classes) or not len(b_classes):
+        return a_match, b_match, a_iou
+    first, second = cross_image_pairs(a_offsets, b_offsets)
+    xyxy = np.concatenate([xywh_to_xyxy(a_boxes.astype(np.float64)), xywh_to_xyxy(b_boxes.astype(np.float64))])
+    iou = pair_iou(xyxy, first, second + len(a_classes))
+    candidate = iou >= match_iou
+    first, second, iou = first[candidate], second[candidate], iou[candidate]
+    group = np.repeat(np.arange(len(a_offsets) - 1), np.diff(a_offsets))[first]
+    chosen = assign(first, second, iou, group)
+    a_match[first[chosen]] = second[chosen]
+    b_match[second[chosen]] = first[chosen]
+    a_iou[first[chosen]] = iou[chosen]
+    return a_match, b_match, a_iou
+
+
+def classify(a_classes, b_classes, a_match, a_iou, same_iou=0.9):
+    """A 中每个框的状态: 'removed' / 'unchanged' / 'moved' / 'reclassified'"""
+    status = np.full(len(a_classes), 'removed', dtype=object)
+    matched = a_match >= 0
+    same_class = np.zeros(len(a_classes), dtype=bool)
+    same_class[matched] = a_classes[matched] == b_classes[a_match[matched]]
+    status[matched & ~same_class] = 'reclassified'
+    status[matched & same_class & (a_iou < same_iou)] = 'moved'
+    status[matched & same_class & (a_iou >= same_iou)] = 'unchanged'
+    return status
+
+
+def diff_chunk(a_classes, a_boxes, a_offsets, b_paths, match_iou, same_iou):
+    """
+    工作进程：读取一批图片的 B 组标注并与 A 组比较。
+
+    Returns:
+        (tuple): (每张图片各类变化数 {kind: 数组}, 匹配框对的 A 类别, B 类别, IoU, 每张图片 A/B 框数, 错误)
+    """
+    b_classes, b_boxes, b_counts, _, errors = labelio.scan_label_chunk(b_paths)
+    b_offsets = np.zeros(len(b_paths) + 1, dtype=np.int64)
+    np.cumsum(b_counts, out=b_offsets[1:])
+    a_match, b_match, a_iou = match_boxes(a_classes, a_boxes, a_offsets, b_classes, b_boxes, b_offsets,
+                                          match_iou, same_iou)
+    status = classify(a_classes, b_classes, a_match, a_iou, same_iou)
+    num_images = len(b_paths)
+    a_image = np.repeat(np.arange(num_images), np.diff(a_offsets))
+    b_image = np.repeat(np.arange(num_images), np.diff(b_offsets))
+    counts = {kind: np.bincount(a_image[status == kind], minlength=num_images)
+              for kind in ('removed', 'moved', 'reclassified', 'unchanged')}
+    counts['added'] = np.bincount(b_image[b_match < 0], minlength=num_images)
+    matched = a_match >= 0
+    return (counts, a_classes[matched], b_classes[a_match[matched]], a_iou[matched],
+            np.diff(a_offsets), np.diff(b_offsets), errors)
+
+
+def cohen_kappa(a_labels, b_labels):
+    """两组类别标签的 Cohen's kappa"""
+    if not len(a_labels):
+        return 1.0
+    labels, inverse = np.unique(np.r_[a_labels, b_labels], return_inverse=True)
+    a_index, b_index = inverse[:len(a_labels)], inverse[len(a_labels):]
+    confusion = np.zeros((len(labels), len(labels)))
+    np.add.at(confusion, (a_index, b_index), 1)
+    total = confusion.sum()
+    observed = np.trace(confusion) / total
+    expected = float((confusion.sum(axis=0) * confusion.sum(axis=1)).sum()) / total ** 2
+    return 1.0 if expected >= 1.0 else (observed - expected) / (1.0 - expected)
+
+
+class DiffReport:
+    """比较结果，图片以 image_files 中的序号表示"""
+
+    def __init__(self, counts, a_counts, b_counts, matched_a, matched_b, matched_iou, errors=None):
+        self.counts = counts
+        self.a_counts = a_counts
+        self.b_counts = b_counts
+        self.matched_a = matched_a
+        self.matched_b = matched_b
+        self.matched_iou = matched_iou
+        self.errors = errors or {}
+        changed = np.zeros(len(a_counts), dtype=bool)
+        for kind in CHANGE_KINDS:
+            changed |= counts[kind] > 0
+        self.image_indices = np.flatnonzero(changed)
+
+    @property
+    def num_images(self):
+        return len(self.a_counts)
+
+    def changes_for(self, index):
+        """某张图片各类变化的数量（只包含非 0 的）"""
+        return {kind: int(self.counts[kind][index]) for kind in CHANGE_KINDS if self.counts[kind][index]}
+
+    def next_image(self, current, step=1):
+        """current 之后（step=-1 时为之前）第一张有差异的图片，没有时返回 -1"""
+        if step > 0:
+            position = np.searchsorted(self.image_indices, current, side='right')
+            return int(self.image_indices[position]) if position < len(self.image_indices) else -1
+        position = np.searchsorted(self.image_indices, current, side='left') - 1
+        return int(self.image_indices[position]) if position >= 0 else -1
+
+    def agreement(self):
+        """一致性指标"""
+        agreed = int(self.counts['unchanged'].sum() + self.counts['moved'].sum())
+        total = int(self.a_counts.sum() + self.b_counts.sum())
+        return {
+            'f1': 2 * agreed / total if total else 1.0,
+            'mean_iou': float(self.matched_iou.mean()) if len(self.matched_iou) else 1.0,
+            'kappa': cohen_kappa(self.matched_a, self.matched_b),
+            'identical_images': 1.0 - len(self.image_indices) / max(self.num_images, 1),
+        }
+
+    def summary(self):
+        """多行文字摘要"""
+        metrics = self.agreement()
+        lines = [f"有差异的图片: {len(self.image_indices)}/{self.num_images}",
+                 f"框: A {int(self.a_counts.sum())}  B {int(self.b_counts.sum())}"]
+        for kind in CHANGE_KINDS + ('unchanged',):
+            lines.append(f"  {CHANGE_NAMES[kind]}: {int(self.counts[kind].sum())}")
+        lines.append(f"一致性: F1 {metrics['f1']:.4f}  平均 IoU {metrics['mean_iou']:.4f}  "
+                     f"类别 kappa {metrics['kappa']:.4f}  完全一致的图片 {metrics['identical_images']:.2%}")
+        if self.errors:
+            lines.append(f"读取失败的标注文件: {len(self.errors)}")
+        return "\n".join(lines)
+
+
+def diff_labels(table, b_paths, match_iou=0.3, same_iou=0.9, workers=None, chunk_size=2048):
+    """
+    并行比较 A 组标注（labelio.LabelTable）和 B 组标注文件。
+
+    Args:
+        b_paths (list): 与 table 中图片一一对应的 B 组标注文件路径。
+
+    Returns:
+        (DiffReport): 比较结果。
+    """
+    chunks = []
+    for start in range(0, len(b_paths), chunk_size):
+        stop = min(start + chunk_size, len(b_paths))
+        lo, hi = table.offsets[start], table.offsets[stop]
+        chunks.append((table.classes[lo:hi], table.boxes[lo:hi], table.offsets[start:stop + 1] - lo,
+                       b_paths[start:stop], match_iou, same_iou))
+    if len(chunks) <= 1 or workers == 1:
+        results = [diff_chunk(*chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(diff_chunk, *chunk) for chunk in chunks]
+            results = [future.result() for future in futures]
+
+    def gather(values, dtype):
+        return np.concatenate(values) if values else np.empty(0, dtype)
+
+    counts = {kind: gather([r[0][kind] for r in results], np.int64) for kind in CHANGE_KINDS + ('unchanged',)}
+    errors = {}
+    for chunk_index, r in enumerate(results):
+        for i, message in r[6].items():
+            errors[chunk_index * chunk_size + i] = message
+    return DiffReport(counts, gather([r[4] for r in results], np.int64), gather([r[5] for r in results], np.int64),
+                      gather([r[1] for r in results], np.int32), gather([r[2] for r in results], np.int32),
+                      gather([r[3] for r in results], np.float64), errors)
+
+
+def diff_image(a_annotations, b_annotations, match_iou=0.3, same_iou=0.9):
+    """
+    单张图片（界面上当前编辑中的标注与另一组比较）。
+
+    Returns:
+        (list, list): A 中每个框的状态，B 中每个框的状态（B 中匹配上的框与对应 A 框的状态相同，其余为 'added'）。
+    """
+    def arrays(annotations):
+        classes = np.array([ann['class'] for ann in annotations], dtype=np.int64)
+        boxes = np.array([ann['bbox'] for ann in annotations], dtype=np.float64).reshape(-1, 4)
+        return classes, boxes, np.array([0, len(annotations)])
+
+    a_classes, a_boxes, a_offsets = arrays(a_annotations)
+    b_classes, b_boxes, b_offsets = arrays(b_annotations)
+    a_match, b_match, a_iou = match_boxes(a_classes, a_boxes, a_offsets, b_classes, b_boxes, b_offsets,
+                                          match_iou, same_iou)
+    a_status = classify(a_classes, b_classes, a_match, a_iou, same_iou)
+    b_status = [a_status[a] if a >= 0 else 'added' for a in b_match]
+    return list(a_status), b_status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比较两组 YOLO 标注，列出新增/删除/移动/改类别的框和一致性指标")
+    parser.add_argument("folder", help="图片文件夹（A 组标注与图片同目录，或在对应的 labels/ 目录中）")
+    parser.add_argument("other", help="B 组标注文件夹（结构与 A 组标注目录相同、同名的 .txt）")
+    parser.add_argument("--match-iou", type=float, default=0.3, help="IoU 低于该值的框不算匹配")
+    parser.add_argument("--same-iou", type=float, default=0.9, help="IoU 不低于该值的同类别框视为不变")
+    parser.add_argument("--list", type=int, default=20, help="列出有差异的图片数")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--recursive", action="store_true", help="包括子文件夹")
+    args = parser.parse_args(argv)
+
+    image_files = labelio.list_image_files(args.folder, args.recursive)
+    if not image_files:
+        print(f"没有找到图片: {args.folder}")
+        return 1
+    table = labelio.scan_labels(image_files, workers=args.workers)
+    b_paths = labelio.mirrored_label_paths(args.other, image_files, args.folder)
+    report = diff_labels(table, b_paths, args.match_iou, args.same_iou, args.workers)
+    print(report.summary())
+    for i in report.image_indices[:args.list]:
+        changes = "  ".join(f"{CHANGE_NAMES[kind]} {n}" for kind, n in report.changes_for(i).items())
+        print(f"  {os.path.basename(image_files[i])}: {changes}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
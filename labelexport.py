@@ -0,0 +1,526 @@
+"""
+标注导出：COCO JSON（流式写出）、Pascal VOC XML 和训练用的打包格式。
+
+图片尺寸只读取文件头，和标注一起由进程池按批读取；主进程按批把相对坐标向量化换算为像素坐标后立即写出，
+同一时间只有少量批次在内存中，内存占用与图片总数无关。
+
+打包格式（输出文件夹，训练时用 load_packed 以 mmap 方式打开，不需要解析任何文本）:
+    labels.npy      float32 (框总数, 5)，每行 class cx cy w h，按图片顺序拼接
+    offsets.npy     int64 (图片数 + 1)，第 i 张图片的框为 labels[offsets[i]:offsets[i + 1]]
+    sizes.npy       int32 (图片数, 2)，图片的 (宽, 高)，读取失败为 0
+    index.json      图片相对路径、类别名称、分片文件名
+    shard-NNNNNN.tar        （可选）图片按文件大小分成约 shard_size 字节的 tar 分片，成员名为 <图片序号>.<扩展名>；
+                            视频帧按每个视频抽一帧编码后的大小估计
+    shard_index.npy         （可选）int64 (图片数, 3)，每张图片所在分片、数据在 tar 中的偏移和长度，
+                            可以直接 mmap tar 文件读取，分片由工作进程并行写出
+
+命令行用法:
+    python labelexport.py coco <图片文件夹> --out annotations.json
+    python labelexport.py voc <图片文件夹> --out Annotations
+    python labelexport.py packed <图片文件夹> --out packed [--shard-size 1024]
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import struct
+import sys
+import tarfile
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+import imagesource
+import labelio
+from imagecodec import decode_rgb, encode_jpeg, read_image_size
+
+NPY_HEADER_SIZE = 128  # 预留的 .npy 头长度，流式写完后再填入实际的形状
+
+
+def read_export_chunk(image_paths, label_paths):
+    """
+    工作进程：读取一批图片的尺寸和标注。
+
+    Returns:
+        (tuple): (尺寸 int64 (N, 2)，读取失败为 0, 类别, 框, 每张图片框数, 错误 {批内序号: 信息})
+    """
+    sizes = np.zeros((len(image_paths), 2), dtype=np.int64)
+    errors = {}
+    for i, path in enumerate(image_paths):
+        try:
+            sizes[i] = read_image_size(path)
+        except Exception as e:
+            errors[i] = f"读取图片尺寸失败: {e}"
+    classes, boxes, counts, skipped, label_errors = labelio.scan_label_chunk(label_paths)
+    for i, message in label_errors.items():
+        errors.setdefault(i, f"读取标注失败: {message}")
+    return sizes, classes, boxes, counts, errors
+
+
+def iter_chunks(func, chunks, workers=None):
+    """按顺序返回 func(*chunk) 的结果；同时只保留少量批次在进程池中，避免结果堆积在内存里"""
+    if len(chunks) <= 1 or workers == 1:
+        for chunk in chunks:
+            yield func(*chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        window = 2 * (workers or os.cpu_count() or 1)
+        futures = [executor.submit(func, *chunk) for chunk in chunks[:window]]
+        for i in range(len(chunks)):
+            result = futures[i].result()
+            futures[i] = None
+            if i + window < len(chunks):
+                futures.append(executor.submit(func, *chunks[i + window]))
+            yield result
+
+
+def to_pixel_boxes(boxes, sizes):
+    """相对 (cx, cy, w, h) -> 像素 (x1, y1, x2, y2)，裁剪到图片范围内；sizes 为每个框所在图片的 (宽, 高)"""
+    boxes = boxes.astype(np.float64)
+    scale = np.concatenate([sizes, sizes], axis=1).astype(np.float64)
+    half = boxes[:, 2:4] / 2
+    xyxy = np.concatenate([boxes[:, 0:2] - half, boxes[:, 0:2] + half], axis=1) * scale
+    return np.clip(xyxy, 0, scale)
+
+
+def class_name_for(class_names, class_id):
+    """类别名称，类别ID不在列表中时与界面一致显示为 "Class N" """
+    return class_names[class_id] if 0 <= class_id < len(class_names) else f"Class {class_id}"
+
+
+def _make_chunks(image_files, chunk_size, label_path, *extra):
+    chunks = []
+    for start in range(0, len(image_files), chunk_size):
+        paths = image_files[start:start + chunk_size]
+        chunks.append((paths, [label_path(p) for p in paths]) + extra)
+    return chunks
+
+
+def export_coco(image_files, class_names, out_path, root=None, workers=None, chunk_size=1024,
+                label_path=labelio.label_path_for, progress=None):
+    """
+    导出 COCO JSON。
+
+    images 直接写入输出文件，annotations 先写入同目录的临时文件，最后拼接；categories 放在最后，
+    这样标注中出现的、classes.txt 里没有的类别ID也能写进去。输出先写临时文件再替换，中途失败不会留下半个文件。
+
+    Args:
+        root (str, optional): file_name 相对的目录，默认为第一张图片所在目录。
+        progress (callable, optional): progress(已处理图片数, 总数)。
+
+    Returns:
+        (dict): {'images', 'annotations', 'failed': [(图片路径, 错误信息)]}
+    """
+    if root is None:
+        root = os.path.dirname(image_files[0]) if image_files else "."
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    os.makedirs(out_dir, exist_ok=True)
+    chunks = _make_chunks(image_files, chunk_size, label_path)
+    stats = {'images': 0, 'annotations': 0, 'failed': []}
+    seen_classes = set()
+    temp_path = out_path + ".tmp"
+
+    with open(temp_path, "w", encoding="utf-8") as out, \
+            tempfile.TemporaryFile("w+", encoding="utf-8", dir=out_dir) as spool:
+        out.write('{"info": {"description": "LabelBridge export"}, "licenses": [],\n"images": [')
+        first_image = first_annotation = True
+        for chunk_index, (sizes, classes, boxes, counts, errors) in enumerate(iter_chunks(
+                read_export_chunk, chunks, workers)):
+            start = chunk_index * chunk_size
+            paths = chunks[chunk_index][0]
+            for i, message in errors.items():
+                stats['failed'].append((paths[i], message))
+            valid = (sizes[:, 0] > 0) & (sizes[:, 1] > 0)
+
+            for i in np.flatnonzero(valid):
+                file_name = os.path.relpath(paths[i], root).replace(os.sep, "/")
+                out.write(f'{"" if first_image else ","}\n{{"id": {start + i + 1}, '
+                          f'"file_name": {json.dumps(file_name, ensure_ascii=False)}, '
+                          f'"width": {sizes[i, 0]}, "height": {sizes[i, 1]}}}')
+                first_image = False
+            stats['images'] += int(valid.sum())
+            if progress:
+                progress(min(start + chunk_size, len(image_files)), len(image_files))
+
+            # 没有尺寸的图片无法换算坐标，连同其标注一起跳过
+            image_of_box = np.repeat(np.arange(len(paths)), counts)
+            keep = valid[image_of_box]
+            image_of_box, classes, boxes = image_of_box[keep], classes[keep], boxes[keep]
+            if not len(classes):
+                continue
+            xyxy = to_pixel_boxes(boxes, sizes[image_of_box])
+            wh = xyxy[:, 2:4] - xyxy[:, 0:2]
+            rows = zip((image_of_box + start + 1).tolist(), (classes.astype(np.int64) + 1).tolist(),
+                       np.round(xyxy[:, 0:2], 2).tolist(), np.round(wh, 2).tolist(),
+                       np.round(wh[:, 0] * wh[:, 1], 2).tolist())
+            lines = []
+            for image_id, category_id, (x, y), (w, h), area in rows:
+                stats['annotations'] += 1
+                lines.append(f'{"" if first_annotation else ","}\n{{"id": {stats["annotations"]}, '
+                             f'"image_id": {image_id}, "category_id": {category_id}, '
+                             f'"bbox": [{x}, {y}, {w}, {h}], "area": {area}, "iscrowd": 0}}')
+                first_annotation = False
+            spool.write("".join(lines))
+            seen_classes.update(np.unique(classes).tolist())
+
+        out.write('\n],\n"annotations": [')
+        spool.seek(0)
+        shutil.copyfileobj(spool, out)
+        categories = [{'id': class_id + 1, 'name': class_name_for(class_names, class_id), 'supercategory': ""}
+                      for class_id in sorted(seen_classes | set(range(len(class_names))))]
+        out.write('\n],\n"categories": ')
+        json.dump(categories, out, ensure_ascii=False)
+        out.write('}\n')
+    os.replace(temp_path, out_path)
+    return stats
+
+
+def format_voc(image_path, size, classes, xyxy, class_names, root):
+    """生成一张图片的 VOC XML（坐标从 1 开始，取整）"""
+    width, height = int(size[0]), int(size[1])
+    lines = ["<annotation>",
+             f"  <folder>{escape(os.path.basename(os.path.dirname(image_path)))}</folder>",
+             f"  <filename>{escape(os.path.basename(image_path))}</filename>",
+             f"  <path>{escape(os.path.relpath(image_path, root))}</path>",
+             "  <size>",
+             f"    <width>{width}</width>",
+             f"    <height>{height}</height>",
+             "    <depth>3</depth>",
+             "  </size>",
+             "  <segmented>0</segmented>"]
+    pixels = np.rint(xyxy).astype(np.int64)
+    pixels[:, 0:2] += 1
+    pixels[:, [0, 2]] = np.clip(pixels[:, [0, 2]], 1, max(width, 1))
+    pixels[:, [1, 3]] = np.clip(pixels[:, [1, 3]], 1, max(height, 1))
+    pixels[:, 2:4] = np.maximum(pixels[:, 2:4], pixels[:, 0:2])
+    for class_id, (xmin, ymin, xmax, ymax) in zip(classes.tolist(), pixels.tolist()):
+        lines += ["  <object>",
+                  f"    <name>{escape(class_name_for(class_names, class_id))}</name>",
+                  "    <pose>Unspecified</pose>",
+                  "    <truncated>0</truncated>",
+                  "    <difficult>0</difficult>",
+                  "    <bndbox>",
+                  f"      <xmin>{xmin}</xmin>",
+                  f"      <ymin>{ymin}</ymin>",
+                  f"      <xmax>{xmax}</xmax>",
+                  f"      <ymax>{ymax}</ymax>",
+                  "    </bndbox>",
+                  "  </object>"]
+    lines.append("</annotation>\n")
+    return "\n".join(lines)
+
+
+def export_voc_chunk(image_paths, label_paths, class_names, out_dir, root):
+    """工作进程：为一批图片各写一个 VOC XML，返回 (写出的文件数, 框数, 失败列表)"""
+    sizes, classes, boxes, counts, errors = read_export_chunk(image_paths, label_paths)
+    offsets = np.zeros(len(image_paths) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    image_of_box = np.repeat(np.arange(len(image_paths)), counts)
+    xyxy = to_pixel_boxes(boxes, sizes[image_of_box])
+    written = 0
+    failed = [(image_paths[i], message) for i, message in errors.items()]
+    for i, image_path in enumerate(image_paths):
+        if sizes[i, 0] <= 0 or sizes[i, 1] <= 0:
+            continue
+        lo, hi = offsets[i], offsets[i + 1]
+        xml = format_voc(image_path, sizes[i], classes[lo:hi], xyxy[lo:hi], class_names, root)
+        relative = os.path.splitext(os.path.relpath(image_path, root))[0]
+        xml_path = os.path.join(out_dir, relative + ".xml")
+        os.makedirs(os.path.dirname(xml_path), exist_ok=True)
+        try:
+            with open(xml_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(xml)
+            os.replace(xml_path + ".tmp", xml_path)
+            written += 1
+        except OSError as e:
+            failed.append((image_path, f"写入 {xml_path} 失败: {e}"))
+    return written, int(len(classes)), failed
+
+
+def export_voc(image_files, class_names, out_dir, root=None, workers=None, chunk_size=512,
+               label_path=labelio.label_path_for, progress=None):
+    """
+    导出 Pascal VOC XML，每张图片一个文件（保持相对 root 的子目录结构），由工作进程并行写出。
+
+    Returns:
+        (dict): {'images', 'annotations', 'failed': [(图片路径, 错误信息)]}
+    """
+    if root is None:
+        root = os.path.dirname(image_files[0]) if image_files else "."
+    os.makedirs(out_dir, exist_ok=True)
+    chunks = _make_chunks(image_files, chunk_size, label_path, list(class_names), out_dir, root)
+    stats = {'images': 0, 'annotations': 0, 'failed': []}
+    for chunk_index, (written, box_count, failed) in enumerate(iter_chunks(export_voc_chunk, chunks, workers)):
+        stats['images'] += written
+        stats['annotations'] += box_count
+        stats['failed'].extend(failed)
+        if progress:
+            progress(min((chunk_index + 1) * chunk_size, len(image_files)), len(image_files))
+    return stats
+
+
+def npy_header(dtype, shape, size=NPY_HEADER_SIZE):
+    """固定长度的 .npy 1.0 文件头（形状可以在数据写完后改写而不移动数据）"""
+    header = repr({'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False,
+                   'shape': tuple(shape)})
+    header = header.ljust(size - 10 - 1) + "\n"
+    if len(header) + 10 != size:
+        raise ValueError(f"形状太大，.npy 文件头超过 {size} 字节: {shape}")
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+class NpyWriter:
+    """按行追加写出 .npy 文件，关闭时填入实际行数；先写临时文件，完成后再替换"""
+
+    def __init__(self, path, dtype, row_shape=()):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.rows = 0
+        self.f = open(path + ".tmp", "wb")
+        self.f.write(npy_header(self.dtype, (0,) + self.row_shape))
+
+    def append(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype).reshape((-1,) + self.row_shape)
+        self.f.write(values.tobytes())
+        self.rows += len(values)
+
+    def close(self):
+        self.f.seek(0)
+        self.f.write(npy_header(self.dtype, (self.rows,) + self.row_shape))
+        self.f.close()
+        os.replace(self.path + ".tmp", self.path)
+
+    def abort(self):
+        self.f.close()
+        os.remove(self.path + ".tmp")
+
+
+def read_image_bytes(path):
+    """图片文件的原始字节和扩展名；视频帧解码后编码为 JPEG"""
+    if labelio.split_frame_path(path):
+        return encode_jpeg(decode_rgb(path)[0], quality=95), ".jpg"
+    return imagesource.read_image(path), os.path.splitext(path)[1].lower()
+
+
+def write_shard_chunk(image_paths, first_index, shard_path):
+    """
+    工作进程：把一批图片写成一个 tar 分片。
+
+    Returns:
+        (np.ndarray, list): int64 (N, 2) 每张图片数据在 tar 中的偏移和长度（失败为 -1），失败列表。
+    """
+    locations = np.full((len(image_paths), 2), -1, dtype=np.int64)
+    failed = []
+    with tarfile.open(shard_path + ".tmp", "w", format=tarfile.USTAR_FORMAT) as tar:
+        for i, path in enumerate(image_paths):
+            try:
+                data, ext = read_image_bytes(path)
+            except Exception as e:
+                failed.append((path, f"读取图片失败: {e}"))
+                continue
+            info = tarfile.TarInfo(f"{first_index + i:09d}{ext}")
+            info.size = len(data)
+            info.mtime = 0
+            locations[i] = (tar.offset + tarfile.BLOCKSIZE, len(data))  # 短文件名的 USTAR 头正好一个块
+            tar.addfile(info, io.BytesIO(data))
+    os.replace(shard_path + ".tmp", shard_path)
+    return locations, failed
+
+
+def image_file_size(path, frame_sizes=None):
+    """
+    图片文件的大小（压缩包内的图片为成员的原始大小，对象存储中的图片为对象大小）。
+
+    视频帧没有单独的文件，按同一视频中第一次遇到的那一帧编码为 JPEG 后的大小估计，
+    frame_sizes 保存每个视频的估计值（视频路径 -> 字节数），每个视频只编码一帧。
+    """
+    frame = labelio.split_frame_path(path)
+    if frame:
+        frame_sizes = {} if frame_sizes is None else frame_sizes
+        size = frame_sizes.get(frame[0])
+        if size is None:
+            try:
+                size = len(read_image_bytes(path)[0])
+            except Exception:
+                size = 0  # 读不出来的帧写分片时同样失败，不占分片的空间
+            frame_sizes[frame[0]] = size
+        return size
+    if labelio.split_archive_path(path):
+        import archivesource
+        return archivesource.member_size(path)
+    return imagesource.stat(path).st_size
+
+
+def plan_shards(image_files, shard_size):
+    """按文件大小把图片依次分组，每组的总大小不超过 shard_size（单张超过的图片单独成组），返回每组的起始序号"""
+    frame_sizes = {}
+    sizes = np.array([image_file_size(p, frame_sizes) for p in image_files], dtype=np.int64)
+    starts = [0]
+    total = 0
+    for i, size in enumerate(sizes.tolist()):
+        if total and total + size > shard_size:
+            starts.append(i)
+            total = 0
+        total += size
+    return starts
+
+
+def export_packed(image_files, class_names, out_dir, root=None, workers=None, chunk_size=2048,
+                  label_path=labelio.label_path_for, progress=None, shard_size=None):
+    """
+    导出训练用的打包格式（见模块说明）。标注按批扫描后立即追加到 labels.npy，内存占用与图片总数无关。
+
+    Args:
+        shard_size (int, optional): 每个 tar 分片的目标字节数，None 时不打包图片。
+
+    Returns:
+        (dict): {'images', 'annotations', 'shards', 'failed': [(图片路径, 错误信息)]}
+    """
+    if root is None:
+        root = os.path.dirname(image_files[0]) if image_files else "."
+    os.makedirs(out_dir, exist_ok=True)
+    chunks = _make_chunks(image_files, chunk_size, label_path)
+    stats = {'images': len(image_files), 'annotations': 0, 'shards': 0, 'failed': []}
+    total_steps = len(image_files) * (2 if shard_size else 1)
+
+    labels = NpyWriter(os.path.join(out_dir, "labels.npy"), np.float32, (5,))
+    offsets = NpyWriter(os.path.join(out_dir, "offsets.npy"), np.int64)
+    sizes = NpyWriter(os.path.join(out_dir, "sizes.npy"), np.int32, (2,))
+    try:
+        offsets.append([0])
+        for chunk_index, (chunk_sizes, classes, boxes, counts, errors) in enumerate(iter_chunks(
+                read_export_chunk, chunks, workers)):
+            paths = chunks[chunk_index][0]
+            for i, message in errors.items():
+                stats['failed'].append((paths[i], message))
+            labels.append(np.concatenate([classes[:, None].astype(np.float32), boxes], axis=1))
+            offsets.append(stats['annotations'] + np.cumsum(counts, dtype=np.int64))
+            sizes.append(chunk_sizes)
+            stats['annotations'] += len(classes)
+            if progress:
+                progress(min((chunk_index + 1) * chunk_size, len(image_files)), total_steps)
+    except BaseException:
+        for writer in (labels, offsets, sizes):
+            writer.abort()
+        raise
+    for writer in (labels, offsets, sizes):
+        writer.close()
+
+    shard_names = []
+    if shard_size:
+        starts = plan_shards(image_files, shard_size)
+        bounds = list(zip(starts, starts[1:] + [len(image_files)]))
+        shard_names = [f"shard-{n:06d}.tar" for n in range(len(bounds))]
+        shard_chunks = [(image_files[lo:hi], lo, os.path.join(out_dir, name))
+                        for (lo, hi), name in zip(bounds, shard_names)]
+        shard_index = np.full((len(image_files), 3), -1, dtype=np.int64)
+        for n, (locations, failed) in enumerate(iter_chunks(write_shard_chunk, shard_chunks, workers)):
+            lo, hi = bounds[n]
+            shard_index[lo:hi, 0] = np.where(locations[:, 0] >= 0, n, -1)
+            shard_index[lo:hi, 1:] = locations
+            stats['failed'].extend(failed)
+            if progress:
+                progress(len(image_files) + hi, total_steps)
+        np.save(os.path.join(out_dir, "shard_index.npy"), shard_index)
+        stats['shards'] = len(shard_names)
+
+    index = {
+        'version': 1,
+        'num_images': len(image_files),
+        'num_boxes': stats['annotations'],
+        'columns': ["class", "cx", "cy", "w", "h"],
+        'class_names': list(class_names),
+        'images': [os.path.relpath(p, root).replace(os.sep, "/") for p in image_files],
+        'shards': shard_names,
+    }
+    labelio.write_text_atomic(os.path.join(out_dir, "index.json"), json.dumps(index, ensure_ascii=False))
+    return stats
+
+
+class PackedLabels:
+    """
+    以 mmap 方式打开 export_packed 的输出。
+
+    labels[i] 返回第 i 张图片的 (类别 int64, 框 float32 (N, 4))，框为 mmap 数组的视图，不复制数据；
+    image_bytes(i) 从 tar 分片中直接读出图片字节。
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.labels = np.load(os.path.join(folder, "labels.npy"), mmap_mode='r')
+        self.offsets = np.load(os.path.join(folder, "offsets.npy"), mmap_mode='r')
+        self.sizes = np.load(os.path.join(folder, "sizes.npy"), mmap_mode='r')
+        with open(os.path.join(folder, "index.json"), encoding="utf-8") as f:
+            self.index = json.load(f)
+        shard_index_path = os.path.join(folder, "shard_index.npy")
+        self.shard_index = np.load(shard_index_path, mmap_mode='r') if os.path.exists(shard_index_path) else None
+        self._shards = {}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        rows = self.labels[self.offsets[i]:self.offsets[i + 1]]
+        return rows[:, 0].astype(np.int64), rows[:, 1:5]
+
+    def image_bytes(self, i):
+        if self.shard_index is None or self.shard_index[i, 0] < 0:
+            raise KeyError(f"第 {i} 张图片没有打包")
+        shard, offset, length = (int(v) for v in self.shard_index[i])
+        data = self._shards.get(shard)
+        if data is None:
+            data = self._shards[shard] = np.memmap(os.path.join(self.folder, self.index['shards'][shard]),
+                                                   dtype=np.uint8, mode='r')
+        return bytes(data[offset:offset + length])
+
+
+def load_packed(folder):
+    """打开 export_packed 的输出"""
+    return PackedLabels(folder)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导出 YOLO 标注为 COCO JSON、Pascal VOC XML 或训练用的打包格式")
+    parser.add_argument("format", choices=("coco", "voc", "packed"), help="导出格式")
+    parser.add_argument("folder", help="图片文件夹（标注文件与图片同目录）、zip/tar 压缩包或对象存储前缀 (http(s):// 或 s3://)")
+    parser.add_argument("--out", required=True, help="COCO 为输出 JSON 文件，VOC 和打包格式为输出目录")
+    parser.add_argument("--classes", help="类别文件，默认为图片文件夹下的 classes.txt")
+    parser.add_argument("--shard-size", type=float, default=None, help="打包格式: 图片 tar 分片大小 (MB)，默认不打包图片")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--recursive", action="store_true",
+                        help="包括子文件夹（YOLO 的 images/、labels/ 布局中标注从 labels/ 下对应的位置读取）")
+    args = parser.parse_args(argv)
+
+    args.folder = imagesource.normalize_url(args.folder)
+    image_files = imagesource.list_images(args.folder, args.recursive)
+    if not image_files:
+        print(f"没有找到图片: {args.folder}")
+        return 1
+    classes_path = args.classes or os.path.join(labelio.label_folder_for(args.folder), "classes.txt")
+    class_names = labelio.read_class_names(classes_path) if os.path.exists(classes_path) else []
+
+    def progress(done, total):
+        print(f"\r{done}/{total}", end="", file=sys.stderr)
+
+    if args.format == "packed":
+        shard_size = int(args.shard_size * 1024 * 1024) if args.shard_size else None
+        stats = export_packed(image_files, class_names, args.out, root=args.folder, workers=args.workers,
+                              progress=progress, shard_size=shard_size)
+    else:
+        export = export_coco if args.format == "coco" else export_voc
+        stats = export(image_files, class_names, args.out, root=args.folder, workers=args.workers, progress=progress)
+    print(file=sys.stderr)
+    print(f"导出 {stats['images']} 张图片、{stats['annotations']} 个框 -> {args.out}")
+    for path, message in stats['failed'][:20]:
+        print(f"  {path}: {message}")
+    if len(stats['failed']) > 20:
+        print(f"  ... 共 {len(stats['failed'])} 张图片失败")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
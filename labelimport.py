@@ -0,0 +1,433 @@
+"""
+把 COCO JSON / Pascal VOC XML 标注导入为 YOLO 标注文件（与图片同名的 .txt）。
+
+COCO 文件可能有几个 GB，不能整体 json.load：这里逐个元素增量解析 images / annotations / categories 数组，
+图片和标注按 image_id 取模分区溢写到临时目录，解析完后每个分区由一个工作进程读回、按 image_id 分组、
+用 NumPy 归一化坐标，再原子写出标注文件。内存占用只与单个分区的大小有关。
+
+类别按名称合并进图片文件夹下的 classes.txt（已有类别保持原ID，新类别追加在末尾）。
+
+命令行用法:
+    python labelimport.py coco annotations.json --images <图片文件夹> [--merge]
+    python labelimport.py voc <XML 文件夹> --images <图片文件夹> [--merge]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import labelio
+from imagecodec import read_image_size
+
+# 溢写的标注记录: image_id, category_id, x, y, w, h
+ANNOTATION_FIELDS = 6
+
+
+class JsonStream:
+    """在文本流上增量解析 JSON：每次只解码一个值，缓冲区只保存尚未解析的部分"""
+
+    def __init__(self, f, block_size=1 << 20):
+        self.f = f
+        self.block_size = block_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        data = self.f.read(self.block_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """跳过空白，返回下一个字符（结束时返回空字符串）"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"JSON 格式错误: 期望 {char!r}，实际为 {found!r}")
+        self.pos += 1
+
+    def value(self):
+        """解码下一个完整的值；值跨越缓冲区末尾时继续读取"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # 数字可能被缓冲区截断，只有后面还有内容时才能确定已经完整
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def iter_coco(f, keys=("images", "annotations", "categories")):
+    """逐个返回顶层数组 keys 中的元素 (key, 元素)；其它顶层字段被跳过"""
+    stream = JsonStream(f)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key in keys and stream.peek() == "[":
+            stream.pos += 1
+            if stream.peek() == "]":
+                stream.pos += 1
+            else:
+                while True:
+                    yield key, stream.value()
+                    separator = stream.peek()
+                    stream.pos += 1
+                    if separator == "]":
+                        break
+                    if separator != ",":
+                        raise ValueError(f"JSON 格式错误: {key} 数组中出现 {separator!r}")
+        else:
+            stream.value()
+        separator = stream.peek()
+        stream.pos += 1
+        if separator == "}":
+            return
+        if separator != ",":
+            raise ValueError(f"JSON 格式错误: 顶层出现 {separator!r}")
+
+
+class PartitionSpool:
+    """按 image_id 取模分区溢写图片和标注，缓冲满 buffer_rows 条标注时写盘"""
+
+    def __init__(self, directory, partitions=64, buffer_rows=1 << 18):
+        self.directory = directory
+        self.partitions = partitions
+        self.buffer_rows = buffer_rows
+        self.rows = []
+        self.images = [[] for _ in range(partitions)]
+        self.buffered_images = 0
+
+    def annotation_path(self, partition):
+        return os.path.join(self.directory, f"ann_{partition:03d}.bin")
+
+    def image_path(self, partition):
+        return os.path.join(self.directory, f"img_{partition:03d}.jsonl")
+
+    def add_image(self, image):
+        image_id = int(image["id"])
+        record = [image_id, image.get("file_name", ""), image.get("width") or 0, image.get("height") or 0]
+        self.images[image_id % self.partitions].append(json.dumps(record, ensure_ascii=False))
+        self.buffered_images += 1
+        if self.buffered_images >= self.buffer_rows:
+            self.flush_images()
+
+    def add_annotation(self, image_id, category_id, bbox):
+        self.rows.append((image_id, category_id, *bbox[:4]))
+        if len(self.rows) >= self.buffer_rows:
+            self.flush_annotations()
+
+    def flush_images(self):
+        for partition, lines in enumerate(self.images):
+            if lines:
+                with open(self.image_path(partition), "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+                lines.clear()
+        self.buffered_images = 0
+
+    def flush_annotations(self):
+        if not self.rows:
+            return
+        rows = np.array(self.rows, dtype=np.float64)
+        self.rows = []
+        partition_of = rows[:, 0].astype(np.int64) % self.partitions
+        order = np.argsort(partition_of, kind="stable")
+        rows, partition_of = rows[order], partition_of[order]
+        boundaries = np.flatnonzero(np.diff(partition_of)) + 1
+        for start, stop in zip(np.r_[0, boundaries], np.r_[boundaries, len(rows)]):
+            with open(self.annotation_path(int(partition_of[start])), "ab") as f:
+                rows[start:stop].tofile(f)
+
+    def flush(self):
+        self.flush_images()
+        self.flush_annotations()
+
+
+def normalize_boxes(boxes, sizes):
+    """像素 (x, y, w, h) -> 相对 (cx, cy, w, h)，先裁剪到图片范围内"""
+    scale = np.concatenate([sizes, sizes], axis=1)
+    xyxy = np.concatenate([boxes[:, 0:2], boxes[:, 0:2] + boxes[:, 2:4]], axis=1)
+    xyxy = np.clip(xyxy / scale, 0.0, 1.0)
+    return np.concatenate([(xyxy[:, 0:2] + xyxy[:, 2:4]) / 2, xyxy[:, 2:4] - xyxy[:, 0:2]], axis=1)
+
+
+def write_label_file(txt_path, classes, boxes, merge=False):
+    """原子写出一张图片的标注；merge 时保留已有的框"""
+    lines = []
+    if merge:
+        lines = [labelio.format_annotation(ann['class'], ann['bbox']) for ann in labelio.read_annotations(txt_path)]
+    lines += [labelio.format_annotation(c, b) for c, b in zip(classes.tolist(), boxes.tolist())]
+    os.makedirs(os.path.dirname(txt_path) or ".", exist_ok=True)  # labels/ 下对应的子目录可能还不存在
+    labelio.write_text_atomic(txt_path, "".join(lines))
+
+
+def import_coco_partition(annotation_path, image_path, class_map, images_dir, merge=False):
+    """工作进程：导入一个分区，返回 (写出的文件数, 框数, 找不到图片的框数, 失败列表)"""
+    images = {}
+    if os.path.exists(image_path):
+        with open(image_path, "r", encoding="utf-8") as f:
+            for line in f:
+                image_id, file_name, width, height = json.loads(line)
+                images[image_id] = (file_name, width, height)
+    if not os.path.exists(annotation_path):
+        return 0, 0, 0, []
+    rows = np.fromfile(annotation_path, dtype=np.float64).reshape(-1, ANNOTATION_FIELDS)
+    rows = rows[np.argsort(rows[:, 0], kind="stable")]
+    image_ids = rows[:, 0].astype(np.int64)
+
+    category_ids = np.array(sorted(class_map), dtype=np.float64)
+    class_ids = np.array([class_map[c] for c in sorted(class_map)], dtype=np.int64)
+    position = np.clip(np.searchsorted(category_ids, rows[:, 1]), 0, max(len(category_ids) - 1, 0))
+    known_category = (category_ids[position] == rows[:, 1]) if len(category_ids) else np.zeros(len(rows), bool)
+
+    written, boxes_written, orphans, failed = 0, 0, 0, []
+    boundaries = np.flatnonzero(np.diff(image_ids)) + 1
+    groups = list(zip(np.r_[0, boundaries], np.r_[boundaries, len(rows)]))
+    sizes = np.zeros((len(rows), 2), dtype=np.float64)
+    targets = []
+    for start, stop in groups:
+        info = images.get(int(image_ids[start]))
+        if info is None:
+            orphans += stop - start
+            continue
+        file_name, width, height = info
+        full_path = os.path.join(images_dir, file_name)
+        if width <= 0 or height <= 0:
+            try:
+                width, height = read_image_size(full_path)
+            except Exception as e:
+                failed.append((file_name, f"读取图片尺寸失败: {e}"))
+                continue
+        sizes[start:stop] = (width, height)
+        targets.append((start, stop, full_path, file_name))
+
+    valid = sizes[:, 0] > 0
+    normalized = np.zeros((len(rows), 4), dtype=np.float64)
+    if valid.any():
+        normalized[valid] = normalize_boxes(rows[valid, 2:6], sizes[valid])
+    classes = class_ids[position] if len(class_ids) else np.zeros(len(rows), dtype=np.int64)
+
+    for start, stop, full_path, file_name in targets:
+        keep = known_category[start:stop]
+        try:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            write_label_file(labelio.label_path_for(full_path), classes[start:stop][keep],
+                             normalized[start:stop][keep], merge)
+        except OSError as e:
+            failed.append((file_name, f"写入标注失败: {e}"))
+            continue
+        written += 1
+        boxes_written += int(keep.sum())
+    return written, boxes_written, orphans, failed
+
+
+def _merge_classes(images_dir, new_names):
+    """合并并写回 classes.txt，返回 (合并后的类别列表, {名称: 类别ID})"""
+    classes_path = os.path.join(images_dir, "classes.txt")
+    existing = labelio.read_class_names(classes_path) if os.path.exists(classes_path) else []
+    merged, ids = labelio.merge_class_names(existing, new_names)
+    if merged != existing:
+        labelio.write_class_names(classes_path, merged)
+    return merged, ids
+
+
+def import_coco(json_path, images_dir, merge=False, include_crowd=False, workers=None, partitions=64,
+                progress=None):
+    """
+    导入 COCO JSON。
+
+    Args:
+        images_dir (str): 图片文件夹，file_name 相对于该目录；标注文件写在图片旁边。
+        merge (bool): 保留已有标注文件中的框，否则覆盖。
+        include_crowd (bool): 是否导入 iscrowd=1 的标注。
+        progress (callable, optional): progress(已读取字符数, 文件字节数)，解析阶段调用。
+
+    Returns:
+        (dict): {'images', 'annotations', 'orphans', 'failed', 'classes'}
+    """
+    total = os.path.getsize(json_path)
+    categories = {}
+    with tempfile.TemporaryDirectory(prefix="coco_import_", dir=labelio.dataset_cache_dir(images_dir)) as temp_dir:
+        spool = PartitionSpool(temp_dir, partitions)
+        with open(json_path, "r", encoding="utf-8") as f:
+            elements = iter_coco(f)
+            for count, (key, element) in enumerate(elements):
+                if key == "annotations":
+                    if element.get("iscrowd") and not include_crowd:
+                        continue
+                    spool.add_annotation(element["image_id"], element["category_id"], element["bbox"])
+                elif key == "images":
+                    spool.add_image(element)
+                else:
+                    categories[element["id"]] = element["name"]
+                if progress and count % 100000 == 0:
+                    progress(min(f.buffer.tell(), total), total)
+        spool.flush()
+
+        class_names, ids = _merge_classes(images_dir, [categories[c] for c in sorted(categories)])
+        class_map = {category_id: ids[name] for category_id, name in categories.items()}
+        tasks = [(spool.annotation_path(p), spool.image_path(p), class_map, images_dir, merge)
+                 for p in range(partitions)]
+        if workers == 1:
+            results = [import_coco_partition(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(import_coco_partition, *zip(*tasks)))
+
+    stats = {'images': 0, 'annotations': 0, 'orphans': 0, 'failed': [], 'classes': class_names}
+    for written, box_count, orphans, failed in results:
+        stats['images'] += written
+        stats['annotations'] += box_count
+        stats['orphans'] += orphans
+        stats['failed'].extend(failed)
+    return stats
+
+
+def parse_voc(xml_path):
+    """解析一个 VOC XML，返回 (文件名, (宽, 高), [(类别名, x1, y1, x2, y2)])，坐标转换为从 0 开始"""
+    root = ET.parse(xml_path).getroot()
+    file_name = root.findtext("filename") or ""
+    if not os.path.splitext(file_name)[1]:
+        file_name = ""
+    size = root.find("size")
+    width = int(float(size.findtext("width") or 0)) if size is not None else 0
+    height = int(float(size.findtext("height") or 0)) if size is not None else 0
+    objects = []
+    for obj in root.iter("object"):
+        box = obj.find("bndbox")
+        if box is None:
+            continue
+        objects.append((obj.findtext("name", "").strip(),
+                        float(box.findtext("xmin")) - 1, float(box.findtext("ymin")) - 1,
+                        float(box.findtext("xmax")), float(box.findtext("ymax"))))
+    return file_name, (width, height), objects
+
+
+def voc_class_names_chunk(xml_paths):
+    """工作进程：收集一批 XML 中出现的类别名（按首次出现顺序）"""
+    names = {}
+    for xml_path in xml_paths:
+        try:
+            for obj in ET.parse(xml_path).getroot().iter("object"):
+                names.setdefault(obj.findtext("name", "").strip(), None)
+        except Exception:
+            continue  # 第二遍导入时再报告
+    return list(names)
+
+
+def import_voc_chunk(xml_paths, xml_dir, images_dir, class_ids, merge=False):
+    """工作进程：导入一批 VOC XML，返回 (写出的文件数, 框数, 失败列表)"""
+    written, boxes_written, failed = 0, 0, []
+    for xml_path in xml_paths:
+        try:
+            file_name, (width, height), objects = parse_voc(xml_path)
+            relative = os.path.relpath(os.path.dirname(xml_path), xml_dir)
+            stem = os.path.splitext(os.path.basename(xml_path))[0]
+            image_path = os.path.normpath(os.path.join(images_dir, relative, file_name or stem))
+            if width <= 0 or height <= 0:
+                width, height = read_image_size(image_path)
+            if objects:
+                coords = np.array([obj[1:] for obj in objects], dtype=np.float64)
+                coords[:, 2:4] -= coords[:, 0:2]
+                boxes = normalize_boxes(coords, np.array([[width, height]] * len(objects), dtype=np.float64))
+            else:
+                boxes = np.empty((0, 4), dtype=np.float64)
+            classes = np.array([class_ids[obj[0]] for obj in objects], dtype=np.int64)
+            os.makedirs(os.path.dirname(image_path), exist_ok=True)
+            write_label_file(labelio.label_path_for(image_path), classes, boxes, merge)
+            written += 1
+            boxes_written += len(objects)
+        except Exception as e:
+            failed.append((xml_path, str(e)))
+    return written, boxes_written, failed
+
+
+def import_voc(xml_dir, images_dir, merge=False, workers=None, chunk_size=512, progress=None):
+    """
+    导入 Pascal VOC XML 文件夹（递归），两遍并行：先收集类别名合并 classes.txt，再解析并写出标注。
+
+    Returns:
+        (dict): {'images', 'annotations', 'failed', 'classes'}
+    """
+    xml_paths = sorted(os.path.join(dirpath, name) for dirpath, _, names in os.walk(xml_dir)
+                       for name in names if name.lower().endswith(".xml"))
+    chunks = [xml_paths[i:i + chunk_size] for i in range(0, len(xml_paths), chunk_size)]
+    executor = ProcessPoolExecutor(max_workers=workers) if len(chunks) > 1 and workers != 1 else None
+    try:
+        mapper = executor.map if executor else map
+        new_names = {}
+        for names in mapper(voc_class_names_chunk, chunks):
+            for name in names:
+                new_names.setdefault(name, None)
+        class_names, ids = _merge_classes(images_dir, list(new_names))
+
+        stats = {'images': 0, 'annotations': 0, 'failed': [], 'classes': class_names}
+        args = [[a] * len(chunks) for a in (xml_dir, images_dir, ids, merge)]
+        for chunk_index, (written, box_count, failed) in enumerate(mapper(import_voc_chunk, chunks, *args)):
+            stats['images'] += written
+            stats['annotations'] += box_count
+            stats['failed'].extend(failed)
+            if progress:
+                progress(min((chunk_index + 1) * chunk_size, len(xml_paths)), len(xml_paths))
+    finally:
+        if executor:
+            executor.shutdown()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把 COCO JSON 或 Pascal VOC XML 导入为 YOLO 标注")
+    parser.add_argument("format", choices=("coco", "voc"), help="导入格式")
+    parser.add_argument("source", help="COCO 为 JSON 文件，VOC 为 XML 文件夹")
+    parser.add_argument("--images", required=True, help="图片文件夹，标注文件和 classes.txt 写在这里")
+    parser.add_argument("--merge", action="store_true", help="保留已有标注文件中的框")
+    parser.add_argument("--include-crowd", action="store_true", help="COCO: 同时导入 iscrowd=1 的标注")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    args = parser.parse_args(argv)
+
+    def progress(done, total):
+        print(f"\r{done}/{total}", end="", file=sys.stderr)
+
+    if args.format == "coco":
+        stats = import_coco(args.source, args.images, args.merge, args.include_crowd, args.workers,
+                            progress=progress)
+    else:
+        stats = import_voc(args.source, args.images, args.merge, args.workers, progress=progress)
+    print(file=sys.stderr)
+    print(f"导入 {stats['images']} 个标注文件、{stats['annotations']} 个框，共 {len(stats['classes'])} 个类别")
+    if stats.get('orphans'):
+        print(f"  {stats['orphans']} 个框对应的 image_id 不在 images 中，已跳过")
+    for path, message in stats['failed'][:20]:
+        print(f"  {path}: {message}")
+    if len(stats['failed']) > 20:
+        print(f"  ... 共 {len(stats['failed'])} 个失败")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
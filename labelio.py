@@ -0,0 +1,514 @@
+"""
+YOLO 标注文件读写（不依赖 wx，供界面、基准测试和命令行工具共用）。
+
+标注文件与图片同名、同目录，每行一个框: "class cx cy w h"，坐标为相对值。
+YOLO 数据集常用的 images/<子集>、labels/<子集> 布局（与 images 同级有 labels 目录）中，标注文件在 labels 下对应的位置。
+视频帧的路径为 <视频路径>#<帧序号>，标注文件为视频旁边的 <视频名>_<帧序号>.txt（见 videosource.py）。
+zip/tar 压缩包内图片的路径为 <压缩包路径>/<成员名>，标注文件在压缩包旁边的 <压缩包路径>.labels 目录中
+（见 archivesource.py）。
+对象存储中的图片路径为对象的 URL，标注文件在本地 ~/.labelbridge/remote/<主机>/<桶>/<键>.txt（见 imagesource.py）。
+"""
+import hashlib
+import json
+import functools
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.m4v', '.avi', '.mkv')
+FRAME_SEPARATOR = "#"
+ARCHIVE_EXTENSIONS = ('.zip', '.tar')
+ARCHIVE_LABEL_SUFFIX = ".labels"
+REMOTE_PREFIXES = ("http://", "https://")
+IMAGES_DIR = "images"
+LABELS_DIR = "labels"
+
+
+def frame_path(video_path, frame_index):
+    """视频第 frame_index 帧的路径"""
+    return f"{video_path}{FRAME_SEPARATOR}{frame_index:06d}"
+
+
+def split_frame_path(path):
+    """视频帧路径 -> (视频路径, 帧序号)；普通图片返回 None"""
+    video_path, separator, frame = path.rpartition(FRAME_SEPARATOR)
+    if separator and frame.isdigit() and video_path.lower().endswith(VIDEO_EXTENSIONS):
+        return video_path, int(frame)
+    return None
+
+
+def split_archive_path(path):
+    """
+    压缩包内的图片路径 -> (压缩包路径, 成员名)；其它路径返回 None。
+
+    只按路径判断（不访问文件系统）：第一个以 ARCHIVE_EXTENSIONS 结尾且后面还有内容的路径分量为压缩包。
+    对象存储中的压缩包不支持按偏移读取，URL 总是返回 None。
+    """
+    if is_remote_path(path):
+        return None
+    lower = path.lower()
+    ends = []
+    for extension in ARCHIVE_EXTENSIONS:
+        position = lower.find(extension)
+        while position >= 0:
+            end = position + len(extension)
+            if lower[end:end + 1] in ("/", "\\") and end + 1 < len(path):
+                ends.append(end)
+                break
+            position = lower.find(extension, end)
+    if not ends:
+        return None
+    end = min(ends)
+    return path[:end], path[end + 1:].replace("\\", "/")
+
+
+def is_remote_path(path):
+    """是否为对象存储中的图片或前缀（URL）"""
+    return path.startswith(REMOTE_PREFIXES)
+
+
+def is_local_file(path):
+    """是否为本地磁盘上的普通文件路径（不是压缩包成员或 URL，可以直接按路径打开）"""
+    return not is_remote_path(path) and not split_archive_path(path)
+
+
+def safe_path_parts(name):
+    """
+    把压缩包成员名或 URL 路径拆成可以安全拼接到某个目录下的分量：去掉空分量、. 和 ..，
+    以及带盘符的分量（Windows 上 os.path.join 遇到它会丢弃前面的目录），拼接结果不会跳出该目录。
+    """
+    return [part for part in name.replace("\\", "/").split("/") if part not in ("", ".", "..") and ":" not in part]
+
+
+def remote_local_path(url):
+    """URL 在本地标注目录中对应的路径: ~/.labelbridge/remote/<主机_端口>/<路径>"""
+    parsed = urlparse(url)
+    return os.path.join(os.path.expanduser("~"), ".labelbridge", "remote", parsed.netloc.replace(":", "_"),
+                        *safe_path_parts(parsed.path))
+
+
+def is_archive(path):
+    """路径是否为可以当作图片文件夹打开的压缩包"""
+    return path.lower().endswith(ARCHIVE_EXTENSIONS) and os.path.isfile(path)
+
+
+def label_folder_for(folder_path):
+    """
+    文件夹的标注、classes.txt 所在目录：压缩包为旁边的 <压缩包路径>.labels（覆盖层），
+    对象存储的前缀为本地标注目录中对应的目录，其它为文件夹本身
+    """
+    if is_remote_path(folder_path):
+        return remote_local_path(folder_path)
+    return folder_path + ARCHIVE_LABEL_SUFFIX if is_archive(folder_path) else folder_path
+
+
+def source_stat(path):
+    """图片所在文件的 os.stat（视频帧为视频文件，压缩包成员为压缩包），用于按 mtime 和大小判断缓存是否有效"""
+    frame = split_frame_path(path)
+    if frame:
+        return os.stat(frame[0])
+    if is_remote_path(path):
+        import imagesource
+        return imagesource.stat(path)  # 列出对象时得到的大小和修改时间
+    member = split_archive_path(path)
+    return os.stat(member[0] if member else path)
+
+
+@functools.lru_cache(maxsize=None)
+def label_dir_for(image_dir):
+    """
+    图片目录对应的标注目录：路径中有 images 分量且与它同级有 labels 目录时（images/train -> labels/train），
+    把最后一个 images 换为 labels，否则为图片目录本身。按目录缓存，每个目录只检查一次文件系统
+    （切换文件夹时调用 label_dir_for.cache_clear()）。
+    """
+    head, rest = image_dir, []
+    while True:
+        head, tail = os.path.split(head)
+        if tail == IMAGES_DIR:
+            if os.path.isdir(os.path.join(head, LABELS_DIR)):
+                return os.path.join(head, LABELS_DIR, *reversed(rest))
+            return image_dir
+        if not tail:
+            return image_dir
+        rest.append(tail)
+
+
+def label_path_for(image_path):
+    """根据图片路径生成标注文件路径"""
+    frame = split_frame_path(image_path)
+    if frame:
+        video_path, frame_index = frame
+        base_name = os.path.splitext(os.path.basename(video_path))[0]
+        folder, file_name = os.path.dirname(video_path), f"{base_name}_{frame_index:06d}.txt"
+    elif is_remote_path(image_path):
+        folder, file_name = os.path.split(os.path.splitext(remote_local_path(image_path))[0] + ".txt")
+    else:
+        member = split_archive_path(image_path)
+        if member:
+            archive_path, name = member
+            folder, file_name = os.path.split(
+                os.path.join(archive_path + ARCHIVE_LABEL_SUFFIX, *safe_path_parts(os.path.splitext(name)[0])) + ".txt")
+        else:
+            folder, file_name = os.path.split(image_path)
+            file_name = os.path.splitext(file_name)[0] + ".txt"
+    return os.path.join(label_dir_for(folder), file_name)
+
+
+class LabelPathTable:
+    """
+    预先计算的 图片路径 -> 标注文件路径 表，可以作为 label_path 参数传给标注存储和扫描函数，
+    打开、保存和批量改写标注时只查表，不再逐个拆分、拼接路径。不在表中的图片按 label_path_for 计算后加入。
+    """
+
+    def __init__(self, image_files=()):
+        self.paths = {}
+        self.add(image_files)
+
+    def __call__(self, image_path):
+        txt_path = self.paths.get(image_path)
+        if txt_path is None:
+            txt_path = self.paths[image_path] = label_path_for(image_path)
+        return txt_path
+
+    def add(self, image_files):
+        """同一目录的图片只对第一张按 label_path_for 得到标注目录，其余的只替换扩展名（视频帧逐个计算）"""
+        label_dirs = {}
+        for image_path in image_files:
+            if image_path in self.paths:
+                continue
+            folder, file_name = os.path.split(image_path)
+            label_dir = label_dirs.get(folder)
+            if label_dir is None or FRAME_SEPARATOR in file_name:
+                txt_path = label_path_for(image_path)
+                if FRAME_SEPARATOR not in file_name:
+                    label_dirs[folder] = os.path.dirname(txt_path)
+            else:
+                txt_path = os.path.join(label_dir, os.path.splitext(file_name)[0] + ".txt")
+            self.paths[image_path] = txt_path
+
+    def discard(self, image_files):
+        for image_path in image_files:
+            self.paths.pop(image_path, None)
+
+    def folders(self):
+        """图片和标注文件所在的全部本地目录（用于监视文件夹）"""
+        folders = set()
+        for image_path, txt_path in self.paths.items():
+            if is_local_file(image_path) and not split_frame_path(image_path):
+                folders.add(os.path.dirname(image_path))
+            folders.add(os.path.dirname(txt_path))
+        return sorted(folders)
+
+
+def relative_label_path(txt_path, label_root):
+    """
+    标注文件相对数据集标注目录 label_root（label_folder_for 的结果）的路径，另一组标注和预测文件按它对应，
+    不同子文件夹中的同名图片不会读到同一个文件；没有 label_root 或不在其中时为文件名。
+    """
+    if label_root:
+        try:
+            relative = os.path.relpath(txt_path, label_root)
+        except ValueError:  # Windows 上不在同一个盘
+            relative = os.pardir
+        if relative != os.pardir and not relative.startswith(os.pardir + os.sep):
+            return relative
+    return os.path.basename(txt_path)
+
+
+def mirrored_label_path(folder, image_path, root=None, label_path=label_path_for):
+    """
+    另一个文件夹（预测结果、另一组标注）中图片对应的 .txt: folder 下与标注文件相对路径相同的文件
+    （root 为加载的图片文件夹；平铺的文件夹或没有 root 时即与标注文件同名）
+    """
+    label_root = label_folder_for(root) if root else None
+    return os.path.join(folder, relative_label_path(label_path(image_path), label_root))
+
+
+def mirrored_label_paths(folder, image_files, root=None, label_path=label_path_for):
+    """一批图片在另一个文件夹中对应的 .txt（见 mirrored_label_path）"""
+    label_root = label_folder_for(root) if root else None
+    return [os.path.join(folder, relative_label_path(label_path(p), label_root)) for p in image_files]
+
+
+def dataset_cache_dir(folder_path):
+    """数据集的缓存目录: ~/.labelbridge/cache/<文件夹路径哈希>，不写入数据集本身"""
+    key = folder_path if is_remote_path(folder_path) else os.path.abspath(folder_path)
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    path = os.path.join(os.path.expanduser("~"), ".labelbridge", "cache", digest)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def session_path():
+    """上次会话的状态文件: ~/.labelbridge/session.json"""
+    return os.path.join(os.path.expanduser("~"), ".labelbridge", "session.json")
+
+
+def read_session():
+    """读取上次会话的状态（文件夹、当前图片、类别、图片列表）；没有或损坏时返回 {}"""
+    try:
+        with open(session_path(), encoding='utf-8') as f:
+            session = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return session if isinstance(session, dict) else {}
+
+
+def write_session(session):
+    """保存会话状态"""
+    path = session_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_text_atomic(path, json.dumps(session, ensure_ascii=False))
+
+
+def scan_directory(folder_path):
+    """
+    列出一个目录中的图片和要继续扫描的子目录：跳过隐藏目录和压缩包的标注覆盖层，
+    与 images 同级的 labels 目录中只有标注，也跳过。
+    """
+    image_files, subfolders = [], []
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            name = entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if not name.startswith(".") and not name.endswith(ARCHIVE_LABEL_SUFFIX):
+                    subfolders.append(name)
+            elif name.lower().endswith(IMAGE_EXTENSIONS):
+                image_files.append(entry.path)
+    if IMAGES_DIR in subfolders and LABELS_DIR in subfolders:
+        subfolders.remove(LABELS_DIR)
+    return image_files, [os.path.join(folder_path, name) for name in subfolders]
+
+
+def list_image_files(folder_path, recursive=False, workers=8):
+    """
+    列出文件夹中的所有图片（已排序）。
+
+    recursive 时包括所有子文件夹：各目录由 workers 个线程同时扫描（每扫描完一个目录就提交它的子目录），
+    网络文件系统上目录很多时不必逐个等待 listdir 返回。
+    """
+    if not recursive:
+        image_files = []
+        for file_name in os.listdir(folder_path):
+            if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                image_files.append(os.path.join(folder_path, file_name))
+        image_files.sort()
+        return image_files
+
+    image_files, subfolders = scan_directory(folder_path)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(scan_directory, path): path for path in subfolders}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    found, subfolders = future.result()
+                except OSError as e:
+                    print(f"扫描文件夹 {path} 失败: {e}")
+                    continue
+                image_files.extend(found)
+                pending.update((executor.submit(scan_directory, sub), sub) for sub in subfolders)
+    image_files.sort()
+    return image_files
+
+
+def parse_label_lines(lines):
+    """解析标注行，跳过不是 5 个字段的行"""
+    annotations = []
+    for line in lines:
+        parts = line.strip().split()
+        if len(parts) == 5:
+            class_id = int(parts[0])
+            bbox = [float(x) for x in parts[1:]]
+            annotations.append({
+                'class': class_id,
+                'bbox': bbox
+            })
+    return annotations
+
+
+def read_annotations(txt_path):
+    """读取标注文件，文件不存在时返回空列表"""
+    if not os.path.exists(txt_path):
+        return []
+    with open(txt_path, 'r') as f:
+        return parse_label_lines(f)
+
+
+def format_annotation(class_id, bbox):
+    """格式化一行标注"""
+    return f"{class_id} {bbox[0]:.6f} {bbox[1]:.6f} {bbox[2]:.6f} {bbox[3]:.6f}\n"
+
+
+def write_annotations(txt_path, annotations):
+    """
+    写入标注文件；没有标注时删除标注文件（如果存在）。
+    标注目录可能还不存在（labels/ 下没有对应的子目录、压缩包覆盖层或对象存储的本地标注目录），先创建。
+    """
+    if not annotations:
+        if os.path.exists(txt_path):
+            os.remove(txt_path)
+        return
+    os.makedirs(os.path.dirname(txt_path) or ".", exist_ok=True)
+    with open(txt_path, 'w') as f:
+        for ann in annotations:
+            f.write(format_annotation(ann['class'], ann['bbox']))
+
+
+def write_text_atomic(path, text):
+    """先写临时文件再替换，其它进程不会读到写了一半的文件"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def remap_label_file(txt_path, id_mapping):
+    """按 id_mapping 改写标注文件中的类别ID，不在映射中的框被删除；返回剩余框数"""
+    if not os.path.exists(txt_path):
+        return 0
+    annotations = []
+    for ann in read_annotations(txt_path):
+        if ann['class'] in id_mapping:
+            annotations.append({'class': id_mapping[ann['class']], 'bbox': ann['bbox']})
+    write_annotations(txt_path, annotations)
+    return len(annotations)
+
+
+def read_class_names(classes_path):
+    """读取 classes.txt，忽略空行"""
+    with open(classes_path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def write_class_names(classes_path, class_names):
+    """写入 classes.txt（所在目录不存在时先创建，例如对象存储中还没有标注的前缀的本地标注目录）"""
+    os.makedirs(os.path.dirname(classes_path) or ".", exist_ok=True)
+    with open(classes_path, 'w', encoding='utf-8') as f:
+        for class_name in class_names:
+            f.write(f"{class_name}\n")
+
+
+def merge_class_names(class_names, new_names):
+    """把 new_names 合并到 class_names 末尾（已有的类别保持原ID），返回 (合并后的列表, {名称: 类别ID})"""
+    merged = list(class_names)
+    ids = {name: i for i, name in enumerate(merged)}
+    for name in new_names:
+        if name not in ids:
+            ids[name] = len(merged)
+            merged.append(name)
+    return merged, ids
+
+
+class LabelTable:
+    """
+    批量扫描得到的全部标注，按图片顺序拼接存放。
+
+    Attributes:
+        classes (np.ndarray): 所有框的类别ID，int32，长度为框总数。
+        boxes (np.ndarray): 所有框的 (cx, cy, w, h)，float32，形状 (框总数, 4)。
+        offsets (np.ndarray): int64，长度为图片数 + 1；第 i 张图片的框为 offsets[i]:offsets[i + 1]。
+        errors (dict): 解析失败的图片索引 -> 错误信息（这些图片视为没有框）。
+        skipped (np.ndarray): 每张图片因不是 5 个字段而被跳过的行数。
+    """
+
+    def __init__(self, classes, boxes, offsets, errors=None, skipped=None):
+        self.classes = classes
+        self.boxes = boxes
+        self.offsets = offsets
+        self.errors = errors or {}
+        self.skipped = skipped if skipped is not None else np.zeros(len(offsets) - 1, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def counts(self):
+        """每张图片的框数"""
+        return np.diff(self.offsets)
+
+    def image_ids(self):
+        """每个框所属的图片索引"""
+        return np.repeat(np.arange(len(self), dtype=np.int64), self.counts())
+
+    def classes_for(self, i):
+        return self.classes[self.offsets[i]:self.offsets[i + 1]]
+
+    def boxes_for(self, i):
+        return self.boxes[self.offsets[i]:self.offsets[i + 1]]
+
+
+def parse_label_array(text):
+    """
+    把标注文件内容解析为数组，与 parse_label_lines 规则一致。
+
+    Returns:
+        (np.ndarray, np.ndarray, int): 类别 (int32)、框 (float32, Nx4)、被跳过的非空行数。
+    """
+    rows = [line.split() for line in text.splitlines()]
+    rows = [row for row in rows if row]
+    valid = [row for row in rows if len(row) == 5]
+    if not valid:
+        return np.empty(0, np.int32), np.empty((0, 4), np.float32), len(rows)
+    # 类别ID逐个用 int() 校验，坐标一次性转换
+    classes = np.array([int(row[0]) for row in valid], dtype=np.int32)
+    boxes = np.array([row[1:] for row in valid], dtype=np.float64).astype(np.float32)
+    return classes, boxes, len(rows) - len(valid)
+
+
+def scan_label_chunk(label_paths):
+    """工作进程：解析一批标注文件，返回 (类别, 框, 每个文件的框数, 每个文件跳过的行数, {批内序号: 错误})"""
+    all_classes, all_boxes, counts, skipped, errors = [], [], [], [], {}
+    for i, txt_path in enumerate(label_paths):
+        classes, boxes, bad_lines = np.empty(0, np.int32), np.empty((0, 4), np.float32), 0
+        try:
+            with open(txt_path, 'r') as f:
+                classes, boxes, bad_lines = parse_label_array(f.read())
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            errors[i] = str(e)
+        all_classes.append(classes)
+        all_boxes.append(boxes)
+        counts.append(len(classes))
+        skipped.append(bad_lines)
+    if not label_paths:
+        return np.empty(0, np.int32), np.empty((0, 4), np.float32), [], [], errors
+    return np.concatenate(all_classes), np.concatenate(all_boxes), counts, skipped, errors
+
+
+def scan_labels(image_files, workers=None, chunk_size=2048, label_path=label_path_for):
+    """
+    并行扫描全部图片的标注文件。
+
+    Args:
+        image_files (list): 图片路径列表。
+        workers (int, optional): 进程数，默认 CPU 核数；图片数不超过 chunk_size 时直接在当前进程解析。
+        chunk_size (int): 每个任务处理的文件数。
+        label_path (callable): 图片路径 -> 标注文件路径。
+
+    Returns:
+        (LabelTable): 按 image_files 顺序拼接的标注。
+    """
+    label_paths = [label_path(p) for p in image_files]
+    chunks = [label_paths[i:i + chunk_size] for i in range(0, len(label_paths), chunk_size)]
+    if len(chunks) <= 1 or workers == 1:
+        results = [scan_label_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(scan_label_chunk, chunks))
+
+    classes = [r[0] for r in results] or [np.empty(0, np.int32)]
+    boxes = [r[1] for r in results] or [np.empty((0, 4), np.float32)]
+    counts = np.array([c for r in results for c in r[2]], dtype=np.int64)
+    skipped = np.array([c for r in results for c in r[3]], dtype=np.int32)
+    offsets = np.zeros(len(image_files) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    errors = {}
+    for chunk_index, r in enumerate(results):
+        for i, message in r[4].items():
+            errors[chunk_index * chunk_size + i] = message
+    return LabelTable(np.concatenate(classes), np.concatenate(boxes), offsets, errors, skipped)
@@ -0,0 +1,269 @@
+"""
+标注质检：批量加载标注后用 NumPy 向量化检查整个数据集，并提供批量自动修复。
+
+检查项:
+    parse_error     标注文件无法解析（例如类别ID不是整数）
+    malformed_line  不是 5 个字段的行（LoadAnnotations 会静默跳过）
+    out_of_range    框超出 [0, 1]
+    zero_area       宽或高为 0
+    duplicate       同类别且 IoU 很高的重复框（通常是双击造成的）
+    overlap         不同类别但 IoU 很高的框（可能是类别标错）
+    orphan_class    类别ID >= 类别数（界面上显示为 "Class N"）；没有类别列表（num_classes 为 0）时不检查
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import labelio
+
+ISSUE_NAMES = {
+    'parse_error': "解析失败",
+    'malformed_line': "格式错误的行",
+    'out_of_range': "坐标超出图片",
+    'zero_area': "零面积框",
+    'duplicate': "重复框",
+    'overlap': "不同类别高度重叠",
+    'orphan_class': "类别ID不存在",
+}
+
+# 可以自动修复的问题
+FIXABLE_ISSUES = ('out_of_range', 'zero_area', 'duplicate', 'orphan_class', 'malformed_line')
+# 只改写坐标、不删除框的修复（界面上默认选中）
+SAFE_FIXES = ('out_of_range',)
+
+EPS = 1e-6
+
+
+def xywh_to_xyxy(boxes):
+    """(cx, cy, w, h) -> (x1, y1, x2, y2)"""
+    half = boxes[:, 2:4] / 2
+    return np.concatenate([boxes[:, 0:2] - half, boxes[:, 0:2] + half], axis=1)
+
+
+def xyxy_to_xywh(boxes):
+    """(x1, y1, x2, y2) -> (cx, cy, w, h)"""
+    return np.concatenate([(boxes[:, 0:2] + boxes[:, 2:4]) / 2, boxes[:, 2:4] - boxes[:, 0:2]], axis=1)
+
+
+def intra_image_pairs(offsets):
+    """同一张图片内所有框对 (i < j) 的全局框索引，一次性生成整个批次"""
+    counts = np.diff(offsets)
+    n = int(offsets[-1])
+    image_of_box = np.repeat(np.arange(len(counts)), counts)
+    partners = offsets[1:][image_of_box] - np.arange(n) - 1  # 每个框之后同图片的框数
+    total = int(partners.sum())
+    first = np.repeat(np.arange(n), partners)
+    group_start = np.repeat(np.cumsum(partners) - partners, partners)
+    second = first + 1 + (np.arange(total) - group_start)
+    return first, second
+
+
+def pair_iou(xyxy, first, second):
+    """框对的 IoU"""
+    a, b = xyxy[first], xyxy[second]
+    inter_w = np.clip(np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a + area_b - inter
+    return np.where(union > 0, inter / np.where(union > 0, union, 1), 0.0)
+
+
+def find_issues(classes, boxes, offsets, num_classes, duplicate_iou=0.9, overlap_iou=0.8):
+    """
+    向量化检查一批图片的框。
+
+    Returns:
+        (list): [(图片序号, 框序号, 问题, 说明)]，图片序号相对于 offsets，框序号为图片内序号。
+    """
+    issues = []
+    if not len(classes):
+        return issues
+    boxes = boxes.astype(np.float64)
+    image_of_box = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    local = np.arange(len(classes)) - offsets[image_of_box]
+    xyxy = xywh_to_xyxy(boxes)
+
+    def add(mask, code, describe):
+        for k in np.flatnonzero(mask):
+            issues.append((int(image_of_box[k]), int(local[k]), code, describe(k)))
+
+    if num_classes > 0:
+        add((classes < 0) | (classes >= num_classes), 'orphan_class', lambda k: f"类别 {classes[k]}")
+    add((boxes[:, 2] <= EPS) | (boxes[:, 3] <= EPS), 'zero_area',
+        lambda k: f"宽 {boxes[k, 2]:.4f} 高 {boxes[k, 3]:.4f}")
+    add(np.any((xyxy < -EPS) | (xyxy > 1 + EPS), axis=1), 'out_of_range',
+        lambda k: f"({xyxy[k, 0]:.3f}, {xyxy[k, 1]:.3f})-({xyxy[k, 2]:.3f}, {xyxy[k, 3]:.3f})")
+
+    first, second = intra_image_pairs(offsets)
+    if len(first):
+        iou = pair_iou(xyxy, first, second)
+        same_class = classes[first] == classes[second]
+        for code, mask in (('duplicate', same_class & (iou >= duplicate_iou)),
+                           ('overlap', ~same_class & (iou >= overlap_iou))):
+            for k in np.flatnonzero(mask):
+                j = second[k]
+                issues.append((int(image_of_box[j]), int(local[j]), code,
+                               f"与第 {local[first[k]] + 1} 个框 IoU={iou[k]:.2f}"))
+    return issues
+
+
+def check_label_chunk(label_paths, num_classes, duplicate_iou=0.9, overlap_iou=0.8):
+    """工作进程：加载一批标注文件并检查，图片序号相对于本批"""
+    classes, boxes, counts, skipped, errors = labelio.scan_label_chunk(label_paths)
+    offsets = np.zeros(len(label_paths) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return check_table(labelio.LabelTable(classes, boxes, offsets, errors, np.asarray(skipped, dtype=np.int32)),
+                       num_classes, duplicate_iou, overlap_iou)
+
+
+def check_table(table, num_classes, duplicate_iou=0.9, overlap_iou=0.8):
+    """检查已加载的 LabelTable（例如从 SQLite 存储扫描得到的），返回问题列表"""
+    issues = find_issues(table.classes, table.boxes, table.offsets, num_classes, duplicate_iou, overlap_iou)
+    for i, message in table.errors.items():
+        issues.append((i, -1, 'parse_error', message))
+    for i in np.flatnonzero(table.skipped):
+        issues.append((int(i), -1, 'malformed_line', f"{table.skipped[i]} 行"))
+    return issues
+
+
+class QAReport:
+    """质检结果，图片以 image_files 中的序号表示"""
+
+    def __init__(self, issues, num_images):
+        self.issues = sorted(issues)
+        self.num_images = num_images
+        self._issue_images = np.array([issue[0] for issue in self.issues], dtype=np.int64)
+        self.image_indices = np.unique(self._issue_images)
+
+    def __len__(self):
+        return len(self.issues)
+
+    def issues_for(self, image_index):
+        """某张图片的全部问题"""
+        lo = np.searchsorted(self._issue_images, image_index, side='left')
+        hi = np.searchsorted(self._issue_images, image_index, side='right')
+        return self.issues[lo:hi]
+
+    def counts(self):
+        """各类问题的数量"""
+        counts = {}
+        for issue in self.issues:
+            counts[issue[2]] = counts.get(issue[2], 0) + 1
+        return counts
+
+    def next_image(self, current, step=1):
+        """current 之后（step=-1 时为之前）第一张有问题的图片，没有时返回 -1"""
+        if step > 0:
+            position = np.searchsorted(self.image_indices, current, side='right')
+            return int(self.image_indices[position]) if position < len(self.image_indices) else -1
+        position = np.searchsorted(self.image_indices, current, side='left') - 1
+        return int(self.image_indices[position]) if position >= 0 else -1
+
+    def summary(self):
+        """多行文字摘要"""
+        lines = [f"共 {len(self.image_indices)}/{self.num_images} 张图片有问题，{len(self.issues)} 处"]
+        for code, count in sorted(self.counts().items(), key=lambda item: -item[1]):
+            lines.append(f"  {ISSUE_NAMES.get(code, code)}: {count}")
+        return "\n".join(lines)
+
+
+def run_qa(image_files, num_classes, workers=None, chunk_size=1024, duplicate_iou=0.9, overlap_iou=0.8,
+           label_path=labelio.label_path_for):
+    """并行检查全部图片的标注，返回 QAReport"""
+    label_paths = [label_path(p) for p in image_files]
+    chunks = [label_paths[i:i + chunk_size] for i in range(0, len(label_paths), chunk_size)]
+    args = (num_classes, duplicate_iou, overlap_iou)
+    if len(chunks) <= 1 or workers == 1:
+        results = [check_label_chunk(chunk, *args) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(check_label_chunk, chunk, *args) for chunk in chunks]
+            results = [future.result() for future in futures]
+
+    issues = []
+    for chunk_index, chunk_issues in enumerate(results):
+        base = chunk_index * chunk_size
+        issues.extend((base + i, box, code, detail) for i, box, code, detail in chunk_issues)
+    return QAReport(issues, len(image_files))
+
+
+def fix_arrays(classes, boxes, num_classes, fixes, duplicate_iou=0.9):
+    """对单张图片的框应用自动修复，返回 (类别, 框)"""
+    boxes = boxes.astype(np.float64)
+    keep = np.ones(len(classes), dtype=bool)
+    if 'orphan_class' in fixes and num_classes > 0:  # 没有类别列表时无法判断，不能删除全部框
+        keep &= (classes >= 0) & (classes < num_classes)
+    if 'out_of_range' in fixes and len(boxes):
+        boxes = xyxy_to_xywh(np.clip(xywh_to_xyxy(boxes), 0.0, 1.0))
+    if 'zero_area' in fixes:
+        keep &= (boxes[:, 2] > EPS) & (boxes[:, 3] > EPS)
+    classes, boxes = classes[keep], boxes[keep]
+    if 'duplicate' in fixes and len(classes) > 1:
+        first, second = intra_image_pairs(np.array([0, len(classes)]))
+        iou = pair_iou(xywh_to_xyxy(boxes), first, second)
+        duplicate = (classes[first] == classes[second]) & (iou >= duplicate_iou)
+        # 保留每组重复框中最早的一个
+        drop = np.zeros(len(classes), dtype=bool)
+        for a, b in zip(first[duplicate], second[duplicate]):
+            if not drop[a]:
+                drop[b] = True
+        classes, boxes = classes[~drop], boxes[~drop]
+    return classes, boxes
+
+
+def fix_label_chunk(label_paths, num_classes, fixes, duplicate_iou=0.9):
+    """
+    工作进程：修复一批标注文件，返回被改写的文件数。
+
+    文件只在有改动时才改写；改写时不是 5 个字段的行会一并去掉（它们本来也不会被加载）。
+    """
+    changed = 0
+    for txt_path in label_paths:
+        try:
+            with open(txt_path, 'r') as f:
+                classes, boxes, bad_lines = labelio.parse_label_array(f.read())
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            print(f"修复标注文件 {txt_path} 失败: {e}")
+            continue
+        new_classes, new_boxes = fix_arrays(classes, boxes, num_classes, fixes, duplicate_iou)
+        modified = len(new_classes) != len(classes) or not np.allclose(new_boxes, boxes, atol=5e-7)
+        if modified or (bad_lines and 'malformed_line' in fixes):
+            labelio.write_annotations(txt_path, [{'class': int(c), 'bbox': [float(v) for v in b]}
+                                                 for c, b in zip(new_classes, new_boxes)])
+            changed += 1
+    return changed
+
+
+def fix_label_files(image_files, num_classes, fixes, workers=None, chunk_size=512, duplicate_iou=0.9,
+                    label_path=labelio.label_path_for):
+    """并行修复 image_files 的标注文件，返回被改写的文件数"""
+    label_paths = [label_path(p) for p in image_files]
+    chunks = [label_paths[i:i + chunk_size] for i in range(0, len(label_paths), chunk_size)]
+    args = (num_classes, tuple(fixes), duplicate_iou)
+    if len(chunks) <= 1 or workers == 1:
+        return sum(fix_label_chunk(chunk, *args) for chunk in chunks)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(fix_label_chunk, chunks, *[[a] * len(chunks) for a in args]))
+
+
+def fix_store(store, image_files, num_classes, fixes, duplicate_iou=0.9):
+    """通过标注存储（labelstore）修复 image_files 的标注，用于没有单独标注文件的存储；返回被改写的图片数"""
+    changed = []
+    for image_path in image_files:
+        annotations = store.read(image_path)
+        classes = np.array([ann['class'] for ann in annotations], dtype=np.int64)
+        boxes = np.array([ann['bbox'] for ann in annotations], dtype=np.float64).reshape(-1, 4)
+        new_classes, new_boxes = fix_arrays(classes, boxes, num_classes, fixes, duplicate_iou)
+        if len(new_classes) != len(classes) or not np.allclose(new_boxes, boxes, atol=5e-7):
+            changed.append((image_path, [{'class': int(c), 'bbox': [float(v) for v in b]}
+                                         for c, b in zip(new_classes, new_boxes)]))
+    if hasattr(store, 'write_many'):
+        store.write_many(changed)
+    else:
+        for image_path, annotations in changed:
+            store.write(image_path, annotations)
+    return len(changed)
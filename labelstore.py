@@ -0,0 +1,356 @@
+"""
+标注存储后端。
+
+YoloFileStore   每张图片一个同名 .txt（原有布局，其它工具直接读写这些文件）
+SQLiteStore     整个数据集一个 SQLite 文件 (WAL)，不产生大量小文件；类别重映射只需一条 UPDATE
+
+图片文件夹中存在 labels.db 时使用 SQLiteStore，否则使用 YoloFileStore（见 open_store）。
+两种存储之间的转换是无损的: 坐标按文本解析为 double 保存，写回时与原文件格式一致（6 位小数）。
+
+YoloFileStore 读取标注时记录文件的 (mtime, 大小, sha1)，保存前如果文件内容已被其他程序修改则抛出
+ConflictError，不会覆盖别人的修改；调用方确认后用 accept 接受当前版本再保存。
+
+命令行用法:
+    python labelstore.py to-sqlite <图片文件夹> [--remove-txt] [--recursive]
+    python labelstore.py to-yolo <图片文件夹>
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import labelio
+
+DB_NAME = "labels.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS boxes (
+    image_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    class INTEGER NOT NULL,
+    cx REAL NOT NULL,
+    cy REAL NOT NULL,
+    w REAL NOT NULL,
+    h REAL NOT NULL,
+    PRIMARY KEY (image_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+class ConflictError(Exception):
+    """保存时标注已被其他人修改；version 为当前版本，annotations 为当前标注"""
+
+    def __init__(self, message, version, annotations):
+        super().__init__(message)
+        self.version = version
+        self.annotations = annotations
+
+
+def file_signature(path, known=None):
+    """文件的 (mtime_ns, 大小, sha1)，不存在时为 None；mtime 和大小与 known 相同时不重新计算哈希"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if known and known[:2] == (stat.st_mtime_ns, stat.st_size):
+        return known
+    with open(path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).digest()
+    return stat.st_mtime_ns, stat.st_size, digest
+
+
+def same_content(a, b):
+    """两个 file_signature 是否表示相同的内容（只 touch 过或重写了相同内容不算修改）"""
+    if a is None or b is None:
+        return a is b
+    return a[2] == b[2]
+
+
+class YoloFileStore:
+    """每张图片一个 YOLO 标注文件"""
+
+    kind = 'yolo'
+
+    def __init__(self, label_path=labelio.label_path_for):
+        self.label_path = label_path
+        self.signatures = {}  # 标注文件 -> 最近一次读取或写入时的 file_signature
+
+    def read(self, image_path):
+        txt_path = self.label_path(image_path)
+        try:
+            with open(txt_path, 'rb') as f:
+                data = f.read()
+                stat = os.fstat(f.fileno())
+        except FileNotFoundError:
+            self.signatures[txt_path] = None
+            return []
+        self.signatures[txt_path] = (stat.st_mtime_ns, stat.st_size, hashlib.sha1(data).digest())
+        return labelio.parse_label_lines(data.decode('utf-8', 'replace').splitlines())
+
+    def write(self, image_path, annotations):
+        """没有标注时删除标注文件（如果存在）；读取后文件被其他程序修改过时抛出 ConflictError"""
+        txt_path = self.label_path(image_path)
+        if txt_path in self.signatures:
+            known = self.signatures[txt_path]
+            current = file_signature(txt_path, known)
+            if not same_content(current, known):
+                raise ConflictError(f"标注文件已被其他程序修改: {os.path.basename(txt_path)}",
+                                    current, labelio.read_annotations(txt_path))
+        labelio.write_annotations(txt_path, annotations)
+        self.signatures[txt_path] = file_signature(txt_path)
+
+    def changed_externally(self, image_path):
+        """标注文件与最近一次读取或写入时的内容是否不同（没有读过的文件视为已变化）"""
+        txt_path = self.label_path(image_path)
+        if txt_path not in self.signatures:
+            return True
+        known = self.signatures[txt_path]
+        return not same_content(file_signature(txt_path, known), known)
+
+    def accept(self, image_path, version):
+        """接受 ConflictError 中的当前版本，之后的 write 将覆盖它"""
+        self.signatures[self.label_path(image_path)] = version
+
+    def scan(self, image_files, workers=None):
+        return labelio.scan_labels(image_files, workers=workers, label_path=self.label_path)
+
+    def remap(self, image_files, id_mapping):
+        """逐个改写标注文件"""
+        for image_path in image_files:
+            txt_path = self.label_path(image_path)
+            try:
+                labelio.remap_label_file(txt_path, id_mapping)
+                if txt_path in self.signatures:
+                    self.signatures[txt_path] = file_signature(txt_path)
+            except Exception as e:
+                print(f"更新标注文件 {txt_path} 失败: {e}")
+
+    def close(self):
+        pass
+
+
+class SQLiteStore:
+    """
+    单文件 SQLite 标注存储。
+
+    图片以相对 root 的路径（/ 分隔）保存，数据库可以随图片文件夹一起移动。
+    boxes 表按 (image_id, seq) 聚簇，读取一张图片的框是一次连续的范围查询。
+    写操作在创建连接的线程中进行；scan 在调用线程中另开只读连接，WAL 模式下不会阻塞界面写入。
+    """
+
+    kind = 'sqlite'
+
+    def __init__(self, db_path, root):
+        self.db_path = db_path
+        self.root = root
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def key(self, image_path):
+        return os.path.relpath(image_path, self.root).replace(os.sep, "/")
+
+    def read(self, image_path):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT b.class, b.cx, b.cy, b.w, b.h FROM boxes b JOIN images i ON b.image_id = i.id "
+                "WHERE i.path = ? ORDER BY b.seq", (self.key(image_path),)).fetchall()
+        return [{'class': row[0], 'bbox': list(row[1:])} for row in rows]
+
+    def write(self, image_path, annotations):
+        self.write_many([(image_path, annotations)])
+
+    def write_many(self, items):
+        """在一个事务中写入多张图片的标注 [(图片路径, annotations)]"""
+        with self._lock, self._conn:
+            for image_path, annotations in items:
+                key = self.key(image_path)
+                self._conn.execute("INSERT OR IGNORE INTO images (path) VALUES (?)", (key,))
+                image_id = self._conn.execute("SELECT id FROM images WHERE path = ?", (key,)).fetchone()[0]
+                self._conn.execute("DELETE FROM boxes WHERE image_id = ?", (image_id,))
+                self._conn.executemany(
+                    "INSERT INTO boxes (image_id, seq, class, cx, cy, w, h) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(image_id, seq, ann['class'], *ann['bbox'][:4]) for seq, ann in enumerate(annotations)])
+
+    def scan(self, image_files, workers=None):
+        """一次查询读出全部框，按 image_files 顺序组装为 LabelTable"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            index_of = {self.key(p): i for i, p in enumerate(image_files)}
+            image_index = {image_id: index_of.get(path, -1)
+                           for image_id, path in conn.execute("SELECT id, path FROM images")}
+            rows = conn.execute("SELECT image_id, class, cx, cy, w, h FROM boxes ORDER BY image_id, seq").fetchall()
+        finally:
+            conn.close()
+        if rows:
+            data = np.array(rows, dtype=np.float64)
+            images = np.array([image_index.get(int(i), -1) for i in data[:, 0]], dtype=np.int64)
+            keep = images >= 0
+            order = np.argsort(images[keep], kind='stable')
+            images = images[keep][order]
+            classes = data[keep, 1][order].astype(np.int32)
+            boxes = data[keep, 2:6][order].astype(np.float32)
+        else:
+            images = np.empty(0, dtype=np.int64)
+            classes, boxes = np.empty(0, np.int32), np.empty((0, 4), np.float32)
+        offsets = np.zeros(len(image_files) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(images, minlength=len(image_files)), out=offsets[1:])
+        return labelio.LabelTable(classes, boxes, offsets)
+
+    def remap(self, image_files, id_mapping):
+        """与 YoloFileStore.remap 规则一致（不在映射中的框被删除），但只需一次 DELETE 和一次 UPDATE"""
+        old_ids = sorted(id_mapping)
+        placeholders = ", ".join("?" * len(old_ids))
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM boxes WHERE class NOT IN ({placeholders})", old_ids)
+            changed = [(old, new) for old, new in id_mapping.items() if old != new]
+            if changed:
+                cases = " ".join("WHEN ? THEN ?" for _ in changed)
+                self._conn.execute(f"UPDATE boxes SET class = CASE class {cases} END "
+                                   f"WHERE class IN ({', '.join('?' * len(changed))})",
+                                   [v for pair in changed for v in pair] + [old for old, _ in changed])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def db_path_for(folder_path):
+    return os.path.join(labelio.label_folder_for(folder_path), DB_NAME)
+
+
+def open_store(folder_path):
+    """文件夹中有 labels.db 时打开 SQLiteStore，否则返回 YoloFileStore"""
+    db_path = db_path_for(folder_path)
+    if os.path.exists(db_path):
+        return SQLiteStore(db_path, folder_path)
+    return YoloFileStore()
+
+
+def read_annotations_chunk(label_paths):
+    """工作进程：按文本精确读取一批标注文件（坐标保持 double）"""
+    results = []
+    for txt_path in label_paths:
+        try:
+            results.append((labelio.read_annotations(txt_path), None))
+        except Exception as e:
+            results.append(([], str(e)))
+    return results
+
+
+def convert_to_sqlite(folder_path, image_files=None, remove_txt=False, workers=None, chunk_size=2048):
+    """
+    把文件夹中的 YOLO 标注文件导入 labels.db。
+
+    Returns:
+        (dict): {'images', 'annotations', 'failed': [(标注文件, 错误)]}
+    """
+    if image_files is None:
+        image_files = labelio.list_image_files(folder_path)
+    label_paths = [labelio.label_path_for(p) for p in image_files]
+    chunks = [label_paths[i:i + chunk_size] for i in range(0, len(label_paths), chunk_size)]
+    store = SQLiteStore(db_path_for(folder_path), folder_path)
+    stats = {'images': 0, 'annotations': 0, 'failed': []}
+    executor = ProcessPoolExecutor(max_workers=workers) if len(chunks) > 1 and workers != 1 else None
+    try:
+        results = executor.map(read_annotations_chunk, chunks) if executor else map(read_annotations_chunk, chunks)
+        for chunk_index, chunk_results in enumerate(results):
+            items = []
+            for i, (annotations, error) in enumerate(chunk_results):
+                if error:
+                    stats['failed'].append((chunks[chunk_index][i], error))
+                    continue
+                if annotations:
+                    items.append((image_files[chunk_index * chunk_size + i], annotations))
+                    stats['images'] += 1
+                    stats['annotations'] += len(annotations)
+            store.write_many(items)
+    finally:
+        if executor:
+            executor.shutdown()
+        store.close()
+
+    if remove_txt and not stats['failed']:
+        for txt_path in label_paths:
+            if os.path.exists(txt_path):
+                os.remove(txt_path)
+    return stats
+
+
+def convert_to_yolo(folder_path):
+    """
+    把 labels.db 中的每一张图片（按数据库的 images 表，而不是当前列出的图片）写回为 YOLO 标注文件，
+    全部写出后才删除 labels.db；有写出失败的图片时抛出 OSError 并保留 labels.db。返回写出的标注文件数。
+    """
+    db_path = db_path_for(folder_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        images = conn.execute("SELECT id, path FROM images").fetchall()
+        annotations_of = {}
+        for image_id, class_id, *bbox in conn.execute(
+                "SELECT image_id, class, cx, cy, w, h FROM boxes ORDER BY image_id, seq"):
+            annotations_of.setdefault(image_id, []).append({'class': class_id, 'bbox': bbox})
+    finally:
+        conn.close()
+
+    written, failed = 0, []
+    for image_id, key in images:
+        annotations = annotations_of.get(image_id, [])
+        image_path = os.path.join(folder_path, *key.split("/"))
+        try:
+            labelio.write_annotations(labelio.label_path_for(image_path), annotations)
+        except OSError as e:
+            failed.append((key, str(e)))
+            continue
+        written += bool(annotations)
+    if failed:
+        details = "\n".join(f"  {key}: {message}" for key, message in failed[:20])
+        raise OSError(f"{len(failed)} 张图片的标注写出失败，保留 {db_path}:\n{details}")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在 YOLO 标注文件和 SQLite 单文件存储之间转换")
+    parser.add_argument("target", choices=("to-sqlite", "to-yolo"), help="转换方向")
+    parser.add_argument("folder", help="图片文件夹")
+    parser.add_argument("--remove-txt", action="store_true", help="to-sqlite: 成功后删除 .txt 标注文件")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--recursive", action="store_true",
+                        help="to-sqlite: 包括子文件夹（to-yolo 总是写出数据库中的全部图片）")
+    args = parser.parse_args(argv)
+
+    if args.target == "to-sqlite":
+        image_files = labelio.list_image_files(args.folder, args.recursive)
+        stats = convert_to_sqlite(args.folder, image_files, remove_txt=args.remove_txt, workers=args.workers)
+        print(f"已导入 {stats['images']} 张图片、{stats['annotations']} 个框 -> {db_path_for(args.folder)}")
+        for path, message in stats['failed'][:20]:
+            print(f"  {path}: {message}")
+    else:
+        if not os.path.exists(db_path_for(args.folder)):
+            print(f"没有找到 {db_path_for(args.folder)}")
+            return 1
+        try:
+            written = convert_to_yolo(args.folder)
+        except OSError as e:
+            print(e)
+            return 1
+        print(f"已写出 {written} 个标注文件")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
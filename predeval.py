@@ -0,0 +1,294 @@
+"""
+模型评估：加载另一个文件夹中的预测结果，与标注逐张匹配，统计每张图片的 TP/FP/FN 和每个类别的 AP。
+
+预测文件夹与标注目录的结构相同，预测文件与标注文件同名（见 labelio.mirrored_label_path），每行 "class cx cy w h conf"（YOLO save_conf 的输出格式），
+没有置信度的 5 字段行视为 conf=1。
+
+匹配规则与 COCO 相同：每张图片内按置信度从高到低，每个预测框匹配同类别、IoU 最高且尚未被匹配的标注框。
+一批图片的所有 (预测, 标注) 框对一次性生成并计算 IoU，只有超过阈值的少数框对需要逐个贪心分配；
+多批图片在进程池中并行。AP 使用全部预测（101 点插值），TP/FP/FN 只统计置信度不低于 conf_threshold 的预测。
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import labelio
+from labelqa import pair_iou, xywh_to_xyxy
+
+RECALL_POINTS = np.linspace(0.0, 1.0, 101)
+
+
+def parse_prediction_array(text):
+    """
+    解析预测文件内容。
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): 类别 (int32)、框 (float32, Nx4)、置信度 (float32)。
+    """
+    rows = [row for row in (line.split() for line in text.splitlines()) if len(row) in (5, 6)]
+    if not rows:
+        return np.empty(0, np.int32), np.empty((0, 4), np.float32), np.empty(0, np.float32)
+    classes = np.array([int(row[0]) for row in rows], dtype=np.int32)
+    values = np.array([row[1:] + ["1"] * (6 - len(row)) for row in rows], dtype=np.float64).astype(np.float32)
+    return classes, values[:, :4], values[:, 4]
+
+
+def read_predictions(txt_path):
+    """读取预测文件为 [{'class', 'bbox', 'score'}]，文件不存在时返回空列表"""
+    if not os.path.exists(txt_path):
+        return []
+    with open(txt_path, 'r') as f:
+        classes, boxes, scores = parse_prediction_array(f.read())
+    return [{'class': int(c), 'bbox': [float(v) for v in b], 'score': float(s)}
+            for c, b, s in zip(classes, boxes, scores)]
+
+
+def scan_prediction_chunk(pred_paths):
+    """读取一批预测文件，返回 (类别, 框, 置信度, offsets, {批内序号: 错误})"""
+    all_classes, all_boxes, all_scores, errors = [], [], [], {}
+    offsets = np.zeros(len(pred_paths) + 1, dtype=np.int64)
+    for i, txt_path in enumerate(pred_paths):
+        classes, boxes, scores = np.empty(0, np.int32), np.empty((0, 4), np.float32), np.empty(0, np.float32)
+        try:
+            with open(txt_path, 'r') as f:
+                classes, boxes, scores = parse_prediction_array(f.read())
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            errors[i] = str(e)
+        all_classes.append(classes)
+        all_boxes.append(boxes)
+        all_scores.append(scores)
+        offsets[i + 1] = offsets[i] + len(classes)
+    if not pred_paths:
+        return np.empty(0, np.int32), np.empty((0, 4), np.float32), np.empty(0, np.float32), offsets, errors
+    return np.concatenate(all_classes), np.concatenate(all_boxes), np.concatenate(all_scores), offsets, errors
+
+
+def cross_image_pairs(pred_offsets, gt_offsets):
+    """同一张图片内所有 (预测, 标注) 框对的全局索引，一次性生成整个批次"""
+    pred_counts, gt_counts = np.diff(pred_offsets), np.diff(gt_offsets)
+    image_of_pred = np.repeat(np.arange(len(pred_counts)), pred_counts)
+    partners = gt_counts[image_of_pred]
+    first = np.repeat(np.arange(int(pred_offsets[-1])), partners)
+    group_start = np.repeat(np.cumsum(partners) - partners, partners)
+    second = np.repeat(gt_offsets[:-1][image_of_pred], partners) + (np.arange(len(first)) - group_start)
+    return first, second
+
+
+def match_predictions(gt_classes, gt_boxes, gt_offsets, pred_classes, pred_boxes, pred_scores, pred_offsets,
+                      iou_threshold=0.5):
+    """
+    按 COCO 规则匹配一批图片的预测框和标注框。
+
+    Returns:
+        (np.ndarray, np.ndarray): 每个预测框匹配到的全局标注框索引（没有匹配为 -1）和对应的 IoU。
+    """
+    matched = np.full(len(pred_classes), -1, dtype=np.int64)
+    matched_iou = np.zeros(len(pred_classes), dtype=np.float64)
+    if not len(pred_classes) or not len(gt_classes):
+        return matched, matched_iou
+    first, second = cross_image_pairs(pred_offsets, gt_offsets)
+    same_class = pred_classes[first] == gt_classes[second]
+    first, second = first[same_class], second[same_class]
+    xyxy = np.concatenate([xywh_to_xyxy(pred_boxes.astype(np.float64)), xywh_to_xyxy(gt_boxes.astype(np.float64))])
+    iou = pair_iou(xyxy, first, second + len(pred_classes))
+    candidate = iou >= iou_threshold
+    first, second, iou = first[candidate], second[candidate], iou[candidate]
+
+    # 按 (置信度降序, 预测框, IoU 降序) 排列后贪心：每个预测框取第一个尚未被占用的标注框
+    order = np.lexsort((-iou, first, -pred_scores[first]))
+    gt_used = np.zeros(len(gt_classes), dtype=bool)
+    for k in order:
+        p, g = first[k], second[k]
+        if matched[p] < 0 and not gt_used[g]:
+            matched[p], matched_iou[p] = g, iou[k]
+            gt_used[g] = True
+    return matched, matched_iou
+
+
+def match_image(annotations, predictions, iou_threshold=0.5):
+    """单张图片（界面上当前编辑中的标注）: 返回每个预测框匹配到的标注框序号，没有匹配为 -1"""
+    gt_classes = np.array([ann['class'] for ann in annotations], dtype=np.int64)
+    gt_boxes = np.array([ann['bbox'] for ann in annotations], dtype=np.float64).reshape(-1, 4)
+    pred_classes = np.array([p['class'] for p in predictions], dtype=np.int64)
+    pred_boxes = np.array([p['bbox'] for p in predictions], dtype=np.float64).reshape(-1, 4)
+    pred_scores = np.array([p['score'] for p in predictions], dtype=np.float64)
+    matched, _ = match_predictions(gt_classes, gt_boxes, np.array([0, len(gt_classes)]),
+                                   pred_classes, pred_boxes, pred_scores, np.array([0, len(pred_classes)]),
+                                   iou_threshold)
+    return matched
+
+
+def evaluate_chunk(gt_classes, gt_boxes, gt_offsets, pred_paths, iou_threshold, conf_threshold):
+    """
+    工作进程：读取一批预测文件并与标注匹配。
+
+    Returns:
+        (tuple): (每张图片的 TP, FP, FN, 预测框类别, 预测框置信度, 预测框是否为 TP, 错误)
+    """
+    pred_classes, pred_boxes, pred_scores, pred_offsets, errors = scan_prediction_chunk(pred_paths)
+    matched, _ = match_predictions(gt_classes, gt_boxes, gt_offsets, pred_classes, pred_boxes, pred_scores,
+                                   pred_offsets, iou_threshold)
+    is_tp = matched >= 0
+    confident = pred_scores >= conf_threshold
+    image_of_pred = np.repeat(np.arange(len(pred_paths)), np.diff(pred_offsets))
+    num_images = len(pred_paths)
+    tp = np.bincount(image_of_pred[is_tp & confident], minlength=num_images)
+    fp = np.bincount(image_of_pred[~is_tp & confident], minlength=num_images)
+    fn = np.diff(gt_offsets) - tp
+    return tp, fp, fn, pred_classes, pred_scores, is_tp, errors
+
+
+def average_precision(scores, is_tp, num_gt):
+    """101 点插值的 AP（COCO 方式）"""
+    if num_gt == 0 or not len(scores):
+        return 0.0
+    order = np.argsort(-scores, kind='stable')
+    tp = np.cumsum(is_tp[order])
+    fp = np.cumsum(~is_tp[order])
+    recall = tp / num_gt
+    precision = tp / np.maximum(tp + fp, 1)
+    envelope = np.maximum.accumulate(precision[::-1])[::-1]
+    positions = np.searchsorted(recall, RECALL_POINTS, side='left')
+    return float(np.where(positions < len(envelope), envelope[np.minimum(positions, len(envelope) - 1)], 0.0).mean())
+
+
+class EvalReport:
+    """
+    评估结果，图片以 image_files 中的序号表示。
+
+    Attributes:
+        tp, fp, fn (np.ndarray): 每张图片置信度不低于 conf_threshold 的预测的 TP/FP/FN 数。
+        ap (dict): 类别ID -> AP（只包含有标注框的类别）。
+        gt_counts, pred_counts (dict): 类别ID -> 标注框数 / 预测框数。
+        errors (dict): 读取失败的预测文件，图片序号 -> 错误信息。
+    """
+
+    def __init__(self, tp, fp, fn, ap, gt_counts, pred_counts, iou_threshold, conf_threshold, errors=None):
+        self.tp, self.fp, self.fn = tp, fp, fn
+        self.ap = ap
+        self.gt_counts = gt_counts
+        self.pred_counts = pred_counts
+        self.iou_threshold = iou_threshold
+        self.conf_threshold = conf_threshold
+        self.errors = errors or {}
+
+    @property
+    def num_images(self):
+        return len(self.tp)
+
+    def error_counts(self):
+        """每张图片的错误数 (FP + FN)"""
+        return self.fp + self.fn
+
+    def worst_first(self):
+        """按错误数从多到少排列的图片序号（错误数相同时保持原顺序）"""
+        return np.argsort(-self.error_counts(), kind='stable')
+
+    def mean_ap(self):
+        return float(np.mean(list(self.ap.values()))) if self.ap else 0.0
+
+    def precision_recall(self):
+        tp, fp, fn = int(self.tp.sum()), int(self.fp.sum()), int(self.fn.sum())
+        return tp / max(tp + fp, 1), tp / max(tp + fn, 1)
+
+    def summary(self, class_names=()):
+        """多行文字摘要"""
+        precision, recall = self.precision_recall()
+        lines = [f"mAP@{self.iou_threshold:.2f}: {self.mean_ap():.4f}",
+                 f"置信度 >= {self.conf_threshold:.2f}: P {precision:.4f}  R {recall:.4f}  "
+                 f"TP {int(self.tp.sum())}  FP {int(self.fp.sum())}  FN {int(self.fn.sum())}",
+                 f"有错误的图片: {int(np.count_nonzero(self.error_counts()))}/{self.num_images}"]
+        for class_id in sorted(self.ap):
+            name = class_names[class_id] if class_id < len(class_names) else f"Class {class_id}"
+            lines.append(f"  {name}: AP {self.ap[class_id]:.4f}  "
+                         f"({self.gt_counts.get(class_id, 0)} 个标注, {self.pred_counts.get(class_id, 0)} 个预测)")
+        if self.errors:
+            lines.append(f"读取失败的预测文件: {len(self.errors)}")
+        return "\n".join(lines)
+
+
+def evaluate(table, pred_paths, iou_threshold=0.5, conf_threshold=0.25, workers=None, chunk_size=2048):
+    """
+    并行评估全部图片。
+
+    Args:
+        table (labelio.LabelTable): 标注（例如 label_store.scan(image_files) 的结果）。
+        pred_paths (list): 与 table 中图片一一对应的预测文件路径。
+
+    Returns:
+        (EvalReport): 评估结果。
+    """
+    chunks = []
+    for start in range(0, len(pred_paths), chunk_size):
+        stop = min(start + chunk_size, len(pred_paths))
+        lo, hi = table.offsets[start], table.offsets[stop]
+        chunks.append((table.classes[lo:hi], table.boxes[lo:hi], table.offsets[start:stop + 1] - lo,
+                       pred_paths[start:stop], iou_threshold, conf_threshold))
+    if len(chunks) <= 1 or workers == 1:
+        results = [evaluate_chunk(*chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(evaluate_chunk, *chunk) for chunk in chunks]
+            results = [future.result() for future in futures]
+
+    def gather(i, empty):
+        return np.concatenate([r[i] for r in results]) if results else empty
+
+    tp, fp, fn = (gather(i, np.empty(0, np.int64)) for i in range(3))
+    pred_classes = gather(3, np.empty(0, np.int32))
+    pred_scores = gather(4, np.empty(0, np.float32))
+    is_tp = gather(5, np.empty(0, bool))
+    errors = {}
+    for chunk_index, r in enumerate(results):
+        for i, message in r[6].items():
+            errors[chunk_index * chunk_size + i] = message
+
+    gt_ids, gt_num = np.unique(table.classes, return_counts=True)
+    pred_ids, pred_num = np.unique(pred_classes, return_counts=True)
+    gt_counts = {int(c): int(n) for c, n in zip(gt_ids, gt_num)}
+    pred_counts = {int(c): int(n) for c, n in zip(pred_ids, pred_num)}
+    ap = {}
+    for class_id, num_gt in gt_counts.items():
+        mask = pred_classes == class_id
+        ap[class_id] = average_precision(pred_scores[mask], is_tp[mask], num_gt)
+    return EvalReport(tp, fp, fn, ap, gt_counts, pred_counts, iou_threshold, conf_threshold, errors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="用标注评估模型预测：每张图片的 TP/FP/FN 和每个类别的 AP")
+    parser.add_argument("folder", help="图片文件夹（标注文件与图片同目录，或在对应的 labels/ 目录中）")
+    parser.add_argument("predictions", help="预测文件夹（结构与标注目录相同、与标注文件同名的 .txt，每行 class cx cy w h conf）")
+    parser.add_argument("--iou", type=float, default=0.5, help="匹配的 IoU 阈值")
+    parser.add_argument("--conf", type=float, default=0.25, help="统计 TP/FP/FN 的置信度阈值")
+    parser.add_argument("--worst", type=int, default=20, help="列出错误最多的图片数")
+    parser.add_argument("--classes", help="类别文件，默认为图片文件夹下的 classes.txt")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--recursive", action="store_true", help="包括子文件夹")
+    args = parser.parse_args(argv)
+
+    image_files = labelio.list_image_files(args.folder, args.recursive)
+    if not image_files:
+        print(f"没有找到图片: {args.folder}")
+        return 1
+    classes_path = args.classes or os.path.join(args.folder, "classes.txt")
+    class_names = labelio.read_class_names(classes_path) if os.path.exists(classes_path) else []
+
+    table = labelio.scan_labels(image_files, workers=args.workers)
+    pred_paths = labelio.mirrored_label_paths(args.predictions, image_files, args.folder)
+    report = evaluate(table, pred_paths, args.iou, args.conf, args.workers)
+    print(report.summary(class_names))
+    errors = report.error_counts()
+    for i in report.worst_first()[:args.worst]:
+        if not errors[i]:
+            break
+        print(f"  {os.path.basename(image_files[i])}: FP {report.fp[i]}  FN {report.fn[i]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""
+性能遥测：各阶段耗时统计、滚动延迟直方图、帧率统计，以及退出时导出 JSON。
+
+用法:
+    >>> from telemetry import telemetry
+    >>> with telemetry.span("decode"):
+    ...     image = load()
+    >>> telemetry.summary()["stages"]["decode"]["p50_ms"]
+"""
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# 直方图分桶上界（毫秒），按 2 倍递增，最后一个桶收纳所有更大的值
+HISTOGRAM_BOUNDS_MS = tuple(0.125 * 2 ** i for i in range(18))
+
+
+class StageStats:
+    """单个阶段的延迟统计：滚动窗口用于分位数，累积分桶直方图用于跨机器比较"""
+
+    def __init__(self, window=1024):
+        self.samples = deque(maxlen=window)  # 最近 window 次耗时（毫秒）
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+
+    def add(self, ms):
+        """记录一次耗时"""
+        self.samples.append(ms)
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+        for i, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def percentile(self, q):
+        """滚动窗口内的分位数（q 取 0~100），无样本时返回 0"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "max_ms": self.max_ms,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "histogram": {
+                "bounds_ms": list(HISTOGRAM_BOUNDS_MS),
+                "counts": list(self.buckets),
+            },
+        }
+
+
+class Telemetry:
+    """轻量级计时子系统，所有阶段共享一个实例（见模块级 telemetry）"""
+
+    def __init__(self, window=1024, fps_window_s=2.0):
+        self.enabled = True
+        self.window = window
+        self.fps_window_s = fps_window_s
+        self.stages = {}
+        self.frame_times = deque(maxlen=1024)
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, name, ms):
+        """记录某阶段的一次耗时（毫秒）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats(self.window)
+            stats.add(ms)
+
+    @contextmanager
+    def span(self, name):
+        """计时上下文：with telemetry.span("paint"): ..."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000.0)
+
+    def timed(self, name):
+        """计时装饰器，等价于把整个函数体包在 span(name) 里"""
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def tick_frame(self):
+        """标记一帧绘制完成，用于计算 FPS"""
+        if self.enabled:
+            self.frame_times.append(time.perf_counter())
+
+    def fps(self):
+        """最近 fps_window_s 秒内的平均帧率"""
+        if len(self.frame_times) < 2:
+            return 0.0
+        newest = self.frame_times[-1]
+        frames = [t for t in self.frame_times if newest - t <= self.fps_window_s]
+        if len(frames) < 2 or frames[-1] == frames[0]:
+            return 0.0
+        return (len(frames) - 1) / (frames[-1] - frames[0])
+
+    def stage_percentiles(self):
+        """返回 [(阶段名, p50, p99)]，供 HUD 显示"""
+        with self._lock:
+            return [(name, stats.percentile(50), stats.percentile(99))
+                    for name, stats in sorted(self.stages.items())]
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.frame_times.clear()
+            self.started_at = time.time()
+
+    def summary(self, meta=None):
+        """汇总为可 JSON 序列化的字典，meta 用于附加数据集等信息"""
+        with self._lock:
+            stages = {name: stats.to_dict() for name, stats in sorted(self.stages.items())}
+        return {
+            "started_at": self.started_at,
+            "duration_s": time.time() - self.started_at,
+            "machine": {
+                "platform": platform.platform(),
+                "python": platform.python_version(),
+                "processor": platform.processor(),
+                "cpu_count": os.cpu_count(),
+            },
+            "meta": meta or {},
+            "fps": self.fps(),
+            "stages": stages,
+        }
+
+    def dump(self, path, meta=None):
+        """把统计数据写入 JSON 文件，返回写入的路径"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(meta), f, ensure_ascii=False, indent=2)
+        return path
+
+
+def process_rss_bytes():
+    """当前进程常驻内存（RSS，字节），无法获取时返回 None"""
+    try:
+        if sys.platform.startswith("linux"):
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        if sys.platform == "win32":
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                            ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                            ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize
+            return None
+        # 其它平台只能拿到峰值 RSS（macOS 单位为字节，其余为 KB）
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return None
+
+
+def default_dump_path():
+    """默认导出路径：环境变量 LABELBRIDGE_TELEMETRY，否则 ~/.labelbridge/telemetry/<主机>-<时间>.json"""
+    path = os.environ.get("LABELBRIDGE_TELEMETRY")
+    if path:
+        return path
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return os.path.join(os.path.expanduser("~"), ".labelbridge", "telemetry",
+                        f"{platform.node() or 'host'}-{stamp}.json")
+
+
+telemetry = Telemetry()  # 全局实例
@@ -0,0 +1,33 @@
+"""主动学习队列的回归检查：改标使类别计数减少后，取出的仍是当前分数最高的图片"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import activequeue  # noqa: E402
+
+
+def test_relabel_keeps_queue_order():
+    rng = np.random.default_rng(1)
+    offsets = np.r_[0, np.cumsum(rng.integers(1, 4, 300))]
+    pred_classes = rng.integers(0, 5, offsets[-1])
+    pred_scores = rng.random(offsets[-1]).astype(np.float32)
+    labeled = np.zeros(300, dtype=bool)
+    labeled[:40] = True
+    image_classes = {i: {int(rng.integers(0, 5))} for i in range(40)}
+    label_counts = {}
+    for classes in image_classes.values():
+        for class_id in classes:
+            label_counts[class_id] = label_counts.get(class_id, 0) + 1
+    queue = activequeue.ActiveQueue(labeled, [(activequeue.UncertaintyScorer(pred_scores, offsets), 1.0),
+                                              (activequeue.RarityScorer(pred_classes, offsets, label_counts), 2.0)],
+                                    dict(image_classes))
+    for step in range(150):
+        if step % 3 == 0:
+            queue.update(int(rng.integers(0, 40)), {int(rng.integers(0, 5))})
+        best = max(queue.score(i) for i in np.flatnonzero(~queue.labeled & ~queue.visited))
+        index = queue.pop_next()
+        assert queue.score(index) >= best - 1e-12
+        queue.update(index, {int(rng.integers(0, 5))})
@@ -0,0 +1,25 @@
+"""划分结果的回归检查：子文件夹中的同名图片不能互相覆盖，重新划分不能残留上一次的链接"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datasplit  # noqa: E402
+
+
+def test_resplit_keeps_subfolders_and_clears_old_links(tmp_path):
+    image_files = []
+    for sub in ("a", "b"):
+        os.makedirs(tmp_path / "src" / sub)
+        (tmp_path / "src" / sub / "x.jpg").write_bytes(b"\xff\xd8\xff\xd9")
+        (tmp_path / "src" / sub / "x.txt").write_text(f"0 0.5 0.5 0.1 0.{len(image_files) + 1}\n")
+        image_files.append(str(tmp_path / "src" / sub / "x.jpg"))
+    out_dir = str(tmp_path / "out")
+    datasplit.materialize_split(image_files, np.array([0, 0], dtype=np.int8), out_dir, ["c"], 'symlink')
+    datasplit.materialize_split(image_files, np.array([1, 0], dtype=np.int8), out_dir, ["c"], 'symlink')
+    linked = {os.path.relpath(os.path.join(root, name), out_dir)
+              for root, _, names in os.walk(out_dir) for name in names if name != "data.yaml"}
+    assert linked == {os.path.join("images", "val", "a", "x.jpg"), os.path.join("labels", "val", "a", "x.txt"),
+                      os.path.join("images", "train", "b", "x.jpg"), os.path.join("labels", "train", "b", "x.txt")}
@@ -0,0 +1,54 @@
+"""标注路径的回归检查：保存到还不存在的标注目录、压缩包成员名不能跳出覆盖层"""
+import os
+import sys
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import archivesource  # noqa: E402
+import labelio  # noqa: E402
+import labelstore  # noqa: E402
+
+BOX = [{'class': 0, 'bbox': [0.5, 0.5, 0.25, 0.25]}]
+
+
+def make_archive(path, members):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+
+def test_save_archive_member_in_subfolder_without_labels(tmp_path):
+    archive_path = str(tmp_path / "a.zip")
+    make_archive(archive_path, {"train/x.jpg": b"\xff\xd8\xff\xd9", "val/y.jpg": b"\xff\xd8\xff\xd9",
+                                "val/y.txt": b"0 0.5 0.5 0.1 0.1\n"})
+    image_files = archivesource.list_images(archive_path)
+    image_path = next(p for p in image_files if p.endswith("x.jpg"))
+    store = labelstore.YoloFileStore()
+    store.read(image_path)
+    store.write(image_path, BOX)
+    assert os.path.isfile(os.path.join(archive_path + labelio.ARCHIVE_LABEL_SUFFIX, "train", "x.txt"))
+    assert store.read(image_path) == BOX
+
+
+def test_archive_members_stay_inside_overlay(tmp_path):
+    archive_path = str(tmp_path / "data" / "a.zip")
+    os.makedirs(os.path.dirname(archive_path))
+    make_archive(archive_path, {"../../escaped.txt": b"x", "/abs/evil.txt": b"x", "x.jpg": b"\xff\xd8\xff\xd9"})
+    label_dir = archivesource.prepare_overlay(archive_path)
+    written = {os.path.relpath(os.path.join(root, name), label_dir)
+               for root, _, names in os.walk(label_dir) for name in names}
+    assert written == {archivesource.OVERLAY_STAMP, "escaped.txt", os.path.join("abs", "evil.txt")}
+    assert not os.path.exists(tmp_path / "escaped.txt")
+    label_path = labelio.label_path_for(os.path.join(archive_path, "../../y.jpg"))
+    assert os.path.dirname(label_path) == archive_path + labelio.ARCHIVE_LABEL_SUFFIX
+
+
+def test_save_into_missing_labels_subfolder(tmp_path):
+    os.makedirs(tmp_path / "images" / "val")
+    os.makedirs(tmp_path / "labels")
+    image_path = str(tmp_path / "images" / "val" / "x.jpg")
+    labelio.label_dir_for.cache_clear()
+    table = labelio.LabelPathTable([image_path])
+    labelstore.YoloFileStore(table).write(image_path, BOX)
+    assert os.path.isfile(tmp_path / "labels" / "val" / "x.txt")
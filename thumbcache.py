@@ -0,0 +1,210 @@
+"""
+磁盘缩略图缓存：所有缩略图追加写入同一个打包文件，按 (路径, mtime) 索引，由进程池在后台生成。
+
+打包文件由连续的记录组成，每条记录为:
+    RECORD 头 | 路径 (utf-8) | JPEG 数据
+打开时顺序扫描记录头重建索引（不读取 JPEG 数据），同一路径以最后一条记录为准；
+末尾写了一半的记录（例如程序崩溃）会被截断。
+"""
+import os
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import labelio
+from imagecodec import decode_rgb, encode_jpeg
+
+MAGIC = b"LBT1"
+# magic, 路径长度, mtime_ns, 文件大小, 缩略图宽, 缩略图高, 原图宽, 原图高, 数据长度
+RECORD = struct.Struct("<4sHqqHHIII")
+
+
+def make_thumbnail(path, size):
+    """工作进程：生成一张缩略图，返回 (路径, mtime_ns, 文件大小, 宽, 高, 原图尺寸, JPEG 数据)"""
+    stat = labelio.source_stat(path)
+    rgb, original_size = decode_rgb(path, size)
+    height, width = rgb.shape[:2]
+    return path, stat.st_mtime_ns, stat.st_size, width, height, original_size, encode_jpeg(rgb)
+
+
+class ThumbnailPack:
+    """单文件缩略图存储（追加写入，内存中保存索引）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.index = {}  # 路径 -> (mtime_ns, 文件大小, 宽, 高, 原图尺寸, 数据偏移, 数据长度)
+        self.stale_records = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "a+b")
+        self._scan()
+
+    def _scan(self):
+        """顺序扫描记录头重建索引"""
+        f = self._file
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        offset = 0
+        f.seek(0)
+        while offset + RECORD.size <= end:
+            header = f.read(RECORD.size)
+            magic, key_len, mtime_ns, file_size, w, h, orig_w, orig_h, data_len = RECORD.unpack(header)
+            if magic != MAGIC or offset + RECORD.size + key_len + data_len > end:
+                break
+            key = f.read(key_len).decode("utf-8")
+            data_offset = offset + RECORD.size + key_len
+            if key in self.index:
+                self.stale_records += 1
+            self.index[key] = (mtime_ns, file_size, w, h, (orig_w, orig_h), data_offset, data_len)
+            offset = data_offset + data_len
+            f.seek(offset)
+        if offset < end:
+            f.truncate(offset)
+
+    def lookup(self, path, mtime_ns, file_size):
+        """返回与 mtime/大小匹配的索引项，不匹配或不存在时返回 None"""
+        entry = self.index.get(path)
+        if entry and entry[0] == mtime_ns and entry[1] == file_size:
+            return entry
+        return None
+
+    def read(self, path, mtime_ns, file_size):
+        """读取缩略图 (宽, 高, 原图尺寸, JPEG 数据)，缓存失效时返回 None"""
+        with self._lock:
+            entry = self.lookup(path, mtime_ns, file_size)
+            if entry is None:
+                return None
+            w, h, original_size, data_offset, data_len = entry[2:]
+            self._file.seek(data_offset)
+            return w, h, original_size, self._file.read(data_len)
+
+    def write(self, path, mtime_ns, file_size, w, h, original_size, data):
+        """追加一条缩略图记录"""
+        key = path.encode("utf-8")
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            offset = self._file.tell()
+            self._file.write(RECORD.pack(MAGIC, len(key), mtime_ns, file_size, w, h,
+                                         original_size[0], original_size[1], len(data)))
+            self._file.write(key)
+            self._file.write(data)
+            self._file.flush()
+            if path in self.index:
+                self.stale_records += 1
+            self.index[path] = (mtime_ns, file_size, w, h, tuple(original_size),
+                                offset + RECORD.size + len(key), len(data))
+
+    def compact(self, keep_paths=None):
+        """重写打包文件，去掉过期记录以及不在 keep_paths 中的路径"""
+        with self._lock:
+            temp_path = self.path + ".tmp"
+            new_index = {}
+            with open(temp_path, "wb") as out:
+                for path, (mtime_ns, file_size, w, h, original_size, data_offset, data_len) in self.index.items():
+                    if keep_paths is not None and path not in keep_paths:
+                        continue
+                    self._file.seek(data_offset)
+                    data = self._file.read(data_len)
+                    key = path.encode("utf-8")
+                    offset = out.tell()
+                    out.write(RECORD.pack(MAGIC, len(key), mtime_ns, file_size, w, h,
+                                          original_size[0], original_size[1], data_len))
+                    out.write(key)
+                    out.write(data)
+                    new_index[path] = (mtime_ns, file_size, w, h, original_size,
+                                       offset + RECORD.size + len(key), data_len)
+            self._file.close()
+            os.replace(temp_path, self.path)
+            self._file = open(self.path, "a+b")
+            self.index = new_index
+            self.stale_records = 0
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class ThumbnailCache:
+    """
+    缩略图缓存：命中时直接从打包文件读取，未命中时提交到进程池后台生成。
+
+    Args:
+        pack_path (str): 打包文件路径。
+        size (int): 缩略图长边。
+        workers (int, optional): 进程数，默认 CPU 核数。
+        on_ready (callable, optional): 缩略图生成后在后台线程中回调 on_ready(path)。
+    """
+
+    def __init__(self, pack_path, size=128, workers=None, on_ready=None):
+        self.size = size
+        self.on_ready = on_ready
+        self.pack = ThumbnailPack(pack_path)
+        if len(self.pack.index) and self.pack.stale_records > len(self.pack.index):
+            self.pack.compact()
+        self.pending = {}  # 路径 -> Future
+        self.failed = set()
+        self._stats = {}  # 路径 -> (mtime_ns, 文件大小)
+        self._lock = threading.RLock()  # future.cancel() 会在持锁的线程中同步回调 _on_done
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        self.closed = False
+
+    def _stat(self, path, refresh=False):
+        stat = None if refresh else self._stats.get(path)
+        if stat is None:
+            try:
+                st = labelio.source_stat(path)
+            except OSError:
+                return None
+            stat = self._stats[path] = (st.st_mtime_ns, st.st_size)
+        return stat
+
+    def get(self, path):
+        """返回 (宽, 高, 原图尺寸, JPEG 数据)，尚未生成时返回 None"""
+        stat = self._stat(path)
+        if stat is None:
+            return None
+        return self.pack.read(path, *stat)
+
+    def request(self, paths):
+        """
+        请求生成 paths 中尚未缓存的缩略图；不在本次请求中且尚未开始的任务会被取消。
+        已 stat 过的图片使用记住的 mtime，图片被修改后由 invalidate 重新检查。
+        """
+        wanted = set(paths)
+        with self._lock:
+            for path, future in list(self.pending.items()):
+                if path not in wanted and future.cancel():
+                    self.pending.pop(path, None)
+            for path in paths:
+                if path in self.pending or path in self.failed:
+                    continue
+                stat = self._stat(path)
+                if stat is None or self.pack.lookup(path, *stat):
+                    continue
+                future = self._executor.submit(make_thumbnail, path, self.size)
+                self.pending[path] = future
+                future.add_done_callback(lambda f, p=path: self._on_done(p, f))
+
+    def _on_done(self, path, future):
+        with self._lock:
+            self.pending.pop(path, None)
+        if future.cancelled() or self.closed:
+            return
+        try:
+            path, mtime_ns, file_size, w, h, original_size, data = future.result()
+            self.pack.write(path, mtime_ns, file_size, w, h, original_size, data)
+            self._stats[path] = (mtime_ns, file_size)
+        except Exception as e:
+            print(f"生成缩略图 {path} 失败: {e}")
+            self.failed.add(path)
+        if self.on_ready:
+            self.on_ready(path)
+
+    def invalidate(self, path):
+        """图片被修改后重新检查 mtime"""
+        self._stats.pop(path, None)
+        self.failed.discard(path)
+
+    def close(self):
+        self.closed = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.pack.close()
@@ -0,0 +1,417 @@
+"""
+视频文件作为图片来源（行车记录仪等长视频不需要先抽出几百万张 JPEG）。
+
+每一帧是一张“图片”，路径为 <视频路径>#<帧序号>（见 labelio.frame_path）；标注按帧保存为视频旁边的
+<视频名>_<帧序号>.txt（YOLO 格式），与抽帧后的图片同名，以后抽帧时标注可以直接使用。
+
+帧索引（每帧的显示时间和关键帧位置）只建立一次，缓存在数据集缓存目录:
+    MP4/MOV   解析 moov 中视频轨的 stts/ctts/stss 表，不需要解码
+    其它格式  顺序 grab 一遍得到准确的帧数和每帧时间（没有关键帧信息）
+
+VideoSource 在工作线程中解码，结果放在固定容量的缓冲区中。向后顺序浏览时预读后面几帧；
+跳转或向前浏览时从目标帧之前最近的关键帧开始解码，把这一段中最后的若干帧都留在缓冲区，
+之后的上一帧/下一帧都不需要等待解码。
+
+需要 OpenCV (cv2)，没有安装时不列出视频帧。
+"""
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import labelio
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+INDEX_VERSION = 1
+
+
+class VideoIndex:
+    """帧索引: 每帧的显示时间（毫秒）和关键帧序号（升序，未知时为空）"""
+
+    def __init__(self, timestamps, keyframes, width, height, fps):
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.keyframes = np.asarray(keyframes, dtype=np.int64)
+        self.width = int(width)
+        self.height = int(height)
+        self.fps = float(fps)
+
+    @property
+    def frame_count(self):
+        return len(self.timestamps)
+
+    def keyframe_before(self, frame_index):
+        """frame_index 之前（含）最近的关键帧，没有关键帧信息时返回 None"""
+        if not len(self.keyframes):
+            return None
+        position = np.searchsorted(self.keyframes, frame_index, side='right') - 1
+        return int(self.keyframes[position]) if position >= 0 else 0
+
+
+def _iter_boxes(f, start, end):
+    """遍历 [start, end) 范围内的 MP4 box，产生 (类型, 内容起点, 终点)"""
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        size, kind = struct.unpack(">I4s", f.read(8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - position
+        if size < header_size:
+            return
+        yield kind, position + header_size, position + size
+        position += size
+
+
+def _find_box(f, start, end, path):
+    for kind, body, stop in _iter_boxes(f, start, end):
+        if kind == path[0]:
+            if len(path) == 1:
+                return body, stop
+            found = _find_box(f, body, stop, path[1:])
+            if found:
+                return found
+    return None
+
+
+def _read_table(f, box, row_format):
+    """读取 full box 中的表: 4 字节版本/标志 + 4 字节条目数 + 条目"""
+    body, _ = box
+    f.seek(body)
+    version = f.read(1)[0]
+    f.seek(body + 4)
+    count = struct.unpack(">I", f.read(4))[0]
+    dtype = np.dtype(row_format)
+    return version, np.frombuffer(f.read(count * dtype.itemsize), dtype=dtype)
+
+
+def parse_mp4_frames(video_path):
+    """
+    从 MP4/MOV 的采样表得到每帧的显示时间和关键帧（按显示顺序编号）。
+
+    Returns:
+        (np.ndarray, np.ndarray) 或 None: 显示时间（毫秒）和关键帧序号；不是 MP4 或没有视频轨时返回 None。
+    """
+    with open(video_path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        moov = _find_box(f, 0, file_size, [b"moov"])
+        if not moov:
+            return None
+        for kind, body, stop in _iter_boxes(f, *moov):
+            if kind != b"trak":
+                continue
+            hdlr = _find_box(f, body, stop, [b"mdia", b"hdlr"])
+            if not hdlr:
+                continue
+            f.seek(hdlr[0] + 8)
+            if f.read(4) != b"vide":
+                continue
+            mdhd = _find_box(f, body, stop, [b"mdia", b"mdhd"])
+            stbl = _find_box(f, body, stop, [b"mdia", b"minf", b"stbl"])
+            if not mdhd or not stbl:
+                return None
+            f.seek(mdhd[0])
+            version = f.read(1)[0]
+            f.seek(mdhd[0] + (20 if version == 1 else 12))
+            timescale = struct.unpack(">I", f.read(4))[0] or 1
+
+            stts = _find_box(f, *stbl, [b"stts"])
+            if not stts:
+                return None
+            _, rows = _read_table(f, stts, ">u4,>u4")
+            durations = np.repeat(rows["f1"].astype(np.int64), rows["f0"].astype(np.int64))
+            decode_times = np.concatenate([[0], np.cumsum(durations)[:-1]]) if len(durations) else durations
+            presentation = decode_times.copy()
+            ctts = _find_box(f, *stbl, [b"ctts"])
+            if ctts:
+                version, rows = _read_table(f, ctts, ">u4,>i4")
+                offsets = rows["f1"] if version == 1 else rows["f1"].view(">u4")
+                offsets = np.repeat(offsets.astype(np.int64), rows["f0"].astype(np.int64))
+                presentation[:len(offsets)] += offsets[:len(presentation)]
+            # 解码顺序 -> 显示顺序
+            order = np.argsort(presentation, kind='stable')
+            rank = np.empty_like(order)
+            rank[order] = np.arange(len(order))
+            stss = _find_box(f, *stbl, [b"stss"])
+            if stss:
+                _, rows = _read_table(f, stss, ">u4")
+                samples = rows.astype(np.int64) - 1
+                keyframes = np.sort(rank[samples[(samples >= 0) & (samples < len(rank))]])
+            else:
+                keyframes = np.arange(len(rank))  # 没有 stss 表时每帧都是关键帧
+            timestamps = (presentation[order] - presentation[order[0]]) * 1000.0 / timescale if len(order) else order
+            return timestamps.astype(np.float64), keyframes
+    return None
+
+
+def scan_frames(capture):
+    """顺序 grab 整个视频，返回每帧的显示时间（毫秒）"""
+    timestamps = []
+    while capture.grab():
+        timestamps.append(capture.get(cv2.CAP_PROP_POS_MSEC))
+    return np.array(timestamps, dtype=np.float64)
+
+
+def build_index(video_path):
+    """建立帧索引（见模块说明）"""
+    if cv2 is None:
+        raise RuntimeError("需要安装 OpenCV (opencv-python) 才能读取视频")
+    capture = cv2.VideoCapture(video_path)
+    try:
+        if not capture.isOpened():
+            raise ValueError(f"无法打开视频: {video_path}")
+        width = capture.get(cv2.CAP_PROP_FRAME_WIDTH)
+        height = capture.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        parsed = None
+        if video_path.lower().endswith(('.mp4', '.mov', '.m4v')):
+            try:
+                parsed = parse_mp4_frames(video_path)
+            except (OSError, struct.error, ValueError) as e:
+                print(f"解析 {video_path} 的采样表失败，改为逐帧扫描: {e}")
+        if parsed is not None:
+            timestamps, keyframes = parsed
+        else:
+            timestamps, keyframes = scan_frames(capture), np.empty(0, dtype=np.int64)
+    finally:
+        capture.release()
+    return VideoIndex(timestamps, keyframes, width, height, fps)
+
+
+_indices = {}  # 视频路径 -> ((mtime_ns, 大小), VideoIndex)
+_indices_lock = threading.Lock()
+
+
+def load_index(video_path):
+    """读取缓存的帧索引，视频变化或没有缓存时重新建立"""
+    stat = os.stat(video_path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _indices_lock:
+        cached = _indices.get(video_path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    cache_path = os.path.join(labelio.dataset_cache_dir(os.path.dirname(video_path)),
+                              f"video_{os.path.basename(video_path)}.npz")
+    index = None
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as data:
+                if tuple(data["key"].tolist()) == key + (INDEX_VERSION,):
+                    width, height, fps = data["info"].tolist()
+                    index = VideoIndex(data["timestamps"], data["keyframes"], width, height, fps)
+        except (OSError, ValueError, KeyError):
+            index = None
+    if index is None:
+        index = build_index(video_path)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+        np.savez(temp_path, key=np.array(key + (INDEX_VERSION,), dtype=np.int64), timestamps=index.timestamps,
+                 keyframes=index.keyframes, info=np.array([index.width, index.height, index.fps], dtype=np.float64))
+        os.replace(temp_path, cache_path)
+    with _indices_lock:
+        _indices[video_path] = (key, index)
+    return index
+
+
+class VideoSource:
+    """
+    一个视频的解码器（工作线程）和解码帧缓冲区。
+
+    Args:
+        video_path (str): 视频路径。
+        capacity (int): 缓冲区最多保留的帧数（1080p 每帧约 6 MB）。
+        read_ahead (int): 顺序浏览时预读的帧数。
+    """
+
+    def __init__(self, video_path, capacity=32, read_ahead=8, index=None):
+        if cv2 is None:
+            raise RuntimeError("需要安装 OpenCV (opencv-python) 才能读取视频")
+        self.video_path = video_path
+        self.index = index or load_index(video_path)
+        self.capacity = max(2, capacity)
+        self.read_ahead = min(read_ahead, self.capacity // 2)
+        self.frames = OrderedDict()  # 帧序号 -> RGB 数组，按最近使用排序
+        self.errors = {}  # 帧序号 -> 解码错误
+        self.wanted = None  # 界面最近请求的帧
+        self.closed = False
+        self._position = None  # 解码器下一次 read 得到的帧（只在工作线程中使用）
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def frame_count(self):
+        return self.index.frame_count
+
+    def get_frame(self, frame_index, timeout=30):
+        """返回第 frame_index 帧（HxWx3 uint8 RGB），缓冲区中没有时等待工作线程解码"""
+        if not 0 <= frame_index < self.frame_count:
+            raise IndexError(f"帧序号超出范围: {frame_index}")
+        with self._cond:
+            self.wanted = frame_index
+            self._cond.notify_all()
+            ready = self._cond.wait_for(
+                lambda: frame_index in self.frames or frame_index in self.errors or self.closed, timeout)
+            if frame_index in self.errors:
+                raise self.errors.pop(frame_index)
+            if not ready or frame_index not in self.frames:
+                raise TimeoutError(f"解码第 {frame_index} 帧超时: {self.video_path}")
+            self.frames.move_to_end(frame_index)
+            return self.frames[frame_index]
+
+    def is_ready(self, frame_index):
+        """第 frame_index 帧已在缓冲区中或已知解码失败（get_frame 不会等待）"""
+        with self._cond:
+            return frame_index in self.frames or frame_index in self.errors
+
+    def prefetch(self, frame_index):
+        """提示工作线程提前解码 frame_index 附近的帧（不等待）"""
+        if 0 <= frame_index < self.frame_count:
+            with self._cond:
+                self.wanted = frame_index
+                self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self.frames.clear()
+            self._cond.notify_all()
+
+    def _next_job(self):
+        """（持有锁）下一段要解码的帧 (start, stop)，没有工作时返回 None"""
+        wanted = self.wanted
+        if wanted is None or wanted in self.errors:
+            return None
+        if wanted not in self.frames:
+            position = self._position
+            if position is not None and position <= wanted < position + self.capacity:
+                return position, wanted  # 在当前位置之后不远，继续顺序解码比跳转快
+            start = self.index.keyframe_before(wanted)
+            if start is None:
+                start = max(0, wanted - self.capacity // 2)
+            return start, wanted
+        stop = min(wanted + self.read_ahead, self.frame_count - 1)
+        last = wanted
+        while last < stop and last + 1 in self.frames:
+            last += 1
+        return (last + 1, stop) if last < stop else None
+
+    def _run(self):
+        capture = cv2.VideoCapture(self.video_path)
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self.closed or self._next_job() is not None)
+                    if self.closed:
+                        return
+                    start, stop = self._next_job()
+                self._decode(capture, start, stop)
+        finally:
+            capture.release()
+
+    def _decode(self, capture, start, stop):
+        """解码 [start, stop]；靠前且放不进缓冲区的帧只 grab 不转换颜色"""
+        if self._position != start:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+        self._position = start
+        keep_from = stop - self.capacity + 1
+        for frame_index in range(start, stop + 1):
+            if frame_index < keep_from:
+                ok, bgr = capture.grab(), None
+            else:
+                ok, bgr = capture.read()
+            if not ok:
+                with self._cond:
+                    for failed in range(frame_index, stop + 1):
+                        self.errors[failed] = ValueError(f"无法解码第 {failed} 帧: {self.video_path}")
+                    self._position = None
+                    self._cond.notify_all()
+                return
+            self._position = frame_index + 1
+            if bgr is None:
+                continue
+            rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+            with self._cond:
+                if self.closed:
+                    return
+                self.frames[frame_index] = rgb
+                self.frames.move_to_end(frame_index)
+                while len(self.frames) > self.capacity:
+                    self.frames.popitem(last=False)
+                self._cond.notify_all()
+                # 界面已经跳到别处，放弃这一段
+                wanted = self.wanted
+                if wanted is not None and not frame_index <= wanted <= stop and wanted not in self.frames:
+                    return
+
+
+_sources = OrderedDict()  # 视频路径 -> VideoSource（每个进程最多保留几个打开的视频）
+_sources_lock = threading.Lock()
+MAX_OPEN_SOURCES = 4
+
+
+def open_source(video_path):
+    """返回该视频共用的 VideoSource（按最近使用保留 MAX_OPEN_SOURCES 个）"""
+    with _sources_lock:
+        source = _sources.get(video_path)
+        if source is not None:
+            _sources.move_to_end(video_path)
+            return source
+        source = _sources[video_path] = VideoSource(video_path)
+        while len(_sources) > MAX_OPEN_SOURCES:
+            _sources.popitem(last=False)[1].close()
+        return source
+
+
+def close_sources():
+    with _sources_lock:
+        for source in _sources.values():
+            source.close()
+        _sources.clear()
+
+
+def frame_ready(path):
+    """视频帧路径对应的视频已经打开且该帧可以立即取得（不打开视频、不等待）"""
+    video_path, frame_index = labelio.split_frame_path(path)
+    with _sources_lock:
+        source = _sources.get(video_path)
+    return source is not None and source.is_ready(frame_index)
+
+
+def read_frame(path):
+    """解码视频帧路径对应的帧，返回 HxWx3 uint8 RGB 数组"""
+    video_path, frame_index = labelio.split_frame_path(path)
+    return open_source(video_path).get_frame(frame_index)
+
+
+def frame_size(path):
+    """视频帧的尺寸 (width, height)，只读取帧索引"""
+    video_path, _ = labelio.split_frame_path(path)
+    index = load_index(video_path)
+    return index.width, index.height
+
+
+def list_frames(folder_path):
+    """列出文件夹中所有视频的全部帧路径；没有安装 OpenCV 或视频无法打开时跳过"""
+    videos = sorted(os.path.join(folder_path, name) for name in os.listdir(folder_path)
+                    if name.lower().endswith(labelio.VIDEO_EXTENSIONS))
+    if videos and cv2 is None:
+        print("没有安装 OpenCV (opencv-python)，跳过文件夹中的视频")
+        return []
+    frames = []
+    for video_path in videos:
+        try:
+            count = load_index(video_path).frame_count
+        except Exception as e:
+            print(f"读取视频 {video_path} 失败: {e}")
+            continue
+        frames.extend(labelio.frame_path(video_path, i) for i in range(count))
+    return frames